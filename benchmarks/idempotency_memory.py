@@ -0,0 +1,87 @@
+"""
+Compares Redis memory per million message IDs for the idempotency backends.
+
+Requires a disposable Redis instance (the selected database is flushed) and the
+service settings available in the environment or in `.env`:
+
+    python benchmarks/idempotency_memory.py --redis-url redis://localhost:6379/15 --count 1000000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import redis.asyncio as redis
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from notification_service.idempotency import BucketedIdempotencyStore, RedisKeyIdempotencyStore  # noqa: E402
+
+BATCH_SIZE = 10_000
+
+
+async def used_memory(client: redis.Redis) -> int:
+    info = await client.info("memory")
+    return int(info["used_memory"])
+
+
+async def fill_keys(client: redis.Redis, count: int, ttl_seconds: int):
+    for start in range(0, count, BATCH_SIZE):
+        async with client.pipeline(transaction=False) as pipe:
+            for _ in range(min(BATCH_SIZE, count - start)):
+                pipe.set(RedisKeyIdempotencyStore.key_for(uuid4()), "processed", ex=ttl_seconds)
+            await pipe.execute()
+
+
+async def fill_buckets(client: redis.Redis, count: int, ttl_seconds: int, bucket_seconds: int):
+    # Spreads the IDs evenly over the buckets of one TTL window, as steady traffic would.
+    store = BucketedIdempotencyStore(client, ttl_seconds=ttl_seconds, bucket_seconds=bucket_seconds)
+    buckets = ttl_seconds // bucket_seconds
+    current = store._bucket_index(time.time())
+    for start in range(0, count, BATCH_SIZE):
+        async with client.pipeline(transaction=False) as pipe:
+            for offset in range(min(BATCH_SIZE, count - start)):
+                index = current - (start + offset) % buckets
+                key = store._bucket_key(index)
+                pipe.sadd(key, uuid4().bytes)
+                pipe.expireat(key, (index + 1) * bucket_seconds + ttl_seconds)
+            await pipe.execute()
+
+
+async def measure(client: redis.Redis, name: str, fill, count: int) -> float:
+    await client.flushdb()
+    baseline = await used_memory(client)
+    await fill()
+    used = await used_memory(client) - baseline
+    per_million_mb = used / count * 1_000_000 / (1024 * 1024)
+    print(f"{name:<10} {used / count:>10.1f} B/ID {per_million_mb:>10.1f} MiB per million IDs")
+    await client.flushdb()
+    return per_million_mb
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", required=True)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--ttl-seconds", type=int, default=86400)
+    parser.add_argument("--bucket-seconds", type=int, default=3600)
+    args = parser.parse_args()
+
+    client = redis.from_url(args.redis_url)
+    try:
+        keys_mb = await measure(
+            client, "keys", lambda: fill_keys(client, args.count, args.ttl_seconds), args.count)
+        buckets_mb = await measure(
+            client, "bucketed",
+            lambda: fill_buckets(client, args.count, args.ttl_seconds, args.bucket_seconds),
+            args.count,
+        )
+        print(f"bucketed / keys: {buckets_mb / keys_mb:.2f}")
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
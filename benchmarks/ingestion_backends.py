@@ -0,0 +1,137 @@
+"""
+Compares publish and consume throughput of the RabbitMQ and Redis Streams ingestion backends.
+
+Publishes `--count` events through each backend's publisher, then times the
+backend's consumer draining them into a handler that only counts. Requires
+disposable brokers (the Redis database is flushed and the RabbitMQ queues are
+declared from the service settings) and the settings available in the
+environment or in `.env`:
+
+    python benchmarks/ingestion_backends.py --redis-url redis://localhost:6379/15 --count 100000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from uuid import uuid4
+
+import aio_pika
+import redis.asyncio as redis
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from config import settings  # noqa: E402
+from notification_service.consumer import RabbitMQConsumer  # noqa: E402
+from notification_service.publisher import NotificationPublisher, routing_key_for  # noqa: E402
+from notification_service.streams import RedisStreamConsumer, RedisStreamPublisher  # noqa: E402
+
+BATCH_SIZE = 500
+EVENT_TYPE = "INVOICE_DUE_SOON"
+
+
+class CountingHandler:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.processed = 0
+        self.done = asyncio.Event()
+
+    async def process_event(self, event_data: dict, correlation_id: str | None = None) -> bool:
+        self.processed += 1
+        if self.processed >= self.expected:
+            self.done.set()
+        return True
+
+
+def build_message(n: int) -> aio_pika.Message:
+    event = {
+        "message_id": str(uuid4()),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "trigger_type": "system_scheduled",
+        "event_type": EVENT_TYPE,
+        "recipient": {"user_id": f"user-{n}", "email": f"user-{n}@example.com", "name": "Benchmark"},
+        "payload": {
+            "credit_card": "Benchmark Card",
+            "month": 10,
+            "year": 2025,
+            "due_date": "2025-10-28",
+            "amount": 150.50,
+            "invoice_deep_link": "poupeai://app/invoices/1",
+        },
+    }
+    return aio_pika.Message(json.dumps(event).encode(), correlation_id=str(uuid4()), content_type="application/json")
+
+
+async def publish(publisher, count: int) -> float:
+    started = time.perf_counter()
+    routing_key = routing_key_for(EVENT_TYPE)
+    for start in range(0, count, BATCH_SIZE):
+        batch = [(build_message(n), routing_key) for n in range(start, min(start + BATCH_SIZE, count))]
+        errors = [error for error in await publisher.publish_batch(batch) if error is not None]
+        if errors:
+            raise errors[0]
+    return time.perf_counter() - started
+
+
+async def consume(consumer, handler: CountingHandler) -> float:
+    started = time.perf_counter()
+    task = asyncio.create_task(consumer.run())
+    try:
+        await handler.done.wait()
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return time.perf_counter() - started
+
+
+def report(name: str, count: int, published: float, consumed: float):
+    print(f"{name:<14} publish {count / published:>10.0f} msg/s   consume {count / consumed:>10.0f} msg/s")
+
+
+async def bench_rabbitmq(count: int):
+    handler = CountingHandler(count)
+    consumer = RabbitMQConsumer(event_handler=handler)
+    await consumer.connect()
+    # Declares the queues up front so the published messages are routed before the consumer starts.
+    await consumer._setup_queues()
+    publisher = NotificationPublisher(settings.RABBITMQ_URL)
+    await publisher.connect()
+    try:
+        published = await publish(publisher, count)
+    finally:
+        await publisher.close()
+    report("rabbitmq", count, published, await consume(consumer, handler))
+
+
+async def bench_redis_streams(client: redis.Redis, count: int):
+    await client.flushdb()
+    handler = CountingHandler(count)
+    consumer = RedisStreamConsumer(client, handler)
+    await consumer.connect()
+    published = await publish(RedisStreamPublisher(client), count)
+    report("redis_streams", count, published, await consume(consumer, handler))
+    await client.flushdb()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", required=True)
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--backend", choices=["rabbitmq", "redis_streams"], action="append")
+    args = parser.parse_args()
+    backends = args.backend or ["rabbitmq", "redis_streams"]
+
+    client = redis.from_url(args.redis_url, decode_responses=True)
+    try:
+        if "rabbitmq" in backends:
+            await bench_rabbitmq(args.count)
+        if "redis_streams" in backends:
+            await bench_redis_streams(client, args.count)
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,217 @@
+import hmac
+from typing import Any, Literal
+
+import structlog
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, status as http_status
+from fastapi.responses import PlainTextResponse
+
+from config import settings
+from diagnostics import (
+    Diagnostics,
+    LoopStallMonitor,
+    dump_tasks,
+    get_diagnostics,
+    run_cprofile,
+    run_sampling_profile,
+)
+from tuning import RuntimeTuner, TuningError, get_tuner
+
+logger = structlog.get_logger(__name__)
+
+
+async def require_admin_token(x_admin_token: str | None = Header(None)):
+    """Admin endpoints require `X-Admin-Token` to match ADMIN_TOKEN; without a configured token they are closed."""
+    expected = settings.ADMIN_TOKEN.get_secret_value() if settings.ADMIN_TOKEN else None
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        logger.warning(
+            "Rejected admin request",
+            event_type="ADMIN_AUTH_FAILED",
+            trigger_type="user_action",
+            event_details={"token_configured": bool(expected)},
+        )
+        raise HTTPException(status_code=http_status.HTTP_403_FORBIDDEN, detail="Invalid admin token.")
+
+
+async def require_diagnostics() -> Diagnostics:
+    try:
+        return await get_diagnostics()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Diagnostics are disabled.",
+        )
+
+
+async def require_tuner() -> RuntimeTuner:
+    try:
+        return await get_tuner()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Runtime tuning is not available.",
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    summary="Perfila o event loop por alguns segundos",
+    responses={409: {"description": "Outro perfil já está em execução"}},
+)
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    mode: Literal["sampling", "cprofile"] = "sampling",
+    sort: Literal["cumulative", "tottime", "calls"] = "cumulative",
+    limit: int = Query(50, ge=1, le=1000),
+    diagnostics: Diagnostics = Depends(require_diagnostics),
+):
+    """
+    Perfila o processo em execução por `seconds` (até `ADMIN_PROFILE_MAX_SECONDS`).
+    `sampling` amostra a pilha do event loop a partir de outra thread e retorna
+    pilhas colapsadas (entrada do flamegraph.pl), com baixo custo; `cprofile`
+    registra todas as chamadas e retorna o relatório do pstats ordenado por
+    `sort`, com custo maior enquanto executa.
+    """
+    if diagnostics.profile_lock.locked():
+        raise HTTPException(status_code=http_status.HTTP_409_CONFLICT, detail="A profile is already running.")
+    seconds = min(seconds, settings.ADMIN_PROFILE_MAX_SECONDS)
+    async with diagnostics.profile_lock:
+        logger.info(
+            "Profiling started",
+            event_type="ADMIN_PROFILE_STARTED",
+            trigger_type="user_action",
+            event_details={"mode": mode, "seconds": seconds},
+        )
+        if mode == "cprofile":
+            return await run_cprofile(seconds, sort=sort, limit=limit)
+        return await run_sampling_profile(seconds, settings.ADMIN_PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+
+@router.post("/memory/snapshots", summary="Captura um snapshot de memória (tracemalloc)")
+async def take_memory_snapshot(
+    limit: int = Query(20, ge=1, le=500),
+    diagnostics: Diagnostics = Depends(require_diagnostics),
+):
+    """
+    Captura um snapshot das alocações com tracemalloc e retorna as `limit`
+    linhas que mais alocam. O rastreamento começa no primeiro snapshot e
+    continua ativo (com custo de memória e CPU) até `DELETE /memory/snapshots`.
+    Apenas as alocações feitas depois do início do rastreamento aparecem.
+    """
+    return diagnostics.snapshot_store.take(limit=limit)
+
+
+@router.get("/memory/snapshots", summary="Lista os snapshots de memória guardados")
+async def list_memory_snapshots(diagnostics: Diagnostics = Depends(require_diagnostics)):
+    return {"snapshots": diagnostics.snapshot_store.entries()}
+
+
+@router.get(
+    "/memory/snapshots/{snapshot_id}/diff",
+    summary="Compara dois snapshots de memória",
+    responses={404: {"description": "Snapshot não encontrado"}},
+)
+async def diff_memory_snapshots(
+    snapshot_id: int,
+    against: int,
+    limit: int = Query(20, ge=1, le=500),
+    diagnostics: Diagnostics = Depends(require_diagnostics),
+):
+    """
+    Retorna as linhas cujo uso de memória mais cresceu do snapshot `against`
+    até `snapshot_id`.
+    """
+    diff = diagnostics.snapshot_store.diff(snapshot_id, against, limit=limit)
+    if diff is None:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Snapshot not found.")
+    return {"snapshot_id": snapshot_id, "against": against, "top": diff}
+
+
+@router.delete("/memory/snapshots", summary="Descarta os snapshots e desliga o tracemalloc")
+async def stop_memory_tracing(diagnostics: Diagnostics = Depends(require_diagnostics)):
+    diagnostics.snapshot_store.stop()
+    return {"tracing": False}
+
+
+@router.get("/tasks", summary="Lista as tarefas asyncio em execução")
+async def list_tasks(
+    stack_limit: int = Query(10, ge=1, le=100),
+    diagnostics: Diagnostics = Depends(require_diagnostics),
+):
+    """
+    Retorna cada tarefa do event loop com o ponto em que está suspensa, e a
+    contagem de tarefas por corrotina (útil para achar tarefas que vazam).
+    """
+    return dump_tasks(stack_limit=stack_limit)
+
+
+@router.post("/loop-monitor/start", summary="Liga o detector de bloqueios do event loop")
+async def start_loop_monitor(
+    threshold_ms: float = Query(100.0, ge=10),
+    diagnostics: Diagnostics = Depends(require_diagnostics),
+):
+    """
+    Registra cada vez que o event loop fica bloqueado por mais de
+    `threshold_ms`, com a pilha do código que o bloqueou. Fica ligado até
+    `POST /loop-monitor/stop`.
+    """
+    if diagnostics.loop_monitor:
+        await diagnostics.loop_monitor.stop()
+    diagnostics.loop_monitor = LoopStallMonitor(threshold_ms / 1000, max_stalls=settings.ADMIN_MAX_LOOP_STALLS)
+    diagnostics.loop_monitor.start()
+    return diagnostics.loop_monitor.report()
+
+
+@router.post("/loop-monitor/stop", summary="Desliga o detector de bloqueios do event loop")
+async def stop_loop_monitor(diagnostics: Diagnostics = Depends(require_diagnostics)):
+    if diagnostics.loop_monitor:
+        await diagnostics.loop_monitor.stop()
+        return diagnostics.loop_monitor.report()
+    return {"running": False, "stalls": []}
+
+
+@router.get("/loop-monitor", summary="Bloqueios do event loop detectados")
+async def get_loop_monitor(diagnostics: Diagnostics = Depends(require_diagnostics)):
+    if diagnostics.loop_monitor:
+        return diagnostics.loop_monitor.report()
+    return {"running": False, "stalls": []}
+
+
+@router.get("/tuning", summary="Configurações ajustáveis em tempo de execução")
+async def get_tuning(tuner: RuntimeTuner = Depends(require_tuner)):
+    """Valor atual, valor de inicialização e faixa aceita de cada configuração ajustável."""
+    return {"settings": tuner.current()}
+
+
+@router.patch(
+    "/tuning",
+    summary="Altera configurações sem reiniciar",
+    responses={422: {"description": "Configuração desconhecida ou valor fora da faixa"}},
+)
+async def update_tuning(
+    changes: dict[str, Any] = Body(..., examples=[{"RABBITMQ_PREFETCH_COUNT": 20, "RABBITMQ_MAX_RETRIES": None}]),
+    x_admin_actor: str = Header("admin", max_length=100),
+    tuner: RuntimeTuner = Depends(require_tuner),
+):
+    """
+    Aplica as alterações imediatamente neste pod, registra-as na auditoria e as
+    publica para os demais pods (com `TUNING_SYNC_ENABLED`). O valor `null`
+    restaura o valor de inicialização. `X-Admin-Actor` identifica quem fez a
+    alteração na auditoria. `synced: false` indica que o Redis falhou e a
+    alteração valeu apenas para este pod.
+    """
+    try:
+        return await tuner.update(changes, actor=x_admin_actor)
+    except TuningError as e:
+        raise HTTPException(status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@router.get("/tuning/audit", summary="Histórico de alterações em tempo de execução")
+async def get_tuning_audit(
+    limit: int = Query(100, ge=1, le=1000),
+    tuner: RuntimeTuner = Depends(require_tuner),
+):
+    return {"entries": await tuner.audit_log(limit=limit)}
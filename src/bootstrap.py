@@ -0,0 +1,167 @@
+import asyncio
+from typing import Optional
+
+import structlog
+from fastapi_mail import ConnectionConfig
+from redis.asyncio import Redis
+
+from config import settings
+from redis_client import init_redis_pool, close_redis_pool, get_redis_client, warm_redis_pool
+from startup import retry_with_backoff, warm_up
+import tracing
+from tracing import close_tracing, init_tracing
+from tuning import RuntimeTuner, init_tuner, close_tuner
+from notification_service.channels import WEBHOOK, NotificationChannel, build_channels, close_channels
+from notification_service.consumer import RabbitMQConsumer
+from notification_service.delivery_status import DeliveryStatusRecorder, init_delivery_recorder, close_delivery_recorder
+from notification_service.idempotency import build_idempotency_store
+from notification_service.outbox import build_outbox
+from notification_service.publisher import NotificationPublisher
+from notification_service.streams import RedisStreamConsumer, RedisStreamPublisher
+from notification_service.suppression import init_suppression_list, close_suppression_list
+from notification_service.service import EmailService, EventHandler, TemplateCachingFastMail, build_mail_config
+
+logger = structlog.get_logger(__name__)
+
+
+class ConsumerRuntime:
+    """The consumer and the dependencies it was built with, shared by the API and the headless worker."""
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        email_service: EmailService,
+        consumer: RabbitMQConsumer | RedisStreamConsumer,
+        delivery_recorder: Optional[DeliveryStatusRecorder],
+        channels: Optional[dict[str, NotificationChannel]] = None,
+    ):
+        self.redis_client = redis_client
+        self.email_service = email_service
+        self.consumer = consumer
+        self.delivery_recorder = delivery_recorder
+        self.channels = channels or {}
+        self.consumer_task: Optional[asyncio.Task] = None
+
+
+def register_tuning_appliers(
+    tuner: RuntimeTuner,
+    consumer: RabbitMQConsumer | RedisStreamConsumer,
+    event_handler: EventHandler,
+    email_service: EmailService,
+    channels: dict[str, NotificationChannel],
+):
+    """Pushes runtime setting changes into the objects that copied the value when they were built."""
+    tuner.on("RABBITMQ_PREFETCH_COUNT", consumer.set_prefetch_count)
+    limiter = consumer.concurrency_limiter
+    if limiter is not None:
+        async def set_bounds(_):
+            await limiter.set_bounds(settings.CONCURRENCY_MIN_LIMIT, settings.CONCURRENCY_MAX_LIMIT)
+        tuner.on("CONCURRENCY_MIN_LIMIT", set_bounds)
+        tuner.on("CONCURRENCY_MAX_LIMIT", set_bounds)
+        tuner.on("CONCURRENCY_LATENCY_TARGET_MS",
+                 lambda value: setattr(limiter, "latency_target_seconds", value / 1000))
+        tuner.on("CONCURRENCY_BACKOFF_RATIO", lambda value: setattr(limiter, "backoff_ratio", value))
+    tuner.on("MAIL_LOCAL_RETRY_ATTEMPTS", lambda value: setattr(email_service, "local_retry_attempts", value))
+    if WEBHOOK in channels:
+        tuner.on("WEBHOOK_RETRY_ATTEMPTS", lambda value: setattr(channels[WEBHOOK], "retry_attempts", value))
+    tuner.on("BULK_CHUNK_SIZE", lambda value: setattr(event_handler.bulk_expander, "chunk_size", value))
+    tuner.on("BULK_RECIPIENT_CONCURRENCY",
+             lambda value: setattr(event_handler.bulk_expander, "concurrency", value))
+    tuner.on("BULK_MAX_CHUNKS_PER_DELIVERY",
+             lambda value: setattr(event_handler.bulk_expander, "max_chunks_per_delivery", value))
+    tuner.on("TRACING_SAMPLE_RATIO", lambda value: setattr(tracing.tracer, "sample_ratio", value))
+
+
+async def start_consumer_runtime(
+    publisher: Optional[NotificationPublisher | RedisStreamPublisher] = None,
+    mail_config: Optional[ConnectionConfig] = None,
+) -> ConsumerRuntime:
+    """
+    Builds the handler and consumer, warms their dependencies concurrently and
+    starts the consumer task. The publisher, when given, is warmed alongside.
+    """
+    init_tracing()
+    await init_redis_pool()
+    redis_client = await get_redis_client()
+
+    email_service = EmailService(TemplateCachingFastMail(mail_config or build_mail_config(settings)))
+    suppression_list = init_suppression_list(redis_client) if settings.SUPPRESSION_ENABLED else None
+    channels = build_channels()
+    event_handler = EventHandler(
+        redis_client=redis_client,
+        email_service=email_service,
+        idempotency_store=build_idempotency_store(redis_client),
+        suppression_list=suppression_list,
+        channels=channels,
+    )
+    delivery_recorder = init_delivery_recorder(redis_client) if settings.DELIVERY_STATUS_ENABLED else None
+    if settings.INGESTION_BACKEND == "redis_streams":
+        consumer = RedisStreamConsumer(redis_client, event_handler, delivery_recorder=delivery_recorder)
+    else:
+        outbox = build_outbox() if settings.OUTBOX_ENABLED else None
+        consumer = RabbitMQConsumer(event_handler=event_handler, delivery_recorder=delivery_recorder, outbox=outbox)
+    tuner = init_tuner(redis_client)
+    register_tuning_appliers(tuner, consumer, event_handler, email_service, channels)
+
+    async def warm_redis(deadline):
+        await retry_with_backoff(
+            lambda: warm_redis_pool(settings.REDIS_WARM_CONNECTIONS), name="redis", deadline=deadline)
+        # Before the consumer starts, so it runs with the settings the other pods use.
+        await retry_with_backoff(tuner.load_overrides, name="runtime_settings", deadline=deadline)
+        if suppression_list is not None:
+            await retry_with_backoff(suppression_list.load, name="suppression_list", deadline=deadline)
+            suppression_list.start()
+
+    async def warm_broker(deadline):
+        steps = [consumer.connect(deadline=deadline)]
+        if publisher is not None:
+            steps.append(retry_with_backoff(publisher.warm_up, name=f"{settings.INGESTION_BACKEND}_publisher", deadline=deadline))
+        await asyncio.gather(*steps)
+
+    async def warm_templates(deadline):
+        await asyncio.to_thread(email_service.precompile_templates)
+
+    await warm_up(
+        {
+            "redis": (warm_redis, True),
+            settings.INGESTION_BACKEND: (warm_broker, True),
+            "smtp": (lambda deadline: email_service.check_connection(), False),
+            "templates": (warm_templates, False),
+        },
+        deadline_seconds=settings.STARTUP_DEADLINE_SECONDS,
+    )
+
+    tuner.start()
+    runtime = ConsumerRuntime(redis_client, email_service, consumer, delivery_recorder, channels)
+    logger.debug(
+        "Starting consumer task",
+        event_type="CONSUMER_TASK_STARTED",
+        event_details={"ingestion_backend": settings.INGESTION_BACKEND},
+    )
+    runtime.consumer_task = asyncio.create_task(consumer.run())
+    return runtime
+
+
+async def stop_consumer_runtime(runtime: Optional[ConsumerRuntime]):
+    """Stops the consumer task, then closes the channels, the settings subscription and the suppression refresh, flushes delivery records, closes Redis and exports the remaining spans."""
+    if runtime and runtime.consumer_task:
+        runtime.consumer_task.cancel()
+        try:
+            await runtime.consumer_task
+        except asyncio.CancelledError:
+            logger.debug(
+                "Consumer task cancelled successfully",
+                event_type="CONSUMER_TASK_CANCELLED",
+                trigger_type="system_scheduled",
+            )
+        except Exception:
+            # Already logged by the consumer when it failed.
+            pass
+
+    if runtime:
+        await close_channels(runtime.channels)
+    await close_tuner()
+    await close_suppression_list()
+    await close_delivery_recorder()
+    await close_redis_pool()
+    await close_tracing()
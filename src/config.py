@@ -1,6 +1,20 @@
-from pydantic import SecretStr, AmqpDsn, RedisDsn
+from pydantic import BaseModel, SecretStr, AmqpDsn, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, List, Literal, Optional
+
+
+class QueueShard(BaseModel):
+    """Dedicated queue for a group of event types (routed by event_type routing keys)."""
+    event_types: List[str]
+    max_priority: Optional[int] = None
+    prefetch_count: int = 50
+    consumers: int = 1
+
+
+class ChannelRoute(BaseModel):
+    """Channels an event type is delivered through; the message is acked once the required ones succeed."""
+    channels: List[str] = ["email"]
+    required: Optional[List[str]] = None  # None: every channel is required
 
 
 class Settings(BaseSettings):
@@ -15,6 +29,10 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8001
 
+    # Health checks
+    HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 5.0
+
     # RabbitMQ Connection
     RABBITMQ_USER: str
     RABBITMQ_PASSWORD: SecretStr
@@ -33,10 +51,180 @@ class Settings(BaseSettings):
 
     RABBITMQ_ROUTING_KEY: str
     RABBITMQ_RETRY_DELAY_MS: int
+    RABBITMQ_PREFETCH_COUNT: int = 50
+
+    # RabbitMQ Sharding (one queue per event type or priority class)
+    RABBITMQ_SHARDING_ENABLED: bool = False
+    RABBITMQ_QUEUE_SHARDS: Dict[str, QueueShard] = {
+        "transactional": QueueShard(
+            event_types=[
+                "PROFILE_DELETION_SCHEDULED",
+                "STATEMENT_PROCESSING_COMPLETED",
+                "STATEMENT_PROCESSING_FAILED",
+            ],
+            max_priority=10,
+            prefetch_count=20,
+            consumers=2,
+        ),
+        "invoices": QueueShard(
+            event_types=["INVOICE_DUE_SOON", "INVOICE_OVERDUE"],
+            prefetch_count=100,
+            consumers=1,
+        ),
+    }
+
+    # Admin diagnostics (profiling, memory snapshots, task dump); not mounted unless enabled
+    ADMIN_ENABLED: bool = False
+    ADMIN_TOKEN: Optional[SecretStr] = None
+    ADMIN_PROFILE_MAX_SECONDS: float = 60.0
+    ADMIN_PROFILE_SAMPLE_INTERVAL_MS: float = 5.0
+    ADMIN_TRACEMALLOC_FRAMES: int = 10
+    ADMIN_MAX_MEMORY_SNAPSHOTS: int = 5
+    ADMIN_MAX_LOOP_STALLS: int = 100
+
+    # Runtime tuning (changes made through the admin API, shared across pods via Redis)
+    TUNING_SYNC_ENABLED: bool = True
+    TUNING_CHANNEL: str = "tuning:changes"
+    TUNING_AUDIT_MAX_ENTRIES: int = 1000
+
+    # Startup
+    STARTUP_DEADLINE_SECONDS: float = 30.0
+    STARTUP_BACKOFF_INITIAL_SECONDS: float = 0.5
+    STARTUP_BACKOFF_MAX_SECONDS: float = 10.0
+    REDIS_WARM_CONNECTIONS: int = 4
+
+    # Headless worker
+    WORKER_METRICS_PORT: int = 9100
+
+    # Publishing / HTTP ingestion
+    PUBLISHER_CHANNEL_POOL_SIZE: int = 4
+    INGESTION_BATCH_SIZE: int = 500
+    INGESTION_MAX_LINE_BYTES: int = 65536
+
+    # Ingestion backend: RabbitMQ, or a Redis stream consumed through a consumer group
+    INGESTION_BACKEND: Literal["rabbitmq", "redis_streams"] = "rabbitmq"
+    REDIS_STREAM_KEY: str = "notifications:events"
+    REDIS_STREAM_GROUP: str = "notification-service"
+    REDIS_STREAM_CONSUMER_NAME: Optional[str] = None
+    REDIS_STREAM_BATCH_SIZE: int = 100
+    REDIS_STREAM_BLOCK_MS: int = 2000
+    REDIS_STREAM_CONCURRENCY: int = 50
+    REDIS_STREAM_ACK_BATCH_SIZE: int = 100
+    REDIS_STREAM_ACK_INTERVAL_MS: float = 50.0
+    REDIS_STREAM_CLAIM_IDLE_MS: int = 300000
+    REDIS_STREAM_CLAIM_INTERVAL_SECONDS: float = 30.0
+    REDIS_STREAM_RETRY_KEY: str = "notifications:events:retry"
+    REDIS_STREAM_RETRY_POLL_INTERVAL_MS: float = 1000.0
+    REDIS_STREAM_DLQ_KEY: str = "notifications:events:dlq"
+    REDIS_STREAM_MAXLEN: int = 1000000
+
+    # Outbox (local spool for retry/DLQ republishes the broker refused)
+    OUTBOX_ENABLED: bool = False
+    OUTBOX_DIR: str = "data/outbox"
+    OUTBOX_MAX_BYTES: int = 256 * 1024 * 1024
+    OUTBOX_SEGMENT_MAX_BYTES: int = 16 * 1024 * 1024
+    OUTBOX_FSYNC_INTERVAL_MS: float = 10.0
+    OUTBOX_PUBLISH_TIMEOUT_SECONDS: float = 10.0
+    OUTBOX_DRAIN_INTERVAL_SECONDS: float = 5.0
+    OUTBOX_DRAIN_BATCH_SIZE: int = 100
+
+    # Consumer scheduling
+    SCHEDULER_ENABLED: bool = False
+    SCHEDULER_WORKERS: int = 10
+    SCHEDULER_DEFAULT_WEIGHT: int = 1
+    SCHEDULER_WEIGHTS: Dict[str, int] = {
+        "PROFILE_DELETION_SCHEDULED": 8,
+        "STATEMENT_PROCESSING_FAILED": 8,
+        "STATEMENT_PROCESSING_COMPLETED": 4,
+        "INVOICE_OVERDUE": 2,
+        "INVOICE_DUE_SOON": 1,
+    }
+    SCHEDULER_LATENCY_SLO_MS: Dict[str, int] = {
+        "PROFILE_DELETION_SCHEDULED": 2000,
+        "STATEMENT_PROCESSING_FAILED": 2000,
+        "STATEMENT_PROCESSING_COMPLETED": 5000,
+    }
+
+    # Queue metrics
+    QUEUE_METRICS_ENABLED: bool = True
+    QUEUE_METRICS_INTERVAL_SECONDS: float = 15.0
+    # Read passively from the management API's head_message_timestamp when set (e.g. http://rabbitmq:15672)
+    QUEUE_METRICS_MANAGEMENT_URL: Optional[str] = None
+    # Fallback that fetches the head message and requeues it: marks it redelivered and counts towards delivery limits
+    QUEUE_METRICS_HEAD_AGE_ENABLED: bool = False
+
+    # DLQ inspection / replay
+    DLQ_REPLAY_BATCH_SIZE: int = 100
+    DLQ_REPLAY_RATE_PER_SECOND: float = 200.0
+    DLQ_BROWSE_MAX_SCAN: int = 10000
+    DLQ_IDLE_TIMEOUT_SECONDS: float = 2.0
+    DLQ_CHECKPOINT_DIR: Optional[str] = None
+
+    # Adaptive concurrency
+    ADAPTIVE_CONCURRENCY_ENABLED: bool = False
+    CONCURRENCY_INITIAL_LIMIT: int = 10
+    CONCURRENCY_MIN_LIMIT: int = 1
+    CONCURRENCY_MAX_LIMIT: int = 100
+    CONCURRENCY_LATENCY_TARGET_MS: int = 2000
+    CONCURRENCY_BACKOFF_RATIO: float = 0.7
+    CONCURRENCY_PREFETCH_MULTIPLIER: int = 2
+
+    # Tracing (W3C traceparent in AMQP headers, spans exported to a file or OTLP/HTTP)
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATIO: float = 0.1
+    TRACING_EXPORTER: Literal["file", "otlp"] = "file"
+    TRACING_FILE_PATH: str = "traces/spans.ndjson"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_EXPORT_TIMEOUT_SECONDS: float = 5.0
+    TRACING_EXPORT_INTERVAL_SECONDS: float = 2.0
+    TRACING_EXPORT_BATCH_SIZE: int = 512
+    TRACING_MAX_QUEUE_SIZE: int = 10000
 
     # Redis
     REDIS_URL: str
 
+    # Idempotency
+    IDEMPOTENCY_BACKEND: Literal["keys", "bucketed"] = "keys"
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_BUCKET_SECONDS: int = 3600
+    IDEMPOTENCY_LOCAL_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_LOCAL_CACHE_TTL_SECONDS: int = 300
+    IDEMPOTENCY_DEGRADED_MODE_ENABLED: bool = False
+    IDEMPOTENCY_JOURNAL_PATH: Optional[str] = None
+    IDEMPOTENCY_JOURNAL_MAX_ENTRIES: int = 100000
+    IDEMPOTENCY_RECONCILE_INTERVAL_SECONDS: float = 5.0
+
+    # Delivery status
+    DELIVERY_STATUS_ENABLED: bool = True
+    DELIVERY_STATUS_RETENTION_SECONDS: int = 7 * 86400
+    DELIVERY_STATUS_FLUSH_INTERVAL_SECONDS: float = 1.0
+    DELIVERY_STATUS_BATCH_SIZE: int = 500
+    DELIVERY_STATUS_MAX_BUFFER: int = 50000
+
+    # Suppression list
+    SUPPRESSION_ENABLED: bool = True
+    SUPPRESSION_REFRESH_INTERVAL_SECONDS: float = 5.0
+    SUPPRESSION_CHANGES_MAX_LENGTH: int = 100000
+    SUPPRESSION_ADD_HARD_BOUNCES: bool = True
+    SUPPRESSION_BULK_MAX_ADDRESSES: int = 10000
+
+    # Bulk envelopes (one message, many recipients)
+    BULK_CHUNK_SIZE: int = 500
+    BULK_RECIPIENT_CONCURRENCY: int = 20
+    BULK_PROGRESS_TTL_SECONDS: int = 7 * 86400
+    # Chunks expanded per delivery before the envelope is requeued to continue, so one
+    # delivery stays well within the broker's consumer_timeout (30 min by default)
+    BULK_MAX_CHUNKS_PER_DELIVERY: int = 20
+
+    # Delivery channels (event types without a route go to email only)
+    CHANNEL_ROUTES: Dict[str, ChannelRoute] = {}
+    WEBHOOK_URL: Optional[str] = None
+    WEBHOOK_SECRET: Optional[SecretStr] = None
+    WEBHOOK_TIMEOUT_SECONDS: float = 5.0
+    WEBHOOK_MAX_CONNECTIONS: int = 20
+    WEBHOOK_RETRY_ATTEMPTS: int = 1
+    FILE_SINK_PATH: Optional[str] = None
+
     # Email
     MAIL_USERNAME: Optional[str] = None
     MAIL_PASSWORD: Optional[SecretStr] = None
@@ -48,6 +236,15 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool = False
     MAIL_SUPPRESS_SEND: bool = False
     USE_CREDENTIALS: bool = False
+    MAIL_LOCAL_RETRY_ATTEMPTS: int = 2
+    MAIL_LOCAL_RETRY_INITIAL_MS: int = 200
+    MAIL_LOCAL_RETRY_MAX_MS: int = 2000
+    SMTP_RETRY_DELAYS_MS: dict[int, int] = {421: 60000, 450: 300000, 451: 120000, 452: 600000}
+    SMTP_MAX_RETRY_DELAY_MS: int = 3600000
+
+    # Email templates: minified HTML and plain-text parts built by notification_service.template_build
+    TEMPLATE_BUILD_ENABLED: bool = True
+    TEMPLATE_BUILD_DIR: Optional[str] = "build/templates"
 
     @property
     def RABBITMQ_URL(self) -> AmqpDsn:
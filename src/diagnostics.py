@@ -0,0 +1,277 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Deque, Optional
+
+import structlog
+
+from config import settings
+from metrics import EVENT_LOOP_STALLS
+
+logger = structlog.get_logger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_qualname}"
+
+
+def _format_stack(frame, limit: int = 30) -> list[str]:
+    return [
+        f"{summary.filename}:{summary.lineno} {summary.name}"
+        for summary in traceback.extract_stack(frame, limit=limit)
+    ]
+
+
+async def run_cprofile(seconds: float, sort: str = "cumulative", limit: int = 50) -> str:
+    """
+    Profiles everything that runs on the event loop thread for `seconds` with
+    cProfile and returns the pstats report. Deterministic, so it adds noticeable
+    overhead while it runs.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+async def run_sampling_profile(seconds: float, interval_seconds: float = 0.005) -> str:
+    """
+    Samples the event loop thread's stack from a helper thread every
+    `interval_seconds` for `seconds` and returns the samples as collapsed stacks
+    (`frame;frame;frame count`, the flamegraph.pl input format). The loop itself
+    does no extra work, so the overhead stays low enough for production. The
+    sampler needs the GIL, so samples land where the loop thread releases it:
+    callbacks shorter than the interpreter switch interval are under-counted.
+    """
+    loop_thread_id = threading.get_ident()
+    stacks: Counter = Counter()
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval_seconds):
+            frame = sys._current_frames().get(loop_thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                stacks[";".join(reversed(labels))] += 1
+
+    sampler = threading.Thread(target=sample, name="stack-sampler", daemon=True)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        await asyncio.to_thread(sampler.join)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class SnapshotStore:
+    """
+    tracemalloc snapshots kept in memory for diffing. Tracing starts with the
+    first snapshot and stays on (at a memory and CPU cost) until `stop()`.
+    """
+
+    def __init__(self, max_snapshots: int = 5, frames: int = 10):
+        self.max_snapshots = max_snapshots
+        self.frames = frames
+        self._snapshots: dict[int, tuple[str, tracemalloc.Snapshot]] = {}
+        self._next_id = 1
+
+    @staticmethod
+    def _statistics(stats: list, limit: int) -> list[dict]:
+        return [
+            {
+                "location": str(stat.traceback[0]) if stat.traceback else "?",
+                "size_bytes": stat.size,
+                "count": stat.count,
+                **({"size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                   if hasattr(stat, "size_diff") else {}),
+            }
+            for stat in stats[:limit]
+        ]
+
+    def take(self, limit: int = 20) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        snapshot_id = self._next_id
+        self._next_id += 1
+        self._snapshots[snapshot_id] = (datetime.now(timezone.utc).isoformat(), snapshot)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.pop(min(self._snapshots))
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "snapshot_id": snapshot_id,
+            "taken_at": self._snapshots[snapshot_id][0],
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": self._statistics(snapshot.statistics("lineno"), limit),
+        }
+
+    def entries(self) -> list[dict]:
+        return [{"snapshot_id": snapshot_id, "taken_at": taken_at}
+                for snapshot_id, (taken_at, _) in sorted(self._snapshots.items())]
+
+    def diff(self, snapshot_id: int, against: int, limit: int = 20) -> Optional[list[dict]]:
+        """Allocation growth from `against` to `snapshot_id`, largest first; None if either is unknown."""
+        if snapshot_id not in self._snapshots or against not in self._snapshots:
+            return None
+        stats = self._snapshots[snapshot_id][1].compare_to(self._snapshots[against][1], "lineno")
+        return self._statistics(stats, limit)
+
+    def stop(self):
+        self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def dump_tasks(stack_limit: int = 10) -> dict:
+    """Every task on the running loop with where it is suspended, and how many run each coroutine."""
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coroutine": getattr(coro, "__qualname__", type(coro).__name__),
+            "done": task.done(),
+            "stack": [line for frame in task.get_stack(limit=stack_limit) for line in _format_stack(frame, limit=1)],
+        })
+    tasks.sort(key=lambda task: task["coroutine"])
+    return {
+        "total": len(tasks),
+        "by_coroutine": dict(Counter(task["coroutine"] for task in tasks).most_common()),
+        "tasks": tasks,
+    }
+
+
+class LoopStallMonitor:
+    """
+    Detects callbacks that block the event loop. A heartbeat task stamps the
+    time every `threshold_seconds / 2`; a watchdog thread that finds the loop
+    late by more than `threshold_seconds` captures the loop thread's stack, which is
+    the code blocking it. Each stall is recorded once, with its duration
+    filled in when the loop resumes.
+    """
+
+    def __init__(self, threshold_seconds: float = 0.1, max_stalls: int = 100):
+        self.threshold_seconds = threshold_seconds
+        self._stalls: Deque[dict] = deque(maxlen=max_stalls)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._current: Optional[dict] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat is not None
+
+    async def _beat(self):
+        while True:
+            now = time.monotonic()
+            current = self._current
+            if current is not None:
+                current["duration_ms"] = round((now - self._last_beat) * 1000, 1)
+                self._current = None
+            self._last_beat = now
+            await asyncio.sleep(self.threshold_seconds / 2)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold_seconds / 4):
+            blocked_for = time.monotonic() - self._last_beat
+            # The stamp is normally up to one beat interval old; only time beyond that counts as blocked.
+            if self._current is not None or blocked_for < self.threshold_seconds * 1.5:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stall = {
+                "detected_at": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": None,
+                "stack": _format_stack(frame) if frame is not None else [],
+            }
+            self._current = stall
+            self._stalls.append(stall)
+            EVENT_LOOP_STALLS.inc()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._heartbeat.cancel()
+        await asyncio.gather(self._heartbeat, return_exceptions=True)
+        await asyncio.to_thread(self._watchdog.join)
+        self._heartbeat = None
+        self._watchdog = None
+
+    def report(self) -> dict:
+        return {
+            "running": self.running,
+            "threshold_ms": round(self.threshold_seconds * 1000, 1),
+            "stalls": list(self._stalls),
+        }
+
+
+class Diagnostics:
+    """State behind the admin endpoints; nothing here runs until an endpoint asks for it."""
+
+    def __init__(self, snapshot_store: SnapshotStore):
+        self.snapshot_store = snapshot_store
+        self.loop_monitor: Optional[LoopStallMonitor] = None
+        self.profile_lock = asyncio.Lock()
+
+    async def close(self):
+        if self.loop_monitor:
+            await self.loop_monitor.stop()
+        self.snapshot_store.stop()
+
+
+diagnostics: Diagnostics | None = None
+
+
+def init_diagnostics() -> Diagnostics:
+    global diagnostics
+    diagnostics = Diagnostics(SnapshotStore(
+        max_snapshots=settings.ADMIN_MAX_MEMORY_SNAPSHOTS,
+        frames=settings.ADMIN_TRACEMALLOC_FRAMES,
+    ))
+    return diagnostics
+
+
+async def close_diagnostics():
+    if diagnostics:
+        await diagnostics.close()
+
+
+async def get_diagnostics() -> Diagnostics:
+    if diagnostics is None:
+        raise RuntimeError("Diagnostics not initialized.")
+    return diagnostics
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+import structlog
+
+from config import settings
+
+logger = structlog.get_logger(__name__)
+
+HealthCheck = Callable[[], Awaitable[None]]
+
+
+class HealthProber:
+    """
+    Runs dependency checks in the background and caches their results.
+
+    Health endpoints only read the cached results, so probe traffic from
+    kubelets and load balancers never reaches Redis, RabbitMQ or SMTP. A check
+    passes when its coroutine returns and fails when it raises or times out.
+    Non-critical checks are reported as "warn" and do not fail the service.
+    """
+
+    def __init__(self, interval_seconds: float = 10.0, timeout_seconds: float = 5.0):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self._checks: Dict[str, tuple[HealthCheck, bool]] = {}
+        self._results: Dict[str, dict] = {}
+        self._backpressure: Optional[Callable[[], bool]] = None
+        self._last_run: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, check: HealthCheck, critical: bool = True):
+        self._checks[name] = (check, critical)
+
+    def set_backpressure_source(self, is_backpressured: Callable[[], bool]):
+        self._backpressure = is_backpressured
+
+    async def _run_check(self, name: str, check: HealthCheck, critical: bool) -> dict:
+        result = {"component_name": name, "status": "pass"}
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout_seconds)
+        except Exception as e:
+            result["status"] = "fail" if critical else "warn"
+            result["output"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+            previous = self._results.get(name, {}).get("status")
+            if previous != result["status"]:
+                logger.error(
+                    f"Health check failed for {name}",
+                    event_type=f"HEALTH_CHECK_{name.upper()}_FAIL",
+                    trigger_type="system_scheduled",
+                    error=result["output"],
+                    exc_info=e,
+                )
+        result["time"] = datetime.now(timezone.utc).isoformat()
+        return result
+
+    async def run_checks(self):
+        results = await asyncio.gather(*(
+            self._run_check(name, check, critical)
+            for name, (check, critical) in self._checks.items()
+        ))
+        self._results = {result["component_name"]: result for result in results}
+        self._last_run = time.monotonic()
+
+    async def _loop(self):
+        while True:
+            await self.run_checks()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def is_stale(self) -> bool:
+        """True if no probe round has completed within three intervals."""
+        if self._last_run is None:
+            return True
+        return time.monotonic() - self._last_run > 3 * self.interval_seconds
+
+    def report(self) -> dict:
+        checks = list(self._results.values())
+        overall_status = "pass"
+        if self._last_run is None or any(check["status"] == "fail" for check in checks):
+            overall_status = "fail"
+        return {
+            "status": overall_status,
+            "service_id": settings.SERVICE_NAME,
+            "version": settings.API_VERSION,
+            "checks": checks,
+        }
+
+    def liveness(self) -> dict:
+        """The process is alive while probing keeps running and the consumer task has not died."""
+        consumer = self._results.get("consumer", {})
+        alive = not self.is_stale() and consumer.get("status") != "fail"
+        return {"status": "pass" if alive else "fail"}
+
+    def readiness(self) -> dict:
+        """Ready when every critical dependency passes and the consumer is not saturated."""
+        report = self.report()
+        backpressured = bool(self._backpressure and self._backpressure())
+        ready = report["status"] == "pass" and not backpressured
+        return {
+            "status": "pass" if ready else "fail",
+            "backpressure": backpressured,
+            "checks": report["checks"],
+        }
+
+
+def task_alive_check(task: asyncio.Task) -> HealthCheck:
+    """Builds a check that fails once the given background task has finished."""
+    async def check():
+        if task.done():
+            error = None if task.cancelled() else task.exception()
+            raise RuntimeError(f"Task finished unexpectedly: {error!r}")
+    return check
+
+
+health_prober: HealthProber | None = None
+
+
+def init_health_prober() -> HealthProber:
+    global health_prober
+    health_prober = HealthProber(
+        interval_seconds=settings.HEALTH_CHECK_INTERVAL_SECONDS,
+        timeout_seconds=settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+    )
+    return health_prober
+
+
+async def close_health_prober():
+    if health_prober:
+        await health_prober.stop()
+
+
+async def get_health_prober() -> HealthProber:
+    if health_prober is None:
+        raise RuntimeError("Health prober not initialized.")
+    return health_prober
@@ -68,10 +68,10 @@ def ecs_processor(logger, method_name: str, event_dict: dict) -> dict:
     return ecs_log
 
 
-def setup_logging(log_level: str = "INFO"):
+def setup_logging(log_level: str = "INFO", stream=None):
     logging.basicConfig(
         format="%(message)s",
-        stream=sys.stdout,
+        stream=stream or sys.stdout,
         level=log_level.upper(),
         force=True
     )
@@ -1,19 +1,21 @@
-import asyncio
+import time
 import uvicorn
 from contextlib import asynccontextmanager
 from typing import Dict
 
 from fastapi import FastAPI, Depends, Response, status as http_status
-from redis.asyncio import Redis
-import redis.exceptions
-from fastapi_mail import FastMail
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from config import settings
-from redis_client import init_redis_pool, close_redis_pool, get_redis_client
-from notification_service.consumer import RabbitMQConsumer
+from metrics import STARTUP_TIME_TO_READY
+from health import HealthProber, init_health_prober, close_health_prober, get_health_prober, task_alive_check
+from bootstrap import start_consumer_runtime, stop_consumer_runtime
+from diagnostics import init_diagnostics, close_diagnostics
+from admin import router as admin_router
 from notification_service.router import router as notification_router
-from notification_service.service import EmailService, EventHandler, get_mail_config
+from notification_service.dlq import init_dlq_manager, close_dlq_manager
+from notification_service.queue_metrics import init_queue_metrics_collector, close_queue_metrics_collector
+from notification_service.publisher import init_publisher, close_publisher, get_publisher
 
 from logging_config import setup_logging
 import structlog
@@ -22,24 +24,37 @@ app_state: Dict = {}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_started_at = time.monotonic()
     setup_logging(log_level="DEBUG" if settings.DEBUG else "INFO")
 
     logger = structlog.get_logger(__name__)
     
     logger.debug("Starting service initialization", event_type="SERVICE_INIT_START")
     
-    await init_redis_pool()
-    redis_client = await get_redis_client()
-
-    mail_config = get_mail_config(settings)
-    email_service = EmailService(FastMail(mail_config))
-    event_handler = EventHandler(redis_client=redis_client, email_service=email_service)
-    
-    consumer = RabbitMQConsumer(event_handler=event_handler)
-    
-    logger.debug("Starting RabbitMQ consumer task", event_type="CONSUMER_TASK_STARTED")
-    consumer_task = asyncio.create_task(consumer.run())
-    app_state["consumer_task"] = consumer_task
+    await init_publisher()
+    publisher = await get_publisher()
+    if settings.INGESTION_BACKEND == "rabbitmq":
+        # DLQ inspection and queue metrics read RabbitMQ queues; the stream backend has neither.
+        init_dlq_manager(publisher)
+
+    runtime = await start_consumer_runtime(publisher=publisher)
+    app_state["consumer_runtime"] = runtime
+
+    health_prober = init_health_prober()
+    health_prober.register("redis", runtime.redis_client.ping)
+    health_prober.register(settings.INGESTION_BACKEND, runtime.consumer.check_connection)
+    health_prober.register("consumer", task_alive_check(runtime.consumer_task))
+    health_prober.register("smtp", runtime.email_service.check_connection, critical=False)
+    health_prober.set_backpressure_source(runtime.consumer.is_backpressured)
+    health_prober.start()
+
+    if settings.QUEUE_METRICS_ENABLED and settings.INGESTION_BACKEND == "rabbitmq":
+        init_queue_metrics_collector()
+
+    if settings.ADMIN_ENABLED:
+        init_diagnostics()
+
+    STARTUP_TIME_TO_READY.set(time.monotonic() - startup_started_at)
     
     logger.debug(
         "Application startup complete. Ready to receive requests.",
@@ -50,20 +65,13 @@ async def lifespan(app: FastAPI):
     yield
     
     logger.debug("Application shutdown initiated", event_type="APPLICATION_SHUTDOWN_START")
-    
-    consumer_task = app_state.get("consumer_task")
-    if consumer_task:
-        consumer_task.cancel()
-        try:
-            await consumer_task
-        except asyncio.CancelledError:
-            logger.debug(
-                "Consumer task cancelled successfully",
-                event_type="CONSUMER_TASK_CANCELLED",
-                trigger_type="system_scheduled",
-            )
-            
-    await close_redis_pool()
+
+    await close_health_prober()
+    await close_diagnostics()
+    await close_queue_metrics_collector()
+    await stop_consumer_runtime(app_state.get("consumer_runtime"))
+    await close_dlq_manager()
+    await close_publisher()
     
     logger.debug("Application shutdown complete", event_type="APPLICATION_SHUTDOWN_COMPLETE")
 
@@ -87,51 +95,55 @@ def create_app() -> FastAPI:
             503: {"description": "Serviço indisponível devido a falha em dependência"},
         },
     )
-    async def health_check(response: Response, redis_client: Redis = Depends(get_redis_client)):
-        logger = structlog.get_logger(__name__)
-        checks = []
-        overall_status = "pass"
-
-        try:
-            await redis_client.ping()
-            checks.append({"component_name": "redis", "status": "pass"})
-        except redis.exceptions.ConnectionError as e:
-            overall_status = "fail"
-            error_output = f"Redis connection error: {e}"
-            checks.append({"component_name": "redis", "status": "fail", "output": error_output})
-            logger.error(
-                "Health check falhou: Erro de conexão com Redis",
-                event_type="HEALTH_CHECK_REDIS_FAIL",
-                exc_info=e
-            )
-        except Exception as e:
-            overall_status = "fail"
-            error_output = f"Health check Redis error: {type(e).__name__} - {e}"
-            checks.append({"component_name": "redis", "status": "fail", "output": error_output})
-            logger.error(
-                "Health check falhou: Erro inesperado",
-                event_type="HEALTH_CHECK_UNEXPECTED_FAIL",
-                exc_info=e
-            )
-
-        health_report = {
-            "status": overall_status,
-            "service_id": settings.SERVICE_NAME,
-            "version": settings.API_VERSION,
-            "checks": checks,
-        }
-
-        if overall_status == "fail":
+    async def health_check(response: Response, prober: HealthProber = Depends(get_health_prober)):
+        health_report = prober.report()
+        if health_report["status"] == "fail":
             response.status_code = http_status.HTTP_503_SERVICE_UNAVAILABLE
-
         return health_report
 
+    @app.get(
+        "/api/v1/health/live",
+        tags=["Global"],
+        summary="Liveness: o processo e o consumidor continuam em execução",
+        responses={
+            200: {"description": "Processo vivo"},
+            503: {"description": "Consumidor parado ou verificações interrompidas"},
+        },
+    )
+    async def liveness_check(response: Response, prober: HealthProber = Depends(get_health_prober)):
+        liveness = prober.liveness()
+        if liveness["status"] == "fail":
+            response.status_code = http_status.HTTP_503_SERVICE_UNAVAILABLE
+        return liveness
+
+    @app.get(
+        "/api/v1/health/ready",
+        tags=["Global"],
+        summary="Readiness: dependências saudáveis e consumidor sem sobrecarga",
+        responses={
+            200: {"description": "Pronto para receber tráfego"},
+            503: {"description": "Dependência indisponível ou consumidor saturado"},
+        },
+    )
+    async def readiness_check(response: Response, prober: HealthProber = Depends(get_health_prober)):
+        readiness = prober.readiness()
+        if readiness["status"] == "fail":
+            response.status_code = http_status.HTTP_503_SERVICE_UNAVAILABLE
+        return readiness
+
     app.include_router(
         notification_router,
         prefix="/api/v1/notifications",
         tags=["Notifications"],
     )
 
+    if settings.ADMIN_ENABLED:
+        app.include_router(
+            admin_router,
+            prefix="/api/v1/admin",
+            tags=["Admin"],
+        )
+
     return app
 
 app = create_app()
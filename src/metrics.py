@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 MESSAGES_RECEIVED = Counter(
     "notification_messages_received_total",
@@ -18,8 +18,223 @@ MESSAGE_PROCESSING_TIME = Histogram(
     ["event_type"]
 )
 
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+DELIVERY_LATENCY = Histogram(
+    "notification_delivery_latency_seconds",
+    "Latência ponta a ponta, do timestamp do evento até o fim do processamento com sucesso",
+    ["event_type", "attempt", "path"],
+    buckets=LATENCY_BUCKETS
+)
+
+QUEUE_WAIT_TIME = Histogram(
+    "notification_queue_wait_seconds",
+    "Tempo de espera em fila até o início do processamento (desde o evento, ou desde a volta da fila de retentativa)",
+    ["event_type", "attempt", "path"],
+    buckets=LATENCY_BUCKETS
+)
+
 EMAILS_SENT = Counter(
     "notification_emails_sent_total",
     "Total de emails tentados/enviados",
     ["template", "status"]
-)
\ No newline at end of file
+)
+
+EMAIL_LOCAL_RETRIES = Counter(
+    "notification_email_local_retries_total",
+    "Reenvios SMTP feitos no próprio processo, por resultado (recovered ou exhausted)",
+    ["outcome"]
+)
+
+SMTP_FAILURES = Counter(
+    "notification_smtp_failures_total",
+    "Falhas de envio SMTP por classificação (permanent, temporary, connection) e código de resposta",
+    ["classification", "code"]
+)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "notification_scheduler_queue_depth",
+    "Mensagens aguardando no escalonador interno, por tipo de evento",
+    ["event_type"]
+)
+
+SCHEDULER_WAIT_TIME = Histogram(
+    "notification_scheduler_wait_seconds",
+    "Tempo de espera da mensagem no escalonador interno antes da execução",
+    ["event_type"]
+)
+
+IDEMPOTENCY_CACHE_LOOKUPS = Counter(
+    "notification_idempotency_cache_lookups_total",
+    "Consultas ao cache local de idempotência (hit/miss)",
+    ["result"]
+)
+
+IDEMPOTENCY_CACHE_ENTRIES = Gauge(
+    "notification_idempotency_cache_entries",
+    "Quantidade de message_ids no cache local de idempotência"
+)
+
+IDEMPOTENCY_CACHE_BYTES = Gauge(
+    "notification_idempotency_cache_bytes",
+    "Tamanho aproximado em bytes do cache local de idempotência"
+)
+
+IDEMPOTENCY_DEGRADED_MODE = Gauge(
+    "notification_idempotency_degraded_mode",
+    "1 quando a idempotência está em modo degradado (Redis indisponível), 0 caso contrário"
+)
+
+IDEMPOTENCY_MODE_SWITCHES = Counter(
+    "notification_idempotency_mode_switches_total",
+    "Transições entre os modos normal e degradado da idempotência",
+    ["mode"]
+)
+
+IDEMPOTENCY_JOURNAL_ENTRIES = Gauge(
+    "notification_idempotency_journal_entries",
+    "IDs processados no modo degradado aguardando reconciliação com o Redis"
+)
+
+IDEMPOTENCY_JOURNAL_EVICTED = Counter(
+    "notification_idempotency_journal_evicted_total",
+    "IDs descartados do journal de idempotência por atingir o limite de entradas"
+)
+
+DELIVERY_STATUS_FLUSHED = Counter(
+    "notification_delivery_status_flushed_total",
+    "Registros de status de entrega gravados no Redis"
+)
+
+DELIVERY_STATUS_DROPPED = Counter(
+    "notification_delivery_status_dropped_total",
+    "Registros de status de entrega descartados por buffer cheio"
+)
+
+DLQ_MESSAGES_REPLAYED = Counter(
+    "notification_dlq_replayed_total",
+    "Mensagens da DLQ republicadas na exchange principal",
+    ["event_type"]
+)
+
+QUEUE_MESSAGES = Gauge(
+    "notification_rabbitmq_queue_messages",
+    "Mensagens prontas na fila (lidas por declaração passiva)",
+    ["queue"]
+)
+
+QUEUE_CONSUMERS = Gauge(
+    "notification_rabbitmq_queue_consumers",
+    "Consumidores conectados à fila",
+    ["queue"]
+)
+
+QUEUE_HEAD_AGE = Gauge(
+    "notification_rabbitmq_queue_head_age_seconds",
+    "Idade da mensagem no início da fila, a partir do timestamp do envelope (0 se vazia; ausente se desconhecida)",
+    ["queue"]
+)
+
+CONCURRENCY_LIMIT = Gauge(
+    "notification_concurrency_limit",
+    "Limite adaptativo (AIMD) de entregas simultâneas"
+)
+
+CONCURRENCY_IN_FLIGHT = Gauge(
+    "notification_concurrency_in_flight",
+    "Entregas em andamento dentro do limite adaptativo"
+)
+
+CONCURRENCY_LIMIT_DECREASES = Counter(
+    "notification_concurrency_limit_decreases_total",
+    "Reduções do limite adaptativo, por motivo (latência ou erro transitório)",
+    ["reason"]
+)
+
+STARTUP_TIME_TO_READY = Gauge(
+    "notification_startup_time_to_ready_seconds",
+    "Tempo desde o início da inicialização até o serviço ficar pronto para consumir"
+)
+
+STARTUP_DEPENDENCY_SECONDS = Gauge(
+    "notification_startup_dependency_seconds",
+    "Tempo de aquecimento de cada dependência na inicialização",
+    ["dependency"]
+)
+
+STARTUP_IMPORT_SECONDS = Gauge(
+    "notification_startup_import_seconds",
+    "Tempo gasto importando os módulos do worker antes de iniciar as dependências"
+)
+
+SUPPRESSION_ENTRIES = Gauge(
+    "notification_suppression_entries",
+    "Endereços na lista de supressão replicada em memória neste processo"
+)
+
+CHANNEL_DELIVERIES = Counter(
+    "notification_channel_deliveries_total",
+    "Entregas por canal (email, webhook, file) e resultado",
+    ["channel", "status"]
+)
+
+CHANNEL_DELIVERY_TIME = Histogram(
+    "notification_channel_delivery_seconds",
+    "Tempo de entrega bem-sucedida por canal",
+    ["channel"]
+)
+
+BULK_RECIPIENTS = Counter(
+    "notification_bulk_recipients_total",
+    "Destinatários de mensagens em massa processados, por resultado",
+    ["outcome"]
+)
+
+TRACING_SPANS_EXPORTED = Counter(
+    "notification_tracing_spans_exported_total",
+    "Spans de tracing exportados"
+)
+
+TRACING_SPANS_DROPPED = Counter(
+    "notification_tracing_spans_dropped_total",
+    "Spans de tracing descartados (buffer cheio ou falha na exportação)"
+)
+
+EVENT_LOOP_STALLS = Counter(
+    "notification_event_loop_stalls_total",
+    "Bloqueios do event loop detectados pelo monitor administrativo"
+)
+
+RUNTIME_SETTING_CHANGES = Counter(
+    "notification_runtime_setting_changes_total",
+    "Configurações alteradas em tempo de execução, por configuração e origem (api, sync, startup)",
+    ["setting", "source"]
+)
+
+OUTBOX_RECORDS = Counter(
+    "notification_outbox_records_total",
+    "Republicações no outbox local, por resultado (spooled, replayed, rejected_full, corrupt)",
+    ["outcome"]
+)
+
+OUTBOX_PENDING_BYTES = Gauge(
+    "notification_outbox_pending_bytes",
+    "Bytes no outbox local aguardando republicação"
+)
+
+REDIS_STREAM_PENDING = Gauge(
+    "notification_redis_stream_pending_messages",
+    "Entradas do stream entregues ao grupo de consumidores e ainda sem ACK",
+    ["stream"]
+)
+
+REDIS_STREAM_LAG = Gauge(
+    "notification_redis_stream_lag_messages",
+    "Entradas do stream ainda não entregues ao grupo de consumidores",
+    ["stream"]
+)
+
+REDIS_STREAM_CLAIMED = Counter(
+    "notification_redis_stream_claimed_total",
+    "Entradas presas assumidas com XAUTOCLAIM"
+)
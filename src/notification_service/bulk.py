@@ -0,0 +1,249 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional
+from uuid import UUID, uuid5
+
+import structlog
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import settings
+from metrics import BULK_RECIPIENTS
+from tracing import start_span
+from .exceptions import (
+    DeliveryContinuationRequired,
+    PermanentDeliveryError,
+    RecipientSuppressedError,
+    SchemaValidationError,
+    TemplateRenderingError,
+    TransientProcessingError,
+)
+from .schemas import BulkNotificationEventEnvelope, RecipientSchema
+
+logger = structlog.get_logger(__name__)
+
+ProcessEvent = Callable[[dict, Optional[str]], Awaitable[bool]]
+
+# Per-recipient outcomes counted once a chunk settles; deliveries are counted as they happen.
+_SETTLED_OUTCOMES = ("suppressed", "failed", "invalid")
+
+
+def progress_key(message_id) -> str:
+    return f"bulk:progress:{message_id}"
+
+
+async def get_bulk_progress(redis_client: Redis, message_id) -> Optional[dict]:
+    """The checkpointed progress of a bulk message, or None if it was never (or long ago) processed."""
+    data = await redis_client.hgetall(progress_key(message_id))
+    if not data:
+        return None
+    return {
+        "message_id": str(message_id),
+        "state": data.get("state", "running"),
+        "next_index": int(data.get("next_index", 0)),
+        "total": int(data["total"]) if data.get("total") else None,
+        **{field: int(data.get(field, 0)) for field in ("delivered", *_SETTLED_OUTCOMES)},
+        "updated_at": float(data.get("updated_at", 0)),
+    }
+
+
+class BulkEventExpander:
+    """
+    Expands a BulkNotificationEventEnvelope into one single-recipient event per
+    recipient and processes them through the regular event path, chunk by
+    chunk, so only one chunk of recipients is ever held in memory.
+
+    Each recipient event gets a message_id derived from the bulk message_id and
+    the recipient's user_id, so per-recipient idempotency makes a retry skip
+    whoever was already delivered. After every chunk the next offset is
+    checkpointed in the `bulk:progress:<message_id>` Redis hash, so a retried
+    message resumes at the first chunk that did not finish instead of walking
+    the whole list again.
+
+    Suppressed recipients and permanent failures only affect their recipient.
+    A transient failure fails the message once its chunk has settled, and the
+    broker retry resumes at that chunk.
+
+    One delivery expands at most `max_chunks_per_delivery` chunks, so a large
+    campaign does not hold its delivery unacked past the broker's consumer
+    timeout: past that, DeliveryContinuationRequired has the consumer requeue
+    the envelope, and the next delivery resumes at the checkpoint.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        process_event: ProcessEvent,
+        chunk_size: int = 500,
+        concurrency: int = 20,
+        progress_ttl_seconds: int = 7 * 86400,
+        max_chunks_per_delivery: int = 20,
+    ):
+        self.redis_client = redis_client
+        self.process_event = process_event
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.progress_ttl_seconds = progress_ttl_seconds
+        self.max_chunks_per_delivery = max_chunks_per_delivery
+
+    @staticmethod
+    def recipient_message_id(bulk_message_id: UUID, recipient: RecipientSchema) -> UUID:
+        return uuid5(bulk_message_id, str(recipient.user_id))
+
+    async def _total(self, bulk: BulkNotificationEventEnvelope) -> int:
+        if bulk.recipients is not None:
+            return len(bulk.recipients)
+        return await self.redis_client.llen(bulk.recipients_ref)
+
+    async def _read_chunk(self, bulk: BulkNotificationEventEnvelope, start: int) -> list:
+        if bulk.recipients is not None:
+            return bulk.recipients[start:start + self.chunk_size]
+        return await self.redis_client.lrange(bulk.recipients_ref, start, start + self.chunk_size - 1)
+
+    @staticmethod
+    def _parse_recipient(entry) -> RecipientSchema:
+        if isinstance(entry, RecipientSchema):
+            return entry
+        return RecipientSchema.model_validate(json.loads(entry) if isinstance(entry, (str, bytes)) else entry)
+
+    async def _checkpoint(self, key: str, fields: dict, increments: dict):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={**fields, "updated_at": time.time()})
+            for field, amount in increments.items():
+                if amount:
+                    pipe.hincrby(key, field, amount)
+            pipe.expire(key, self.progress_ttl_seconds)
+            await pipe.execute()
+
+    async def _process_recipient(
+        self, shared: dict, bulk: BulkNotificationEventEnvelope, entry, correlation_id: Optional[str],
+        semaphore: asyncio.Semaphore,
+    ) -> str:
+        try:
+            recipient = self._parse_recipient(entry)
+        except (ValueError, ValidationError):
+            return "invalid"
+        event_data = {
+            **shared,
+            "message_id": str(self.recipient_message_id(bulk.message_id, recipient)),
+            "recipient": recipient.model_dump(mode="json"),
+        }
+        async with semaphore:
+            try:
+                return "delivered" if await self.process_event(event_data, correlation_id) else "duplicate"
+            except RecipientSuppressedError:
+                return "suppressed"
+            except (PermanentDeliveryError, TemplateRenderingError):
+                return "failed"
+
+    async def process(self, event_data: dict, correlation_id: Optional[str] = None) -> bool:
+        """
+        Processes recipients from the checkpointed offset on, up to
+        `max_chunks_per_delivery` chunks. Returns False if the bulk message had
+        already been fully processed, and raises DeliveryContinuationRequired if
+        recipients are left after those chunks.
+        """
+        try:
+            bulk = BulkNotificationEventEnvelope.model_validate(event_data)
+        except ValidationError as e:
+            raise SchemaValidationError(f"Invalid bulk message schema: {e}")
+
+        log = logger.bind(correlation_id=correlation_id, event_type=bulk.event_type)
+        key = progress_key(bulk.message_id)
+        try:
+            progress = await get_bulk_progress(self.redis_client, bulk.message_id)
+            if progress and progress["state"] == "completed":
+                log.warning(
+                    "Bulk message already completed. Skipping.",
+                    event_type="BULK_DUPLICATE",
+                    event_details={"message_id": bulk.message_id},
+                )
+                return False
+            start = progress["next_index"] if progress else 0
+            total = await self._total(bulk)
+            await self._checkpoint(key, {"state": "running", "next_index": start, "total": total}, {})
+        except RedisError as e:
+            raise TransientProcessingError(f"Bulk progress checkpoint failed: {e}") from e
+
+        log.info(
+            "Expanding bulk message",
+            event_type="BULK_EXPANSION_START",
+            event_details={"message_id": bulk.message_id, "total": total, "resume_from": start},
+        )
+
+        shared = bulk.model_dump(mode="json", exclude={"message_id", "recipients", "recipients_ref"})
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = 0
+        while start < total:
+            if chunks == self.max_chunks_per_delivery:
+                log.info(
+                    "Bulk delivery reached its chunk limit; requeued to continue",
+                    event_type="BULK_EXPANSION_CONTINUED",
+                    event_details={"message_id": bulk.message_id, "next_index": start, "total": total},
+                )
+                raise DeliveryContinuationRequired(f"Bulk message continues at recipient {start} of {total}")
+            chunks += 1
+            try:
+                chunk = await self._read_chunk(bulk, start)
+            except RedisError as e:
+                raise TransientProcessingError(f"Failed to read bulk recipients: {e}") from e
+            if not chunk:
+                break
+
+            with start_span("notification.bulk_chunk", attributes={"notification.bulk.offset": start,
+                                                                  "notification.bulk.size": len(chunk)}):
+                results = await asyncio.gather(
+                    *(self._process_recipient(shared, bulk, entry, correlation_id, semaphore) for entry in chunk),
+                    return_exceptions=True,
+                )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            outcomes = [result for result in results if not isinstance(result, BaseException)]
+            for outcome in outcomes:
+                BULK_RECIPIENTS.labels(outcome=outcome).inc()
+            for error in errors:
+                if isinstance(error, asyncio.CancelledError):
+                    raise error
+
+            settled = not errors
+            increments = {"delivered": outcomes.count("delivered")}
+            if settled:
+                increments.update({outcome: outcomes.count(outcome) for outcome in _SETTLED_OUTCOMES})
+                start += len(chunk)
+            try:
+                await self._checkpoint(key, {"next_index": start}, increments)
+            except RedisError as e:
+                raise TransientProcessingError(f"Bulk progress checkpoint failed: {e}") from e
+
+            if not settled:
+                log.warning(
+                    "Bulk chunk did not settle; the retry resumes from it",
+                    event_type="BULK_CHUNK_INCOMPLETE",
+                    error=f"{type(errors[0]).__name__}: {errors[0]}",
+                    event_details={"message_id": bulk.message_id, "next_index": start, "failures": len(errors)},
+                )
+                transient = [error for error in errors if isinstance(error, TransientProcessingError)]
+                raise transient[0] if transient else errors[0]
+
+        try:
+            await self._checkpoint(key, {"state": "completed", "next_index": start}, {})
+        except RedisError as e:
+            raise TransientProcessingError(f"Bulk progress checkpoint failed: {e}") from e
+        log.info(
+            "Bulk message completed",
+            event_type="BULK_EXPANSION_COMPLETED",
+            event_details={"message_id": bulk.message_id, "total": total},
+        )
+        return True
+
+
+def build_bulk_expander(redis_client: Redis, process_event: ProcessEvent) -> BulkEventExpander:
+    return BulkEventExpander(
+        redis_client,
+        process_event,
+        chunk_size=settings.BULK_CHUNK_SIZE,
+        concurrency=settings.BULK_RECIPIENT_CONCURRENCY,
+        progress_ttl_seconds=settings.BULK_PROGRESS_TTL_SECONDS,
+        max_chunks_per_delivery=settings.BULK_MAX_CHUNKS_PER_DELIVERY,
+    )
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import httpx
+import structlog
+
+from config import settings
+from startup import backoff_delay
+from tracing import inject
+from .exceptions import PermanentDeliveryError, TransientProcessingError
+from .schemas import NotificationEventEnvelope
+
+logger = structlog.get_logger(__name__)
+
+EMAIL = "email"
+WEBHOOK = "webhook"
+FILE = "file"
+
+
+class NotificationChannel(ABC):
+    """
+    A way of delivering a notification. `send` raises TransientProcessingError
+    for failures worth retrying and PermanentDeliveryError (or
+    TemplateRenderingError) for those that are not. Each channel owns its
+    connections, so a slow channel never holds up another one.
+    """
+
+    name: str = ""
+
+    @abstractmethod
+    async def send(self, event: NotificationEventEnvelope, correlation_id: Optional[str] = None) -> None:
+        """Delivers the event through this channel."""
+
+    async def close(self) -> None:
+        pass
+
+
+class EmailChannel(NotificationChannel):
+    """Sends through the email handler registered for the event type (template and subject)."""
+
+    name = EMAIL
+
+    def __init__(self, handlers: dict[str, Callable[..., Awaitable[None]]]):
+        self.handlers = handlers
+
+    async def send(self, event: NotificationEventEnvelope, correlation_id: Optional[str] = None) -> None:
+        await self.handlers[event.event_type](event=event, correlation_id=correlation_id)
+
+
+def event_document(event: NotificationEventEnvelope, correlation_id: Optional[str] = None) -> dict:
+    """JSON representation of an event pushed by the non-email channels."""
+    return {**event.model_dump(mode="json"), "correlation_id": correlation_id}
+
+
+class WebhookChannel(NotificationChannel):
+    """
+    POSTs the event as JSON to a fixed URL over a pooled httpx client. With a
+    secret, the body is signed with HMAC-SHA256 in `X-Signature-SHA256`.
+    Timeouts, connection errors, 429 and 5xx responses are retried in process
+    up to `retry_attempts` times, then surface as transient (honouring
+    `Retry-After`); other 4xx responses are permanent.
+    """
+
+    name = WEBHOOK
+
+    def __init__(
+        self,
+        url: str,
+        secret: Optional[str] = None,
+        timeout_seconds: float = 5.0,
+        max_connections: int = 20,
+        retry_attempts: int = 1,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.url = url
+        self.secret = secret
+        self.timeout_seconds = timeout_seconds
+        self.retry_attempts = retry_attempts
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout_seconds,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @staticmethod
+    def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+        value = response.headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    async def _post(self, body: bytes, headers: dict) -> None:
+        try:
+            response = await self.client.post(self.url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            raise TransientProcessingError(f"Webhook request failed: {type(e).__name__}: {e}") from e
+        if response.is_success:
+            return
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientProcessingError(
+                f"Webhook returned {response.status_code}",
+                retry_after_seconds=self._retry_after_seconds(response),
+            )
+        raise PermanentDeliveryError(f"Webhook rejected the event with {response.status_code}")
+
+    async def send(self, event: NotificationEventEnvelope, correlation_id: Optional[str] = None) -> None:
+        body = json.dumps(event_document(event, correlation_id)).encode()
+        headers = {"Content-Type": "application/json", "Idempotency-Key": str(event.message_id)}
+        if correlation_id:
+            headers["X-Correlation-ID"] = correlation_id
+        inject(headers)
+        if self.secret:
+            headers["X-Signature-SHA256"] = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+        attempt = 0
+        while True:
+            try:
+                return await self._post(body, headers)
+            except TransientProcessingError as e:
+                if attempt >= self.retry_attempts or e.retry_after_seconds is not None:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, 0.2, 2.0))
+                attempt += 1
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class FileSinkChannel(NotificationChannel):
+    """Appends each event as a JSON line to a local file, e.g. for development or auditing."""
+
+    name = FILE
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = asyncio.Lock()
+
+    def _append(self, line: bytes):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(line)
+
+    async def send(self, event: NotificationEventEnvelope, correlation_id: Optional[str] = None) -> None:
+        line = json.dumps(event_document(event, correlation_id)).encode() + b"\n"
+        async with self._lock:
+            try:
+                await asyncio.to_thread(self._append, line)
+            except OSError as e:
+                raise TransientProcessingError(f"Failed to write to file sink {self.path}: {e}") from e
+
+
+def build_channels() -> dict[str, NotificationChannel]:
+    """The non-email channels enabled by configuration; email is provided by the event handler."""
+    channels: dict[str, NotificationChannel] = {}
+    if settings.WEBHOOK_URL:
+        channels[WEBHOOK] = WebhookChannel(
+            settings.WEBHOOK_URL,
+            secret=settings.WEBHOOK_SECRET.get_secret_value() if settings.WEBHOOK_SECRET else None,
+            timeout_seconds=settings.WEBHOOK_TIMEOUT_SECONDS,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            retry_attempts=settings.WEBHOOK_RETRY_ATTEMPTS,
+        )
+    if settings.FILE_SINK_PATH:
+        channels[FILE] = FileSinkChannel(settings.FILE_SINK_PATH)
+    return channels
+
+
+async def close_channels(channels: dict[str, NotificationChannel]):
+    await asyncio.gather(*(channel.close() for channel in channels.values()), return_exceptions=True)
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+import structlog
+
+from metrics import CONCURRENCY_IN_FLIGHT, CONCURRENCY_LIMIT, CONCURRENCY_LIMIT_DECREASES
+
+logger = structlog.get_logger(__name__)
+
+
+class AIMDConcurrencyLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on concurrent deliveries.
+
+    Every delivery that finishes under `latency_target_seconds` adds 1/limit to
+    the limit (about +1 per window of `limit` deliveries), but only once at least
+    half of the current window has been in use, so a quiet period does not
+    inflate the limit. A delivery slower than the target, or one that failed
+    with a transient error, multiplies the limit by `backoff_ratio`. Samples from
+    deliveries that started before the last decrease are ignored for decreasing,
+    so one overloaded burst shrinks the limit once instead of once per message.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        latency_target_seconds: float = 2.0,
+        backoff_ratio: float = 0.7,
+        on_change: Optional[Callable[[int], None]] = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_seconds = latency_target_seconds
+        self.backoff_ratio = backoff_ratio
+        self.on_change = on_change
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._increase_credit = 0.0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._last_decrease_at = float("-inf")
+        self._condition = asyncio.Condition()
+        CONCURRENCY_LIMIT.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> float:
+        """Waits for a free slot and returns the start time to pass to `release`."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        CONCURRENCY_IN_FLIGHT.set(self._in_flight)
+        return time.monotonic()
+
+    async def release(self, started_at: float, *, sample: bool = True, overloaded: bool = False):
+        """
+        Frees a slot. `sample=False` releases without adjusting the limit (e.g. a
+        duplicate that never reached SMTP); `overloaded` marks a transient failure.
+        """
+        async with self._condition:
+            self._in_flight -= 1
+            latency = time.monotonic() - started_at
+
+            if overloaded or (sample and latency > self.latency_target_seconds):
+                if started_at >= self._last_decrease_at:
+                    self._decrease("error" if overloaded else "latency", latency)
+            elif sample and self._peak_in_flight * 2 >= self._limit and self._limit < self.max_limit:
+                self._increase_credit += 1 / self._limit
+                if self._increase_credit >= 1:
+                    self._increase_credit = 0.0
+                    self._set_limit(self._limit + 1)
+
+            self._condition.notify_all()
+        CONCURRENCY_IN_FLIGHT.set(self._in_flight)
+
+    async def set_bounds(self, min_limit: int, max_limit: int):
+        """Changes the bounds at runtime, clamping the current limit into them."""
+        async with self._condition:
+            self.min_limit = min_limit
+            self.max_limit = max_limit
+            self._set_limit(max(min_limit, min(self._limit, max_limit)))
+            self._condition.notify_all()
+
+    def _decrease(self, reason: str, latency: float):
+        self._last_decrease_at = time.monotonic()
+        self._increase_credit = 0.0
+        CONCURRENCY_LIMIT_DECREASES.labels(reason=reason).inc()
+        previous = self._limit
+        self._set_limit(max(self.min_limit, int(self._limit * self.backoff_ratio)))
+        logger.info(
+            "Concurrency limit decreased",
+            event_type="CONCURRENCY_LIMIT_DECREASED",
+            trigger_type="system_scheduled",
+            reason=reason,
+            event_details={"previous_limit": previous, "limit": self._limit, "latency_ms": latency * 1000},
+        )
+
+    def _set_limit(self, limit: int):
+        if limit == self._limit:
+            return
+        self._limit = limit
+        self._peak_in_flight = self._in_flight
+        CONCURRENCY_LIMIT.set(limit)
+        if self.on_change:
+            self.on_change(limit)
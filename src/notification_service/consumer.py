@@ -2,26 +2,70 @@ import asyncio
 import aio_pika
 import json
 import structlog
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import NamedTuple
 from uuid import uuid4
 
 from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.exceptions import AMQPError, ChannelInvalidStateError
 from config import settings
-from .exceptions import EventTypeValidationError, SchemaValidationError, TemplateRenderingError, TransientProcessingError
+from .exceptions import TransientProcessingError
+from .concurrency import AIMDConcurrencyLimiter
+from .delivery_status import DeliveryStatusRecorder
+from .outcomes import DeliveryOutcomeRouter
+from .outbox import DLQ, RETRY, OutboxFullError, OutboxSpool, SpooledMessage
+from .scheduler import WeightedFairScheduler
 from .service import EventHandler
-from metrics import MESSAGES_RECEIVED, MESSAGES_PROCESSED, MESSAGE_PROCESSING_TIME
+from startup import retry_with_backoff
+from tracing import CONSUMER, extract, inject, start_span, trace_log_fields
+from metrics import MESSAGES_RECEIVED, MESSAGES_PROCESSED
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 logger = structlog.get_logger(__name__)
 
-class RabbitMQConsumer:
-    MAX_RETRIES = settings.RABBITMQ_MAX_RETRIES
 
-    def __init__(self, event_handler: EventHandler):
+class _AmqpDelivery(NamedTuple):
+    message: AbstractIncomingMessage
+    queue_name: str
+    retry_routing_key: str
+
+
+class RabbitMQConsumer(DeliveryOutcomeRouter):
+    def __init__(
+        self,
+        event_handler: EventHandler,
+        delivery_recorder: DeliveryStatusRecorder | None = None,
+        outbox: OutboxSpool | None = None,
+    ):
         self.rabbitmq_url = settings.RABBITMQ_URL
         self.event_handler = event_handler
+        self.delivery_recorder = delivery_recorder
+        self.outbox = outbox
         self._connection = None
         self._channel = None
+        self._scheduler: WeightedFairScheduler | None = None
+        self._shard_queues: dict[str, aio_pika.abc.AbstractQueue] = {}
+        self._shard_channels: list[aio_pika.abc.AbstractChannel] = []
+        self._shard_prefetch_counts: list[int] = []
+        self._in_flight = 0
+        self._worker_tasks: list[asyncio.Task] = []
+        self.concurrency_limiter: AIMDConcurrencyLimiter | None = None
+        self._prefetch_target: int | None = None
+        self._prefetch_task: asyncio.Task | None = None
+        self._main_consumer_tag: str | None = None
+        self._declared_retry_delay_ms: int | None = None
+        if settings.ADAPTIVE_CONCURRENCY_ENABLED:
+            self.concurrency_limiter = AIMDConcurrencyLimiter(
+                initial_limit=settings.CONCURRENCY_INITIAL_LIMIT,
+                min_limit=settings.CONCURRENCY_MIN_LIMIT,
+                max_limit=settings.CONCURRENCY_MAX_LIMIT,
+                latency_target_seconds=settings.CONCURRENCY_LATENCY_TARGET_MS / 1000,
+                backoff_ratio=settings.CONCURRENCY_BACKOFF_RATIO,
+                on_change=self._on_concurrency_limit_change,
+            )
+            self._prefetch_target = self._prefetch_for_limit(self.concurrency_limiter.limit)
         logger.debug(
             "RabbitMQ consumer initialized",
             event_type="RABBITMQ_CONSUMER_INITIALIZED",
@@ -29,37 +73,28 @@ class RabbitMQConsumer:
             rabbitmq_url=self.rabbitmq_url,
         )
 
-    async def connect(self):
-        retry_interval = 5
+    async def connect(self, deadline: float | None = None):
+        """
+        Connects with exponential backoff and jitter. Without a `deadline` (a
+        time.monotonic() value) it retries until it succeeds.
+        """
         logger.debug(
             "Attempting to connect to RabbitMQ",
             event_type="RABBITMQ_CONNECT_ATTEMPT",
             trigger_type="system_scheduled",
             rabbitmq_url=self.rabbitmq_url,
         )
-    
-        while True:
-            try:
-                self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
-                self._channel = await self._connection.channel()
-                logger.debug(
-                    "RabbitMQ connection established successfully",
-                    event_type="RABBITMQ_CONNECTED_SUCCESSFULLY",
-                    trigger_type="system_scheduled",
-                    rabbitmq_url=self.rabbitmq_url,
-                )
-                return
-            except Exception as e:
-                logger.error(
-                    "Failed to connect to RabbitMQ. Retrying...",
-                    event_type="RABBITMQ_CONNECTION_FAILED",
-                    trigger_type="system_scheduled",
-                    error=str(e),
-                    retry_in_seconds=retry_interval,
-                    rabbitmq_url=self.rabbitmq_url,
-                    exc_info=e,
-                )
-                await asyncio.sleep(retry_interval)
+        await retry_with_backoff(self._open_connection, name="rabbitmq", deadline=deadline)
+        logger.debug(
+            "RabbitMQ connection established successfully",
+            event_type="RABBITMQ_CONNECTED_SUCCESSFULLY",
+            trigger_type="system_scheduled",
+            rabbitmq_url=self.rabbitmq_url,
+        )
+
+    async def _open_connection(self):
+        self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        self._channel = await self._connection.channel()
 
     async def _setup_queues(self):
         if not self._channel:
@@ -75,6 +110,7 @@ class RabbitMQConsumer:
             retry_exchange_name = settings.RABBITMQ_EXCHANGE_RETRY
             retry_queue_name = settings.RABBITMQ_QUEUE_RETRY
             retry_delay_ms = settings.RABBITMQ_RETRY_DELAY_MS
+            self._declared_retry_delay_ms = retry_delay_ms
 
             self.retry_exchange = await self._channel.declare_exchange(
                 retry_exchange_name, aio_pika.ExchangeType.DIRECT, durable=True
@@ -106,6 +142,9 @@ class RabbitMQConsumer:
             )
             await self.main_queue.bind(self.main_exchange, routing_key=settings.RABBITMQ_ROUTING_KEY)
 
+            if settings.RABBITMQ_SHARDING_ENABLED:
+                await self._setup_shard_queues()
+
             logger.debug(
                 "RabbitMQ topology setup finished successfully",
                 event_type="RABBITMQ_TOPOLOGY_SETUP_FINISHED",
@@ -120,7 +159,8 @@ class RabbitMQConsumer:
                         "main": settings.RABBITMQ_QUEUE_MAIN,
                         "retry": settings.RABBITMQ_QUEUE_RETRY,
                         "dlq": settings.RABBITMQ_QUEUE_DLQ,
-                    }
+                    },
+                    "shards": list(self._shard_queues),
                 }
             )
         except Exception as e:
@@ -133,146 +173,532 @@ class RabbitMQConsumer:
             )
             raise
 
-    def _republish_message(self, message: AbstractIncomingMessage) -> aio_pika.Message:
+    @staticmethod
+    def _shard_queue_names(shard_name: str) -> tuple[str, str, str]:
+        """Returns the (queue, retry queue, retry routing key) names of a shard."""
+        return (
+            f"{settings.RABBITMQ_QUEUE_MAIN}.{shard_name}",
+            f"{settings.RABBITMQ_QUEUE_RETRY}.{shard_name}",
+            f"{settings.RABBITMQ_ROUTING_KEY}.{shard_name}",
+        )
+
+    async def _setup_shard_queues(self):
+        """
+        Declares one queue (and its delayed-retry queue) per configured shard.
+
+        Shard queues are bound to the main exchange with the event_type routing
+        keys, so producers publishing with an event-type key reach them, while the
+        main queue keeps serving producers that use RABBITMQ_ROUTING_KEY.
+        """
+        for shard_name, shard in settings.RABBITMQ_QUEUE_SHARDS.items():
+            queue_name, retry_queue_name, retry_routing_key = self._shard_queue_names(shard_name)
+
+            arguments = {}
+            if shard.max_priority:
+                arguments["x-max-priority"] = shard.max_priority
+            queue = await self._channel.declare_queue(queue_name, durable=True, arguments=arguments)
+            for event_type in shard.event_types:
+                await queue.bind(self.main_exchange, routing_key=event_type)
+
+            retry_queue = await self._channel.declare_queue(
+                retry_queue_name,
+                durable=True,
+                arguments={
+                    "x-message-ttl": settings.RABBITMQ_RETRY_DELAY_MS,
+                    "x-dead-letter-exchange": settings.RABBITMQ_EXCHANGE_MAIN,
+                    "x-dead-letter-routing-key": shard.event_types[0],
+                },
+            )
+            await retry_queue.bind(self.retry_exchange, routing_key=retry_routing_key)
+
+            self._shard_queues[shard_name] = queue
+
+    async def _consume_shards(self):
+        for shard_name, shard in settings.RABBITMQ_QUEUE_SHARDS.items():
+            queue_name, _, retry_routing_key = self._shard_queue_names(shard_name)
+            for _ in range(shard.consumers):
+                channel = await self._connection.channel()
+                await channel.set_qos(prefetch_count=shard.prefetch_count)
+                self._shard_channels.append(channel)
+                self._shard_prefetch_counts.append(shard.prefetch_count)
+
+                queue = await channel.get_queue(queue_name)
+                await queue.consume(self._message_callback(queue_name, retry_routing_key))
+
+            logger.debug(
+                "Consuming from shard queue",
+                event_type="RABBITMQ_SHARD_CONSUMER_STARTED",
+                trigger_type="system_scheduled",
+                event_details={
+                    "shard": shard_name,
+                    "queue": queue_name,
+                    "event_types": shard.event_types,
+                    "consumers": shard.consumers,
+                    "prefetch_count": shard.prefetch_count,
+                    "max_priority": shard.max_priority,
+                }
+            )
+
+    @staticmethod
+    def _dlq_headers(reason: str, error: Exception) -> dict:
+        """Why and when a message was dead-lettered, so DLQ tooling can filter on it."""
+        return {
+            "x-dlq-reason": reason,
+            "x-dlq-error": f"{type(error).__name__}: {error}"[:1024],
+            "x-dlq-at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    @staticmethod
+    def _retry_count(message: AbstractIncomingMessage) -> int:
+        """Broker retries so far: trips through the retry queue, minus those that only waited out a retry delay."""
+        headers = message.headers or {}
+        dead_lettered = headers.get("x-death", [{}])[0].get("count", 0)
+        return max(dead_lettered - int(headers.get("x-retry-deferrals", 0)), 0)
+
+    @staticmethod
+    def _retry_not_before(message: AbstractIncomingMessage) -> datetime | None:
+        try:
+            return RabbitMQConsumer._as_utc((message.headers or {}).get("x-retry-not-before"))
+        except (TypeError, ValueError):
+            return None
+
+    def _retry_queue_ttl_seconds(self) -> float:
+        """TTL the retry queues were declared with; queue arguments cannot change while they exist."""
+        declared = self._declared_retry_delay_ms or settings.RABBITMQ_RETRY_DELAY_MS
+        return declared / 1000
+
+    def _retry_message(
+        self,
+        message: AbstractIncomingMessage,
+        delay_seconds: float | None = None,
+        extra_headers: dict | None = None,
+    ) -> aio_pika.Message:
+        """
+        Copy for the retry exchange. A delay shorter than the retry queue TTL is
+        set as the message expiration; a longer one is recorded in
+        `x-retry-not-before`, and the message goes around the retry queue until
+        it is due (see `_defer_if_not_due`). Without a delay, RABBITMQ_RETRY_DELAY_MS
+        applies the same way if it was changed since the queues were declared.
+        """
+        republished = self._republish_message(message, extra_headers)
+        republished.headers.pop("x-retry-not-before", None)
+        if delay_seconds is None and settings.RABBITMQ_RETRY_DELAY_MS / 1000 != self._retry_queue_ttl_seconds():
+            delay_seconds = settings.RABBITMQ_RETRY_DELAY_MS / 1000
+        if delay_seconds is None:
+            self._stamp_retry_due(republished, self._retry_queue_ttl_seconds())
+            return republished
+        if delay_seconds > self._retry_queue_ttl_seconds():
+            due_at = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+            republished.headers["x-retry-not-before"] = due_at.isoformat()
+            # Comes back to the main queue each TTL until it is due; the last trip is the one that counts.
+            republished.headers["x-retry-due-at"] = due_at.isoformat()
+        else:
+            republished.expiration = delay_seconds
+            self._stamp_retry_due(republished, delay_seconds)
+        return republished
+
+    @staticmethod
+    def _stamp_retry_due(republished: aio_pika.Message, wait_seconds: float):
+        """
+        Records when the copy is due back in the main queue, so its queue wait
+        excludes the retry delay. x-death cannot tell: its time is set on the
+        first dead-lettering from the retry queue and never updated.
+        """
+        due_at = datetime.now(timezone.utc) + timedelta(seconds=wait_seconds)
+        republished.headers["x-retry-due-at"] = due_at.isoformat()
+
+    async def _defer_if_not_due(self, message: AbstractIncomingMessage, retry_routing_key: str, log) -> bool:
+        """Sends a message back to the retry queue, without using a retry, while its retry delay has not passed."""
+        not_before = self._retry_not_before(message)
+        if not_before is None:
+            return False
+        remaining = (not_before - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            return False
+        deferrals = int((message.headers or {}).get("x-retry-deferrals", 0)) + 1
+        republished = self._republish_message(message, {"x-retry-deferrals": deferrals})
+        if remaining < self._retry_queue_ttl_seconds():
+            republished.expiration = remaining
+        self._stamp_retry_due(republished, min(remaining, self._retry_queue_ttl_seconds()))
+        await self._publish(RETRY, republished, retry_routing_key, message)
+        await message.ack()
+        log.debug(
+            "Retry delay not reached. Message sent back to the retry queue.",
+            event_type="MESSAGE_RETRY_DEFERRED",
+            event_details={"remaining_seconds": round(remaining, 3), "deferrals": deferrals},
+        )
+        return True
+
+    def _delivery_path(self, delivery: _AmqpDelivery, retry_count: int) -> str:
+        if retry_count:
+            return "retry"
+        if "x-replayed-at" in (delivery.message.headers or {}):
+            return "replay"
+        return "main"
+
+    def _requeued_at(self, delivery: _AmqpDelivery, retry_count: int) -> datetime | None:
+        # Retried messages waited in the main queue since they came back from the retry queue.
+        headers = delivery.message.headers or {}
+        try:
+            if "x-retry-due-at" in headers:
+                return self._as_utc(headers["x-retry-due-at"])
+            # Retried before the due time was stamped: only right for a first retry.
+            return self._as_utc(headers.get("x-death", [{}])[0].get("time"))
+        except (TypeError, ValueError):
+            return None
+
+    def _received_details(self, delivery: _AmqpDelivery) -> dict:
+        return {
+            "queue": delivery.queue_name,
+            "routing_key": delivery.message.routing_key,
+            "message_size_bytes": len(delivery.message.body),
+        }
+
+    async def _ack(self, delivery: _AmqpDelivery):
+        await delivery.message.ack()
+
+    async def _retry(self, delivery: _AmqpDelivery, retry_count: int, error: TransientProcessingError):
+        republished_message = self._retry_message(delivery.message, error.retry_after_seconds)
+        await self._publish(RETRY, republished_message, delivery.retry_routing_key, delivery.message)
+        await delivery.message.ack()
+
+    async def _requeue(self, delivery: _AmqpDelivery):
+        # Through the main exchange with the original routing key, so a shard message returns to its shard.
+        # If the publish fails the delivery is left to redelivery, which resumes the same way.
+        republished = self._republish_message(delivery.message)
+        if self._retry_count(delivery.message):
+            self._stamp_retry_due(republished, 0)
+        await self.main_exchange.publish(republished, routing_key=delivery.message.routing_key)
+        await delivery.message.ack()
+
+    async def _dead_letter(self, delivery: _AmqpDelivery, reason: str, error: Exception, smtp_code: int | None = None):
+        dlq_headers = self._dlq_headers(reason, error)
+        if smtp_code is not None:
+            dlq_headers["x-dlq-smtp-code"] = smtp_code
+        republished_message = self._republish_message(delivery.message, dlq_headers)
+        await self._publish(DLQ, republished_message, settings.RABBITMQ_ROUTING_KEY, delivery.message)
+        await delivery.message.ack()
+
+    @staticmethod
+    def _prefetch_for_limit(limit: int) -> int:
+        return min(limit * settings.CONCURRENCY_PREFETCH_MULTIPLIER, 65535)
+
+    def _on_concurrency_limit_change(self, limit: int):
+        self._prefetch_target = self._prefetch_for_limit(limit)
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.create_task(self._apply_prefetch())
+
+    async def _apply_prefetch(self):
+        """
+        Follows the adaptive limit with a channel-wide (global) prefetch, applied on
+        top of the fixed per-consumer prefetch so it takes effect on running
+        consumers. Changes made while applying are coalesced into one more round.
+        """
+        applied = None
+        while applied != self._prefetch_target:
+            applied = self._prefetch_target
+            for channel in [self._channel, *self._shard_channels]:
+                if channel is None or channel.is_closed:
+                    continue
+                try:
+                    await channel.set_qos(prefetch_count=applied, global_=True)
+                except Exception as e:
+                    logger.warning(
+                        "Failed to apply adaptive prefetch",
+                        event_type="ADAPTIVE_PREFETCH_FAILED",
+                        trigger_type="system_scheduled",
+                        error=str(e),
+                        event_details={"prefetch_count": applied},
+                    )
+
+    @asynccontextmanager
+    async def _delivery_slot(self):
+        """
+        Holds a slot of the adaptive concurrency limit, when enabled. The caller
+        sets `outcome["sample"]` once a delivery was actually attempted, so that
+        its latency counts; transient errors count as overload.
+        """
+        outcome = {"sample": False, "overloaded": False}
+        if self.concurrency_limiter is None:
+            yield outcome
+            return
+        started_at = await self.concurrency_limiter.acquire()
+        try:
+            yield outcome
+        except TransientProcessingError:
+            outcome["overloaded"] = True
+            raise
+        finally:
+            await self.concurrency_limiter.release(started_at, **outcome)
+
+    def _republish_message(self, message: AbstractIncomingMessage, extra_headers: dict | None = None) -> aio_pika.Message:
+        # The copy carries the current span as its parent, so the next attempt continues the same trace.
         return aio_pika.Message(
             body=message.body,
-            headers=message.headers,
+            headers=inject({**(message.headers or {}), **(extra_headers or {})}),
             content_type=message.content_type,
             correlation_id=message.correlation_id,
-            delivery_mode=message.delivery_mode
+            delivery_mode=message.delivery_mode,
+            priority=message.priority,
+            timestamp=message.timestamp,
         )
 
-    async def _on_message(self, message: AbstractIncomingMessage):
+    @staticmethod
+    def _can_settle(delivery: AbstractIncomingMessage) -> bool:
+        """Whether the channel the delivery arrived on is still open, so it can still be acked."""
+        try:
+            return not delivery.channel.is_closed
+        except ChannelInvalidStateError:
+            return False
+
+    async def _publish(
+        self,
+        exchange: str,
+        message: aio_pika.Message,
+        routing_key: str,
+        delivery: AbstractIncomingMessage,
+    ):
+        """
+        Publishes to the retry or DLQ exchange. If the broker refuses the
+        publish and the outbox is enabled, the message is spooled locally
+        instead, so the delivery can be acked; with the outbox full or disabled
+        the error propagates and the delivery is left to redelivery. A delivery
+        whose own channel is gone cannot be acked and will be redelivered
+        anyway, so it is not spooled: that would publish the copy twice.
+        """
+        target = self.retry_exchange if exchange == RETRY else self.dlx_exchange
+        if self.outbox is None:
+            await target.publish(message, routing_key=routing_key)
+            return
+        try:
+            await target.publish(message, routing_key=routing_key, timeout=settings.OUTBOX_PUBLISH_TIMEOUT_SECONDS)
+        except (AMQPError, ChannelInvalidStateError, ConnectionError, asyncio.TimeoutError) as e:
+            if not self._can_settle(delivery):
+                raise
+            try:
+                await self.outbox.append(SpooledMessage.from_message(exchange, routing_key, message))
+            except (OutboxFullError, OSError) as spool_error:
+                raise e from spool_error
+            logger.warning(
+                "Broker refused republish; message spooled to the outbox",
+                event_type="OUTBOX_MESSAGE_SPOOLED",
+                trigger_type="system_scheduled",
+                error=str(e),
+                event_details={"exchange": exchange, "routing_key": routing_key, "outbox_bytes": self.outbox.size_bytes},
+            )
+
+    async def _publish_spooled(self, record: SpooledMessage):
+        target = self.retry_exchange if record.exchange == RETRY else self.dlx_exchange
+        await target.publish(
+            record.to_message(), routing_key=record.routing_key, timeout=settings.OUTBOX_PUBLISH_TIMEOUT_SECONDS)
+
+    async def _on_message(
+        self,
+        message: AbstractIncomingMessage,
+        queue_name: str | None = None,
+        retry_routing_key: str | None = None,
+    ):
+        """Handles one delivery inside a consumer span that continues the trace of the message's `traceparent`."""
+        with start_span(
+            "notification.consume",
+            parent=extract(message.headers),
+            kind=CONSUMER,
+            attributes={
+                "messaging.system": "rabbitmq",
+                "messaging.destination.name": queue_name or self.main_queue.name,
+                "messaging.rabbitmq.routing_key": message.routing_key,
+                "messaging.message.correlation_id": message.correlation_id,
+                "messaging.message.retry_count": self._retry_count(message),
+            },
+        ):
+            await self._handle_message(message, queue_name, retry_routing_key)
+
+    async def _handle_message(
+        self,
+        message: AbstractIncomingMessage,
+        queue_name: str | None = None,
+        retry_routing_key: str | None = None,
+    ):
         correlation_id = message.correlation_id or str(uuid4())
-        log = logger.bind(correlation_id=correlation_id)
-        event_data = {}
-        event_type_label = "unknown"
+        log = logger.bind(correlation_id=correlation_id, **trace_log_fields())
+        queue_name = queue_name or self.main_queue.name
+        retry_routing_key = retry_routing_key or settings.RABBITMQ_ROUTING_KEY
 
         MESSAGES_RECEIVED.labels(
-            queue=self.main_queue.name,
+            queue=queue_name,
             routing_key=message.routing_key
         ).inc()
-    
+
+        self._in_flight += 1
         try:
-            event_data = json.loads(message.body.decode())
-            retry_count = message.headers.get("x-death", [{}])[0].get("count", 0)
-            event_type_label = event_data.get("event_type", "unknown")
-
-            log.info(
-                "Message successfully received and deserialized",
-                event_type="MESSAGE_RECEIVED",
-                trigger_type=event_data.get("trigger_type"),
-                actor_user_id=event_data.get("recipient", {}).get("user_id"),
-                event_details={
-                    "queue": self.main_queue.name,
-                    "retry_count": retry_count,
-                    "routing_key": message.routing_key,
-                    "message_size_bytes": len(message.body),
-                }
-            )
-        
-            with MESSAGE_PROCESSING_TIME.labels(event_type=event_type_label).time():
-                await self.event_handler.process_event(event_data, correlation_id)
-            
-            processed_in_ms = None
-            event_ts_str = event_data.get("timestamp")
-            if event_ts_str:
-                try:
-                    event_ts = datetime.fromisoformat(event_ts_str.replace("Z", "+00:00"))
-                    now = datetime.utcnow().timestamp()
-                    processed_in_ms = (now - event_ts.timestamp()) * 1000
-                except Exception as e:
-                    log.warning("Failed to parse event timestamp from body", error=str(e))
+            try:
+                deferred = await self._defer_if_not_due(message, retry_routing_key, log)
+            except Exception:
+                MESSAGES_PROCESSED.labels(event_type="unknown", status="error").inc()
+                raise
+            if deferred:
+                MESSAGES_PROCESSED.labels(event_type=self._peek_event_type(message), status="retry_deferred").inc()
+                return
 
-            log.info(
-                "Message processed successfully",
-                event_type="MESSAGE_PROCESSED_SUCCESSFULLY",
-                trigger_type=event_data.get("trigger_type"),
-                actor_user_id=event_data.get("recipient", {}).get("user_id"),
-                event_details={
-                    "processed_in_ms": processed_in_ms,
-                }
+            await self._process_delivery(
+                _AmqpDelivery(message, queue_name, retry_routing_key),
+                message.body,
+                self._retry_count(message),
+                correlation_id,
+                log,
             )
 
-            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="success").inc()
+        finally:
+            self._in_flight -= 1
 
-            await message.ack()
+    async def set_prefetch_count(self, prefetch_count: int):
+        """
+        Applies a new RABBITMQ_PREFETCH_COUNT to the main queue consumer. A
+        per-consumer prefetch only binds consumers created after it, so the
+        consumer is replaced: the new one starts before the old one is
+        cancelled, and messages already delivered to the old one are still
+        processed and acked. Before the consumer starts there is nothing to
+        replace: run() reads the new value. Raises when the change cannot take
+        effect, so the tuner reverts it.
+        """
+        if self.concurrency_limiter is not None:
+            raise RuntimeError("Adaptive concurrency drives the prefetch; RABBITMQ_PREFETCH_COUNT has no effect.")
+        if self._main_consumer_tag is None:
+            return
+        if self._channel is None or self._channel.is_closed:
+            raise ConnectionError("Consumer channel is closed; the prefetch change was not applied.")
+        await self._channel.set_qos(prefetch_count=prefetch_count)
+        previous_tag = self._main_consumer_tag
+        self._main_consumer_tag = await self.main_queue.consume(self._message_callback())
+        await self.main_queue.cancel(previous_tag)
+        logger.info(
+            "Consumer prefetch changed",
+            event_type="CONSUMER_PREFETCH_CHANGED",
+            trigger_type="system_scheduled",
+            event_details={"prefetch_count": prefetch_count},
+        )
 
-        except (EventTypeValidationError, SchemaValidationError, json.JSONDecodeError, TemplateRenderingError) as e:
-            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="dlq_schema_error").inc()
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
 
-            log.error(
-                "Unrecoverable error processing message. Moving to DLQ.",
-                event_type="MESSAGE_SENT_TO_DLQ",
-                trigger_type=event_data.get("trigger_type", "unknown"),
-                actor_user_id=event_data.get("recipient", {}).get("user_id"),
-                reason=f"Exception type: {type(e).__name__}",
-                event_details={
-                    "error_message": str(e),
-                },
-                exc_info=e
-            )
-            republished_message = self._republish_message(message)
-            await self.dlx_exchange.publish(republished_message, routing_key=settings.RABBITMQ_ROUTING_KEY)
-            await message.ack()
-
-        except TransientProcessingError as e:
-            retry_count = message.headers.get("x-death", [{}])[0].get("count", 0)
-            log_details = {
-                "trigger_type": event_data.get("trigger_type"),
-                "actor_user_id": event_data.get("recipient", {}).get("user_id")
-            }
-            if retry_count < self.MAX_RETRIES:
-                MESSAGES_PROCESSED.labels(event_type=event_type_label, status="retry_scheduled").inc()
-
-                log.warning(
-                    "Transient error occurred. Scheduling message for retry.",
-                    event_type="MESSAGE_RETRY_SCHEDULED",
-                    **log_details,
-                    event_details={
-                        "current_attempt": retry_count + 1,
-                        "max_retries": self.MAX_RETRIES,
-                        "error_message": str(e)
-                    },
-                    exc_info=e
-                )
-                republished_message = self._republish_message(message)
-                await self.retry_exchange.publish(republished_message, routing_key=settings.RABBITMQ_ROUTING_KEY)
-            else:
-                MESSAGES_PROCESSED.labels(event_type=event_type_label, status="dlq_max_retries").inc()
-
-                log.error(
-                    f"Max retries ({self.MAX_RETRIES}) reached. Moving message to DLQ.",
-                    event_type="MESSAGE_SENT_TO_DLQ_MAX_RETRIES",
-                    **log_details,
-                    event_details={
-                        "last_error_message": str(e),
-                    },
+    def prefetch_capacity(self) -> int:
+        """
+        Deliveries the broker may have outstanding to this consumer: the main
+        queue's prefetch plus each shard consumer's, every channel capped by the
+        channel-wide prefetch when adaptive concurrency drives it.
+        """
+        windows = [settings.RABBITMQ_PREFETCH_COUNT, *self._shard_prefetch_counts]
+        if self.concurrency_limiter is not None and self._prefetch_target:
+            windows = [min(window, self._prefetch_target) for window in windows]
+        return sum(windows)
+
+    def is_backpressured(self) -> bool:
+        """True when a full prefetch window, across every consuming channel, is waiting behind the handlers."""
+        waiting = len(self._scheduler) if self._scheduler else self._in_flight
+        return waiting >= self.prefetch_capacity()
+
+    async def check_connection(self):
+        if not self._connection or self._connection.is_closed:
+            raise ConnectionError("RabbitMQ connection is not open.")
+        if not self._channel or self._channel.is_closed:
+            raise ConnectionError("RabbitMQ channel is not open.")
+
+    @staticmethod
+    def _peek_event_type(message: AbstractIncomingMessage) -> str:
+        try:
+            return json.loads(message.body).get("event_type") or "unknown"
+        except (ValueError, AttributeError):
+            return "unknown"
+
+    def _message_callback(self, queue_name: str | None = None, retry_routing_key: str | None = None):
+        handler = self._enqueue_message if settings.SCHEDULER_ENABLED else self._on_message
+        return partial(handler, queue_name=queue_name, retry_routing_key=retry_routing_key)
+
+    async def _enqueue_message(
+        self,
+        message: AbstractIncomingMessage,
+        queue_name: str | None = None,
+        retry_routing_key: str | None = None,
+    ):
+        """Intake callback used when the weighted fair scheduler is enabled."""
+        lane = {"queue_name": queue_name, "retry_routing_key": retry_routing_key}
+        self._scheduler.put(self._peek_event_type(message), (message, lane))
+
+    async def _scheduler_worker(self):
+        while True:
+            event_type, (message, lane) = await self._scheduler.get()
+            try:
+                await self._on_message(message, **lane)
+            except Exception as e:
+                logger.error(
+                    "Unexpected error while processing scheduled message",
+                    event_type="SCHEDULER_WORKER_ERROR",
+                    trigger_type="system_scheduled",
+                    correlation_id=message.correlation_id,
+                    error=str(e),
+                    event_details={"message_event_type": event_type},
                     exc_info=e
                 )
-                republished_message = self._republish_message(message)
-                await self.dlx_exchange.publish(republished_message, routing_key=settings.RABBITMQ_ROUTING_KEY)
-            await message.ack()
-        
-        except Exception as e:
-            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="error").inc()
-            raise e
-    
+
+    def _start_scheduler(self):
+        self._scheduler = WeightedFairScheduler(
+            weights=settings.SCHEDULER_WEIGHTS,
+            latency_slo_ms=settings.SCHEDULER_LATENCY_SLO_MS,
+            default_weight=settings.SCHEDULER_DEFAULT_WEIGHT,
+        )
+        self._worker_tasks = [
+            asyncio.create_task(self._scheduler_worker())
+            for _ in range(settings.SCHEDULER_WORKERS)
+        ]
+        logger.debug(
+            "Weighted fair scheduler started",
+            event_type="SCHEDULER_STARTED",
+            trigger_type="system_scheduled",
+            event_details={
+                "workers": settings.SCHEDULER_WORKERS,
+                "weights": settings.SCHEDULER_WEIGHTS,
+                "latency_slo_ms": settings.SCHEDULER_LATENCY_SLO_MS,
+            }
+        )
+
+    async def _stop_scheduler(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
     async def run(self):
         try:
-            await self.connect()
+            if self._channel is None:
+                await self.connect()
             await self._setup_queues()
-        
+            await self._channel.set_qos(prefetch_count=settings.RABBITMQ_PREFETCH_COUNT)
+
             logger.debug(
                 "Consumer is ready and starting to consume messages",
                 event_type="CONSUMER_STARTED_SUCCESSFULLY",
                 trigger_type="system_scheduled",
                 event_details={
-                    "main_queue_name": self.main_queue.name
+                    "main_queue_name": self.main_queue.name,
+                    "prefetch_count": settings.RABBITMQ_PREFETCH_COUNT,
+                    "scheduler_enabled": settings.SCHEDULER_ENABLED,
                 }
             )
-        
-            await self.main_queue.consume(self._on_message)
+
+            if settings.SCHEDULER_ENABLED:
+                self._start_scheduler()
+            self._main_consumer_tag = await self.main_queue.consume(self._message_callback())
+            if settings.RABBITMQ_SHARDING_ENABLED:
+                await self._consume_shards()
+            if self.concurrency_limiter:
+                await self._apply_prefetch()
+            if self.outbox:
+                self.outbox.start(
+                    self._publish_spooled,
+                    interval_seconds=settings.OUTBOX_DRAIN_INTERVAL_SECONDS,
+                    batch_size=settings.OUTBOX_DRAIN_BATCH_SIZE,
+                )
             await asyncio.Future()
         
         except Exception as e:
@@ -286,6 +712,11 @@ class RabbitMQConsumer:
             raise
         
         finally:
+            await self._stop_scheduler()
+            if self._prefetch_task:
+                self._prefetch_task.cancel()
+            if self.outbox:
+                await self.outbox.stop()
             if self._connection and not self._connection.is_closed:
                 await self._connection.close()
                 logger.debug(
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import settings
+from metrics import DELIVERY_STATUS_DROPPED, DELIVERY_STATUS_FLUSHED
+
+logger = structlog.get_logger(__name__)
+
+
+class DeliveryStatusRecorder:
+    """
+    Buffers delivery outcomes in memory and writes them to Redis in bulk.
+
+    Each outcome is stored as a `delivery:<message_id>` hash and indexed in a
+    per-user sorted set (`delivery:user:<user_id>`, scored by record time).
+    Both expire after `retention_seconds`, and each flush trims index entries
+    older than the retention window. `record()` never awaits, so consumers pay
+    no Redis round trip per message; when the buffer is full new records are
+    dropped and counted. A failed flush puts its batch back, dropping (and
+    counting) the oldest records that no longer fit.
+    """
+
+    KEY_PREFIX = "delivery:"
+    USER_INDEX_PREFIX = "delivery:user:"
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        retention_seconds: int = 7 * 86400,
+        flush_interval_seconds: float = 1.0,
+        batch_size: int = 500,
+        max_buffer: int = 50000,
+    ):
+        self.redis_client = redis_client
+        self.retention_seconds = retention_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self._buffer: Deque[dict] = deque(maxlen=max_buffer)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        *,
+        message_id: str,
+        user_id: Optional[str],
+        event_type: str,
+        status: str,
+        attempts: int,
+        event_timestamp: Optional[str] = None,
+    ) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            DELIVERY_STATUS_DROPPED.inc()
+            return
+        self._buffer.append({
+            "message_id": message_id,
+            "user_id": user_id or "",
+            "event_type": event_type,
+            "status": status,
+            "attempts": attempts,
+            "event_timestamp": event_timestamp or "",
+            "recorded_at": time.time(),
+        })
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            cutoff = time.time() - self.retention_seconds
+            user_indexes = set()
+            try:
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for record in batch:
+                        key = f"{self.KEY_PREFIX}{record['message_id']}"
+                        pipe.hset(key, mapping=record)
+                        pipe.expire(key, self.retention_seconds)
+                        if record["user_id"]:
+                            index = f"{self.USER_INDEX_PREFIX}{record['user_id']}"
+                            pipe.zadd(index, {record["message_id"]: record["recorded_at"]})
+                            user_indexes.add(index)
+                    for index in user_indexes:
+                        pipe.zremrangebyscore(index, "-inf", cutoff)
+                        pipe.expire(index, self.retention_seconds)
+                    await pipe.execute()
+            except RedisError:
+                # Keep the batch for the next flush. Records added meanwhile may leave no room for all of it:
+                # the batch holds the oldest records, so its head is dropped and counted.
+                overflow = max(len(self._buffer) + len(batch) - self._buffer.maxlen, 0)
+                if overflow:
+                    DELIVERY_STATUS_DROPPED.inc(overflow)
+                self._buffer.extendleft(reversed(batch[overflow:]))
+                raise
+            DELIVERY_STATUS_FLUSHED.inc(len(batch))
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except RedisError as e:
+                logger.error(
+                    "Failed to flush delivery status records",
+                    event_type="DELIVERY_STATUS_FLUSH_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"buffered": len(self._buffer)},
+                    exc_info=e,
+                )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except RedisError as e:
+            logger.error(
+                "Failed to flush delivery status records on shutdown",
+                event_type="DELIVERY_STATUS_FLUSH_FAILED",
+                trigger_type="system_scheduled",
+                error=str(e),
+                exc_info=e,
+            )
+
+    @staticmethod
+    def _from_hash(data: dict) -> dict:
+        return {
+            "message_id": data["message_id"],
+            "user_id": data["user_id"] or None,
+            "event_type": data["event_type"],
+            "status": data["status"],
+            "attempts": int(data["attempts"]),
+            "event_timestamp": data["event_timestamp"] or None,
+            "recorded_at": float(data["recorded_at"]),
+        }
+
+    async def get(self, message_id: str) -> Optional[dict]:
+        data = await self.redis_client.hgetall(f"{self.KEY_PREFIX}{message_id}")
+        return self._from_hash(data) if data else None
+
+    async def list_for_user(self, user_id: str, offset: int = 0, limit: int = 50) -> tuple[list[dict], Optional[int]]:
+        """Newest first. Returns the page and the offset of the next page, if any."""
+        index = f"{self.USER_INDEX_PREFIX}{user_id}"
+        message_ids = await self.redis_client.zrevrange(index, offset, offset + limit)
+        has_more = len(message_ids) > limit
+        message_ids = message_ids[:limit]
+
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for message_id in message_ids:
+                pipe.hgetall(f"{self.KEY_PREFIX}{message_id}")
+            rows = await pipe.execute()
+
+        items = [self._from_hash(row) for row in rows if row]
+        return items, (offset + limit if has_more else None)
+
+
+delivery_recorder: DeliveryStatusRecorder | None = None
+
+
+def init_delivery_recorder(redis_client: Redis) -> DeliveryStatusRecorder:
+    global delivery_recorder
+    delivery_recorder = DeliveryStatusRecorder(
+        redis_client,
+        retention_seconds=settings.DELIVERY_STATUS_RETENTION_SECONDS,
+        flush_interval_seconds=settings.DELIVERY_STATUS_FLUSH_INTERVAL_SECONDS,
+        batch_size=settings.DELIVERY_STATUS_BATCH_SIZE,
+        max_buffer=settings.DELIVERY_STATUS_MAX_BUFFER,
+    )
+    delivery_recorder.start()
+    return delivery_recorder
+
+
+async def close_delivery_recorder():
+    if delivery_recorder:
+        await delivery_recorder.stop()
+
+
+async def get_delivery_recorder() -> DeliveryStatusRecorder:
+    if delivery_recorder is None:
+        raise RuntimeError("Delivery status recorder not initialized.")
+    return delivery_recorder
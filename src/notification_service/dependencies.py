@@ -0,0 +1,28 @@
+from fastapi import Depends
+from fastapi_mail import ConnectionConfig
+from redis.asyncio import Redis
+
+from config import Settings, settings as app_settings
+from redis_client import get_redis_client
+from .idempotency import build_idempotency_store
+from .service import EmailService, EventHandler, TemplateCachingFastMail, build_mail_config
+
+
+def get_mail_config(settings: Settings = Depends(lambda: app_settings)) -> ConnectionConfig:
+    return build_mail_config(settings)
+
+
+def get_email_service(mail_config: ConnectionConfig = Depends(get_mail_config)) -> EmailService:
+    mailer = TemplateCachingFastMail(mail_config)
+    return EmailService(mailer)
+
+
+def get_event_handler(
+    redis_client: Redis = Depends(get_redis_client),
+    email_service: EmailService = Depends(get_email_service)
+) -> EventHandler:
+    return EventHandler(
+        redis_client=redis_client,
+        email_service=email_service,
+        idempotency_store=build_idempotency_store(redis_client),
+    )
@@ -0,0 +1,442 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from uuid import uuid4
+
+import aio_pika
+import structlog
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractRobustConnection
+
+from config import settings
+from metrics import DLQ_MESSAGES_REPLAYED
+from .exceptions import DLQReplayInProgressError
+from .publisher import NotificationPublisher, routing_key_for
+from .schemas import DLQFilter, DLQReplayProgress, DLQReplayRequest
+
+logger = structlog.get_logger(__name__)
+
+# AMQP prefetch counts are 16-bit.
+MAX_PREFETCH_COUNT = 65535
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def describe_message(message: AbstractIncomingMessage) -> dict:
+    """Summarizes a dead-lettered message from its body and the x-dlq-* headers set by the consumer."""
+    headers = message.headers or {}
+    try:
+        event = json.loads(message.body)
+    except ValueError:
+        event = None
+    if not isinstance(event, dict):
+        event = {}
+    recipient = event.get("recipient") if isinstance(event.get("recipient"), dict) else {}
+    x_death = headers.get("x-death") or [{}]
+
+    return {
+        "message_id": event.get("message_id") or message.message_id,
+        "event_type": event.get("event_type"),
+        "user_id": recipient.get("user_id"),
+        "reason": headers.get("x-dlq-reason"),
+        "error": headers.get("x-dlq-error"),
+        "dead_lettered_at": headers.get("x-dlq-at"),
+        "retry_count": x_death[0].get("count", 0),
+        "correlation_id": message.correlation_id,
+        "size_bytes": len(message.body),
+    }
+
+
+def matches(dlq_filter: DLQFilter, entry: dict) -> bool:
+    if dlq_filter.event_types and entry["event_type"] not in dlq_filter.event_types:
+        return False
+    if dlq_filter.reason and entry["reason"] != dlq_filter.reason:
+        return False
+    if dlq_filter.since or dlq_filter.until:
+        if not entry["dead_lettered_at"]:
+            return False
+        dead_lettered_at = _as_utc(datetime.fromisoformat(entry["dead_lettered_at"]))
+        if dlq_filter.since and dead_lettered_at < _as_utc(dlq_filter.since):
+            return False
+        if dlq_filter.until and dead_lettered_at > _as_utc(dlq_filter.until):
+            return False
+    return True
+
+
+def replay_message(message: AbstractIncomingMessage) -> aio_pika.Message:
+    """
+    Copy of a DLQ message for the main exchange with fresh retry state: x-death
+    and the x-dlq-* and x-retry-* headers are dropped, so the consumer counts
+    attempts from zero.
+    """
+    headers = {
+        key: value for key, value in (message.headers or {}).items()
+        if key != "x-death" and not key.startswith(("x-dlq-", "x-retry-"))
+    }
+    headers["x-replayed-at"] = datetime.now(timezone.utc).isoformat()
+    return aio_pika.Message(
+        body=message.body,
+        headers=headers,
+        content_type=message.content_type,
+        correlation_id=message.correlation_id,
+        message_id=message.message_id,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=message.priority,
+    )
+
+
+def requeue_message(message: AbstractIncomingMessage) -> aio_pika.Message:
+    """Unchanged copy of a DLQ message, to move it to the back of the DLQ."""
+    return aio_pika.Message(
+        body=message.body,
+        headers=message.headers,
+        content_type=message.content_type,
+        correlation_id=message.correlation_id,
+        message_id=message.message_id,
+        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        priority=message.priority,
+    )
+
+
+def new_replay_progress(dlq_filter: DLQFilter, limit: Optional[int] = None) -> DLQReplayProgress:
+    now = datetime.now(timezone.utc)
+    return DLQReplayProgress(
+        job_id=str(uuid4()),
+        filter=DLQFilter.model_validate(dlq_filter.model_dump()),
+        limit=limit,
+        started_at=now,
+        updated_at=now,
+    )
+
+
+def load_checkpoint(path: str) -> Optional[DLQReplayProgress]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as checkpoint:
+        return DLQReplayProgress.model_validate_json(checkpoint.read())
+
+
+def save_checkpoint(progress: DLQReplayProgress, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as checkpoint:
+        checkpoint.write(progress.model_dump_json())
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(tmp_path, path)
+
+
+class DLQManager:
+    """
+    Browses and replays `RABBITMQ_QUEUE_DLQ` on its own connection.
+
+    Browsing holds the scanned messages unacked and lets them return to the DLQ
+    when its channel closes, so nothing is removed. Replay moves matching
+    messages to the main exchange through the confirmed publisher in batches,
+    acking each one only after its confirm; messages that do not match are moved
+    to the back of the DLQ. Both stop once they have seen as many messages as
+    the DLQ held when they started, so requeued messages are not scanned twice.
+    """
+
+    def __init__(
+        self,
+        rabbitmq_url: str,
+        publisher: NotificationPublisher,
+        batch_size: int = 100,
+        rate_per_second: float = 200.0,
+        browse_max_scan: int = 10000,
+        idle_timeout_seconds: float = 2.0,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        self.rabbitmq_url = rabbitmq_url
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.rate_per_second = rate_per_second
+        self.browse_max_scan = browse_max_scan
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.checkpoint_dir = checkpoint_dir
+        self._connection: AbstractRobustConnection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._jobs: dict[str, DLQReplayProgress] = {}
+        self._replay_task: Optional[asyncio.Task] = None
+
+    async def _open_channel(self, prefetch_count: int) -> AbstractChannel:
+        async with self._connect_lock:
+            if self._connection is None:
+                self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        channel = await self._connection.channel()
+        await channel.set_qos(prefetch_count=min(prefetch_count, MAX_PREFETCH_COUNT))
+        return channel
+
+    async def depth(self) -> int:
+        channel = await self._open_channel(1)
+        try:
+            queue = await channel.declare_queue(settings.RABBITMQ_QUEUE_DLQ, passive=True)
+            return queue.declaration_result.message_count
+        finally:
+            await channel.close()
+
+    async def _consume(self, prefetch_count: int, max_messages: int) -> AsyncIterator[AbstractIncomingMessage]:
+        """
+        Yields DLQ messages until `max_messages` (capped at the current depth) were
+        delivered or the queue stays idle. Unacked messages return to the DLQ when
+        the channel closes.
+        """
+        channel = await self._open_channel(prefetch_count)
+        try:
+            queue = await channel.declare_queue(settings.RABBITMQ_QUEUE_DLQ, passive=True)
+            budget = min(queue.declaration_result.message_count, max_messages)
+            if budget <= 0:
+                return
+            async with queue.iterator(timeout=self.idle_timeout_seconds) as messages:
+                async for message in messages:
+                    yield message
+                    budget -= 1
+                    if budget <= 0:
+                        break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await channel.close()
+
+    async def browse(self, dlq_filter: DLQFilter, limit: int = 100) -> AsyncIterator[dict]:
+        """Streams up to `limit` matching entries, scanning at most `browse_max_scan` messages."""
+        found = 0
+        async with aclosing(self._consume(self.browse_max_scan, self.browse_max_scan)) as messages:
+            async for message in messages:
+                entry = describe_message(message)
+                if not matches(dlq_filter, entry):
+                    continue
+                yield entry
+                found += 1
+                if found >= limit:
+                    break
+
+    async def replay(
+        self,
+        progress: DLQReplayProgress,
+        checkpoint_path: Optional[str] = None,
+        rate_per_second: Optional[float] = None,
+    ) -> DLQReplayProgress:
+        """
+        Replays the messages selected by `progress.filter`, resuming from `progress`.
+
+        The checkpoint is written after every batch, once its messages were acked,
+        so a restarted replay continues with the remaining scan budget.
+        """
+        rate = rate_per_second or self.rate_per_second
+        if progress.remaining_scan is None:
+            progress.remaining_scan = await self.depth()
+        log = logger.bind(correlation_id=progress.job_id)
+        batch: list[tuple[AbstractIncomingMessage, dict, bool]] = []
+        started = time.monotonic()
+        replayed_at_start = progress.replayed
+
+        async def flush():
+            selected = [(message, entry) for message, entry, chosen in batch if chosen]
+            others = [(message, entry) for message, entry, chosen in batch if not chosen]
+            replay_errors = await self.publisher.publish_batch(
+                [(replay_message(message), routing_key_for(entry["event_type"])) for message, entry in selected]
+            ) if selected else []
+            requeue_errors = await self.publisher.publish_batch(
+                [(requeue_message(message), settings.RABBITMQ_ROUTING_KEY) for message, _ in others],
+                exchange_name=settings.RABBITMQ_EXCHANGE_DLQ,
+            ) if others else []
+
+            for (message, entry), error in zip(selected, replay_errors):
+                if error is None:
+                    await message.ack()
+                    progress.replayed += 1
+                    DLQ_MESSAGES_REPLAYED.labels(event_type=entry["event_type"] or "unknown").inc()
+                else:
+                    await message.nack(requeue=True)
+                    progress.failed += 1
+            for (message, _), error in zip(others, requeue_errors):
+                if error is None:
+                    await message.ack()
+                else:
+                    await message.nack(requeue=True)
+                progress.skipped += 1
+
+            progress.scanned += len(batch)
+            progress.remaining_scan -= len(batch)
+            progress.last_message_id = batch[-1][1]["message_id"]
+            progress.updated_at = datetime.now(timezone.utc)
+            batch.clear()
+            if checkpoint_path:
+                save_checkpoint(progress, checkpoint_path)
+
+        async def pace():
+            delay = started + (progress.replayed - replayed_at_start) / rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        try:
+            async with aclosing(self._consume(self.batch_size * 2, progress.remaining_scan)) as messages:
+                async for message in messages:
+                    entry = describe_message(message)
+                    pending = sum(chosen for _, _, chosen in batch)
+                    chosen = matches(progress.filter, entry) and (
+                        progress.limit is None or progress.replayed + pending < progress.limit
+                    )
+                    batch.append((message, entry, chosen))
+                    limit_reached = progress.limit is not None and progress.replayed + pending + chosen >= progress.limit
+                    if len(batch) >= self.batch_size or limit_reached:
+                        await flush()
+                        if limit_reached:
+                            break
+                        await pace()
+                if batch:
+                    await flush()
+        except Exception as e:
+            progress.state = "failed"
+            progress.error = f"{type(e).__name__}: {e}"
+            progress.updated_at = datetime.now(timezone.utc)
+            if checkpoint_path:
+                save_checkpoint(progress, checkpoint_path)
+            log.error(
+                "DLQ replay failed",
+                event_type="DLQ_REPLAY_FAILED",
+                trigger_type="user_action",
+                error=progress.error,
+                event_details=progress.model_dump(mode="json", exclude={"filter"}),
+                exc_info=e,
+            )
+            raise
+
+        progress.state = "completed"
+        progress.updated_at = datetime.now(timezone.utc)
+        if checkpoint_path:
+            save_checkpoint(progress, checkpoint_path)
+        log.info(
+            "DLQ replay finished",
+            event_type="DLQ_REPLAY_FINISHED",
+            trigger_type="user_action",
+            event_details=progress.model_dump(mode="json", exclude={"filter"}),
+        )
+        return progress
+
+    def start_replay(self, request: DLQReplayRequest) -> DLQReplayProgress:
+        """Starts a replay in the background; only one replay runs at a time."""
+        if self._replay_task and not self._replay_task.done():
+            raise DLQReplayInProgressError("A DLQ replay is already running.")
+
+        progress = new_replay_progress(request, limit=request.limit)
+        checkpoint_path = (
+            os.path.join(self.checkpoint_dir, f"dlq-replay-{progress.job_id}.json")
+            if self.checkpoint_dir else None
+        )
+        self._jobs[progress.job_id] = progress
+        self._replay_task = asyncio.create_task(
+            self._run_replay_job(progress, checkpoint_path, request.rate_per_second)
+        )
+        return progress
+
+    async def _run_replay_job(self, progress: DLQReplayProgress, checkpoint_path: Optional[str], rate_per_second: Optional[float]):
+        try:
+            await self.replay(progress, checkpoint_path=checkpoint_path, rate_per_second=rate_per_second)
+        except Exception:
+            # Already logged and recorded on the progress by replay().
+            pass
+
+    def get_job(self, job_id: str) -> Optional[DLQReplayProgress]:
+        return self._jobs.get(job_id)
+
+    async def close(self):
+        if self._replay_task and not self._replay_task.done():
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+        if self._connection and not self._connection.is_closed:
+            await self._connection.close()
+
+
+dlq_manager: DLQManager | None = None
+
+
+def init_dlq_manager(publisher: NotificationPublisher) -> DLQManager:
+    """Creates the shared DLQ manager; its connection is opened on first use."""
+    global dlq_manager
+    dlq_manager = DLQManager(
+        settings.RABBITMQ_URL,
+        publisher,
+        batch_size=settings.DLQ_REPLAY_BATCH_SIZE,
+        rate_per_second=settings.DLQ_REPLAY_RATE_PER_SECOND,
+        browse_max_scan=settings.DLQ_BROWSE_MAX_SCAN,
+        idle_timeout_seconds=settings.DLQ_IDLE_TIMEOUT_SECONDS,
+        checkpoint_dir=settings.DLQ_CHECKPOINT_DIR,
+    )
+    return dlq_manager
+
+
+async def close_dlq_manager():
+    if dlq_manager:
+        await dlq_manager.close()
+
+
+async def get_dlq_manager() -> DLQManager:
+    if dlq_manager is None:
+        raise RuntimeError("DLQ manager not initialized.")
+    return dlq_manager
+
+
+def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m notification_service.dlq",
+        description="Inspeciona e reprocessa a DLQ de notificações.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    browse = commands.add_parser("browse", help="Lista mensagens da DLQ sem removê-las (NDJSON).")
+    replay = commands.add_parser("replay", help="Republica mensagens da DLQ na exchange principal.")
+    for command in (browse, replay):
+        command.add_argument("--event-type", action="append", dest="event_types", help="Pode ser repetido.")
+        command.add_argument("--reason", help="Motivo do envio à DLQ, ex.: schema_error, max_retries.")
+        command.add_argument("--since", type=datetime.fromisoformat, help="ISO 8601; UTC se sem fuso.")
+        command.add_argument("--until", type=datetime.fromisoformat, help="ISO 8601; UTC se sem fuso.")
+        command.add_argument("--limit", type=int)
+    replay.add_argument("--rate", type=float, help="Mensagens por segundo.")
+    replay.add_argument("--checkpoint", help="Arquivo de checkpoint; se existir, a execução é retomada dele.")
+    return parser.parse_args(argv)
+
+
+async def _run_cli(args: argparse.Namespace):
+    dlq_filter = DLQFilter(event_types=args.event_types, reason=args.reason, since=args.since, until=args.until)
+    publisher = NotificationPublisher(settings.RABBITMQ_URL, pool_size=settings.PUBLISHER_CHANNEL_POOL_SIZE)
+    manager = DLQManager(
+        settings.RABBITMQ_URL,
+        publisher,
+        batch_size=settings.DLQ_REPLAY_BATCH_SIZE,
+        rate_per_second=settings.DLQ_REPLAY_RATE_PER_SECOND,
+        browse_max_scan=settings.DLQ_BROWSE_MAX_SCAN,
+        idle_timeout_seconds=settings.DLQ_IDLE_TIMEOUT_SECONDS,
+    )
+    try:
+        if args.command == "browse":
+            async for entry in manager.browse(dlq_filter, limit=args.limit or 100):
+                print(json.dumps(entry), flush=True)
+        else:
+            progress = (load_checkpoint(args.checkpoint) if args.checkpoint else None) or new_replay_progress(
+                dlq_filter, limit=args.limit)
+            progress.state = "running"
+            progress.error = None
+            progress = await manager.replay(progress, checkpoint_path=args.checkpoint, rate_per_second=args.rate)
+            print(progress.model_dump_json(), flush=True)
+    finally:
+        await manager.close()
+        await publisher.close()
+
+
+def main(argv: Optional[list[str]] = None):
+    from logging_config import setup_logging
+
+    setup_logging(log_level="WARNING", stream=sys.stderr)
+    asyncio.run(_run_cli(_parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
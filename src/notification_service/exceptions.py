@@ -10,9 +10,32 @@ class EventTypeValidationError(Exception):
         super().__init__(self.message)
 
 class TransientProcessingError(Exception):
-    """Error for processing failures that can be retried."""
+    """Error for processing failures that can be retried, optionally after a specific delay."""
+    def __init__(self, *args, retry_after_seconds: float | None = None):
+        super().__init__(*args)
+        self.retry_after_seconds = retry_after_seconds
+
+class PermanentDeliveryError(Exception):
+    """Error for deliveries rejected permanently (e.g. SMTP 5xx), which should not be retried."""
+    def __init__(self, message: str, smtp_code: int | None = None, recipient_refused: bool = False):
+        self.smtp_code = smtp_code
+        self.recipient_refused = recipient_refused
+        super().__init__(message)
+
+class DeliveryContinuationRequired(Exception):
+    """Raised when a delivery did its share of a longer job; the message is requeued, unchanged, to continue it."""
     pass
 
+class RecipientSuppressedError(Exception):
+    """Raised when the recipient is on the suppression list; the message is dropped, not retried."""
+    def __init__(self, email: str):
+        self.email = email
+        super().__init__(f"Recipient is suppressed: {email}")
+
 class TemplateRenderingError(Exception):
     """Error for template rendering failures that should not be retried."""
-    pass
\ No newline at end of file
+    pass
+
+class DLQReplayInProgressError(Exception):
+    """Raised when a DLQ replay is requested while another one is still running."""
+    pass
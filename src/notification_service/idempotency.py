@@ -0,0 +1,468 @@
+import asyncio
+import math
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import UUID
+
+import redis.exceptions
+import structlog
+from redis.asyncio import Redis
+
+from config import settings
+from metrics import (
+    IDEMPOTENCY_CACHE_BYTES,
+    IDEMPOTENCY_CACHE_ENTRIES,
+    IDEMPOTENCY_CACHE_LOOKUPS,
+    IDEMPOTENCY_DEGRADED_MODE,
+    IDEMPOTENCY_JOURNAL_ENTRIES,
+    IDEMPOTENCY_JOURNAL_EVICTED,
+    IDEMPOTENCY_MODE_SWITCHES,
+)
+from startup import backoff_delay
+
+logger = structlog.get_logger(__name__)
+
+
+class IdempotencyStore(ABC):
+    """Records which message IDs were already processed successfully."""
+
+    ttl_seconds: int
+
+    @abstractmethod
+    async def is_processed(self, message_id: UUID) -> bool:
+        """Whether the message was already processed successfully."""
+
+    @abstractmethod
+    async def mark_processed(self, message_id: UUID) -> None:
+        """Records the message as processed successfully."""
+
+
+class RedisKeyIdempotencyStore(IdempotencyStore):
+    """
+    One `idempotency:<uuid>` string key per message, each with its own TTL.
+
+    This is the original scheme and remains the default backend.
+    """
+
+    def __init__(self, redis_client: Redis, ttl_seconds: int = 86400):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def key_for(message_id: UUID) -> str:
+        return f"idempotency:{message_id}"
+
+    async def is_processed(self, message_id: UUID) -> bool:
+        return bool(await self.redis_client.exists(self.key_for(message_id)))
+
+    async def mark_processed(self, message_id: UUID) -> None:
+        await self.redis_client.set(self.key_for(message_id), "processed", ex=self.ttl_seconds)
+
+
+class BucketedIdempotencyStore(IdempotencyStore):
+    """
+    Memory-compact backend that keeps message IDs as 16-byte binary members of
+    time-bucketed Redis sets (`idempotency:bucket:<bucket_start>`).
+
+    A whole bucket expires at once, `ttl_seconds` after the bucket closes, so
+    Redis only tracks one key and one expiry per bucket instead of one per
+    message. Lookups check every bucket that can still be alive in a single
+    pipelined round trip.
+
+    False-positive policy: membership is exact, so a message is never reported
+    as processed unless its ID was recorded. The only difference from the
+    per-key scheme is the retention granularity: an ID is remembered for at
+    least `ttl_seconds` and at most `ttl_seconds + bucket_seconds`.
+    """
+
+    KEY_PREFIX = "idempotency:bucket:"
+
+    def __init__(self, redis_client: Redis, ttl_seconds: int = 86400, bucket_seconds: int = 3600):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.bucket_seconds = bucket_seconds
+        self._lookback_buckets = math.ceil(ttl_seconds / bucket_seconds) + 1
+
+    def _bucket_index(self, now: float) -> int:
+        return int(now // self.bucket_seconds)
+
+    def _bucket_key(self, index: int) -> str:
+        return f"{self.KEY_PREFIX}{index * self.bucket_seconds}"
+
+    async def is_processed(self, message_id: UUID) -> bool:
+        current = self._bucket_index(time.time())
+        member = message_id.bytes
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for index in range(current - self._lookback_buckets, current + 1):
+                pipe.sismember(self._bucket_key(index), member)
+            results = await pipe.execute()
+        return any(results)
+
+    async def mark_processed(self, message_id: UUID) -> None:
+        index = self._bucket_index(time.time())
+        key = self._bucket_key(index)
+        expire_at = (index + 1) * self.bucket_seconds + self.ttl_seconds
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, message_id.bytes)
+            pipe.expireat(key, expire_at)
+            await pipe.execute()
+
+
+class LocalIdempotencyCache:
+    """
+    Bounded in-process LRU of recently processed message IDs, with a TTL per entry.
+
+    Only positive results are cached. An ID is never removed from Redis before its
+    TTL, so a cached entry can only go stale by expiring, which the local TTL
+    (never longer than the store TTL) already covers.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[int, float] = OrderedDict()
+        # A 128-bit int key plus its float expiry; the dict itself is measured separately.
+        self._entry_bytes = sys.getsizeof(1 << 127) + sys.getsizeof(0.0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, message_id: UUID) -> bool:
+        key = message_id.int
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False
+        self._entries.move_to_end(key)
+        return True
+
+    def add(self, message_id: UUID) -> None:
+        key = message_id.int
+        self._entries[key] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def approximate_bytes(self) -> int:
+        return sys.getsizeof(self._entries) + len(self._entries) * self._entry_bytes
+
+
+class CachedIdempotencyStore(IdempotencyStore):
+    """Checks a `LocalIdempotencyCache` before falling back to the wrapped store."""
+
+    def __init__(self, store: IdempotencyStore, cache: LocalIdempotencyCache):
+        self.store = store
+        self.cache = cache
+        self.ttl_seconds = store.ttl_seconds
+
+    def _update_gauges(self):
+        IDEMPOTENCY_CACHE_ENTRIES.set(len(self.cache))
+        IDEMPOTENCY_CACHE_BYTES.set(self.cache.approximate_bytes())
+
+    async def is_processed(self, message_id: UUID) -> bool:
+        if self.cache.contains(message_id):
+            IDEMPOTENCY_CACHE_LOOKUPS.labels(result="hit").inc()
+            return True
+
+        IDEMPOTENCY_CACHE_LOOKUPS.labels(result="miss").inc()
+        processed = await self.store.is_processed(message_id)
+        if processed:
+            self.cache.add(message_id)
+            self._update_gauges()
+        return processed
+
+    async def mark_processed(self, message_id: UUID) -> None:
+        await self.store.mark_processed(message_id)
+        self.cache.add(message_id)
+        self._update_gauges()
+
+
+class IdempotencyJournal:
+    """
+    Local record of IDs processed while Redis was unavailable.
+
+    Entries live in memory and, when `path` is set, are also appended to a file so
+    that a restart during an outage does not lose them. The file is written from a
+    worker thread: `flush` appends everything added since the last write in one
+    fsynced write, so callers that arrive during a write share the next one, and
+    `compact` rewrites it once a reconcile completes instead of on every discard.
+    At most `max_entries` are kept, the oldest dropped first. Entries older than
+    the TTL are dropped when the file is loaded.
+    """
+
+    def __init__(self, ttl_seconds: int, path: Optional[str] = None, max_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self.max_entries = max_entries
+        self._entries: Dict[UUID, float] = {}
+        self._unwritten: list[str] = []
+        self._write_lock = asyncio.Lock()
+        if self.path and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        cutoff = time.time() - self.ttl_seconds
+        for line in self.path.read_text().splitlines():
+            try:
+                raw_id, recorded_at = line.split()
+                if float(recorded_at) >= cutoff:
+                    self._remember(UUID(raw_id), float(recorded_at))
+            except ValueError:
+                logger.warning(
+                    "Skipping malformed idempotency journal entry",
+                    event_type="IDEMPOTENCY_JOURNAL_ENTRY_INVALID",
+                    trigger_type="system_scheduled",
+                    event_details={"path": str(self.path)},
+                )
+
+    def _remember(self, message_id: UUID, recorded_at: float):
+        # Re-inserted so iteration order stays oldest first.
+        self._entries.pop(message_id, None)
+        self._entries[message_id] = recorded_at
+        if len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+            IDEMPOTENCY_JOURNAL_EVICTED.inc()
+
+    def contains(self, message_id: UUID) -> bool:
+        return message_id in self._entries
+
+    def add(self, message_id: UUID) -> None:
+        recorded_at = time.time()
+        self._remember(message_id, recorded_at)
+        if self.path:
+            self._unwritten.append(f"{message_id.hex} {recorded_at}\n")
+
+    def entries(self) -> list[UUID]:
+        return list(self._entries)
+
+    def discard(self, message_ids: list[UUID]) -> None:
+        """Forgets reconciled IDs; the file keeps them until the next `compact`."""
+        for message_id in message_ids:
+            self._entries.pop(message_id, None)
+
+    async def flush(self) -> None:
+        """Appends the entries added since the last flush to the file."""
+        async with self._write_lock:
+            if not self._unwritten:
+                return
+            lines, self._unwritten = self._unwritten, []
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except OSError as e:
+                # Kept in memory either way; the lines are tried again with the next flush.
+                self._unwritten[:0] = lines
+                self._write_failed(e)
+
+    async def compact(self) -> None:
+        """Rewrites the file with only the entries still pending."""
+        if not self.path:
+            return
+        async with self._write_lock:
+            unwritten, self._unwritten = self._unwritten, []
+            lines = [f"{message_id.hex} {recorded_at}\n" for message_id, recorded_at in self._entries.items()]
+            try:
+                await asyncio.to_thread(self._write, lines, True)
+            except OSError as e:
+                self._unwritten[:0] = unwritten
+                self._write_failed(e)
+
+    def _write(self, lines: list[str], replace: bool = False):
+        target = self.path.with_name(self.path.name + ".tmp") if replace else self.path
+        with target.open("w" if replace else "a") as journal_file:
+            journal_file.writelines(lines)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        if replace:
+            os.replace(target, self.path)
+
+    def _write_failed(self, error: OSError):
+        logger.error(
+            "Failed to write the idempotency journal file",
+            event_type="IDEMPOTENCY_JOURNAL_WRITE_FAILED",
+            trigger_type="system_scheduled",
+            error=str(error),
+            event_details={"path": str(self.path), "entries": len(self._entries)},
+        )
+
+
+class DegradedModeIdempotencyStore(IdempotencyStore):
+    """
+    Keeps idempotency working while Redis is unreachable.
+
+    On a Redis connection or timeout error the store switches to degraded mode
+    and serves lookups and writes from an `IdempotencyJournal`, without paying
+    a Redis timeout per message. A background task probes Redis at a fixed
+    interval and, once it answers, writes the journal back into the wrapped
+    store and switches back to normal mode. Any other failure is logged and
+    retried with backoff, so the task never ends while the journal has entries.
+
+    While degraded, only IDs processed by this pod since the outage began are
+    known, so a redelivery of a message processed elsewhere may be sent again.
+    """
+
+    REDIS_UNAVAILABLE_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+    RECONCILE_BATCH_SIZE = 100
+    RECONCILE_MAX_BACKOFF_SECONDS = 60.0
+
+    def __init__(
+        self,
+        store: IdempotencyStore,
+        journal: IdempotencyJournal,
+        probe: Callable[[], Awaitable],
+        reconcile_interval_seconds: float = 5.0,
+    ):
+        self.store = store
+        self.journal = journal
+        self.probe = probe
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self.ttl_seconds = store.ttl_seconds
+        self.degraded = False
+        self._reconcile_task: Optional[asyncio.Task] = None
+        IDEMPOTENCY_DEGRADED_MODE.set(0)
+        IDEMPOTENCY_JOURNAL_ENTRIES.set(len(journal))
+
+    def _set_degraded(self, error: Exception):
+        if self.degraded:
+            return
+        self.degraded = True
+        IDEMPOTENCY_DEGRADED_MODE.set(1)
+        IDEMPOTENCY_MODE_SWITCHES.labels(mode="degraded").inc()
+        logger.error(
+            "Redis unavailable. Idempotency switched to degraded mode (local journal).",
+            event_type="IDEMPOTENCY_DEGRADED_MODE_ENTERED",
+            trigger_type="system_scheduled",
+            error=str(error),
+            exc_info=error,
+        )
+
+    def _enter_degraded_mode(self, error: Exception):
+        self._set_degraded(error)
+        self._ensure_reconciler()
+
+    def _ensure_reconciler(self):
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+
+    async def _reconcile_loop(self):
+        failures = 0
+        while self.degraded or len(self.journal):
+            if self.degraded:
+                await asyncio.sleep(self.reconcile_interval_seconds)
+            try:
+                await self.probe()
+                await self._flush_journal()
+            except self.REDIS_UNAVAILABLE_ERRORS as e:
+                self._set_degraded(e)
+                continue
+            except Exception as e:
+                # Anything else would end the task silently and leave the journal unreconciled.
+                delay = backoff_delay(failures, self.reconcile_interval_seconds, self.RECONCILE_MAX_BACKOFF_SECONDS)
+                failures += 1
+                logger.error(
+                    "Idempotency journal reconciliation failed. Retrying.",
+                    event_type="IDEMPOTENCY_RECONCILE_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"attempt": failures, "retry_in_seconds": round(delay, 2),
+                                   "journal_entries": len(self.journal)},
+                    exc_info=e,
+                )
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+
+            if self.degraded:
+                self.degraded = False
+                IDEMPOTENCY_DEGRADED_MODE.set(0)
+                IDEMPOTENCY_MODE_SWITCHES.labels(mode="normal").inc()
+                logger.info(
+                    "Redis available again. Idempotency journal reconciled, back to normal mode.",
+                    event_type="IDEMPOTENCY_DEGRADED_MODE_EXITED",
+                    trigger_type="system_scheduled",
+                )
+
+    async def _flush_journal(self):
+        pending = self.journal.entries()
+        for start in range(0, len(pending), self.RECONCILE_BATCH_SIZE):
+            batch = pending[start:start + self.RECONCILE_BATCH_SIZE]
+            await asyncio.gather(*(self.store.mark_processed(message_id) for message_id in batch))
+            self.journal.discard(batch)
+            IDEMPOTENCY_JOURNAL_ENTRIES.set(len(self.journal))
+        await self.journal.compact()
+
+    async def is_processed(self, message_id: UUID) -> bool:
+        if self.journal.contains(message_id):
+            return True
+        if self.degraded:
+            return False
+        if len(self.journal):
+            self._ensure_reconciler()
+        try:
+            return await self.store.is_processed(message_id)
+        except self.REDIS_UNAVAILABLE_ERRORS as e:
+            self._enter_degraded_mode(e)
+            return False
+
+    async def mark_processed(self, message_id: UUID) -> None:
+        if not self.degraded:
+            try:
+                await self.store.mark_processed(message_id)
+                return
+            except self.REDIS_UNAVAILABLE_ERRORS as e:
+                self._enter_degraded_mode(e)
+        self.journal.add(message_id)
+        IDEMPOTENCY_JOURNAL_ENTRIES.set(len(self.journal))
+        await self.journal.flush()
+
+
+def build_idempotency_store(redis_client: Redis) -> IdempotencyStore:
+    """Creates the idempotency backend selected by `IDEMPOTENCY_BACKEND`."""
+    if settings.IDEMPOTENCY_BACKEND == "bucketed":
+        store = BucketedIdempotencyStore(
+            redis_client,
+            ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+            bucket_seconds=settings.IDEMPOTENCY_BUCKET_SECONDS,
+        )
+    else:
+        store = RedisKeyIdempotencyStore(redis_client, ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+
+    if settings.IDEMPOTENCY_DEGRADED_MODE_ENABLED:
+        store = DegradedModeIdempotencyStore(
+            store,
+            IdempotencyJournal(
+                settings.IDEMPOTENCY_TTL_SECONDS,
+                path=settings.IDEMPOTENCY_JOURNAL_PATH,
+                max_entries=settings.IDEMPOTENCY_JOURNAL_MAX_ENTRIES,
+            ),
+            probe=redis_client.ping,
+            reconcile_interval_seconds=settings.IDEMPOTENCY_RECONCILE_INTERVAL_SECONDS,
+        )
+
+    if settings.IDEMPOTENCY_LOCAL_CACHE_SIZE > 0:
+        store = CachedIdempotencyStore(store, LocalIdempotencyCache(
+            max_entries=settings.IDEMPOTENCY_LOCAL_CACHE_SIZE,
+            ttl_seconds=min(settings.IDEMPOTENCY_LOCAL_CACHE_TTL_SECONDS, settings.IDEMPOTENCY_TTL_SECONDS),
+        ))
+
+    logger.debug(
+        "Idempotency store configured",
+        event_type="IDEMPOTENCY_STORE_CONFIGURED",
+        trigger_type="system_scheduled",
+        event_details={
+            "backend": settings.IDEMPOTENCY_BACKEND,
+            "ttl_seconds": settings.IDEMPOTENCY_TTL_SECONDS,
+            "local_cache_size": settings.IDEMPOTENCY_LOCAL_CACHE_SIZE,
+            "degraded_mode_enabled": settings.IDEMPOTENCY_DEGRADED_MODE_ENABLED,
+        }
+    )
+    return store
@@ -0,0 +1,128 @@
+import json
+from typing import AsyncIterator, Optional
+
+import aio_pika
+import structlog
+from pydantic import ValidationError
+
+from config import settings
+from tracing import TRACEPARENT, parse_traceparent
+from .publisher import NotificationPublisher, routing_key_for
+from .schemas import NotificationEventEnvelope
+
+logger = structlog.get_logger(__name__)
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, Optional[bytes]]]:
+    """
+    Splits a byte stream into (line_number, line) pairs without buffering the body.
+
+    Lines longer than `max_line_bytes` are yielded as None and their remaining
+    bytes are discarded up to the next newline. Blank lines are skipped.
+    """
+    buffer = bytearray()
+    line_number = 0
+    oversized = False
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline == -1:
+                if not oversized:
+                    buffer += chunk[start:]
+                    if len(buffer) > max_line_bytes:
+                        oversized = True
+                        buffer.clear()
+                break
+
+            if not oversized:
+                buffer += chunk[start:newline]
+            line_number += 1
+            if oversized or len(buffer) > max_line_bytes:
+                yield line_number, None
+            elif buffer.strip():
+                yield line_number, bytes(buffer)
+            buffer.clear()
+            oversized = False
+            start = newline + 1
+
+    if oversized or buffer.strip():
+        line_number += 1
+        yield line_number, None if oversized else bytes(buffer)
+
+
+async def ingest_ndjson(
+    chunks: AsyncIterator[bytes],
+    publisher: NotificationPublisher,
+    correlation_id: str,
+    traceparent: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Validates each NDJSON line against `NotificationEventEnvelope` and publishes the
+    valid ones in confirmed batches. Yields one NDJSON result per input line, so
+    memory stays bounded by the batch size whatever the upload size. The caller's
+    `traceparent`, when valid, is passed on so consumers continue its trace.
+    """
+    log = logger.bind(correlation_id=correlation_id)
+    batch: list[tuple[int, str, aio_pika.Message, str]] = []
+    totals = {"accepted": 0, "rejected": 0, "failed": 0}
+    headers = {TRACEPARENT: traceparent} if parse_traceparent(traceparent) else None
+
+    def result_line(result: dict) -> bytes:
+        totals[result["status"]] += 1
+        return json.dumps(result).encode() + b"\n"
+
+    async def flush() -> AsyncIterator[bytes]:
+        errors = await publisher.publish_batch([(message, routing_key) for _, _, message, routing_key in batch])
+        for (line_number, message_id, _, _), error in zip(batch, errors):
+            if error is None:
+                yield result_line({"line": line_number, "status": "accepted", "message_id": message_id})
+            else:
+                yield result_line({
+                    "line": line_number, "status": "failed", "message_id": message_id,
+                    "error": f"{type(error).__name__}: {error}",
+                })
+        batch.clear()
+
+    async for line_number, line in iter_ndjson_lines(chunks, settings.INGESTION_MAX_LINE_BYTES):
+        if line is None:
+            yield result_line({
+                "line": line_number, "status": "rejected",
+                "error": f"Line exceeds {settings.INGESTION_MAX_LINE_BYTES} bytes",
+            })
+            continue
+
+        try:
+            event = NotificationEventEnvelope.model_validate_json(line)
+        except ValidationError as e:
+            yield result_line({
+                "line": line_number, "status": "rejected",
+                "error": json.loads(e.json(include_url=False, include_input=False)),
+            })
+            continue
+
+        message = aio_pika.Message(
+            body=line,
+            content_type="application/json",
+            correlation_id=correlation_id,
+            headers=headers,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            # Lets the management API report the queue head age (head_message_timestamp) without reading it.
+            timestamp=event.timestamp,
+        )
+        batch.append((line_number, str(event.message_id), message, routing_key_for(event.event_type)))
+        if len(batch) >= settings.INGESTION_BATCH_SIZE:
+            async for result in flush():
+                yield result
+
+    if batch:
+        async for result in flush():
+            yield result
+
+    log.info(
+        "Batch ingestion finished",
+        event_type="BATCH_INGESTION_FINISHED",
+        trigger_type="user_action",
+        event_details=totals,
+    )
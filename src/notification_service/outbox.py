@@ -0,0 +1,386 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable, Optional
+
+import aio_pika
+import structlog
+
+from config import settings
+from metrics import OUTBOX_PENDING_BYTES, OUTBOX_RECORDS
+
+logger = structlog.get_logger(__name__)
+
+RETRY = "retry"
+DLQ = "dlq"
+
+# magic, payload length, CRC32 of the payload
+_HEADER = struct.Struct(">4sII")
+_MAGIC = b"OBX1"
+_SEGMENT_SUFFIX = ".seg"
+
+
+class OutboxFullError(Exception):
+    """The spool reached OUTBOX_MAX_BYTES; the caller falls back to broker redelivery."""
+
+
+def _encode_value(value: Any) -> Any:
+    # AMQP headers carry timestamps and bytes (x-death), which JSON has no type for.
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode()}
+    if isinstance(value, dict):
+        return {key: _encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if value.keys() == {"__datetime__"}:
+            return datetime.fromisoformat(value["__datetime__"])
+        if value.keys() == {"__bytes__"}:
+            return base64.b64decode(value["__bytes__"])
+        return {key: _decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    return value
+
+
+@dataclass
+class SpooledMessage:
+    """A republish the broker refused, with everything needed to publish it again."""
+
+    exchange: str
+    routing_key: str
+    body: bytes
+    headers: dict = field(default_factory=dict)
+    content_type: Optional[str] = None
+    correlation_id: Optional[str] = None
+    delivery_mode: Optional[int] = None
+    priority: Optional[int] = None
+    expiration: Optional[float] = None
+
+    @classmethod
+    def from_message(cls, exchange: str, routing_key: str, message: aio_pika.Message) -> "SpooledMessage":
+        return cls(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=message.body,
+            headers=dict(message.headers or {}),
+            content_type=message.content_type,
+            correlation_id=message.correlation_id,
+            delivery_mode=int(message.delivery_mode) if message.delivery_mode is not None else None,
+            priority=message.priority,
+            expiration=message.expiration,
+        )
+
+    def to_message(self) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=self.body,
+            headers=self.headers,
+            content_type=self.content_type,
+            correlation_id=self.correlation_id,
+            delivery_mode=self.delivery_mode,
+            priority=self.priority,
+            expiration=self.expiration,
+        )
+
+    def encode(self) -> bytes:
+        payload = json.dumps(_encode_value({
+            "exchange": self.exchange,
+            "routing_key": self.routing_key,
+            "body": self.body,
+            "headers": self.headers,
+            "content_type": self.content_type,
+            "correlation_id": self.correlation_id,
+            "delivery_mode": self.delivery_mode,
+            "priority": self.priority,
+            "expiration": self.expiration,
+        })).encode()
+        return _HEADER.pack(_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+    @classmethod
+    def decode(cls, payload: bytes) -> "SpooledMessage":
+        return cls(**_decode_value(json.loads(payload)))
+
+
+def read_segment(path: Path, offset: int = 0) -> tuple[list[tuple[SpooledMessage, int]], bool]:
+    """
+    Records from `offset` on, each with the offset just past it, and whether
+    the segment is corrupt. A short record at the end is a write torn by a
+    crash and ends the segment; a bad checksum ends it too, as the lengths
+    after it cannot be trusted.
+    """
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    position = 0
+    while position < len(data):
+        header = data[position:position + _HEADER.size]
+        if len(header) < _HEADER.size:
+            break
+        magic, length, checksum = _HEADER.unpack(header)
+        payload = data[position + _HEADER.size:position + _HEADER.size + length]
+        if magic != _MAGIC:
+            return records, True
+        if len(payload) < length:
+            break
+        if zlib.crc32(payload) != checksum:
+            return records, True
+        position += _HEADER.size + length
+        try:
+            records.append((SpooledMessage.decode(payload), offset + position))
+        except (ValueError, TypeError) as e:
+            OUTBOX_RECORDS.labels(outcome="corrupt").inc()
+            logger.error(
+                "Skipping undecodable outbox record",
+                event_type="OUTBOX_RECORD_CORRUPT",
+                trigger_type="system_scheduled",
+                error=str(e),
+                event_details={"segment": path.name, "offset": offset + position},
+            )
+    return records, False
+
+
+class OutboxSpool:
+    """
+    Local append-only spool for republishes the broker refused, so the original
+    delivery can still be acked.
+
+    Records are appended to segment files, each framed with its length and a
+    CRC32. Appends are group-committed: callers wait while appends arriving
+    within `fsync_interval_seconds` are written and fsynced together, so a
+    record is on disk before `append` returns. The spool holds at most
+    `max_bytes`; beyond that `append` raises OutboxFullError.
+
+    `drain` publishes the records in segment order, in concurrent batches, and
+    checkpoints the offset after each batch, so a crash while draining repeats
+    at most one batch. Segments left by a previous process are drained the same
+    way. Delivery is at least once; the handler's idempotency keys absorb the
+    duplicates.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        fsync_interval_seconds: float = 0.01,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self._size_bytes = 0
+        self._next_sequence = 1
+        self._active: Optional[BinaryIO] = None
+        self._active_size = 0
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._drain_lock = asyncio.Lock()
+        self._drain_task: Optional[asyncio.Task] = None
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size_bytes
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(f"*{_SEGMENT_SUFFIX}"))
+
+    @staticmethod
+    def _checkpoint_path(segment: Path) -> Path:
+        return segment.with_suffix(".offset")
+
+    def open(self):
+        """Picks up the segments a previous process left; new records always go to a new segment."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        self._size_bytes = sum(segment.stat().st_size for segment in segments)
+        if segments:
+            self._next_sequence = int(segments[-1].stem) + 1
+            logger.warning(
+                "Outbox has records from a previous run",
+                event_type="OUTBOX_RECOVERED",
+                trigger_type="system_scheduled",
+                event_details={"segments": len(segments), "bytes": self._size_bytes},
+            )
+        OUTBOX_PENDING_BYTES.set(self._size_bytes)
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _close_active(self):
+        if self._active is not None:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active.close()
+            self._active = None
+
+    def _write_batch(self, chunks: list[bytes]):
+        for chunk in chunks:
+            if self._active is None or self._active_size + len(chunk) > self.segment_max_bytes:
+                self._close_active()
+                path = self.directory / f"{self._next_sequence:012d}{_SEGMENT_SUFFIX}"
+                self._next_sequence += 1
+                self._active = open(path, "ab")
+                self._active_size = 0
+                self._fsync_directory()
+            self._active.write(chunk)
+            self._active_size += len(chunk)
+        self._active.flush()
+        os.fsync(self._active.fileno())
+
+    async def _flush(self):
+        async with self._write_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write_batch, [chunk for chunk, _ in batch])
+            except OSError as e:
+                self._size_bytes -= sum(len(chunk) for chunk, _ in batch)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def _flush_after_interval(self):
+        await asyncio.sleep(self.fsync_interval_seconds)
+        await self._flush()
+
+    async def append(self, message: SpooledMessage):
+        """Returns once the record is fsynced."""
+        chunk = message.encode()
+        if self._size_bytes + len(chunk) > self.max_bytes:
+            OUTBOX_RECORDS.labels(outcome="rejected_full").inc()
+            raise OutboxFullError(f"Outbox is full ({self._size_bytes} of {self.max_bytes} bytes).")
+        self._size_bytes += len(chunk)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((chunk, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_interval())
+        # Shielded: a cancelled caller must not cancel the write other callers wait on.
+        await asyncio.shield(future)
+        OUTBOX_RECORDS.labels(outcome="spooled").inc()
+        OUTBOX_PENDING_BYTES.set(self._size_bytes)
+
+    async def drain(self, publish: Callable[[SpooledMessage], Awaitable[None]], batch_size: int = 100) -> int:
+        """
+        Publishes every spooled record. Stops at the first batch with a failed
+        publish and raises its error; that batch is retried on the next drain.
+        """
+        async with self._drain_lock:
+            async with self._write_lock:
+                # Seal the active segment; appends made while draining start a new one.
+                await asyncio.to_thread(self._close_active)
+                segments = self._segments()
+            replayed = 0
+            for segment in segments:
+                replayed += await self._drain_segment(segment, publish, batch_size)
+            return replayed
+
+    async def _drain_segment(self, segment: Path, publish, batch_size: int) -> int:
+        checkpoint = self._checkpoint_path(segment)
+        offset = int(checkpoint.read_text()) if checkpoint.exists() else 0
+        records, corrupt = await asyncio.to_thread(read_segment, segment, offset)
+        replayed = 0
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            results = await asyncio.gather(*(publish(record) for record, _ in batch), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise errors[0]
+            await asyncio.to_thread(self._write_checkpoint, checkpoint, batch[-1][1])
+            replayed += len(batch)
+            OUTBOX_RECORDS.labels(outcome="replayed").inc(len(batch))
+
+        size = segment.stat().st_size
+        if corrupt:
+            OUTBOX_RECORDS.labels(outcome="corrupt").inc()
+            segment.rename(segment.with_suffix(".corrupt"))
+            logger.error(
+                "Outbox segment is corrupt; records after the damage were not replayed",
+                event_type="OUTBOX_SEGMENT_CORRUPT",
+                trigger_type="system_scheduled",
+                event_details={"segment": segment.name, "replayed": replayed},
+            )
+        else:
+            segment.unlink()
+        checkpoint.unlink(missing_ok=True)
+        self._size_bytes -= size
+        OUTBOX_PENDING_BYTES.set(self._size_bytes)
+        return replayed
+
+    @staticmethod
+    def _write_checkpoint(path: Path, offset: int):
+        temporary = path.with_suffix(".offset.tmp")
+        with open(temporary, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    async def _drain_loop(self, publish, interval_seconds: float, batch_size: int):
+        while True:
+            if self._size_bytes > 0:
+                try:
+                    replayed = await self.drain(publish, batch_size)
+                    logger.info(
+                        "Outbox drained",
+                        event_type="OUTBOX_DRAINED",
+                        trigger_type="system_scheduled",
+                        event_details={"replayed": replayed},
+                    )
+                except Exception as e:
+                    logger.warning(
+                        "Failed to drain outbox; will retry",
+                        event_type="OUTBOX_DRAIN_FAILED",
+                        trigger_type="system_scheduled",
+                        error=str(e),
+                        event_details={"pending_bytes": self._size_bytes, "retry_in_seconds": interval_seconds},
+                    )
+            await asyncio.sleep(interval_seconds)
+
+    def start(self, publish: Callable[[SpooledMessage], Awaitable[None]], interval_seconds: float = 5.0,
+              batch_size: int = 100):
+        """Drains in the background every `interval_seconds`, starting with whatever a previous run left."""
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain_loop(publish, interval_seconds, batch_size))
+
+    async def stop(self):
+        if self._drain_task:
+            self._drain_task.cancel()
+            await asyncio.gather(self._drain_task, return_exceptions=True)
+            self._drain_task = None
+        await self._flush()
+        async with self._write_lock:
+            await asyncio.to_thread(self._close_active)
+
+
+def build_outbox() -> OutboxSpool:
+    outbox = OutboxSpool(
+        settings.OUTBOX_DIR,
+        max_bytes=settings.OUTBOX_MAX_BYTES,
+        segment_max_bytes=settings.OUTBOX_SEGMENT_MAX_BYTES,
+        fsync_interval_seconds=settings.OUTBOX_FSYNC_INTERVAL_MS / 1000,
+    )
+    outbox.open()
+    return outbox
@@ -0,0 +1,290 @@
+import json
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any
+
+from config import settings
+from metrics import DELIVERY_LATENCY, MESSAGES_PROCESSED, MESSAGE_PROCESSING_TIME, QUEUE_WAIT_TIME
+from tracing import current_span
+from .delivery_status import DeliveryStatusRecorder
+from .exceptions import (
+    DeliveryContinuationRequired,
+    EventTypeValidationError,
+    PermanentDeliveryError,
+    RecipientSuppressedError,
+    SchemaValidationError,
+    TemplateRenderingError,
+    TransientProcessingError,
+)
+from .service import EventHandler
+
+
+class DeliveryOutcomeRouter(ABC):
+    """
+    Backend-neutral handling of one delivery: deserializes the event, runs the
+    EventHandler and routes the outcome to an ack, a retry, a requeue or the
+    DLQ, with the same metrics, logs, span attributes and delivery records on
+    every ingestion backend.
+
+    Backends supply how a delivery is acked, retried, requeued and
+    dead-lettered; all but the ack settle the delivery themselves. A
+    delivery is whatever the backend passes in, and is only handed back to
+    those operations and the optional hooks below.
+    """
+
+    event_handler: EventHandler
+    delivery_recorder: DeliveryStatusRecorder | None = None
+
+    @property
+    def MAX_RETRIES(self) -> int:
+        # Read on every use, so a runtime change applies to the next failure.
+        return settings.RABBITMQ_MAX_RETRIES
+
+    @abstractmethod
+    async def _ack(self, delivery: Any):
+        """Settles a delivery that needs no further handling."""
+
+    @abstractmethod
+    async def _retry(self, delivery: Any, retry_count: int, error: TransientProcessingError):
+        """Schedules the next attempt, after `error.retry_after_seconds` when set, and settles the delivery."""
+
+    @abstractmethod
+    async def _requeue(self, delivery: Any):
+        """Adds an unchanged copy of the delivery back to its queue, keeping its retry count, and settles it."""
+
+    @abstractmethod
+    async def _dead_letter(self, delivery: Any, reason: str, error: Exception, smtp_code: int | None = None):
+        """Moves the delivery to the DLQ with why and when it was dead-lettered, and settles it."""
+
+    async def _on_unexpected_error(self, delivery: Any, error: Exception, log):
+        """Called for errors outside the known outcomes; by default the delivery is left unsettled."""
+        raise error
+
+    def _delivery_path(self, delivery: Any, retry_count: int) -> str:
+        return "retry" if retry_count else "main"
+
+    def _requeued_at(self, delivery: Any, retry_count: int) -> datetime | None:
+        """When a retried delivery was queued again, so its queue wait excludes the retry delay."""
+        return None
+
+    def _received_details(self, delivery: Any) -> dict:
+        """Backend-specific fields for the MESSAGE_RECEIVED log."""
+        return {}
+
+    @asynccontextmanager
+    async def _delivery_slot(self):
+        yield {}
+
+    def _record_delivery(self, event_data: dict, status: str, retry_count: int):
+        if self.delivery_recorder is None or not event_data.get("message_id"):
+            return
+        self.delivery_recorder.record(
+            message_id=str(event_data["message_id"]),
+            user_id=(event_data.get("recipient") or {}).get("user_id"),
+            event_type=event_data.get("event_type", "unknown"),
+            status=status,
+            attempts=retry_count + 1,
+            event_timestamp=event_data.get("timestamp"),
+        )
+
+    @staticmethod
+    def _as_utc(value) -> datetime | None:
+        """Parses an ISO 8601 string or datetime as an aware UTC datetime; naive values are taken as UTC."""
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if not isinstance(value, datetime):
+            return None
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+    @staticmethod
+    def _set_outcome(span, status: str, event_type: str, error: BaseException | None = None):
+        if span is None:
+            return
+        span.set_attribute("notification.event_type", event_type)
+        span.set_attribute("notification.outcome", status)
+        if error is not None:
+            span.record_error(error)
+
+    async def _process_delivery(
+        self,
+        delivery: Any,
+        body: str | bytes,
+        retry_count: int,
+        correlation_id: str,
+        log,
+    ):
+        span = current_span()
+        event_data = {}
+        event_type_label = "unknown"
+
+        try:
+            event_data = json.loads(body)
+            event_type_label = event_data.get("event_type", "unknown")
+            latency_labels = {
+                "event_type": event_type_label,
+                "attempt": str(retry_count + 1),
+                "path": self._delivery_path(delivery, retry_count),
+            }
+
+            event_ts = None
+            queue_wait_ms = None
+            try:
+                event_ts = self._as_utc(event_data.get("timestamp"))
+            except (TypeError, ValueError) as e:
+                log.warning("Failed to parse event timestamp from body", error=str(e))
+            queued_since = (self._requeued_at(delivery, retry_count) if retry_count else None) or event_ts
+            if queued_since:
+                queue_wait = max((datetime.now(timezone.utc) - queued_since).total_seconds(), 0.0)
+                QUEUE_WAIT_TIME.labels(**latency_labels).observe(queue_wait)
+                queue_wait_ms = queue_wait * 1000
+
+            log.info(
+                "Message successfully received and deserialized",
+                event_type="MESSAGE_RECEIVED",
+                trigger_type=event_data.get("trigger_type"),
+                actor_user_id=event_data.get("recipient", {}).get("user_id"),
+                event_details={
+                    **self._received_details(delivery),
+                    "retry_count": retry_count,
+                    "queue_wait_ms": queue_wait_ms,
+                }
+            )
+
+            async with self._delivery_slot() as slot:
+                with MESSAGE_PROCESSING_TIME.labels(event_type=event_type_label).time():
+                    processed = await self.event_handler.process_event(event_data, correlation_id)
+                slot["sample"] = bool(processed)
+
+            processed_in_ms = None
+            if event_ts:
+                latency = max((datetime.now(timezone.utc) - event_ts).total_seconds(), 0.0)
+                DELIVERY_LATENCY.labels(**latency_labels).observe(latency)
+                processed_in_ms = latency * 1000
+
+            log.info(
+                "Message processed successfully",
+                event_type="MESSAGE_PROCESSED_SUCCESSFULLY",
+                trigger_type=event_data.get("trigger_type"),
+                actor_user_id=event_data.get("recipient", {}).get("user_id"),
+                event_details={
+                    "processed_in_ms": processed_in_ms,
+                    "queue_wait_ms": queue_wait_ms,
+                    "path": latency_labels["path"],
+                }
+            )
+
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="success").inc()
+            self._set_outcome(span, "success", event_type_label)
+            if processed:
+                self._record_delivery(event_data, "delivered", retry_count)
+
+            await self._ack(delivery)
+
+        except (EventTypeValidationError, SchemaValidationError, json.JSONDecodeError, TemplateRenderingError) as e:
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="dlq_schema_error").inc()
+            self._set_outcome(span, "dlq_schema_error", event_type_label, e)
+
+            log.error(
+                "Unrecoverable error processing message. Moving to DLQ.",
+                event_type="MESSAGE_SENT_TO_DLQ",
+                trigger_type=event_data.get("trigger_type", "unknown"),
+                actor_user_id=event_data.get("recipient", {}).get("user_id"),
+                reason=f"Exception type: {type(e).__name__}",
+                event_details={
+                    "error_message": str(e),
+                },
+                exc_info=e
+            )
+            await self._dead_letter(delivery, "schema_error", e)
+            self._record_delivery(event_data, "dlq", retry_count)
+
+        except DeliveryContinuationRequired as e:
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="continued").inc()
+            self._set_outcome(span, "continued", event_type_label)
+
+            log.info(
+                "Delivery did its share of the work. Message requeued to continue.",
+                event_type="MESSAGE_CONTINUATION_REQUEUED",
+                trigger_type=event_data.get("trigger_type"),
+                event_details={"reason": str(e)},
+            )
+            await self._requeue(delivery)
+
+        except RecipientSuppressedError as e:
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="suppressed").inc()
+            self._set_outcome(span, "suppressed", event_type_label)
+
+            log.info(
+                "Recipient is on the suppression list. Message dropped.",
+                event_type="MESSAGE_SUPPRESSED",
+                trigger_type=event_data.get("trigger_type"),
+                actor_user_id=event_data.get("recipient", {}).get("user_id"),
+                event_details={"recipient_email": e.email},
+            )
+            self._record_delivery(event_data, "suppressed", retry_count)
+            await self._ack(delivery)
+
+        except PermanentDeliveryError as e:
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="dlq_permanent_failure").inc()
+            self._set_outcome(span, "dlq_permanent_failure", event_type_label, e)
+
+            log.error(
+                "Delivery rejected permanently. Moving to DLQ.",
+                event_type="MESSAGE_SENT_TO_DLQ_PERMANENT_FAILURE",
+                trigger_type=event_data.get("trigger_type", "unknown"),
+                actor_user_id=event_data.get("recipient", {}).get("user_id"),
+                event_details={
+                    "error_message": str(e),
+                    "smtp_code": e.smtp_code,
+                },
+            )
+            if e.smtp_code is not None:
+                await self._dead_letter(delivery, "smtp_permanent", e, smtp_code=e.smtp_code)
+            else:
+                await self._dead_letter(delivery, "delivery_permanent", e)
+            self._record_delivery(event_data, "dlq", retry_count)
+
+        except TransientProcessingError as e:
+            log_details = {
+                "trigger_type": event_data.get("trigger_type"),
+                "actor_user_id": event_data.get("recipient", {}).get("user_id")
+            }
+            if retry_count < self.MAX_RETRIES:
+                MESSAGES_PROCESSED.labels(event_type=event_type_label, status="retry_scheduled").inc()
+                self._set_outcome(span, "retry_scheduled", event_type_label, e)
+
+                log.warning(
+                    "Transient error occurred. Scheduling message for retry.",
+                    event_type="MESSAGE_RETRY_SCHEDULED",
+                    **log_details,
+                    event_details={
+                        "current_attempt": retry_count + 1,
+                        "max_retries": self.MAX_RETRIES,
+                        "retry_after_seconds": e.retry_after_seconds,
+                        "error_message": str(e)
+                    },
+                    exc_info=e
+                )
+                await self._retry(delivery, retry_count, e)
+                self._record_delivery(event_data, "retry_scheduled", retry_count)
+            else:
+                MESSAGES_PROCESSED.labels(event_type=event_type_label, status="dlq_max_retries").inc()
+                self._set_outcome(span, "dlq_max_retries", event_type_label, e)
+
+                log.error(
+                    f"Max retries ({self.MAX_RETRIES}) reached. Moving message to DLQ.",
+                    event_type="MESSAGE_SENT_TO_DLQ_MAX_RETRIES",
+                    **log_details,
+                    event_details={
+                        "last_error_message": str(e),
+                    },
+                    exc_info=e
+                )
+                await self._dead_letter(delivery, "max_retries", e)
+                self._record_delivery(event_data, "dlq", retry_count)
+
+        except Exception as e:
+            MESSAGES_PROCESSED.labels(event_type=event_type_label, status="error").inc()
+            self._set_outcome(span, "error", event_type_label, e)
+            await self._on_unexpected_error(delivery, e, log)
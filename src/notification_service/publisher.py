@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Optional, Sequence
+
+import aio_pika
+import structlog
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.pool import Pool
+
+from config import settings
+from .streams import RedisStreamPublisher
+
+logger = structlog.get_logger(__name__)
+
+
+def routing_key_for(event_type: Optional[str]) -> str:
+    """
+    Routing key to publish an event with: the event_type itself when it belongs to
+    a shard queue, the shared RABBITMQ_ROUTING_KEY otherwise.
+    """
+    if settings.RABBITMQ_SHARDING_ENABLED and event_type:
+        for shard in settings.RABBITMQ_QUEUE_SHARDS.values():
+            if event_type in shard.event_types:
+                return event_type
+    return settings.RABBITMQ_ROUTING_KEY
+
+
+class NotificationPublisher:
+    """
+    Publishes to the main exchange over a pool of channels with publisher confirms.
+
+    A batch is published on a single pooled channel and all confirms are awaited
+    together, so the broker round trip is paid once per batch, not per message.
+    """
+
+    def __init__(self, rabbitmq_url: str, pool_size: int = 4):
+        self.rabbitmq_url = rabbitmq_url
+        self.pool_size = pool_size
+        self._connection: AbstractRobustConnection | None = None
+        self._channel_pool: Pool | None = None
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self._channel_pool is not None:
+                return
+            self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
+            self._channel_pool = Pool(self._open_channel, max_size=self.pool_size)
+        logger.debug(
+            "RabbitMQ publisher connected",
+            event_type="RABBITMQ_PUBLISHER_CONNECTED",
+            trigger_type="system_scheduled",
+            event_details={"channel_pool_size": self.pool_size},
+        )
+
+    async def warm_up(self):
+        """Connects and opens every pooled channel ahead of the first publish."""
+        await self.connect()
+        async with AsyncExitStack() as stack:
+            for _ in range(self.pool_size):
+                await stack.enter_async_context(self._channel_pool.acquire())
+
+    async def _open_channel(self) -> AbstractChannel:
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def publish_batch(
+        self,
+        messages: Sequence[tuple[aio_pika.Message, str]],
+        exchange_name: Optional[str] = None,
+    ) -> list[Optional[BaseException]]:
+        """
+        Publishes (message, routing_key) pairs and waits for their confirms.
+
+        Returns one entry per message: None when confirmed, the exception otherwise.
+        """
+        if self._channel_pool is None:
+            await self.connect()
+
+        async with self._channel_pool.acquire() as channel:
+            exchange = await channel.get_exchange(exchange_name or settings.RABBITMQ_EXCHANGE_MAIN, ensure=False)
+            results = await asyncio.gather(
+                *(exchange.publish(message, routing_key=routing_key) for message, routing_key in messages),
+                return_exceptions=True,
+            )
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def close(self):
+        if self._channel_pool:
+            await self._channel_pool.close()
+        if self._connection and not self._connection.is_closed:
+            await self._connection.close()
+
+
+publisher: NotificationPublisher | RedisStreamPublisher | None = None
+
+
+async def init_publisher():
+    """Creates the shared publisher for INGESTION_BACKEND; the connection is opened on first use."""
+    global publisher
+    if settings.INGESTION_BACKEND == "redis_streams":
+        publisher = RedisStreamPublisher()
+    else:
+        publisher = NotificationPublisher(settings.RABBITMQ_URL, pool_size=settings.PUBLISHER_CHANNEL_POOL_SIZE)
+
+
+async def close_publisher():
+    if publisher:
+        await publisher.close()
+        logger.debug(
+            "RabbitMQ publisher closed",
+            event_type="RABBITMQ_PUBLISHER_CLOSED",
+            trigger_type="system_scheduled",
+        )
+
+
+async def get_publisher() -> NotificationPublisher | RedisStreamPublisher:
+    if publisher is None:
+        raise RuntimeError("RabbitMQ publisher not initialized.")
+    return publisher
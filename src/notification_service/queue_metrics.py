@@ -0,0 +1,200 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote
+
+import aio_pika
+import httpx
+import structlog
+from aio_pika.abc import AbstractChannel, AbstractIncomingMessage, AbstractRobustConnection
+
+from config import settings
+from metrics import QUEUE_CONSUMERS, QUEUE_HEAD_AGE, QUEUE_MESSAGES
+from .consumer import RabbitMQConsumer
+
+logger = structlog.get_logger(__name__)
+
+
+def monitored_queue_names() -> list[str]:
+    """The queues declared by the consumer: main, retry and DLQ, plus shard queues when enabled."""
+    names = [settings.RABBITMQ_QUEUE_MAIN, settings.RABBITMQ_QUEUE_RETRY, settings.RABBITMQ_QUEUE_DLQ]
+    if settings.RABBITMQ_SHARDING_ENABLED:
+        for shard_name in settings.RABBITMQ_QUEUE_SHARDS:
+            queue_name, retry_queue_name, _ = RabbitMQConsumer._shard_queue_names(shard_name)
+            names += [queue_name, retry_queue_name]
+    return names
+
+
+def message_age_seconds(message: AbstractIncomingMessage, now: Optional[datetime] = None) -> Optional[float]:
+    """Age of a message from its envelope `timestamp`, falling back to the AMQP timestamp property."""
+    timestamp = None
+    try:
+        event = json.loads(message.body)
+        if isinstance(event, dict) and event.get("timestamp"):
+            timestamp = datetime.fromisoformat(str(event["timestamp"]).replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    timestamp = timestamp or message.timestamp
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return max(((now or datetime.now(timezone.utc)) - timestamp).total_seconds(), 0.0)
+
+
+class QueueMetricsCollector:
+    """
+    Periodically exports backlog gauges for the consumer's queues.
+
+    Each queue is declared passively to read its message and consumer counts.
+    Collection uses its own connection and channel, so a failure here (e.g. a
+    queue that does not exist yet closing the channel) never touches the
+    consumer's channels.
+
+    The head age comes from the management API's `head_message_timestamp` when
+    `management_url` is set, which reads nothing from the queue. Otherwise, and
+    only with `head_age_enabled`, the head message is fetched with basic.get and
+    rejected with requeue. That is not passive: the delivery is marked
+    redelivered, counts towards a quorum queue's x-delivery-limit, and competes
+    with the consumers for the head of the queue. With neither, or when the head
+    message carries no timestamp, the head age is not exported.
+    """
+
+    def __init__(
+        self,
+        rabbitmq_url: str,
+        queue_names: list[str],
+        interval_seconds: float = 15.0,
+        head_age_enabled: bool = False,
+        management_url: Optional[str] = None,
+        management_auth: Optional[tuple[str, str]] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.rabbitmq_url = rabbitmq_url
+        self.queue_names = queue_names
+        self.interval_seconds = interval_seconds
+        self.head_age_enabled = head_age_enabled
+        self.management_url = management_url.rstrip("/") if management_url else None
+        self._http_client = http_client
+        if self.management_url and http_client is None:
+            self._http_client = httpx.AsyncClient(auth=management_auth, timeout=5.0)
+        self._connection: AbstractRobustConnection | None = None
+        self._channel: AbstractChannel | None = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_channel(self) -> AbstractChannel:
+        if self._connection is None:
+            self._connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        if self._channel is None or self._channel.is_closed:
+            self._channel = await self._connection.channel()
+        return self._channel
+
+    async def _collect_queue(self, queue_name: str):
+        channel = await self._get_channel()
+        queue = await channel.declare_queue(queue_name, passive=True)
+        message_count = queue.declaration_result.message_count
+        QUEUE_MESSAGES.labels(queue=queue_name).set(message_count)
+        QUEUE_CONSUMERS.labels(queue=queue_name).set(queue.declaration_result.consumer_count)
+
+        head_age = await self._head_age(queue, queue_name, message_count)
+        if head_age is not None:
+            QUEUE_HEAD_AGE.labels(queue=queue_name).set(head_age)
+        else:
+            # An unknown age is left out rather than exported as 0, which reads as a fresh queue.
+            try:
+                QUEUE_HEAD_AGE.remove(queue_name)
+            except KeyError:
+                pass
+
+    async def _head_age(self, queue, queue_name: str, message_count: int) -> Optional[float]:
+        """Age of the head message, 0 for an empty queue, or None when there is no way to know it."""
+        if not (self.management_url or self.head_age_enabled):
+            return None
+        if not message_count:
+            return 0.0
+        if self.management_url:
+            return await self._management_head_age(queue_name)
+        message = await queue.get(no_ack=False, fail=False)
+        if message is None:
+            return 0.0
+        try:
+            return message_age_seconds(message)
+        finally:
+            await message.nack(requeue=True)
+
+    async def _management_head_age(self, queue_name: str) -> Optional[float]:
+        # Only set for messages published with the AMQP timestamp property, and only on classic queues.
+        response = await self._http_client.get(
+            f"{self.management_url}/api/queues/%2F/{quote(queue_name, safe='')}",
+            params={"columns": "head_message_timestamp"},
+        )
+        response.raise_for_status()
+        timestamp = response.json().get("head_message_timestamp")
+        if not timestamp:
+            return None
+        return max(datetime.now(timezone.utc).timestamp() - float(timestamp), 0.0)
+
+    async def collect(self):
+        try:
+            await self._get_channel()
+        except Exception as e:
+            logger.warning(
+                "Failed to open channel for queue metrics",
+                event_type="QUEUE_METRICS_COLLECTION_FAILED",
+                trigger_type="system_scheduled",
+                error=f"{type(e).__name__}: {e}",
+            )
+            return
+
+        for queue_name in self.queue_names:
+            try:
+                await self._collect_queue(queue_name)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to collect metrics for queue {queue_name}",
+                    event_type="QUEUE_METRICS_COLLECTION_FAILED",
+                    trigger_type="system_scheduled",
+                    error=f"{type(e).__name__}: {e}",
+                )
+
+    async def _loop(self):
+        while True:
+            await self.collect()
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._connection and not self._connection.is_closed:
+            await self._connection.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+
+
+queue_metrics_collector: QueueMetricsCollector | None = None
+
+
+def init_queue_metrics_collector() -> QueueMetricsCollector:
+    global queue_metrics_collector
+    queue_metrics_collector = QueueMetricsCollector(
+        settings.RABBITMQ_URL,
+        monitored_queue_names(),
+        interval_seconds=settings.QUEUE_METRICS_INTERVAL_SECONDS,
+        head_age_enabled=settings.QUEUE_METRICS_HEAD_AGE_ENABLED,
+        management_url=settings.QUEUE_METRICS_MANAGEMENT_URL,
+        management_auth=(settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD.get_secret_value()),
+    )
+    queue_metrics_collector.start()
+    return queue_metrics_collector
+
+
+async def close_queue_metrics_collector():
+    if queue_metrics_collector:
+        await queue_metrics_collector.stop()
@@ -1,10 +1,303 @@
-from fastapi import APIRouter
+import json
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status as http_status
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+
+from config import settings
+from redis_client import get_redis_client
+
+from .bulk import get_bulk_progress
+from .delivery_status import DeliveryStatusRecorder, get_delivery_recorder
+from .dlq import DLQManager, get_dlq_manager
+from .exceptions import DLQReplayInProgressError
+from .ingestion import ingest_ndjson
+from .publisher import NotificationPublisher, get_publisher
+from .schemas import (
+    BulkProgressSchema,
+    DeliveryStatusPage,
+    DeliveryStatusSchema,
+    DLQFilter,
+    DLQReplayProgress,
+    DLQReplayRequest,
+    SuppressionBulkRequest,
+    SuppressionBulkResult,
+    SuppressionEntrySchema,
+)
+from .suppression import SuppressionList, get_suppression_list
 
 router = APIRouter()
 
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for generators that are still reading the request body.
+
+    The default implementation listens for client disconnects by calling
+    `receive()` concurrently with the generator, which would consume the request
+    body chunks the generator is waiting for. Disconnects are detected on send.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
 @router.get("/status")
 async def get_notification_status():
     """
     Endpoint de exemplo para o status do módulo de notificação.
     """
-    return {"module": "notification-service", "status": "ok"}
\ No newline at end of file
+    return {"module": "notification-service", "status": "ok"}
+
+
+@router.post(
+    "/batch",
+    summary="Ingestão em lote de notificações (NDJSON)",
+    response_class=RequestBodyStreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def ingest_notifications_batch(
+    request: Request,
+    publisher: NotificationPublisher = Depends(get_publisher),
+):
+    """
+    Recebe um corpo NDJSON (um `NotificationEventEnvelope` por linha), valida cada
+    linha e publica as válidas na exchange principal em lotes confirmados.
+
+    A resposta também é NDJSON, com um resultado por linha de entrada
+    (`accepted`, `rejected` ou `failed`), transmitido à medida que os lotes são
+    confirmados pelo broker.
+    """
+    correlation_id = request.headers.get("x-correlation-id") or str(uuid4())
+    return RequestBodyStreamingResponse(
+        ingest_ndjson(request.stream(), publisher, correlation_id, request.headers.get("traceparent")),
+        media_type="application/x-ndjson",
+        headers={"X-Correlation-ID": correlation_id},
+    )
+
+
+async def require_delivery_recorder() -> DeliveryStatusRecorder:
+    try:
+        return await get_delivery_recorder()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Delivery status recording is disabled.",
+        )
+
+
+@router.get(
+    "/deliveries",
+    response_model=DeliveryStatusPage,
+    summary="Lista os status de entrega de um usuário",
+)
+async def list_user_deliveries(
+    user_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    recorder: DeliveryStatusRecorder = Depends(require_delivery_recorder),
+):
+    """
+    Retorna os resultados de entrega registrados para `user_id`, do mais recente
+    para o mais antigo. Use `next_offset` para buscar a próxima página.
+    """
+    items, next_offset = await recorder.list_for_user(user_id, offset=offset, limit=limit)
+    return {"items": items, "next_offset": next_offset}
+
+
+@router.get(
+    "/deliveries/{message_id}",
+    response_model=DeliveryStatusSchema,
+    summary="Consulta o status de entrega de uma mensagem",
+    responses={404: {"description": "Nenhum registro para este message_id"}},
+)
+async def get_delivery(
+    message_id: str,
+    recorder: DeliveryStatusRecorder = Depends(require_delivery_recorder),
+):
+    """
+    Retorna o último resultado de entrega registrado para `message_id`.
+    """
+    record = await recorder.get(message_id)
+    if record is None:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Delivery not found.")
+    return record
+
+
+@router.get(
+    "/dlq/messages",
+    summary="Lista mensagens da DLQ sem removê-las (NDJSON)",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def browse_dlq(
+    event_type: Optional[List[str]] = Query(None),
+    reason: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=10000),
+    manager: DLQManager = Depends(get_dlq_manager),
+):
+    """
+    Transmite, em NDJSON, até `limit` mensagens da DLQ que atendem aos filtros
+    (`event_type`, motivo do envio à DLQ e intervalo de `since` a `until`).
+    As mensagens lidas voltam para a DLQ ao final da leitura.
+    """
+    dlq_filter = DLQFilter(event_types=event_type, reason=reason, since=since, until=until)
+
+    async def entries():
+        async for entry in manager.browse(dlq_filter, limit=limit):
+            yield json.dumps(entry).encode() + b"\n"
+
+    return StreamingResponse(entries(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/dlq/replay",
+    response_model=DLQReplayProgress,
+    status_code=http_status.HTTP_202_ACCEPTED,
+    summary="Reprocessa mensagens da DLQ",
+    responses={409: {"description": "Já existe um reprocessamento em andamento"}},
+)
+async def replay_dlq(
+    request: DLQReplayRequest,
+    manager: DLQManager = Depends(get_dlq_manager),
+):
+    """
+    Inicia em segundo plano a republicação das mensagens da DLQ que atendem aos
+    filtros na exchange principal, com contadores de retentativa zerados e taxa
+    limitada a `rate_per_second`. Acompanhe em `GET /dlq/replay/{job_id}`.
+    """
+    try:
+        return manager.start_replay(request)
+    except DLQReplayInProgressError as e:
+        raise HTTPException(status_code=http_status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get(
+    "/dlq/replay/{job_id}",
+    response_model=DLQReplayProgress,
+    summary="Consulta o progresso de um reprocessamento da DLQ",
+    responses={404: {"description": "Reprocessamento não encontrado"}},
+)
+async def get_dlq_replay(
+    job_id: str,
+    manager: DLQManager = Depends(get_dlq_manager),
+):
+    """
+    Retorna o progresso do reprocessamento `job_id`.
+    """
+    progress = manager.get_job(job_id)
+    if progress is None:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Replay job not found.")
+    return progress
+
+
+async def require_suppression_list() -> SuppressionList:
+    try:
+        return await get_suppression_list()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Suppression list is disabled.",
+        )
+
+
+def _check_bulk_size(request: SuppressionBulkRequest):
+    if len(request.emails) > settings.SUPPRESSION_BULK_MAX_ADDRESSES:
+        raise HTTPException(
+            status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.SUPPRESSION_BULK_MAX_ADDRESSES} addresses per request.",
+        )
+
+
+@router.post(
+    "/suppressions",
+    response_model=SuppressionBulkResult,
+    summary="Adiciona endereços à lista de supressão",
+)
+async def add_suppressions(
+    request: SuppressionBulkRequest,
+    suppression_list: SuppressionList = Depends(require_suppression_list),
+):
+    """
+    Suprime os endereços informados (ex: *bounces* permanentes ou reclamações
+    de spam). `changed` conta os que ainda não estavam suprimidos; todos os
+    processos passam a ignorá-los em até `SUPPRESSION_REFRESH_INTERVAL_SECONDS`.
+    """
+    _check_bulk_size(request)
+    changed = await suppression_list.add(request.emails, reason=request.reason)
+    return {"requested": len(request.emails), "changed": changed}
+
+
+@router.post(
+    "/suppressions/remove",
+    response_model=SuppressionBulkResult,
+    summary="Remove endereços da lista de supressão",
+)
+async def remove_suppressions(
+    request: SuppressionBulkRequest,
+    suppression_list: SuppressionList = Depends(require_suppression_list),
+):
+    """
+    Volta a permitir envios para os endereços informados. `changed` conta os
+    que estavam suprimidos.
+    """
+    _check_bulk_size(request)
+    changed = await suppression_list.remove(request.emails)
+    return {"requested": len(request.emails), "changed": changed}
+
+
+@router.get(
+    "/suppressions/{email}",
+    response_model=SuppressionEntrySchema,
+    summary="Consulta se um endereço está suprimido",
+    responses={404: {"description": "Endereço não suprimido"}},
+)
+async def get_suppression(
+    email: str,
+    suppression_list: SuppressionList = Depends(require_suppression_list),
+):
+    """
+    Retorna o motivo e o instante da supressão de `email`.
+    """
+    entry = await suppression_list.get(email)
+    if entry is None:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Address is not suppressed.")
+    return entry
+
+
+async def require_redis_client():
+    try:
+        return await get_redis_client()
+    except RuntimeError:
+        raise HTTPException(
+            status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Redis is not available.",
+        )
+
+
+@router.get(
+    "/bulk/{message_id}",
+    response_model=BulkProgressSchema,
+    summary="Consulta o progresso de uma mensagem em massa",
+    responses={404: {"description": "Nenhum progresso registrado para este message_id"}},
+)
+async def get_bulk_message_progress(message_id: str, redis_client=Depends(require_redis_client)):
+    """
+    Retorna até onde a lista de destinatários de uma mensagem em massa já foi
+    processada (`next_index`) e quantos destinatários foram entregues,
+    suprimidos, falharam ou eram inválidos.
+    """
+    progress = await get_bulk_progress(redis_client, message_id)
+    if progress is None:
+        raise HTTPException(status_code=http_status.HTTP_404_NOT_FOUND, detail="Bulk message not found.")
+    return progress
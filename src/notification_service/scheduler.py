@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import structlog
+
+from metrics import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_TIME
+
+logger = structlog.get_logger(__name__)
+
+
+class WeightedFairScheduler:
+    """
+    In-process scheduler that sits between delivery intake and handler execution.
+
+    Items are kept in one FIFO sub-queue per event type. Selection uses smooth
+    weighted round-robin across the non-empty sub-queues, so bulk traffic keeps
+    receiving the capacity left over by higher-weight event types. Any sub-queue
+    whose head has waited longer than its latency SLO is served first.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, int],
+        latency_slo_ms: Optional[Dict[str, int]] = None,
+        default_weight: int = 1,
+    ):
+        self.weights = dict(weights)
+        self.latency_slo_ms = dict(latency_slo_ms or {})
+        self.default_weight = max(1, default_weight)
+        self._queues: Dict[str, Deque[Tuple[float, Any]]] = {}
+        self._current_weights: Dict[str, int] = {}
+        self._size = 0
+        self._not_empty = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def weight_for(self, key: str) -> int:
+        return max(1, self.weights.get(key, self.default_weight))
+
+    def put(self, key: str, item: Any) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._current_weights[key] = 0
+        queue.append((time.monotonic(), item))
+        self._size += 1
+        SCHEDULER_QUEUE_DEPTH.labels(event_type=key).set(len(queue))
+        self._not_empty.set()
+
+    async def get(self) -> Tuple[str, Any]:
+        while not self._size:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def get_nowait(self) -> Tuple[str, Any]:
+        if not self._size:
+            raise asyncio.QueueEmpty()
+
+        now = time.monotonic()
+        key = self._select_overdue(now) or self._select_weighted()
+
+        queue = self._queues[key]
+        enqueued_at, item = queue.popleft()
+        self._size -= 1
+        SCHEDULER_QUEUE_DEPTH.labels(event_type=key).set(len(queue))
+        SCHEDULER_WAIT_TIME.labels(event_type=key).observe(now - enqueued_at)
+        return key, item
+
+    def _select_overdue(self, now: float) -> Optional[str]:
+        """Returns the sub-queue whose head is furthest past its SLO, if any."""
+        selected, worst_ratio = None, 1.0
+        for key, slo_ms in self.latency_slo_ms.items():
+            queue = self._queues.get(key)
+            if not queue or slo_ms <= 0:
+                continue
+            ratio = (now - queue[0][0]) * 1000 / slo_ms
+            if ratio >= worst_ratio:
+                selected, worst_ratio = key, ratio
+        return selected
+
+    def _select_weighted(self) -> str:
+        """Smooth weighted round-robin (as used by nginx upstreams)."""
+        selected, total = None, 0
+        for key, queue in self._queues.items():
+            if not queue:
+                continue
+            weight = self.weight_for(key)
+            total += weight
+            self._current_weights[key] += weight
+            if selected is None or self._current_weights[key] > self._current_weights[selected]:
+                selected = key
+        self._current_weights[selected] -= total
+        return selected
+
+    def depths(self) -> Dict[str, int]:
+        return {key: len(queue) for key, queue in self._queues.items()}
@@ -1,6 +1,6 @@
 from datetime import datetime, date
-from pydantic import BaseModel, Field, EmailStr
-from typing import Union
+from pydantic import BaseModel, Field, EmailStr, model_validator
+from typing import List, Optional, Union
 from uuid import UUID
 
 class RecipientSchema(BaseModel):
@@ -61,4 +61,106 @@ class NotificationEventEnvelope(BaseModel):
         ProfileDeletionScheduledPayload,
         StatementProcessingCompletedPayload,
         StatementProcessingFailedPayload
-    ] = Field(...)
\ No newline at end of file
+    ] = Field(...)
+
+class BulkNotificationEventEnvelope(BaseModel):
+    """
+    Campaign envelope: one message for many recipients sharing the event type
+    and payload. Recipients come inline in `recipients` or, for large
+    campaigns, from the Redis list named by `recipients_ref` (one
+    RecipientSchema JSON per entry), read in chunks.
+    """
+    message_id: UUID
+    timestamp: datetime
+    trigger_type: str
+    event_type: str
+    recipients: Optional[List[RecipientSchema]] = None
+    recipients_ref: Optional[str] = None
+    payload: Union[
+        InvoiceDueSoonPayload,
+        InvoiceOverduePayload,
+        ProfileDeletionScheduledPayload,
+        StatementProcessingCompletedPayload,
+        StatementProcessingFailedPayload
+    ] = Field(...)
+
+    @model_validator(mode="after")
+    def _one_recipient_source(self):
+        if (self.recipients is None) == (self.recipients_ref is None):
+            raise ValueError("exactly one of recipients or recipients_ref is required")
+        return self
+
+    @staticmethod
+    def is_bulk(event_data: dict) -> bool:
+        return "recipients" in event_data or "recipients_ref" in event_data
+
+class BulkProgressSchema(BaseModel):
+    """Checkpointed progress of a bulk envelope's expansion."""
+    message_id: str
+    state: str
+    next_index: int
+    total: Optional[int] = None
+    delivered: int = 0
+    suppressed: int = 0
+    failed: int = 0
+    invalid: int = 0
+    updated_at: float
+
+class DeliveryStatusSchema(BaseModel):
+    """Recorded outcome of a notification delivery attempt."""
+    message_id: str
+    user_id: Optional[str] = None
+    event_type: str
+    status: str
+    attempts: int
+    event_timestamp: Optional[str] = None
+    recorded_at: float
+
+class DeliveryStatusPage(BaseModel):
+    """Page of delivery outcomes, newest first."""
+    items: List[DeliveryStatusSchema]
+    next_offset: Optional[int] = None
+
+class DLQFilter(BaseModel):
+    """Selects dead-lettered messages; unset fields match everything."""
+    event_types: Optional[List[str]] = None
+    reason: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+class DLQReplayRequest(DLQFilter):
+    """Replay of the DLQ messages matching the filter."""
+    limit: Optional[int] = Field(default=None, ge=1)
+    rate_per_second: Optional[float] = Field(default=None, gt=0)
+
+class DLQReplayProgress(BaseModel):
+    """Progress of a DLQ replay, persisted as its checkpoint."""
+    job_id: str
+    state: str = "running"
+    filter: DLQFilter
+    limit: Optional[int] = None
+    remaining_scan: Optional[int] = None
+    scanned: int = 0
+    replayed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    last_message_id: Optional[str] = None
+    error: Optional[str] = None
+    started_at: datetime
+    updated_at: datetime
+
+class SuppressionBulkRequest(BaseModel):
+    """Addresses to add to or remove from the suppression list."""
+    emails: List[EmailStr] = Field(min_length=1)
+    reason: str = "manual"
+
+class SuppressionBulkResult(BaseModel):
+    """Outcome of a bulk suppression change: addresses received and addresses actually changed."""
+    requested: int
+    changed: int
+
+class SuppressionEntrySchema(BaseModel):
+    """A suppressed address with why and when it was added."""
+    email: str
+    reason: Optional[str] = None
+    added_at: float
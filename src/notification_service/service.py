@@ -1,25 +1,272 @@
+import asyncio
+import time
+from email.message import Message
+from email.mime.text import MIMEText
+from email.utils import formataddr
 from pathlib import Path
+import aiosmtplib
 import structlog
 from typing import Optional
+from uuid import UUID, uuid5
 
-from fastapi import Depends
 from pydantic import ValidationError
 from redis.asyncio import Redis
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from redis.exceptions import RedisError
+from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType, MultipartSubtypeEnum
+from fastapi_mail.fastmail import email_dispatched
+from fastapi_mail.msg import MailMsg
+from jinja2 import Environment, Template, TemplateNotFound
 
-from config import Settings, settings as app_settings
-from redis_client import get_redis_client
-from .exceptions import EventTypeValidationError, SchemaValidationError, TransientProcessingError, TemplateRenderingError
-from .schemas import NotificationEventEnvelope
-from metrics import EMAILS_SENT
+from config import ChannelRoute, Settings, settings as app_settings
+from startup import backoff_delay
+from tracing import CLIENT, set_span_attributes, start_span, traced
+from .bulk import build_bulk_expander
+from .channels import EMAIL, EmailChannel, NotificationChannel
+from .exceptions import (
+    EventTypeValidationError,
+    PermanentDeliveryError,
+    RecipientSuppressedError,
+    SchemaValidationError,
+    TemplateRenderingError,
+    TransientProcessingError,
+)
+from .idempotency import IdempotencyStore, RedisKeyIdempotencyStore
+from .schemas import BulkNotificationEventEnvelope, NotificationEventEnvelope
+from .smtp_errors import CONNECTION, PERMANENT, TEMPORARY, classify_smtp_error
+from .suppression import SuppressionList
+from .template_build import CompiledTemplateLoader, normalize_text, text_name
+from metrics import CHANNEL_DELIVERIES, CHANNEL_DELIVERY_TIME, EMAIL_LOCAL_RETRIES, EMAILS_SENT, SMTP_FAILURES
 
 logger = structlog.get_logger(__name__)
 
 
+class TemplateCachingFastMail(FastMail):
+    """
+    FastMail that keeps a single Jinja environment. FastMail builds a new
+    environment for every message, so each send recompiled its template.
+
+    With TEMPLATE_BUILD_ENABLED the environment serves the minified HTML and
+    generated plain text of each template (see `template_build`), loaded from
+    the artifacts in `build_dir` when they match the sources.
+    """
+
+    def __init__(self, config: ConnectionConfig, build_dir: Optional[str] = None):
+        super().__init__(config)
+        self.template_env = config.template_engine() if config.TEMPLATE_FOLDER else None
+        if self.template_env is not None:
+            self.template_env.auto_reload = False
+            if app_settings.TEMPLATE_BUILD_ENABLED:
+                self.template_env.loader = CompiledTemplateLoader(
+                    config.TEMPLATE_FOLDER, build_dir or app_settings.TEMPLATE_BUILD_DIR)
+
+    async def get_mail_template(self, env_path: Environment, template_name: str) -> Template:
+        return (self.template_env or env_path).get_template(template_name)
+
+    def precompile_templates(self) -> list[str]:
+        """Compiles every template in the folder into the environment's cache."""
+        if self.template_env is None:
+            return []
+        names = self.template_env.list_templates(extensions=["html", "txt"])
+        for name in names:
+            self.template_env.get_template(name)
+        return names
+
+    async def render_message(self, message: MessageSchema, template_name: str) -> Message:
+        """Renders the template and builds the MIME message once, so a retry can send it again as is."""
+        template = await self.get_mail_template(self.template_env, template_name)
+        context = self.check_data(message.template_body)
+        message.template_body = template.render(**context)
+        text = self._render_text(template_name, context)
+        if text is not None:
+            message.multipart_subtype = MultipartSubtypeEnum.alternative
+        sender = message.from_email or self.config.MAIL_FROM
+        if from_name := message.from_name or self.config.MAIL_FROM_NAME:
+            sender = formataddr((from_name, sender))
+        # Private fastapi-mail API, hence the exact pin in requirements/base.txt.
+        rendered = await MailMsg(message)._message(sender)
+        if text is not None:
+            # Clients show the last alternative they support, so plain text goes before the HTML.
+            rendered.get_payload().insert(0, MIMEText(text, "plain", message.charset))
+        return rendered
+
+    def _render_text(self, template_name: str, context: dict) -> Optional[str]:
+        if not template_name.endswith(".html"):
+            return None
+        try:
+            template = self.template_env.get_template(text_name(template_name))
+        except TemplateNotFound:
+            return None
+        return normalize_text(template.render(**context))
+
+    async def deliver(self, rendered: Message):
+        """
+        Sends an already rendered message, opening a new SMTP session like
+        `send_message`. The session is driven here rather than through
+        fastapi-mail's Connection, whose exit quits unconditionally: after a
+        421 the server has already closed the session, and the failed quit
+        would replace the SMTP reply with SMTPServerDisconnected.
+        """
+        if not self.config.SUPPRESS_SEND:
+            smtp = smtp_client(self.config)
+            await smtp.connect()
+            try:
+                if self.config.USE_CREDENTIALS:
+                    await smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+                await smtp.send_message(rendered)
+            finally:
+                await close_smtp_client(smtp)
+        email_dispatched.send(rendered)
+
+
+def smtp_client(config: ConnectionConfig) -> aiosmtplib.SMTP:
+    return aiosmtplib.SMTP(
+        hostname=config.MAIL_SERVER,
+        port=config.MAIL_PORT,
+        timeout=config.TIMEOUT,
+        use_tls=config.MAIL_SSL_TLS,
+        start_tls=config.MAIL_STARTTLS,
+        validate_certs=config.VALIDATE_CERTS,
+        local_hostname=config.LOCAL_HOSTNAME,
+    )
+
+
+async def close_smtp_client(smtp: aiosmtplib.SMTP):
+    """Quits the session if the server still holds it open; closing never raises over the send result."""
+    if not smtp.is_connected:
+        return
+    try:
+        await smtp.quit()
+    except (aiosmtplib.SMTPException, OSError):
+        smtp.close()
+
+
 class EmailService:
-    def __init__(self, mailer: FastMail):
+    def __init__(
+        self,
+        mailer: FastMail,
+        local_retry_attempts: Optional[int] = None,
+        local_retry_initial_seconds: Optional[float] = None,
+        local_retry_max_seconds: Optional[float] = None,
+    ):
         self.mailer = mailer
+        self.local_retry_attempts = (
+            app_settings.MAIL_LOCAL_RETRY_ATTEMPTS if local_retry_attempts is None else local_retry_attempts)
+        self.local_retry_initial_seconds = (
+            local_retry_initial_seconds or app_settings.MAIL_LOCAL_RETRY_INITIAL_MS / 1000)
+        self.local_retry_max_seconds = local_retry_max_seconds or app_settings.MAIL_LOCAL_RETRY_MAX_MS / 1000
+
+    def precompile_templates(self) -> list[str]:
+        if isinstance(self.mailer, TemplateCachingFastMail):
+            return self.mailer.precompile_templates()
+        return []
+
+    async def check_connection(self):
+        """Opens and closes an SMTP session to verify that the mail server is reachable."""
+        config = self.mailer.config
+        if config.SUPPRESS_SEND:
+            return
+        smtp = smtp_client(config)
+        await smtp.connect()
+        try:
+            await smtp.noop()
+        finally:
+            await smtp.quit()
+
+    def _renders_once(self) -> bool:
+        return isinstance(self.mailer, TemplateCachingFastMail) and self.mailer.template_env is not None
+
+    async def _send_with_local_retry(self, send, log):
+        """
+        Awaits `send`, retrying connection-level failures in process with jittered
+        backoff up to `local_retry_attempts` times; only when the budget runs out
+        does the failure go back to the broker retry queue. SMTP replies are not
+        retried here, since a 4xx asks the sender to come back later.
+        """
+        attempt = 0
+        while True:
+            try:
+                await send()
+                if attempt:
+                    EMAIL_LOCAL_RETRIES.labels(outcome="recovered").inc()
+                return
+            except Exception as e:
+                failure = classify_smtp_error(e)
+                if failure is None or failure.kind != CONNECTION:
+                    raise
+                if attempt >= self.local_retry_attempts:
+                    if attempt:
+                        EMAIL_LOCAL_RETRIES.labels(outcome="exhausted").inc()
+                    raise
+                delay = backoff_delay(attempt, self.local_retry_initial_seconds, self.local_retry_max_seconds)
+                log.warning(
+                    "Email server connection failed. Retrying in process...",
+                    event_type="EMAIL_SEND_RETRY_LOCAL",
+                    error=str(e),
+                    retry_in_seconds=round(delay, 3),
+                    event_details={"attempt": attempt + 1, "max_attempts": self.local_retry_attempts},
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _render_failed(self, error: Exception, template_name: str, log) -> TemplateRenderingError:
+        log.error(
+            "Failed to render email template",
+            event_type="EMAIL_SEND_FAILED_RENDER",
+            error=str(error),
+            exc_info=error
+        )
+        return TemplateRenderingError(f"Failed to render template {template_name}: {error}")
+
+    def _delivery_failed(self, error: Exception, template_name: str, log) -> Exception:
+        """Maps a send failure to the error the consumer routes on: DLQ, delayed retry or regular retry."""
+        failure = classify_smtp_error(error)
+        if failure is None:
+            if not self._renders_once():
+                # Without the caching mailer, rendering happens inside send_message.
+                return self._render_failed(error, template_name, log)
+            log.error(
+                "Unexpected email delivery failure",
+                event_type="EMAIL_SEND_FAILED_UNKNOWN",
+                error=str(error),
+                exc_info=error
+            )
+            return TransientProcessingError(f"Unexpected email delivery failure: {error}")
+
+        SMTP_FAILURES.labels(classification=failure.kind, code=failure.code_label).inc()
+        smtp_details = {"smtp_code": failure.code, "smtp_message": failure.message}
+
+        if failure.kind == PERMANENT:
+            log.error(
+                "Email permanently rejected by the mail server",
+                event_type="EMAIL_SEND_REJECTED_PERMANENT",
+                error=str(error),
+                event_details=smtp_details,
+            )
+            return PermanentDeliveryError(
+                f"Mail server rejected the message permanently ({failure.code}): {failure.message}",
+                failure.code,
+                recipient_refused=failure.recipient_refused,
+            )
+
+        if failure.kind == TEMPORARY:
+            log.warning(
+                "Email temporarily rejected by the mail server",
+                event_type="EMAIL_SEND_DEFERRED_TEMPORARY",
+                error=str(error),
+                event_details={**smtp_details, "retry_after_seconds": failure.retry_after_seconds},
+            )
+            return TransientProcessingError(
+                f"Mail server deferred the message ({failure.code}): {failure.message}",
+                retry_after_seconds=failure.retry_after_seconds,
+            )
+
+        log.error(
+            "Failed to connect to email server",
+            event_type="EMAIL_SEND_FAILED_CONNECTION",
+            error=str(error),
+            exc_info=error
+        )
+        return TransientProcessingError(f"Failed to connect to the email server: {error}")
 
     async def send_email(self, subject: str, recipient: str, template_name: str, body_context: dict, correlation_id: Optional[str] = None):
         log = logger.bind(correlation_id=correlation_id,
@@ -31,43 +278,50 @@ class EmailService:
             template_body=body_context,
             subtype=MessageType.html
         )
-        try:
-            log.info("Starting email delivery",
-                     event_type="EMAIL_DELIVERY_START")
-            await self.mailer.send_message(message, template_name=template_name)
-            
-            EMAILS_SENT.labels(template=template_name, status="success").inc()
-            
-            log.info("Email sent successfully",
-                     event_type="EMAIL_SENT_SUCCESSFULLY")
-        except ConnectionErrors as e:
-            EMAILS_SENT.labels(template=template_name, status="failed").inc()
+        log.info("Starting email delivery",
+                 event_type="EMAIL_DELIVERY_START")
 
-            log.error(
-                "Failed to connect to email server",
-                event_type="EMAIL_SEND_FAILED_CONNECTION",
-                error=str(e),
-                exc_info=e
-            )
-            raise TransientProcessingError(
-                f"Failed to connect to the email server: {e}") from e
+        if self._renders_once():
+            # Rendered and built once, so in-process retries resend the same MIME message.
+            try:
+                with start_span("email.render", attributes={"email.template": template_name}):
+                    rendered = await self.mailer.render_message(message, template_name)
+            except Exception as e:
+                EMAILS_SENT.labels(template=template_name, status="failed").inc()
+                raise self._render_failed(e, template_name, log) from e
+            send = lambda: self.mailer.deliver(rendered)
+        else:
+            # send_message renders into the schema it is given, so each attempt gets a fresh copy.
+            send = lambda: self.mailer.send_message(message.model_copy(), template_name=template_name)
+
+        try:
+            with start_span("email.send", kind=CLIENT, attributes={"email.template": template_name}):
+                await self._send_with_local_retry(send, log)
         except Exception as e:
             EMAILS_SENT.labels(template=template_name, status="failed").inc()
-            
-            log.error(
-                "Failed to render email template",
-                event_type="EMAIL_SEND_FAILED_RENDER",
-                error=str(e),
-                exc_info=e
-            )
-            raise TemplateRenderingError(
-                f"Failed to render template {template_name}: {e}") from e
+            raise self._delivery_failed(e, template_name, log) from e
+
+        EMAILS_SENT.labels(template=template_name, status="success").inc()
+
+        log.info("Email sent successfully",
+                 event_type="EMAIL_SENT_SUCCESSFULLY")
 
 
 class EventHandler:
-    def __init__(self, redis_client: Redis, email_service: EmailService):
+    def __init__(
+        self,
+        redis_client: Redis,
+        email_service: EmailService,
+        idempotency_store: Optional[IdempotencyStore] = None,
+        suppression_list: Optional[SuppressionList] = None,
+        channels: Optional[dict[str, NotificationChannel]] = None,
+        routes: Optional[dict[str, ChannelRoute]] = None,
+    ):
         self.redis_client = redis_client
         self.email_service = email_service
+        self.idempotency_store = idempotency_store or RedisKeyIdempotencyStore(redis_client)
+        self.suppression_list = suppression_list
+        self.routes = app_settings.CHANNEL_ROUTES if routes is None else routes
         self.event_router = {
             "INVOICE_DUE_SOON": self._handle_invoice_due_soon,
             "INVOICE_OVERDUE": self._handle_invoice_overdue,
@@ -75,6 +329,17 @@ class EventHandler:
             "STATEMENT_PROCESSING_COMPLETED": self._handle_statement_status,
             "STATEMENT_PROCESSING_FAILED": self._handle_statement_status,
         }
+        self.channels: dict[str, NotificationChannel] = {EMAIL: EmailChannel(self.event_router), **(channels or {})}
+        self.bulk_expander = build_bulk_expander(redis_client, self.process_event)
+        for event_type, route in self.routes.items():
+            missing = set(route.channels) - set(self.channels)
+            if missing:
+                logger.error(
+                    "Channel route refers to channels that are not configured",
+                    event_type="CHANNEL_ROUTE_INVALID",
+                    trigger_type="system_scheduled",
+                    event_details={"routed_event_type": event_type, "missing_channels": sorted(missing)},
+                )
 
     async def _handle_invoice_due_soon(self, event: NotificationEventEnvelope, correlation_id: str, **_):
         await self.email_service.send_email(
@@ -118,7 +383,96 @@ class EventHandler:
             correlation_id=correlation_id
         )
 
+    async def _suppress_hard_bounce(self, email: str, log):
+        if not self.suppression_list or not app_settings.SUPPRESSION_ADD_HARD_BOUNCES:
+            return
+        try:
+            await self.suppression_list.add([email], reason="hard_bounce")
+        except RedisError as e:
+            log.error(
+                "Failed to add hard-bounced address to the suppression list",
+                event_type="SUPPRESSION_ADD_FAILED",
+                error=str(e),
+            )
+            return
+        log.info(
+            "Hard-bounced address added to the suppression list",
+            event_type="SUPPRESSION_HARD_BOUNCE_ADDED",
+            event_details={"recipient_email": email},
+        )
+
+    def _route_for(self, event_type: str) -> tuple[list[str], set[str]]:
+        """Channels for the event type and which of them must succeed; unrouted events go to email only."""
+        route = self.routes.get(event_type)
+        if route is None:
+            return [EMAIL], {EMAIL}
+        required = set(route.channels if route.required is None else route.required)
+        return list(route.channels), required
+
+    @staticmethod
+    def _channel_key(message_id: UUID, channel: str) -> UUID:
+        """Idempotency key per channel; email keeps the message_id itself, as before channels existed."""
+        return message_id if channel == EMAIL else uuid5(message_id, channel)
+
+    async def _deliver(self, channel_name: str, event: NotificationEventEnvelope, correlation_id: Optional[str], log):
+        channel = self.channels.get(channel_name)
+        if channel is None:
+            raise PermanentDeliveryError(f"Delivery channel is not configured: {channel_name}")
+        started_at = time.monotonic()
+        try:
+            with start_span(f"notification.channel.{channel_name}", attributes={"notification.channel": channel_name}):
+                await channel.send(event, correlation_id)
+        except Exception as e:
+            CHANNEL_DELIVERIES.labels(channel=channel_name, status="failed").inc()
+            if channel_name == EMAIL and isinstance(e, PermanentDeliveryError) and e.recipient_refused:
+                await self._suppress_hard_bounce(event.recipient.email, log)
+            raise
+        CHANNEL_DELIVERIES.labels(channel=channel_name, status="success").inc()
+        CHANNEL_DELIVERY_TIME.labels(channel=channel_name).observe(time.monotonic() - started_at)
+
+    @staticmethod
+    def _most_severe(errors: list[BaseException]) -> BaseException:
+        """A failure that will not go away on retry wins over a transient one, so the message is not retried in vain."""
+        for error in errors:
+            if not isinstance(error, TransientProcessingError):
+                return error
+        return errors[0]
+
+    async def _mark_processed(self, event: NotificationEventEnvelope, channels: list[str], log):
+        for channel in channels:
+            try:
+                await self.idempotency_store.mark_processed(self._channel_key(event.message_id, channel))
+            except RedisError as e:
+                # The notification was already delivered: failing here would only make a retry send it again.
+                log.error(
+                    "Failed to mark message as processed in Redis.",
+                    event_type="MESSAGE_IDEMPOTENCY_MARK_FAILED",
+                    event_details={"message_id": event.message_id, "channel": channel},
+                    error=str(e),
+                    exc_info=e
+                )
+                return
+
+        log.info(
+            "Message marked as processed in Redis via idempotency key.",
+            event_type="MESSAGE_IDEMPOTENCY_PROCESSED",
+            event_details={"message_id": event.message_id,
+                           "channels": channels,
+                           "ttl_seconds": self.idempotency_store.ttl_seconds}
+        )
+
+    @traced("notification.process_event")
     async def process_event(self, event_data: dict, correlation_id: Optional[str] = None, retry_count: int = 0) -> bool:
+        """
+        Delivers the event through every channel routed for its event type that
+        has not delivered it yet, concurrently. Each channel has its own
+        idempotency key, so a retry only repeats the channels that failed. Fails
+        if a required channel failed; optional channel failures are only logged.
+        Bulk envelopes are expanded into one such event per recipient.
+        """
+        if BulkNotificationEventEnvelope.is_bulk(event_data):
+            return await self.bulk_expander.process(event_data, correlation_id)
+
         log = logger.bind(correlation_id=correlation_id, event_type=event_data.get(
             "event_type", "unknown"), retry_count=retry_count)
 
@@ -127,9 +481,19 @@ class EventHandler:
         except ValidationError as e:
             raise SchemaValidationError(f"Invalid message schema: {e}")
 
-        idempotency_key = f"idempotency:{event.message_id}"
+        set_span_attributes({"notification.message_id": str(event.message_id),
+                             "notification.event_type": event.event_type})
+        channels, required = self._route_for(event.event_type)
+        try:
+            delivered = await asyncio.gather(*(
+                self.idempotency_store.is_processed(self._channel_key(event.message_id, channel))
+                for channel in channels
+            ))
+        except RedisError as e:
+            raise TransientProcessingError(f"Idempotency check failed: {e}") from e
 
-        if await self.redis_client.exists(idempotency_key):
+        pending = [channel for channel, done in zip(channels, delivered) if not done]
+        if not pending:
             log.warning(
                 "Duplicate message detected via idempotency check. Skipping.",
                 event_type="MESSAGE_IDEMPOTENCY_DUPLICATE",
@@ -141,26 +505,50 @@ class EventHandler:
         if not handler:
             raise EventTypeValidationError(event.event_type)
 
+        if EMAIL in pending and self.suppression_list and await self.suppression_list.is_suppressed(event.recipient.email):
+            pending.remove(EMAIL)
+            if not pending:
+                raise RecipientSuppressedError(event.recipient.email)
+
+        set_span_attributes({"notification.channels": pending})
         log.info(
             "Processing event with handler",
             event_type="EVENT_PROCESSING_START",
             event_details={"handler_name": handler.__name__,
+                           "channels": pending,
                            "recipient_email": event.recipient.email}
         )
 
-        await handler(event=event, correlation_id=correlation_id, retry_count=retry_count)
-
-        await self.redis_client.set(idempotency_key, "processed", ex=86400)
-        log.info(
-            "Message marked as processed in Redis via idempotency key.",
-            event_type="MESSAGE_IDEMPOTENCY_PROCESSED",
-            event_details={"message_id": event.message_id,
-                           "ttl_seconds": 86400}
+        results = await asyncio.gather(
+            *(self._deliver(channel, event, correlation_id, log) for channel in pending),
+            return_exceptions=True,
         )
+
+        succeeded = []
+        required_errors = []
+        for channel, result in zip(pending, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if not isinstance(result, BaseException):
+                succeeded.append(channel)
+            elif channel in required:
+                required_errors.append(result)
+            else:
+                log.warning(
+                    "Optional delivery channel failed",
+                    event_type="CHANNEL_DELIVERY_FAILED_OPTIONAL",
+                    error=f"{type(result).__name__}: {result}",
+                    event_details={"channel": channel},
+                )
+
+        if succeeded:
+            await self._mark_processed(event, succeeded, log)
+        if required_errors:
+            raise self._most_severe(required_errors)
         return True
 
 
-def get_mail_config(settings: Settings = Depends(lambda: app_settings)) -> ConnectionConfig:
+def build_mail_config(settings: Settings) -> ConnectionConfig:
     return ConnectionConfig(
         MAIL_USERNAME=settings.MAIL_USERNAME,
         MAIL_PASSWORD=settings.MAIL_PASSWORD.get_secret_value(
@@ -176,15 +564,3 @@ def get_mail_config(settings: Settings = Depends(lambda: app_settings)) -> Conne
         VALIDATE_CERTS=False,
         SUPPRESS_SEND=settings.MAIL_SUPPRESS_SEND
     )
-
-
-def get_email_service(mail_config: ConnectionConfig = Depends(get_mail_config)) -> EmailService:
-    mailer = FastMail(mail_config)
-    return EmailService(mailer)
-
-
-def get_event_handler(
-    redis_client: Redis = Depends(get_redis_client),
-    email_service: EmailService = Depends(get_email_service)
-) -> EventHandler:
-    return EventHandler(redis_client=redis_client, email_service=email_service)
@@ -0,0 +1,105 @@
+import re
+from typing import Optional
+
+from aiosmtplib import SMTPRecipientRefused, SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+from fastapi_mail.errors import ConnectionErrors
+
+from config import settings
+
+PERMANENT = "permanent"
+TEMPORARY = "temporary"
+CONNECTION = "connection"
+
+# "try again in 5 minutes", "retry after 30s", "please wait 2 min"
+_RETRY_HINT = re.compile(
+    r"(?:try again|retry|wait)\D{0,20}?(\d+)\s*(seconds?|secs?|s|minutes?|mins?|m|hours?|h)\b",
+    re.IGNORECASE,
+)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600}
+
+
+class SMTPFailure:
+    """How a failed send should be handled, with the SMTP reply that caused it when there was one."""
+
+    def __init__(
+        self,
+        kind: str,
+        code: Optional[int] = None,
+        message: str = "",
+        retry_after_seconds: Optional[float] = None,
+        recipient_refused: bool = False,
+    ):
+        self.kind = kind
+        self.code = code
+        self.message = message
+        self.retry_after_seconds = retry_after_seconds
+        self.recipient_refused = recipient_refused
+
+    @property
+    def code_label(self) -> str:
+        return str(self.code) if self.code is not None else "none"
+
+
+def suggested_retry_seconds(message: str) -> Optional[float]:
+    """The delay a server asks for in its reply text, if it names one."""
+    match = _RETRY_HINT.search(message or "")
+    if not match:
+        return None
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)[0].lower()]
+
+
+def temporary_retry_seconds(code: int, message: str) -> Optional[float]:
+    """
+    Delay before retrying a 4xx reply: the one suggested by the server, else the
+    configured delay for the code, capped at SMTP_MAX_RETRY_DELAY_MS. None means
+    the regular broker retry delay.
+    """
+    delay = suggested_retry_seconds(message)
+    if delay is None and code in settings.SMTP_RETRY_DELAYS_MS:
+        delay = settings.SMTP_RETRY_DELAYS_MS[code] / 1000
+    if delay is None:
+        return None
+    return min(delay, settings.SMTP_MAX_RETRY_DELAY_MS / 1000)
+
+
+def _underlying_reply(error: BaseException) -> Optional[BaseException]:
+    """The SMTP reply a connection error was raised while handling, if any."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, (SMTPResponseException, SMTPRecipientsRefused)):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def classify_smtp_error(error: BaseException) -> Optional[SMTPFailure]:
+    """
+    Classifies a send failure by its SMTP reply code: 5xx is permanent, 4xx is
+    temporary and other connection-level failures (refused, dropped or timed
+    out sessions) are retried right away. Returns None for errors that are not
+    SMTP or network failures.
+
+    fastapi-mail wraps greeting and login replies in ConnectionErrors, and a
+    server that closes the session after its reply (as on 421) makes the
+    following quit raise SMTPServerDisconnected; both are classified by the
+    reply they were raised over.
+    """
+    if isinstance(error, (ConnectionErrors, SMTPServerDisconnected)):
+        error = _underlying_reply(error) or error
+
+    if isinstance(error, SMTPRecipientsRefused) and error.recipients:
+        # Permanent only if every recipient was rejected permanently.
+        refusals = sorted(error.recipients, key=lambda refusal: refusal.code)
+        error = refusals[0]
+
+    if isinstance(error, SMTPResponseException):
+        code, message = error.code, error.message
+        if 500 <= code < 600:
+            return SMTPFailure(PERMANENT, code, message, recipient_refused=isinstance(error, SMTPRecipientRefused))
+        if 400 <= code < 500:
+            return SMTPFailure(TEMPORARY, code, message, temporary_retry_seconds(code, message))
+
+    if isinstance(error, (ConnectionErrors, OSError)):
+        return SMTPFailure(CONNECTION, message=str(error))
+    return None
@@ -0,0 +1,494 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Sequence
+from uuid import uuid4
+
+import aio_pika
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+
+from config import settings
+from metrics import (
+    MESSAGES_RECEIVED,
+    REDIS_STREAM_CLAIMED,
+    REDIS_STREAM_LAG,
+    REDIS_STREAM_PENDING,
+)
+from redis_client import get_redis_client
+from startup import retry_with_backoff
+from tracing import CONSUMER, TRACEPARENT, extract, inject, start_span, trace_log_fields
+from .delivery_status import DeliveryStatusRecorder
+from .exceptions import TransientProcessingError
+from .outcomes import DeliveryOutcomeRouter
+from .service import EventHandler
+
+logger = structlog.get_logger(__name__)
+
+# Moves due retries back onto the stream. Atomic, so with several consumers each
+# retry is re-added exactly once.
+_MOVE_DUE_RETRIES = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    local fields = cjson.decode(member)
+    local args = {}
+    for key, value in pairs(fields) do
+        table.insert(args, key)
+        table.insert(args, value)
+    end
+    redis.call('XADD', KEYS[2], '*', unpack(args))
+    redis.call('ZREM', KEYS[1], member)
+end
+return #due
+"""
+
+
+def _entry_time(entry_id: str) -> datetime:
+    """When the entry was added to the stream, from the millisecond part of its id."""
+    return datetime.fromtimestamp(int(entry_id.split("-", 1)[0]) / 1000, tz=timezone.utc)
+
+
+class _StreamEntry(NamedTuple):
+    id: str
+    fields: dict
+
+
+class RedisStreamConsumer(DeliveryOutcomeRouter):
+    """
+    Consumes the event stream through a Redis consumer group, driving the same
+    EventHandler with the same outcome routing (DeliveryOutcomeRouter) as
+    RabbitMQConsumer.
+
+    Entries are read with XREADGROUP in batches of up to `batch_size`, with
+    at most `concurrency` being handled at once. Successes are acknowledged in
+    batches: one XACK for up to `ack_batch_size` ids, or every
+    `ack_interval_seconds`. A transient failure goes to a sorted set scored by
+    the time it is due (RABBITMQ_RETRY_DELAY_MS, or the error's retry_after),
+    and a mover puts due entries back on the stream with `retry_count` raised.
+    Permanent and schema failures, and entries out of retries, are added to
+    the DLQ stream with `dlq_reason`, `dlq_error` and `dlq_at`. The retry or
+    DLQ write and the XACK run in one MULTI.
+
+    An unexpected error leaves the entry pending, like an unacked AMQP
+    delivery. Entries pending for longer than `claim_idle_ms`, from this or a
+    crashed consumer, are taken over with XAUTOCLAIM and handled again, so
+    `claim_idle_ms` must exceed the slowest handling time.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        event_handler: EventHandler,
+        delivery_recorder: DeliveryStatusRecorder | None = None,
+        stream: Optional[str] = None,
+        group: Optional[str] = None,
+        consumer_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.redis_client = redis_client
+        self.event_handler = event_handler
+        self.delivery_recorder = delivery_recorder
+        self.stream = stream or settings.REDIS_STREAM_KEY
+        self.group = group or settings.REDIS_STREAM_GROUP
+        self.consumer_name = (
+            consumer_name or settings.REDIS_STREAM_CONSUMER_NAME or f"{socket.gethostname()}:{os.getpid()}")
+        self.batch_size = batch_size or settings.REDIS_STREAM_BATCH_SIZE
+        self.concurrency = concurrency or settings.REDIS_STREAM_CONCURRENCY
+        self.retry_key = settings.REDIS_STREAM_RETRY_KEY
+        self.dlq_key = settings.REDIS_STREAM_DLQ_KEY
+        self.concurrency_limiter = None
+        self._in_flight = 0
+        self._handling: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._capacity_freed = asyncio.Event()
+        self._ack_ids: list[str] = []
+        self._connected = False
+        self._move_due_retries = self.redis_client.register_script(_MOVE_DUE_RETRIES)
+        logger.debug(
+            "Redis stream consumer initialized",
+            event_type="REDIS_STREAM_CONSUMER_INITIALIZED",
+            trigger_type="system_scheduled",
+            event_details={"stream": self.stream, "group": self.group, "consumer": self.consumer_name},
+        )
+
+    async def _create_group(self):
+        try:
+            # From the start of the stream, so events added before the first deploy are not skipped.
+            await self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._connected = True
+
+    async def connect(self, deadline: float | None = None):
+        """Creates the consumer group (and the stream) if missing, retrying with backoff like the AMQP connect."""
+        await retry_with_backoff(self._create_group, name="redis_streams", deadline=deadline)
+        logger.debug(
+            "Redis stream consumer group ready",
+            event_type="REDIS_STREAM_GROUP_READY",
+            trigger_type="system_scheduled",
+            event_details={"stream": self.stream, "group": self.group},
+        )
+
+    @staticmethod
+    def _retry_count(fields: dict) -> int:
+        try:
+            return int(fields.get("retry_count", 0))
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _forwarded_fields(entry_id: str, fields: dict, extra: dict) -> dict:
+        # The copy carries the current span as its parent, so the next attempt continues the same trace.
+        forwarded = {key: value for key, value in fields.items() if not key.startswith("dlq_")}
+        forwarded.pop(TRACEPARENT, None)
+        return {**inject(forwarded), "origin_id": entry_id, **{key: str(value) for key, value in extra.items()}}
+
+    async def _ack(self, entry: _StreamEntry):
+        self._ack_ids.append(entry.id)
+        if len(self._ack_ids) >= settings.REDIS_STREAM_ACK_BATCH_SIZE:
+            await self._flush_acks()
+
+    async def _flush_acks(self):
+        ids, self._ack_ids = self._ack_ids, []
+        if not ids:
+            return
+        try:
+            await self.redis_client.xack(self.stream, self.group, *ids)
+        except RedisError as e:
+            # Kept for the next flush; if this process dies first, the entries are claimed and deduplicated.
+            self._ack_ids = ids + self._ack_ids
+            logger.warning(
+                "Failed to acknowledge stream entries",
+                event_type="REDIS_STREAM_ACK_FAILED",
+                trigger_type="system_scheduled",
+                error=str(e),
+                event_details={"pending_acks": len(self._ack_ids)},
+            )
+
+    async def _retry(self, entry: _StreamEntry, retry_count: int, error: TransientProcessingError):
+        delay_seconds = error.retry_after_seconds
+        if delay_seconds is None:
+            delay_seconds = settings.RABBITMQ_RETRY_DELAY_MS / 1000
+        member = json.dumps(self._forwarded_fields(entry.id, entry.fields, {"retry_count": retry_count + 1}))
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.retry_key, {member: int((time.time() + delay_seconds) * 1000)})
+            pipe.xack(self.stream, self.group, entry.id)
+            await pipe.execute()
+
+    async def _requeue(self, entry: _StreamEntry):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.stream, self._forwarded_fields(entry.id, entry.fields, {}),
+                      maxlen=settings.REDIS_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, entry.id)
+            await pipe.execute()
+
+    async def _dead_letter(self, entry: _StreamEntry, reason: str, error: Exception, smtp_code: int | None = None):
+        extra = {
+            "dlq_reason": reason,
+            "dlq_error": f"{type(error).__name__}: {error}"[:1024],
+            "dlq_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if smtp_code is not None:
+            extra["dlq_smtp_code"] = smtp_code
+        dlq_fields = self._forwarded_fields(entry.id, entry.fields, extra)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.dlq_key, dlq_fields, maxlen=settings.REDIS_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, entry.id)
+            await pipe.execute()
+
+    async def _on_unexpected_error(self, entry: _StreamEntry, error: Exception, log):
+        log.error(
+            "Unexpected error processing stream entry; left pending to be claimed again.",
+            event_type="REDIS_STREAM_ENTRY_FAILED",
+            trigger_type="system_scheduled",
+            error=str(error),
+            exc_info=error,
+        )
+
+    def _requeued_at(self, entry: _StreamEntry, retry_count: int) -> datetime | None:
+        # A retried entry was re-added when its delay ended, which its id records.
+        return _entry_time(entry.id)
+
+    def _received_details(self, entry: _StreamEntry) -> dict:
+        return {"stream": self.stream}
+
+    async def _on_entry(self, entry_id: str, fields: dict):
+        """Handles one entry inside a consumer span that continues the trace of its `traceparent`."""
+        with start_span(
+            "notification.consume",
+            parent=extract(fields),
+            kind=CONSUMER,
+            attributes={
+                "messaging.system": "redis",
+                "messaging.destination.name": self.stream,
+                "messaging.message.id": entry_id,
+                "messaging.message.correlation_id": fields.get("correlation_id"),
+                "messaging.message.retry_count": self._retry_count(fields),
+            },
+        ):
+            try:
+                await self._handle_entry(entry_id, fields)
+            except RedisError as e:
+                # The retry or DLQ write failed; the entry stays pending and is claimed again.
+                logger.error(
+                    "Failed to record stream entry outcome",
+                    event_type="REDIS_STREAM_ENTRY_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"entry_id": entry_id},
+                )
+
+    async def _handle_entry(self, entry_id: str, fields: dict):
+        correlation_id = fields.get("correlation_id") or str(uuid4())
+        log = logger.bind(correlation_id=correlation_id, stream_entry_id=entry_id, **trace_log_fields())
+        MESSAGES_RECEIVED.labels(queue=self.stream, routing_key=self.stream).inc()
+        await self._process_delivery(
+            _StreamEntry(entry_id, fields),
+            fields.get("body") or "",
+            self._retry_count(fields),
+            correlation_id,
+            log,
+        )
+
+    def _task_done(self, entry_id: str, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._handling.discard(entry_id)
+        self._in_flight -= 1
+        self._capacity_freed.set()
+
+    def _dispatch(self, entries: list):
+        for entry_id, fields in entries:
+            if entry_id in self._handling:
+                continue
+            self._handling.add(entry_id)
+            self._in_flight += 1
+            task = asyncio.create_task(self._on_entry(entry_id, fields))
+            self._tasks.add(task)
+            task.add_done_callback(lambda done, entry_id=entry_id: self._task_done(entry_id, done))
+
+    async def _wait_for_capacity(self):
+        while self._in_flight >= self.concurrency:
+            self._capacity_freed.clear()
+            await self._capacity_freed.wait()
+
+    async def _read_loop(self):
+        delay = settings.STARTUP_BACKOFF_INITIAL_SECONDS
+        while True:
+            await self._wait_for_capacity()
+            try:
+                response = await self.redis_client.xreadgroup(
+                    self.group,
+                    self.consumer_name,
+                    {self.stream: ">"},
+                    count=min(self.batch_size, self.concurrency - self._in_flight),
+                    block=settings.REDIS_STREAM_BLOCK_MS,
+                )
+            except RedisError as e:
+                # Redis restarts drop the connection, and a flushed Redis loses the group.
+                logger.warning(
+                    "Failed to read from stream; retrying",
+                    event_type="REDIS_STREAM_READ_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"retry_in_seconds": delay},
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.STARTUP_BACKOFF_MAX_SECONDS)
+                if isinstance(e, ResponseError) and "NOGROUP" in str(e):
+                    await self._create_group()
+                continue
+            delay = settings.STARTUP_BACKOFF_INITIAL_SECONDS
+            for _, entries in response or []:
+                self._dispatch(entries)
+
+    async def _ack_loop(self):
+        while True:
+            await asyncio.sleep(settings.REDIS_STREAM_ACK_INTERVAL_MS / 1000)
+            await self._flush_acks()
+
+    async def claim_stuck_entries(self) -> int:
+        """Takes over entries pending for longer than REDIS_STREAM_CLAIM_IDLE_MS and handles them again."""
+        claimed = 0
+        start_id = "0-0"
+        while True:
+            await self._wait_for_capacity()
+            response = await self.redis_client.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer_name,
+                min_idle_time=settings.REDIS_STREAM_CLAIM_IDLE_MS,
+                start_id=start_id,
+                count=self.batch_size,
+            )
+            start_id, entries = response[0], response[1]
+            # Entries trimmed from the stream while pending come back without fields (or, on Redis 7, as ids).
+            deleted = [entry_id for entry_id, fields in entries if fields is None]
+            deleted += response[2] if len(response) > 2 else []
+            if deleted:
+                await self.redis_client.xack(self.stream, self.group, *deleted)
+            entries = [(entry_id, fields) for entry_id, fields in entries if fields is not None]
+            if entries:
+                claimed += len(entries)
+                REDIS_STREAM_CLAIMED.inc(len(entries))
+                self._dispatch(entries)
+            if start_id in ("0-0", b"0-0"):
+                return claimed
+
+    async def _update_stream_metrics(self):
+        for group in await self.redis_client.xinfo_groups(self.stream):
+            if group.get("name") == self.group:
+                REDIS_STREAM_PENDING.labels(stream=self.stream).set(group.get("pending") or 0)
+                if group.get("lag") is not None:
+                    REDIS_STREAM_LAG.labels(stream=self.stream).set(group["lag"])
+
+    async def _claim_loop(self):
+        while True:
+            try:
+                claimed = await self.claim_stuck_entries()
+                if claimed:
+                    logger.warning(
+                        "Claimed stuck stream entries",
+                        event_type="REDIS_STREAM_ENTRIES_CLAIMED",
+                        trigger_type="system_scheduled",
+                        event_details={"claimed": claimed, "min_idle_ms": settings.REDIS_STREAM_CLAIM_IDLE_MS},
+                    )
+                await self._update_stream_metrics()
+            except RedisError as e:
+                logger.warning(
+                    "Failed to claim stuck stream entries",
+                    event_type="REDIS_STREAM_CLAIM_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                )
+            await asyncio.sleep(settings.REDIS_STREAM_CLAIM_INTERVAL_SECONDS)
+
+    async def move_due_retries(self) -> int:
+        moved = 0
+        while True:
+            batch = await self._move_due_retries(
+                keys=[self.retry_key, self.stream], args=[int(time.time() * 1000), self.batch_size])
+            moved += batch
+            if batch < self.batch_size:
+                return moved
+
+    async def _retry_loop(self):
+        while True:
+            try:
+                await self.move_due_retries()
+            except RedisError as e:
+                logger.warning(
+                    "Failed to move due retries to the stream",
+                    event_type="REDIS_STREAM_RETRY_MOVE_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                )
+            await asyncio.sleep(settings.REDIS_STREAM_RETRY_POLL_INTERVAL_MS / 1000)
+
+    async def set_prefetch_count(self, prefetch_count: int):
+        """RABBITMQ_PREFETCH_COUNT maps to the XREADGROUP batch size on this backend."""
+        self.batch_size = prefetch_count
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def is_backpressured(self) -> bool:
+        return self._in_flight >= self.concurrency
+
+    async def check_connection(self):
+        if not self._connected:
+            raise ConnectionError("Redis stream consumer group is not set up.")
+        await self.redis_client.ping()
+
+    async def run(self):
+        try:
+            if not self._connected:
+                await self.connect()
+            logger.debug(
+                "Consumer is ready and starting to consume messages",
+                event_type="CONSUMER_STARTED_SUCCESSFULLY",
+                trigger_type="system_scheduled",
+                event_details={
+                    "stream": self.stream,
+                    "group": self.group,
+                    "consumer": self.consumer_name,
+                    "batch_size": self.batch_size,
+                    "concurrency": self.concurrency,
+                },
+            )
+            background = [
+                asyncio.create_task(self._ack_loop()),
+                asyncio.create_task(self._claim_loop()),
+                asyncio.create_task(self._retry_loop()),
+            ]
+            try:
+                await self._read_loop()
+            finally:
+                for task in background:
+                    task.cancel()
+                await asyncio.gather(*background, return_exceptions=True)
+
+        except Exception as e:
+            logger.error(
+                "An unexpected error occurred during consumer runtime. Shutting down.",
+                event_type="CONSUMER_RUNTIME_ERROR",
+                trigger_type="system_scheduled",
+                error=str(e),
+                exc_info=e,
+            )
+            raise
+
+        finally:
+            # Let handlers that already started finish, so their outcome is written and acked.
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._flush_acks()
+
+
+class RedisStreamPublisher:
+    """
+    Publishes events to the stream for HTTP ingestion, with the interface of
+    NotificationPublisher. Routing keys do not apply: every event goes to
+    REDIS_STREAM_KEY.
+    """
+
+    def __init__(self, redis_client: Optional[Redis] = None, stream: Optional[str] = None):
+        self.redis_client = redis_client
+        self.stream = stream or settings.REDIS_STREAM_KEY
+
+    async def _client(self) -> Redis:
+        # The pool is created by the consumer runtime, after the publisher.
+        return self.redis_client or await get_redis_client()
+
+    async def warm_up(self):
+        await (await self._client()).ping()
+
+    async def publish_batch(
+        self,
+        messages: Sequence[tuple[aio_pika.Message, str]],
+        exchange_name: Optional[str] = None,
+    ) -> list[Optional[BaseException]]:
+        """Adds the messages with one pipelined round trip; one entry per message, None when added."""
+        client = await self._client()
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for message, _ in messages:
+                    fields = {"body": message.body}
+                    if message.correlation_id:
+                        fields["correlation_id"] = message.correlation_id
+                    if (message.headers or {}).get(TRACEPARENT):
+                        fields[TRACEPARENT] = message.headers[TRACEPARENT]
+                    pipe.xadd(self.stream, fields, maxlen=settings.REDIS_STREAM_MAXLEN, approximate=True)
+                results = await pipe.execute(raise_on_error=False)
+        except RedisError as e:
+            return [e] * len(messages)
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def close(self):
+        pass
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import time
+from hashlib import blake2b
+from typing import Iterable, Optional
+
+import structlog
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import settings
+from metrics import SUPPRESSION_ENTRIES
+from .exceptions import TransientProcessingError
+
+logger = structlog.get_logger(__name__)
+
+
+class SuppressionList:
+    """
+    Addresses that must not receive notifications (hard bounces, complaints).
+
+    The authoritative list is the `suppression:entries` Redis hash (normalized
+    address -> JSON with the reason and when it was added). Every change is also
+    appended to the `suppression:changes` stream, which each process tails to
+    keep a local set of 64-bit address digests current without reloading the
+    whole list. A miss in the local set means the address is not suppressed, so
+    the common case costs no round trip; a hit is confirmed against the hash, so
+    a digest collision never suppresses a valid address.
+    """
+
+    ENTRIES_KEY = "suppression:entries"
+    CHANGES_KEY = "suppression:changes"
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        refresh_interval_seconds: float = 5.0,
+        changes_max_length: int = 100000,
+        batch_size: int = 1000,
+    ):
+        self.redis_client = redis_client
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.changes_max_length = changes_max_length
+        self.batch_size = batch_size
+        self._digests: set[int] = set()
+        self._last_change_id: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def normalize(email: str) -> str:
+        return email.strip().lower()
+
+    @staticmethod
+    def _digest(address: str) -> int:
+        return int.from_bytes(blake2b(address.encode(), digest_size=8).digest(), "big")
+
+    def _apply(self, op: str, address: str):
+        if op == "add":
+            self._digests.add(self._digest(address))
+        else:
+            self._digests.discard(self._digest(address))
+
+    async def load(self):
+        """Full load: remembers the stream position first, then reads the hash, so no change is missed."""
+        last = await self.redis_client.xrevrange(self.CHANGES_KEY, count=1)
+        last_change_id = last[0][0] if last else "0-0"
+
+        digests = set()
+        cursor = 0
+        while True:
+            cursor, entries = await self.redis_client.hscan(self.ENTRIES_KEY, cursor, count=self.batch_size)
+            digests.update(self._digest(address) for address in entries)
+            if cursor == 0:
+                break
+
+        self._digests = digests
+        self._last_change_id = last_change_id
+        # Changes made while scanning are replayed on top; the last change to an address wins.
+        await self.refresh()
+        logger.debug(
+            "Suppression list loaded",
+            event_type="SUPPRESSION_LIST_LOADED",
+            trigger_type="system_scheduled",
+            event_details={"entries": len(self._digests)},
+        )
+
+    async def refresh(self):
+        """
+        Applies the changes appended since the last load or refresh. If the stream
+        was trimmed past that point, the changes in between are lost and the list
+        is loaded again in full.
+        """
+        if self._last_change_id is None:
+            await self.load()
+            return
+        while True:
+            changes = await self.redis_client.xrange(
+                self.CHANGES_KEY, min=self._last_change_id, count=self.batch_size + 1)
+            if self._last_change_id != "0-0":
+                if changes and changes[0][0] != self._last_change_id:
+                    logger.warning(
+                        "Suppression changes were trimmed before being applied. Reloading.",
+                        event_type="SUPPRESSION_LIST_RELOAD",
+                        trigger_type="system_scheduled",
+                    )
+                    self._last_change_id = None
+                    await self.load()
+                    return
+                changes = changes[1:]
+            for change_id, fields in changes:
+                self._apply(fields["op"], fields["address"])
+                self._last_change_id = change_id
+            SUPPRESSION_ENTRIES.set(len(self._digests))
+            if len(changes) < self.batch_size:
+                return
+
+    async def is_suppressed(self, email: str) -> bool:
+        address = self.normalize(email)
+        if self._digest(address) not in self._digests:
+            return False
+        try:
+            return bool(await self.redis_client.hexists(self.ENTRIES_KEY, address))
+        except RedisError as e:
+            # Retried rather than guessed: dropping on a digest hit alone would lose a valid notification.
+            raise TransientProcessingError(f"Suppression list lookup failed: {e}") from e
+
+    async def get(self, email: str) -> Optional[dict]:
+        address = self.normalize(email)
+        data = await self.redis_client.hget(self.ENTRIES_KEY, address)
+        return {"email": address, **json.loads(data)} if data else None
+
+    async def _write(self, op: str, emails: Iterable[str], reason: Optional[str] = None) -> int:
+        addresses = list(dict.fromkeys(self.normalize(email) for email in emails))
+        entry = json.dumps({"reason": reason, "added_at": time.time()})
+        changed = 0
+        for start in range(0, len(addresses), self.batch_size):
+            chunk = addresses[start:start + self.batch_size]
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for address in chunk:
+                    if op == "add":
+                        pipe.hset(self.ENTRIES_KEY, address, entry)
+                    else:
+                        pipe.hdel(self.ENTRIES_KEY, address)
+                    pipe.xadd(
+                        self.CHANGES_KEY,
+                        {"op": op, "address": address},
+                        maxlen=self.changes_max_length,
+                        approximate=True,
+                    )
+                results = await pipe.execute()
+            changed += sum(results[::2])
+            for address in chunk:
+                self._apply(op, address)
+        SUPPRESSION_ENTRIES.set(len(self._digests))
+        return changed
+
+    async def add(self, emails: Iterable[str], reason: str) -> int:
+        """Suppresses the addresses; returns how many were not suppressed before."""
+        return await self._write("add", emails, reason)
+
+    async def remove(self, emails: Iterable[str]) -> int:
+        """Lifts the suppression; returns how many addresses were suppressed."""
+        return await self._write("remove", emails)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            try:
+                await self.refresh()
+            except RedisError as e:
+                logger.error(
+                    "Failed to refresh suppression list",
+                    event_type="SUPPRESSION_LIST_REFRESH_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+suppression_list: SuppressionList | None = None
+
+
+def init_suppression_list(redis_client: Redis) -> SuppressionList:
+    global suppression_list
+    suppression_list = SuppressionList(
+        redis_client,
+        refresh_interval_seconds=settings.SUPPRESSION_REFRESH_INTERVAL_SECONDS,
+        changes_max_length=settings.SUPPRESSION_CHANGES_MAX_LENGTH,
+    )
+    return suppression_list
+
+
+async def close_suppression_list():
+    if suppression_list:
+        await suppression_list.stop()
+
+
+async def get_suppression_list() -> SuppressionList:
+    if suppression_list is None:
+        raise RuntimeError("Suppression list not initialized.")
+    return suppression_list
@@ -0,0 +1,416 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import structlog
+from jinja2 import BaseLoader, Environment, TemplateNotFound
+
+logger = structlog.get_logger(__name__)
+
+# Bumped whenever compile_template changes its output, so artifacts from an older build are recompiled.
+BUILD_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+SOURCE_DIR = Path(__file__).parent / "templates"
+DEFAULT_BUILD_DIR = "build/templates"
+
+_JINJA = re.compile(r"{{.*?}}|{%.*?%}|{#.*?#}", re.S)
+_PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+_STATEMENT_RUN = re.compile(r"\n((?:\x00\d+\x00)+)\n+")
+_RAW = re.compile(r"\x01(\d+)\x01")
+_RAW_BLOCK = re.compile(r"<(pre|textarea|script)\b.*?</\1\s*>", re.S | re.I)
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_WHITESPACE = re.compile(r"\s+")
+_BLOCK_TAG = re.compile(
+    r"\s*(<!DOCTYPE[^>]*>|</?(?:html|head|body|title|meta|link|style|table|thead|tbody|tfoot|tr|td|th"
+    r"|div|p|h[1-6]|ul|ol|li|br|hr|center)\b[^>]*>)\s*",
+    re.I,
+)
+_STYLE_BLOCK = re.compile(r"<style\b[^>]*>(.*?)</style\s*>", re.S | re.I)
+_HEAD_END = re.compile(r"</head\s*>", re.I)
+_START_TAG = re.compile(r"<([a-zA-Z][\w-]*)(\s[^>]*?)?(/?)>")
+_ATTRIBUTE = re.compile(r'\s([\w-]+)\s*=\s*"([^"]*)"')
+_STYLE_ATTRIBUTE = re.compile(r'\sstyle\s*=\s*"([^"]*)"', re.I)
+_SIMPLE_SELECTOR = re.compile(r"([a-zA-Z][\w-]*)?(?:\.([\w-]+))?(?:#([\w-]+))?")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};:,>])\s*")
+_HEX_COLOR = re.compile(r"#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3\b")
+_JINJA_WHITESPACE = re.compile(r"('[^']*'|\"[^\"]*\")|\s+")
+
+_HEAD = re.compile(r"<head\b.*?</head\s*>", re.S | re.I)
+_INVISIBLE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.S | re.I)
+_LINK = re.compile(r'<a\b[^>]*?\shref\s*=\s*"([^"]*)"[^>]*>(.*?)</a\s*>', re.S | re.I)
+_IMAGE = re.compile(r'<img\b[^>]*?\salt\s*=\s*"([^"]*)"[^>]*>', re.I)
+_LIST_ITEM = re.compile(r"<li\b[^>]*>", re.I)
+_PARAGRAPH_END = re.compile(r"</(?:p|h[1-6]|table|div|ul|ol)\s*>", re.I)
+_LINE_END = re.compile(r"<br\s*/?>|</(?:tr|td|th|li)\s*>", re.I)
+_TAG = re.compile(r"<[^>]*>")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+@dataclass
+class CompiledTemplate:
+    html: str
+    text: str
+
+
+@dataclass
+class TemplateSizes:
+    name: str
+    source_bytes: int
+    html_bytes: int
+    text_bytes: int
+
+    @property
+    def saved_percent(self) -> float:
+        return 100 * (1 - self.html_bytes / self.source_bytes) if self.source_bytes else 0.0
+
+
+def normalize_style(value: str) -> str:
+    """
+    Serializes a declaration list compactly, keeping only the declaration that
+    wins for each property (the last one, unless an earlier one is !important).
+    """
+    if _PLACEHOLDER.search(value):
+        # A Jinja expression may expand to several declarations; only whitespace is safe to touch.
+        return " ".join(value.split())
+    declarations: dict[str, tuple[str, bool]] = {}
+    for declaration in value.split(";"):
+        name, separator, css_value = declaration.partition(":")
+        name = name.strip().lower()
+        if not separator or not name:
+            continue
+        css_value = _HEX_COLOR.sub(r"#\1\2\3", re.sub(r"\s*,\s*", ",", " ".join(css_value.split())))
+        important = css_value.lower().replace(" ", "").endswith("!important")
+        if name in declarations and declarations[name][1] and not important:
+            continue
+        # Re-inserted at the end, so a shorthand still overrides the longhands it followed.
+        declarations.pop(name, None)
+        declarations[name] = (css_value, important)
+    return ";".join(f"{name}:{css_value}" for name, (css_value, _) in declarations.items())
+
+
+def _css_blocks(css: str) -> list[tuple[str, str]]:
+    """Splits a stylesheet into top-level (prelude, body) pairs, keeping at-rule bodies whole."""
+    blocks, depth, start, prelude = [], 0, 0, ""
+    for position, char in enumerate(css):
+        if char == "{":
+            if depth == 0:
+                prelude, start = css[start:position].strip(), position + 1
+            depth += 1
+        elif char == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:position]))
+                start = position + 1
+    return blocks
+
+
+def inline_css(markup: str) -> str:
+    """
+    Moves rules with simple selectors (tag, .class, #id and their combinations)
+    from <style> blocks into the style attribute of each matching element, which
+    is what email clients reliably honor. Media queries and other selectors stay
+    in a <style> block in the head.
+    """
+    rules: list[tuple[tuple[int, int, int], int, Optional[str], Optional[str], Optional[str], str]] = []
+    residual: list[str] = []
+
+    def collect(match: re.Match) -> str:
+        css = re.sub(r"/\*.*?\*/", "", match.group(1), flags=re.S)
+        if _PLACEHOLDER.search(css):
+            return match.group(0)
+        for prelude, body in _css_blocks(css):
+            selectors = [_SIMPLE_SELECTOR.fullmatch(selector.strip()) for selector in prelude.split(",")]
+            if prelude.startswith("@") or not all(selector and selector.group(0) for selector in selectors):
+                residual.append(_CSS_PUNCTUATION.sub(r"\1", f"{prelude}{{{' '.join(body.split())}}}"))
+                continue
+            for selector in selectors:
+                tag, class_name, element_id = selector.groups()
+                specificity = (int(element_id is not None), int(class_name is not None), int(tag is not None))
+                rules.append((specificity, len(rules), tag and tag.lower(), class_name, element_id, body))
+        return ""
+
+    markup = _STYLE_BLOCK.sub(collect, markup)
+    if residual:
+        style = f"<style>{''.join(residual)}</style>"
+        markup, found = _HEAD_END.subn(lambda match: style + match.group(0), markup, count=1)
+        if not found:
+            markup = style + markup
+    if not rules:
+        return markup
+    rules.sort(key=lambda rule: (rule[0], rule[1]))
+
+    def apply(match: re.Match) -> str:
+        tag, attributes, self_closing = match.group(1).lower(), match.group(2) or "", match.group(3)
+        values = {name.lower(): value for name, value in _ATTRIBUTE.findall(attributes)}
+        classes = set(values.get("class", "").split())
+        matched = [
+            body for _, _, rule_tag, class_name, element_id, body in rules
+            if (rule_tag is None or rule_tag == tag)
+            and (class_name is None or class_name in classes)
+            and (element_id is None or element_id == values.get("id"))
+        ]
+        if not matched:
+            return match.group(0)
+        # Inline declarations are more specific than any rule, so they go last and win.
+        style = ";".join([*matched, values["style"]] if "style" in values else matched)
+        if "style" in values:
+            attributes = _STYLE_ATTRIBUTE.sub(lambda _: f' style="{style}"', attributes, count=1)
+        else:
+            attributes = f'{attributes} style="{style}"'
+        return f"<{match.group(1)}{attributes}{self_closing}>"
+
+    return _START_TAG.sub(apply, markup)
+
+
+def minify_html(markup: str) -> str:
+    """
+    Drops comments (except conditional ones) and collapses whitespace, removing
+    it entirely around block-level tags where it cannot affect the layout.
+    Contents of <pre>, <textarea> and <script> are kept verbatim.
+    """
+    raw: list[str] = []
+
+    def protect(match: re.Match) -> str:
+        raw.append(match.group(0))
+        return f"\x01{len(raw) - 1}\x01"
+
+    markup = _RAW_BLOCK.sub(protect, markup)
+    markup = _COMMENT.sub("", markup)
+    markup = _WHITESPACE.sub(" ", markup)
+    markup = _BLOCK_TAG.sub(r"\1", markup)
+    return _RAW.sub(lambda match: raw[int(match.group(1))], markup).strip()
+
+
+def html_to_text(markup: str) -> str:
+    """Renders minified markup as plain text: paragraphs, line breaks, link targets and image alt text."""
+    text = _HEAD.sub("", markup)
+    text = _INVISIBLE.sub("", text)
+    text = _LINK.sub(lambda match: _link_text(match.group(2), match.group(1)), text)
+    text = _IMAGE.sub(lambda match: match.group(1), text)
+    text = _LIST_ITEM.sub("- ", text)
+    text = _PARAGRAPH_END.sub("\n\n", text)
+    text = _LINE_END.sub("\n", text)
+    text = html.unescape(_TAG.sub("", text))
+    text = re.sub(r"[^\S\n]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _link_text(label: str, href: str) -> str:
+    label = _TAG.sub("", label).strip()
+    if not label or label == href or href.startswith("#"):
+        return label or href
+    return f"{label} ({href})"
+
+
+def normalize_text(text: str) -> str:
+    """Collapses the blank lines left where a conditional block rendered nothing."""
+    return _BLANK_LINES.sub("\n\n", text).strip() + "\n"
+
+
+def compile_template(source: str) -> CompiledTemplate:
+    """
+    Builds the HTML sent on the wire and its plain-text alternative from an
+    HTML template. Jinja tags are set aside before any rewriting and restored
+    verbatim, so both outputs render with the same context as the source.
+    """
+    tokens: list[str] = []
+
+    def stash(match: re.Match) -> str:
+        if match.group(0).startswith("{#"):
+            return ""
+        # Whitespace inside a tag only matters within string literals.
+        tokens.append(_JINJA_WHITESPACE.sub(lambda part: part.group(1) or " ", match.group(0)))
+        return f"\x00{len(tokens) - 1}\x00"
+
+    def restore(value: str) -> str:
+        return _PLACEHOLDER.sub(lambda match: tokens[int(match.group(1))], value)
+
+    def is_statement(placeholder: str) -> bool:
+        return tokens[int(placeholder)].startswith("{%")
+
+    markup = inline_css(_JINJA.sub(stash, source))
+    markup = _STYLE_ATTRIBUTE.sub(
+        lambda match: f' style="{style}"' if (style := normalize_style(match.group(1))) else "", markup)
+    markup = minify_html(markup)
+
+    text = html_to_text(markup)
+    # A statement alone between paragraphs moves next to the paragraph it guards, so it adds no blank lines.
+    text = _STATEMENT_RUN.sub(
+        lambda match: "\n" + match.group(1)
+        if all(is_statement(index) for index in _PLACEHOLDER.findall(match.group(1))) else match.group(0),
+        text,
+    )
+    return CompiledTemplate(html=restore(markup), text=restore(text) + "\n")
+
+
+def text_name(template_name: str) -> str:
+    return str(Path(template_name).with_suffix(".txt"))
+
+
+def _source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _read_manifest(build_dir: Optional[Path]) -> dict:
+    if build_dir is None:
+        return {}
+    try:
+        manifest = json.loads((build_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("build_version") == BUILD_VERSION else {}
+
+
+def _sources(source_dir: Path) -> dict[str, str]:
+    return {
+        path.name: path.read_text(encoding="utf-8")
+        for path in sorted(source_dir.iterdir())
+        if path.is_file()
+    }
+
+
+def build_templates(source_dir: str | Path, build_dir: str | Path) -> list[TemplateSizes]:
+    """Writes the compiled HTML and plain text of every HTML template, plus a manifest of source hashes and sizes."""
+    source_dir, build_dir = Path(source_dir), Path(build_dir)
+    build_dir.mkdir(parents=True, exist_ok=True)
+    sources = _sources(source_dir)
+    report, entries = [], {}
+    for name, source in sources.items():
+        if not name.endswith(".html"):
+            continue
+        compiled = compile_template(source)
+        (build_dir / name).write_text(compiled.html, encoding="utf-8")
+        if text_name(name) not in sources:
+            (build_dir / text_name(name)).write_text(compiled.text, encoding="utf-8")
+        sizes = TemplateSizes(
+            name=name,
+            source_bytes=len(source.encode("utf-8")),
+            html_bytes=len(compiled.html.encode("utf-8")),
+            text_bytes=len(compiled.text.encode("utf-8")),
+        )
+        report.append(sizes)
+        entries[name] = {"source_sha256": _source_hash(source), **asdict(sizes)}
+
+    # Written last and atomically, so a build interrupted halfway leaves the previous manifest in charge.
+    manifest_path = build_dir / MANIFEST_NAME
+    temporary = manifest_path.with_suffix(".tmp")
+    temporary.write_text(json.dumps({"build_version": BUILD_VERSION, "templates": entries}, indent=2), encoding="utf-8")
+    os.replace(temporary, manifest_path)
+    return report
+
+
+def load_templates(source_dir: str | Path, build_dir: Optional[str | Path] = None) -> dict[str, str]:
+    """
+    Returns the template sources to serve by name: the compiled HTML of every
+    HTML template and its generated plain text (unless a hand-written .txt
+    exists), plus any other file as is. Artifacts in `build_dir` are used when
+    the manifest says they were built from the current source; anything else
+    is compiled in memory.
+    """
+    source_dir = Path(source_dir)
+    build_dir = Path(build_dir) if build_dir else None
+    entries = _read_manifest(build_dir).get("templates", {})
+    sources = _sources(source_dir)
+    templates = {name: source for name, source in sources.items() if not name.endswith(".html")}
+    loaded, stale = 0, []
+    for name, source in sources.items():
+        if not name.endswith(".html"):
+            continue
+        compiled = None
+        if build_dir is not None and entries.get(name, {}).get("source_sha256") == _source_hash(source):
+            try:
+                text_path = build_dir / text_name(name)
+                compiled = CompiledTemplate(
+                    html=(build_dir / name).read_text(encoding="utf-8"),
+                    text=text_path.read_text(encoding="utf-8") if text_name(name) not in sources else "",
+                )
+                loaded += 1
+            except OSError:
+                compiled = None
+        if compiled is None:
+            compiled = compile_template(source)
+            stale.append(name)
+        templates[name] = compiled.html
+        templates.setdefault(text_name(name), compiled.text)
+
+    if build_dir is not None and stale:
+        logger.warning(
+            "Compiled template artifacts missing or stale; compiling in memory",
+            event_type="TEMPLATE_ARTIFACTS_STALE",
+            trigger_type="system_scheduled",
+            event_details={"build_dir": str(build_dir), "templates": stale},
+        )
+    logger.debug(
+        "Email templates loaded",
+        event_type="TEMPLATES_LOADED",
+        trigger_type="system_scheduled",
+        event_details={"templates": len(templates), "from_artifacts": loaded, "compiled": len(stale)},
+    )
+    return templates
+
+
+class CompiledTemplateLoader(BaseLoader):
+    """Jinja loader serving `load_templates`; the sources are read once, on first use."""
+
+    def __init__(self, source_dir: str | Path, build_dir: Optional[str | Path] = None):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self._templates: Optional[dict[str, str]] = None
+
+    def _load(self) -> dict[str, str]:
+        if self._templates is None:
+            self._templates = load_templates(self.source_dir, self.build_dir)
+        return self._templates
+
+    def get_source(self, environment: Environment, template: str) -> tuple[str, None, Callable[[], bool]]:
+        templates = self._load()
+        if template not in templates:
+            raise TemplateNotFound(template)
+        return templates[template], None, lambda: True
+
+    def list_templates(self) -> list[str]:
+        return sorted(self._load())
+
+
+def format_report(report: list[TemplateSizes]) -> str:
+    """Bytes per template before and after the build, plus the size of the generated plain text."""
+    if report:
+        report = [*report, TemplateSizes(
+            name="total",
+            source_bytes=sum(sizes.source_bytes for sizes in report),
+            html_bytes=sum(sizes.html_bytes for sizes in report),
+            text_bytes=sum(sizes.text_bytes for sizes in report),
+        )]
+    lines = [f"{'template':<36} {'original':>9} {'html':>9} {'redução':>8} {'texto':>9}"]
+    lines.extend(
+        f"{sizes.name:<36} {sizes.source_bytes:>9} {sizes.html_bytes:>9} "
+        f"{sizes.saved_percent:>7.1f}% {sizes.text_bytes:>9}"
+        for sizes in report
+    )
+    return "\n".join(lines)
+
+
+def _parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m notification_service.template_build",
+        description="Compila os templates de e-mail (HTML minificado e versão em texto) e mostra o tamanho antes e depois.",
+    )
+    parser.add_argument("--source", default=str(SOURCE_DIR), help="Diretório dos templates originais.")
+    parser.add_argument("--output", default=DEFAULT_BUILD_DIR, help="Diretório dos artefatos compilados.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None):
+    args = _parse_args(argv)
+    print(format_report(build_templates(args.source, args.output)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 import redis.asyncio as redis
 import structlog
 from config import settings
@@ -6,18 +7,23 @@ redis_pool: redis.Redis | None = None
 logger = structlog.get_logger(__name__)
 
 async def init_redis_pool():
+    """Creates the shared client; connections are opened by `warm_redis_pool` or on first use."""
     global redis_pool
     redis_pool = redis.from_url(
         settings.REDIS_URL, 
         encoding="utf-8", 
         decode_responses=True
     )
-    await redis_pool.ping()
+
+async def warm_redis_pool(connections: int = 1):
+    """Pings over `connections` concurrent connections so they are already open in the pool."""
+    await asyncio.gather(*(redis_pool.ping() for _ in range(connections)))
     logger.debug(
         "Redis connection pool initialized successfully",
         event_type="REDIS_POOL_INITIALIZED",
         trigger_type="system_scheduled",
         redis_url=settings.REDIS_URL,
+        event_details={"warm_connections": connections},
     )
 
 async def close_redis_pool():
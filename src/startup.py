@@ -0,0 +1,112 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+from config import settings
+from metrics import STARTUP_DEPENDENCY_SECONDS
+
+logger = structlog.get_logger(__name__)
+
+WarmUpOperation = Callable[[Optional[float]], Awaitable[None]]
+
+
+class StartupError(Exception):
+    """Raised when a critical dependency is not ready before the startup deadline."""
+    pass
+
+
+def backoff_delay(attempt: int, initial_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with equal jitter: half the capped delay plus a random share of the other half."""
+    delay = min(max_seconds, initial_seconds * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def retry_with_backoff(
+    operation: Callable[[], Awaitable],
+    *,
+    name: str,
+    deadline: Optional[float] = None,
+    initial_seconds: Optional[float] = None,
+    max_seconds: Optional[float] = None,
+):
+    """
+    Awaits `operation` until it succeeds, sleeping with exponential backoff and
+    jitter between attempts. With a `deadline` (a time.monotonic() value), the
+    last error is raised once the next attempt would start after it.
+    """
+    initial_seconds = initial_seconds or settings.STARTUP_BACKOFF_INITIAL_SECONDS
+    max_seconds = max_seconds or settings.STARTUP_BACKOFF_MAX_SECONDS
+    attempt = 0
+    while True:
+        try:
+            return await operation()
+        except Exception as e:
+            delay = backoff_delay(attempt, initial_seconds, max_seconds)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise
+            logger.warning(
+                f"Failed to connect to {name}. Retrying...",
+                event_type=f"{name.upper()}_CONNECTION_FAILED",
+                trigger_type="system_scheduled",
+                error=f"{type(e).__name__}: {e}",
+                retry_in_seconds=round(delay, 3),
+                event_details={"attempt": attempt + 1},
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def warm_up(steps: dict[str, tuple[WarmUpOperation, bool]], deadline_seconds: float):
+    """
+    Runs the warm-up steps concurrently against a shared deadline.
+
+    `steps` maps a dependency name to (operation, critical); each operation gets
+    the deadline and handles its own retries, and is cancelled if it is still
+    running when the deadline passes. Non-critical failures are logged and
+    startup continues; a critical failure raises StartupError once every step
+    has finished.
+    """
+    deadline = time.monotonic() + deadline_seconds
+
+    async def run_step(name: str, operation: WarmUpOperation) -> float:
+        started = time.monotonic()
+        await asyncio.wait_for(operation(deadline), timeout=max(deadline - started, 0))
+        elapsed = time.monotonic() - started
+        STARTUP_DEPENDENCY_SECONDS.labels(dependency=name).set(elapsed)
+        return elapsed
+
+    results = await asyncio.gather(
+        *(run_step(name, operation) for name, (operation, _) in steps.items()),
+        return_exceptions=True,
+    )
+
+    failed_critical = []
+    timings = {}
+    for (name, (_, critical)), result in zip(steps.items(), results):
+        if not isinstance(result, BaseException):
+            timings[name] = round(result * 1000, 1)
+            continue
+        if isinstance(result, asyncio.CancelledError):
+            raise result
+        logger.error(
+            f"Warm-up of {name} failed",
+            event_type=f"STARTUP_{name.upper()}_FAILED",
+            trigger_type="system_scheduled",
+            error=f"{type(result).__name__}: {result}",
+            event_details={"critical": critical},
+            exc_info=result,
+        )
+        if critical:
+            failed_critical.append(name)
+
+    logger.debug(
+        "Dependency warm-up finished",
+        event_type="STARTUP_WARM_UP_FINISHED",
+        trigger_type="system_scheduled",
+        event_details={"timings_ms": timings},
+    )
+    if failed_critical:
+        raise StartupError(f"Dependencies not ready within {deadline_seconds}s: {', '.join(failed_critical)}")
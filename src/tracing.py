@@ -0,0 +1,385 @@
+import asyncio
+import functools
+import json
+import re
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Iterator, NamedTuple, Optional
+
+import httpx
+import structlog
+
+from config import settings
+from metrics import TRACING_SPANS_DROPPED, TRACING_SPANS_EXPORTED
+
+logger = structlog.get_logger(__name__)
+
+TRACEPARENT = "traceparent"
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+PRODUCER = 4
+CONSUMER = 5
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+def parse_traceparent(value: Any) -> Optional[SpanContext]:
+    """Parses a W3C `traceparent` header; None if it is missing or malformed."""
+    if isinstance(value, bytes):
+        value = value.decode(errors="replace")
+    match = _TRACEPARENT.match(value.strip().lower()) if isinstance(value, str) else None
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_attribute_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: dict) -> list[dict]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items()]
+
+
+class Span:
+    """One timed stage of processing. Only sampled spans are exported."""
+
+    def __init__(
+        self,
+        name: str,
+        context: SpanContext,
+        parent_span_id: Optional[str] = None,
+        kind: int = INTERNAL,
+        attributes: Optional[dict] = None,
+    ):
+        self.name = name
+        self.context = context
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_OK
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status_code = STATUS_ERROR
+        self.status_message = str(error)
+        self.attributes["exception.type"] = type(error).__name__
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _attributes(self.attributes),
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class FileSpanExporter:
+    """Appends finished spans to a local file, one OTLP JSON span per line."""
+
+    def __init__(self, path: str, service_name: str):
+        self.path = Path(path)
+        self.service_name = service_name
+
+    def _append(self, lines: bytes):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(lines)
+
+    async def export(self, spans: list[Span]):
+        lines = b"".join(
+            json.dumps({"service.name": self.service_name, **span.to_otlp()}).encode() + b"\n" for span in spans)
+        await asyncio.to_thread(self._append, lines)
+
+    async def close(self):
+        pass
+
+
+class OTLPHttpSpanExporter:
+    """Posts finished spans to an OTLP/HTTP collector endpoint using the JSON encoding."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str,
+        timeout_seconds: float = 5.0,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.client = client or httpx.AsyncClient(timeout=timeout_seconds)
+
+    async def export(self, spans: list[Span]):
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": self.service_name},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        response = await self.client.post(self.endpoint, json=body)
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Tracer:
+    """
+    Creates spans and exports the sampled ones in the background.
+
+    A span continues the trace of its parent: the span that is current in the
+    running task, or the context extracted from a message's `traceparent`
+    header. Root spans are sampled by trace id with probability
+    `sample_ratio`; child spans follow the decision carried by their trace, so
+    a notification is traced across every retry or not at all. Without an
+    exporter nothing is recorded, but incoming trace contexts are still passed
+    on to republished messages.
+
+    Finished spans are buffered and exported in batches; `start_span` never
+    awaits. When the buffer is full new spans are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        exporter=None,
+        sample_ratio: float = 1.0,
+        export_interval_seconds: float = 2.0,
+        batch_size: int = 512,
+        max_queue_size: int = 10000,
+    ):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self.export_interval_seconds = export_interval_seconds
+        self.batch_size = batch_size
+        self._buffer: Deque[Span] = deque(maxlen=max_queue_size)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _sample_root(self, trace_id: str) -> bool:
+        if self.exporter is None:
+            return False
+        # The low 64 bits of a random trace id are uniform, so the same trace always gets the same decision.
+        return int(trace_id[16:], 16) < self.sample_ratio * 2 ** 64
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[SpanContext] = None,
+        kind: int = INTERNAL,
+        attributes: Optional[dict] = None,
+    ) -> Iterator[Span]:
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current else None
+        if parent:
+            context = SpanContext(parent.trace_id, secrets.token_hex(8), parent.sampled)
+        else:
+            trace_id = secrets.token_hex(16)
+            context = SpanContext(trace_id, secrets.token_hex(8), self._sample_root(trace_id))
+        span = Span(name, context, parent.span_id if parent else None, kind, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            if context.sampled and self.exporter is not None:
+                self._enqueue(span)
+
+    def _enqueue(self, span: Span):
+        if len(self._buffer) == self._buffer.maxlen:
+            TRACING_SPANS_DROPPED.inc()
+            return
+        self._buffer.append(span)
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await self.exporter.export(batch)
+            except (httpx.HTTPError, OSError):
+                # Tracing is best effort: a failed batch is dropped instead of piling up.
+                TRACING_SPANS_DROPPED.inc(len(batch))
+                raise
+            TRACING_SPANS_EXPORTED.inc(len(batch))
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.export_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except (httpx.HTTPError, OSError) as e:
+                logger.warning(
+                    "Failed to export trace spans",
+                    event_type="TRACING_EXPORT_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"buffered": len(self._buffer)},
+                )
+
+    def start(self):
+        if self._task is None and self.exporter is not None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.exporter is None:
+            return
+        try:
+            await self.flush()
+        except (httpx.HTTPError, OSError) as e:
+            logger.warning(
+                "Failed to export trace spans on shutdown",
+                event_type="TRACING_EXPORT_FAILED",
+                trigger_type="system_scheduled",
+                error=str(e),
+            )
+        await self.exporter.close()
+
+
+# Non-recording until init_tracing(), so instrumented code never has to check.
+tracer: Tracer = Tracer()
+
+
+def build_exporter():
+    if settings.TRACING_EXPORTER == "otlp":
+        return OTLPHttpSpanExporter(
+            settings.TRACING_OTLP_ENDPOINT,
+            settings.SERVICE_NAME,
+            timeout_seconds=settings.TRACING_EXPORT_TIMEOUT_SECONDS,
+        )
+    return FileSpanExporter(settings.TRACING_FILE_PATH, settings.SERVICE_NAME)
+
+
+def init_tracing() -> Tracer:
+    global tracer
+    if settings.TRACING_ENABLED:
+        tracer = Tracer(
+            build_exporter(),
+            sample_ratio=settings.TRACING_SAMPLE_RATIO,
+            export_interval_seconds=settings.TRACING_EXPORT_INTERVAL_SECONDS,
+            batch_size=settings.TRACING_EXPORT_BATCH_SIZE,
+            max_queue_size=settings.TRACING_MAX_QUEUE_SIZE,
+        )
+        tracer.start()
+    return tracer
+
+
+async def close_tracing():
+    global tracer
+    await tracer.stop()
+    tracer = Tracer()
+
+
+def start_span(name: str, **kwargs) -> Iterator[Span]:
+    """Starts a span on the process-wide tracer, as a context manager."""
+    return tracer.start_span(name, **kwargs)
+
+
+def traced(name: str, kind: int = INTERNAL):
+    """Runs the decorated coroutine function inside a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with start_span(name, kind=kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_span_attributes(attributes: dict):
+    span = _current_span.get()
+    if span is not None:
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+
+
+def inject(headers: dict) -> dict:
+    """Writes the current span's context into message or request headers."""
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT] = format_traceparent(span.context)
+    return headers
+
+
+def extract(headers: Optional[dict]) -> Optional[SpanContext]:
+    return parse_traceparent((headers or {}).get(TRACEPARENT))
+
+
+def trace_log_fields() -> dict:
+    """trace_id/span_id to bind to log records, so logs and traces can be joined."""
+    span = _current_span.get()
+    if span is None:
+        return {}
+    return {"trace_id": span.context.trace_id, "span_id": span.context.span_id}
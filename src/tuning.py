@@ -0,0 +1,326 @@
+import asyncio
+import inspect
+import json
+import os
+import socket
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import structlog
+from pydantic import TypeAdapter, ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from config import Settings, settings
+from metrics import RUNTIME_SETTING_CHANGES
+
+logger = structlog.get_logger(__name__)
+
+OVERRIDES_KEY = "tuning:overrides"
+AUDIT_KEY = "tuning:audit"
+
+# Settings that may change without a restart, with the accepted range.
+TUNABLE_SETTINGS: dict[str, tuple[float, float]] = {
+    "RABBITMQ_MAX_RETRIES": (0, 100),
+    "RABBITMQ_RETRY_DELAY_MS": (100, 86400000),
+    "RABBITMQ_PREFETCH_COUNT": (1, 65535),
+    "CONCURRENCY_MIN_LIMIT": (1, 10000),
+    "CONCURRENCY_MAX_LIMIT": (1, 10000),
+    "CONCURRENCY_LATENCY_TARGET_MS": (1, 600000),
+    "CONCURRENCY_BACKOFF_RATIO": (0.1, 0.99),
+    "MAIL_LOCAL_RETRY_ATTEMPTS": (0, 10),
+    "SMTP_MAX_RETRY_DELAY_MS": (0, 86400000),
+    "WEBHOOK_RETRY_ATTEMPTS": (0, 10),
+    "BULK_CHUNK_SIZE": (1, 100000),
+    "BULK_RECIPIENT_CONCURRENCY": (1, 1000),
+    "BULK_MAX_CHUNKS_PER_DELIVERY": (1, 10000),
+    "TRACING_SAMPLE_RATIO": (0.0, 1.0),
+}
+
+Applier = Callable[[Any], Union[None, Awaitable[None]]]
+
+
+class TuningError(ValueError):
+    """A requested change names an unknown setting or a value out of range."""
+
+
+class RuntimeTuner:
+    """
+    Changes allowlisted settings on the running process.
+
+    A change is validated as a whole, written to `settings`, and handed to the
+    appliers registered for each setting, which push it into objects that
+    copied the value when they were built (the consumer's QoS, the limiter's
+    bounds). Settings read on every use need no applier.
+
+    Changes are kept in a Redis hash, so pods that start later apply them too,
+    audited in a capped Redis list and published on `channel`; every pod
+    subscribed to it applies the change live. A value of None resets the
+    setting to the value the process started with. An applier raises to refuse
+    a change its component cannot take; the change is then reverted.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        channel: str = "tuning:changes",
+        audit_max_entries: int = 1000,
+        sync_enabled: bool = True,
+        instance_id: Optional[str] = None,
+    ):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.audit_max_entries = audit_max_entries
+        self.sync_enabled = sync_enabled
+        self.instance_id = instance_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._defaults = {name: getattr(settings, name) for name in TUNABLE_SETTINGS}
+        self._appliers: dict[str, list[Applier]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def on(self, name: str, applier: Applier):
+        """Registers a callback (sync or async) that receives the new value of `name`."""
+        if name not in TUNABLE_SETTINGS:
+            raise TuningError(f"{name} is not a tunable setting.")
+        self._appliers.setdefault(name, []).append(applier)
+
+    def current(self) -> dict:
+        return {
+            name: {
+                "value": getattr(settings, name),
+                "default": self._defaults[name],
+                "min": low,
+                "max": high,
+            }
+            for name, (low, high) in TUNABLE_SETTINGS.items()
+        }
+
+    def validate(self, changes: dict[str, Any]) -> dict[str, Any]:
+        """Coerces every value to its setting's type; None becomes the startup value."""
+        validated = {}
+        for name, value in changes.items():
+            if name not in TUNABLE_SETTINGS:
+                raise TuningError(f"{name} is not a tunable setting.")
+            if value is None:
+                validated[name] = self._defaults[name]
+                continue
+            try:
+                value = TypeAdapter(Settings.model_fields[name].annotation).validate_python(value)
+            except ValidationError as e:
+                raise TuningError(f"Invalid value for {name}: {e.errors()[0]['msg']}.") from e
+            low, high = TUNABLE_SETTINGS[name]
+            if not low <= value <= high:
+                raise TuningError(f"{name} must be between {low} and {high}.")
+            validated[name] = value
+
+        def resulting(name):
+            return validated.get(name, getattr(settings, name))
+        if resulting("CONCURRENCY_MIN_LIMIT") > resulting("CONCURRENCY_MAX_LIMIT"):
+            raise TuningError("CONCURRENCY_MIN_LIMIT must not exceed CONCURRENCY_MAX_LIMIT.")
+        if ("RABBITMQ_PREFETCH_COUNT" in validated and settings.ADAPTIVE_CONCURRENCY_ENABLED
+                and settings.INGESTION_BACKEND == "rabbitmq"):
+            raise TuningError("RABBITMQ_PREFETCH_COUNT has no effect while adaptive concurrency drives the prefetch.")
+        return validated
+
+    @staticmethod
+    async def _run(applier: Applier, value: Any):
+        result = applier(value)
+        if inspect.isawaitable(result):
+            await result
+
+    async def _apply(self, values: dict[str, Any], actor: str, source: str) -> dict[str, dict]:
+        """
+        Writes the values that differ from the current ones and runs their
+        appliers. A change that an applier fails to take is reverted, so it is
+        neither reported as applied nor audited.
+        """
+        applied = {}
+        async with self._lock:
+            for name, value in values.items():
+                old = getattr(settings, name)
+                if old == value:
+                    continue
+                setattr(settings, name, value)
+                applied[name] = {"old": old, "new": value}
+            for name, change in list(applied.items()):
+                taken = []
+                for applier in self._appliers.get(name, []):
+                    try:
+                        await self._run(applier, change["new"])
+                    except Exception as e:
+                        logger.error(
+                            "Failed to apply runtime setting; change reverted",
+                            event_type="RUNTIME_SETTING_APPLY_FAILED",
+                            trigger_type="system_scheduled",
+                            error=str(e),
+                            event_details={"setting": name, "value": change["new"], "kept": change["old"]},
+                        )
+                        break
+                    taken.append(applier)
+                else:
+                    continue
+                setattr(settings, name, change["old"])
+                del applied[name]
+                for applier in taken:
+                    try:
+                        await self._run(applier, change["old"])
+                    except Exception as e:
+                        logger.error(
+                            "Failed to restore runtime setting",
+                            event_type="RUNTIME_SETTING_APPLY_FAILED",
+                            trigger_type="system_scheduled",
+                            error=str(e),
+                            event_details={"setting": name, "value": change["old"]},
+                        )
+        for name, change in applied.items():
+            RUNTIME_SETTING_CHANGES.labels(setting=name, source=source).inc()
+            logger.warning(
+                "Runtime setting changed",
+                event_type="RUNTIME_SETTING_CHANGED",
+                trigger_type="user_action" if source == "api" else "system_scheduled",
+                event_details={"setting": name, **change, "actor": actor, "source": source},
+            )
+        return applied
+
+    async def update(self, changes: dict[str, Any], actor: str) -> dict:
+        """
+        Applies `changes` here, then persists, audits and publishes them. A
+        Redis failure leaves the change applied on this pod only, reported as
+        `synced: false`.
+        """
+        values = self.validate(changes)
+        applied = await self._apply(values, actor, source="api")
+        if not applied:
+            return {"applied": {}, "synced": True}
+
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "actor": actor,
+            "instance": self.instance_id,
+            "changes": applied,
+        }
+        resets = [name for name in applied if changes.get(name) is None]
+        overrides = {name: json.dumps(change["new"]) for name, change in applied.items() if name not in resets}
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                if overrides:
+                    pipe.hset(OVERRIDES_KEY, mapping=overrides)
+                if resets:
+                    pipe.hdel(OVERRIDES_KEY, *resets)
+                pipe.lpush(AUDIT_KEY, json.dumps(entry))
+                pipe.ltrim(AUDIT_KEY, 0, self.audit_max_entries - 1)
+                await pipe.execute()
+            if self.sync_enabled:
+                await self.redis_client.publish(self.channel, json.dumps({
+                    "origin": self.instance_id,
+                    "actor": actor,
+                    "values": {name: change["new"] for name, change in applied.items()},
+                }))
+        except RedisError as e:
+            logger.error(
+                "Failed to persist runtime setting change",
+                event_type="RUNTIME_SETTING_SYNC_FAILED",
+                trigger_type="user_action",
+                error=str(e),
+                event_details={"settings": sorted(applied)},
+            )
+            return {"applied": applied, "synced": False}
+        return {"applied": applied, "synced": True}
+
+    async def audit_log(self, limit: int = 100) -> list[dict]:
+        """Most recent changes first."""
+        return [json.loads(entry) for entry in await self.redis_client.lrange(AUDIT_KEY, 0, limit - 1)]
+
+    async def load_overrides(self) -> dict[str, dict]:
+        """Applies the overrides kept in Redis; entries that no longer validate are skipped."""
+        stored = await self.redis_client.hgetall(OVERRIDES_KEY)
+        values = {}
+        for name, raw in stored.items():
+            try:
+                values.update(self.validate({name: json.loads(raw)}))
+            except (TuningError, ValueError) as e:
+                logger.warning(
+                    "Ignoring stored runtime setting",
+                    event_type="RUNTIME_SETTING_IGNORED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"setting": name},
+                )
+        return await self._apply(values, actor="overrides", source="startup")
+
+    async def handle_message(self, data: str):
+        """Applies a change published by another pod."""
+        try:
+            message = json.loads(data)
+            if message.get("origin") == self.instance_id:
+                return
+            values = self.validate(message["values"])
+        except (TuningError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(
+                "Ignoring malformed runtime setting message",
+                event_type="RUNTIME_SETTING_IGNORED",
+                trigger_type="system_scheduled",
+                error=str(e),
+            )
+            return
+        await self._apply(values, actor=message.get("actor", "unknown"), source="sync")
+
+    async def _listen(self):
+        delay = 1.0
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Changes published while this pod was not subscribed are only in the hash.
+                await self.load_overrides()
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self.handle_message(message["data"])
+            except RedisError as e:
+                logger.warning(
+                    "Runtime settings subscription lost",
+                    event_type="RUNTIME_SETTING_SYNC_FAILED",
+                    trigger_type="system_scheduled",
+                    error=str(e),
+                    event_details={"retry_in_seconds": delay},
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                await pubsub.aclose()
+
+    def start(self):
+        if self._task is None and self.sync_enabled:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+tuner: RuntimeTuner | None = None
+
+
+def init_tuner(redis_client: Redis) -> RuntimeTuner:
+    global tuner
+    tuner = RuntimeTuner(
+        redis_client,
+        channel=settings.TUNING_CHANNEL,
+        audit_max_entries=settings.TUNING_AUDIT_MAX_ENTRIES,
+        sync_enabled=settings.TUNING_SYNC_ENABLED,
+    )
+    return tuner
+
+
+async def close_tuner():
+    if tuner:
+        await tuner.stop()
+
+
+async def get_tuner() -> RuntimeTuner:
+    if tuner is None:
+        raise RuntimeError("Runtime tuner not initialized.")
+    return tuner
@@ -0,0 +1,83 @@
+"""
+Headless consumer worker: runs only the consumer of the configured ingestion
+backend (RabbitMQ or Redis Streams), its handler and a Prometheus exporter,
+without the FastAPI app.
+
+    cd src && python -m worker
+"""
+import time
+
+_import_started_at = time.perf_counter()
+
+import asyncio
+import signal
+import sys
+
+import structlog
+
+from config import settings
+from logging_config import setup_logging
+from metrics import STARTUP_IMPORT_SECONDS, STARTUP_TIME_TO_READY
+
+logger = structlog.get_logger(__name__)
+
+
+async def run_worker() -> int:
+    startup_started_at = time.perf_counter()
+
+    # Heavy modules (aio-pika, redis, fastapi-mail) are only imported once the
+    # worker actually starts, so that part of startup is measured on its own.
+    from prometheus_client import start_http_server
+    from bootstrap import start_consumer_runtime, stop_consumer_runtime
+
+    import_seconds = time.perf_counter() - _import_started_at
+    STARTUP_IMPORT_SECONDS.set(import_seconds)
+
+    start_http_server(settings.WORKER_METRICS_PORT)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    runtime = await start_consumer_runtime()
+    time_to_ready = time.perf_counter() - startup_started_at
+    STARTUP_TIME_TO_READY.set(time_to_ready)
+    logger.info(
+        "Worker ready",
+        event_type="WORKER_READY",
+        trigger_type="system_scheduled",
+        event_details={
+            "import_seconds": round(import_seconds, 3),
+            "time_to_ready_seconds": round(time_to_ready, 3),
+            "metrics_port": settings.WORKER_METRICS_PORT,
+        },
+    )
+
+    stop_waiter = asyncio.create_task(stop_event.wait())
+    await asyncio.wait({stop_waiter, runtime.consumer_task}, return_when=asyncio.FIRST_COMPLETED)
+    stop_waiter.cancel()
+
+    exit_code = 0
+    if runtime.consumer_task.done() and not stop_event.is_set():
+        logger.error(
+            "Consumer task stopped unexpectedly",
+            event_type="WORKER_CONSUMER_STOPPED",
+            trigger_type="system_scheduled",
+        )
+        exit_code = 1
+
+    logger.info("Worker shutdown initiated", event_type="WORKER_SHUTDOWN_START", trigger_type="system_scheduled")
+    await stop_consumer_runtime(runtime)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.remove_signal_handler(sig)
+    return exit_code
+
+
+def main():
+    setup_logging(log_level="DEBUG" if settings.DEBUG else "INFO")
+    sys.exit(asyncio.run(run_worker()))
+
+
+if __name__ == "__main__":
+    main()
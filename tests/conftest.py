@@ -1,4 +1,8 @@
 import pytest
+import asyncio
+import itertools
+import json
+import time
 from unittest.mock import MagicMock, AsyncMock
 from uuid import uuid4
 from datetime import datetime, UTC
@@ -25,6 +29,213 @@ def mock_redis_client():
     return mock_client
 
 
+def _stream_id_key(entry_id: str) -> tuple[int, int]:
+    ms, seq = entry_id.split("-")
+    return int(ms), int(seq)
+
+
+class FakeRedisPipeline:
+    """Queues commands and runs them, in order, against the FakeRedis on execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error=True):
+        self.redis.executions += 1
+        commands, self.commands = self.commands, []
+        return [await command(*args, **kwargs) for command, args, kwargs in commands]
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the Redis commands the service uses (hashes, sets,
+    sorted sets, lists, streams with consumer groups, pub/sub publish and the
+    retry-mover script), with decode_responses=True semantics for values.
+    """
+
+    def __init__(self):
+        self.hashes: dict[str, dict] = {}
+        self.sets: dict[str, set] = {}
+        self.zsets: dict[str, dict] = {}
+        self.lists: dict[str, list] = {}
+        self.streams: dict[str, list[tuple[str, dict]]] = {}
+        self.groups: dict[tuple[str, str], dict] = {}
+        self.expirations: dict[str, int] = {}
+        self.published: list[tuple[str, str]] = []
+        self.executions = 0
+        self._sequence = itertools.count()
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+    async def ping(self):
+        return True
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    async def expire(self, key, seconds):
+        self.expirations[key] = seconds
+
+    async def expireat(self, key, when):
+        self.expirations[key] = when
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        values = self.hashes.setdefault(key, {})
+        items = {**({field: value} if field is not None else {}), **(mapping or {})}
+        added = sum(name not in values for name in items)
+        values.update({name: str(item) for name, item in items.items()})
+        return added
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hdel(self, key, *fields):
+        return sum(self.hashes.get(key, {}).pop(field, None) is not None for field in fields)
+
+    async def hexists(self, key, field):
+        return field in self.hashes.get(key, {})
+
+    async def hincrby(self, key, field, amount=1):
+        values = self.hashes.setdefault(key, {})
+        values[field] = str(int(values.get(field, 0)) + amount)
+        return int(values[field])
+
+    async def hscan(self, key, cursor=0, count=None):
+        return 0, dict(self.hashes.get(key, {}))
+
+    async def sadd(self, key, *members):
+        values = self.sets.setdefault(key, set())
+        added = sum(member not in values for member in members)
+        values.update(members)
+        return added
+
+    async def sismember(self, key, member):
+        return int(member in self.sets.get(key, set()))
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        removed = [member for member, score in zset.items() if float(low) <= score <= float(high)]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    async def zrevrange(self, key, start, end):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1], reverse=True)
+        return [member for member, _ in members[start:end + 1]]
+
+    async def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    async def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    async def lpush(self, key, *values):
+        for value in values:
+            self.lists.setdefault(key, []).insert(0, value)
+        return len(self.lists[key])
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        entry_id = f"{int(time.time() * 1000)}-{next(self._sequence)}"
+        self.streams.setdefault(key, []).append(
+            (entry_id, {k: v.decode() if isinstance(v, bytes) else str(v) for k, v in fields.items()}))
+        if maxlen is not None:
+            await self.xtrim(key, maxlen)
+        return entry_id
+
+    async def xtrim(self, key, maxlen, approximate=True):
+        entries = self.streams.get(key, [])
+        trimmed = max(len(entries) - maxlen, 0)
+        self.streams[key] = entries[trimmed:]
+        return trimmed
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        entries = [entry for entry in self.streams.get(key, [])
+                   if min == "-" or _stream_id_key(entry[0]) >= _stream_id_key(min)]
+        return entries[:count]
+
+    async def xrevrange(self, key, max="+", min="-", count=None):
+        return list(reversed(self.streams.get(key, [])))[:count]
+
+    async def xgroup_create(self, key, group, id="$", mkstream=False):
+        self.streams.setdefault(key, [])
+        self.groups.setdefault((key, group), {"delivered": 0, "pending": {}})
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        response = []
+        for key in streams:
+            state = self.groups[(key, group)]
+            entries = self.streams[key][state["delivered"]:state["delivered"] + count]
+            state["delivered"] += len(entries)
+            for entry_id, _ in entries:
+                state["pending"][entry_id] = [consumer, time.monotonic()]
+            if entries:
+                response.append([key, entries])
+        if not response:
+            await asyncio.sleep(0.01)
+        return response
+
+    async def xack(self, key, group, *ids):
+        pending = self.groups[(key, group)]["pending"]
+        return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    async def xautoclaim(self, key, group, consumer, min_idle_time, start_id="0-0", count=100):
+        pending = self.groups[(key, group)]["pending"]
+        fields_by_id = dict(self.streams[key])
+        claimed = []
+        for entry_id, (_, delivered_at) in list(pending.items())[:count]:
+            if (time.monotonic() - delivered_at) * 1000 >= min_idle_time:
+                pending[entry_id] = [consumer, time.monotonic()]
+                claimed.append((entry_id, fields_by_id[entry_id]))
+        return ["0-0", claimed, []]
+
+    async def xinfo_groups(self, key):
+        return [{"name": group, "pending": len(state["pending"]), "lag": len(self.streams[key]) - state["delivered"]}
+                for (stream, group), state in self.groups.items() if stream == key]
+
+    def register_script(self, script):
+        # The only script is the stream backend's retry mover.
+        async def move_due(keys, args):
+            retry_key, stream = keys
+            due = [member for member, score in sorted(self.zsets.get(retry_key, {}).items(), key=lambda item: item[1])
+                   if score <= args[0]][:args[1]]
+            for member in due:
+                await self.xadd(stream, json.loads(member))
+                del self.zsets[retry_key][member]
+            return len(due)
+        return move_due
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    """An in-memory Redis for tests that exercise real command sequences and pipelines."""
+    return FakeRedis()
+
+
 @pytest.fixture
 def mock_email_service():
     """Mocks the EmailService."""
@@ -125,10 +336,15 @@ def aio_pika_message_factory():
         msg.headers = headers or {}
         msg.correlation_id = correlation_id or str(uuid4())
         msg.ack = AsyncMock()
+        msg.nack = AsyncMock()
+        msg.channel = MagicMock(is_closed=False)
 
         # Atribu that _republish_message precisa
         msg.content_type = "application/json"
         msg.delivery_mode = 2  # 2 = Persistent
+        msg.priority = None
+        msg.timestamp = None
+        msg.message_id = None
         msg.routing_key = "test.key"  # Add to log
 
         # Mock the 'x-death' header structure for retry count
@@ -0,0 +1,155 @@
+import pytest
+import json
+from unittest.mock import AsyncMock
+
+from notification_service.bulk import BulkEventExpander, get_bulk_progress
+from notification_service.exceptions import (
+    DeliveryContinuationRequired,
+    PermanentDeliveryError,
+    TransientProcessingError,
+)
+from notification_service.idempotency import IdempotencyStore
+from notification_service.service import EventHandler
+
+pytestmark = pytest.mark.asyncio
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    ttl_seconds = 60
+
+    def __init__(self):
+        self.processed = set()
+
+    async def is_processed(self, message_id):
+        return message_id in self.processed
+
+    async def mark_processed(self, message_id):
+        self.processed.add(message_id)
+
+
+def recipient_entry(n: int) -> str:
+    return json.dumps({"user_id": f"user-{n}", "email": f"user{n}@example.com", "name": f"User {n}"})
+
+
+@pytest.fixture
+def bulk_handler(fake_redis, mock_email_service) -> EventHandler:
+    handler = EventHandler(
+        redis_client=fake_redis,
+        email_service=mock_email_service,
+        idempotency_store=InMemoryIdempotencyStore(),
+    )
+    handler.bulk_expander = BulkEventExpander(fake_redis, handler.process_event, chunk_size=2)
+    return handler
+
+
+@pytest.fixture
+def bulk_event(event_data_factory) -> dict:
+    event_data = event_data_factory(recipients_ref="campaign:42")
+    del event_data["recipient"]
+    return event_data
+
+
+def sent_to(mock_email_service) -> list[str]:
+    return [call.kwargs["recipient"] for call in mock_email_service.send_email.await_args_list]
+
+
+class TestBulkExpansion:
+
+    async def test_ut053_bulk_envelope_resumes_from_checkpoint(
+        self, fake_redis, mock_email_service, bulk_handler, bulk_event
+    ):
+        """
+        Tests UT-053: Verifies that a transient failure fails the bulk message
+        once its chunk settles, and that the retry resumes at the unfinished
+        chunk without resending to anyone already delivered.
+        """
+        fake_redis.lists["campaign:42"] = [recipient_entry(n) for n in range(1, 6)]
+        transient_failures = ["user3@example.com"]
+
+        async def send_email(recipient, **_):
+            if recipient in transient_failures:
+                transient_failures.remove(recipient)
+                raise TransientProcessingError("Temporary failure")
+        mock_email_service.send_email = AsyncMock(side_effect=send_email)
+
+        with pytest.raises(TransientProcessingError):
+            await bulk_handler.process_event(bulk_event)
+        progress = await get_bulk_progress(fake_redis, bulk_event["message_id"])
+        assert (progress["state"], progress["next_index"], progress["delivered"]) == ("running", 2, 3)
+
+        assert await bulk_handler.process_event(bulk_event) is True
+        assert sent_to(mock_email_service) == [
+            "user1@example.com", "user2@example.com", "user3@example.com", "user4@example.com",
+            "user3@example.com", "user5@example.com"]
+        progress = await get_bulk_progress(fake_redis, bulk_event["message_id"])
+        assert (progress["state"], progress["total"], progress["delivered"]) == ("completed", 5, 5)
+
+    async def test_ut067_bulk_delivery_expands_a_bounded_number_of_chunks(
+        self, fake_redis, mock_email_service, bulk_handler, bulk_event
+    ):
+        """
+        Tests UT-067: Verifies that one delivery expands at most
+        max_chunks_per_delivery chunks and then asks for the envelope to be
+        requeued, and that each requeued delivery resumes at the checkpoint.
+        """
+        fake_redis.lists["campaign:42"] = [recipient_entry(n) for n in range(5)]
+        bulk_handler.bulk_expander.max_chunks_per_delivery = 2
+
+        with pytest.raises(DeliveryContinuationRequired):
+            await bulk_handler.process_event(bulk_event)
+        assert mock_email_service.send_email.await_count == 4
+        assert (await get_bulk_progress(fake_redis, bulk_event["message_id"]))["next_index"] == 4
+
+        assert await bulk_handler.process_event(bulk_event) is True
+        assert mock_email_service.send_email.await_count == 5
+        assert (await get_bulk_progress(fake_redis, bulk_event["message_id"]))["state"] == "completed"
+
+    async def test_ut070_permanent_failure_only_affects_its_recipient(
+        self, fake_redis, mock_email_service, bulk_handler, bulk_event
+    ):
+        """
+        Tests UT-070: Verifies that a permanent delivery failure is counted for
+        its recipient while the rest of the campaign is delivered.
+        """
+        fake_redis.lists["campaign:42"] = [recipient_entry(n) for n in range(1, 4)]
+
+        async def send_email(recipient, **_):
+            if recipient == "user2@example.com":
+                raise PermanentDeliveryError("Mailbox unavailable", 550)
+        mock_email_service.send_email = AsyncMock(side_effect=send_email)
+
+        assert await bulk_handler.process_event(bulk_event) is True
+
+        assert sent_to(mock_email_service) == ["user1@example.com", "user2@example.com", "user3@example.com"]
+        progress = await get_bulk_progress(fake_redis, bulk_event["message_id"])
+        assert (progress["state"], progress["delivered"], progress["failed"]) == ("completed", 2, 1)
+
+    async def test_ut071_invalid_entry_only_affects_its_recipient(
+        self, fake_redis, mock_email_service, bulk_handler, bulk_event
+    ):
+        """
+        Tests UT-071: Verifies that a recipients list entry that does not parse
+        is counted as invalid and skipped, while the others are delivered.
+        """
+        fake_redis.lists["campaign:42"] = [recipient_entry(1), "not json", recipient_entry(3)]
+
+        assert await bulk_handler.process_event(bulk_event) is True
+
+        assert sent_to(mock_email_service) == ["user1@example.com", "user3@example.com"]
+        progress = await get_bulk_progress(fake_redis, bulk_event["message_id"])
+        assert (progress["total"], progress["delivered"], progress["invalid"]) == (3, 2, 1)
+
+    async def test_ut072_completed_bulk_message_is_skipped(
+        self, fake_redis, mock_email_service, bulk_handler, bulk_event
+    ):
+        """
+        Tests UT-072: Verifies that a bulk message already processed to the end
+        is skipped without reading or sending to its recipients again.
+        """
+        fake_redis.lists["campaign:42"] = [recipient_entry(1)]
+        assert await bulk_handler.process_event(bulk_event) is True
+        mock_email_service.send_email.reset_mock()
+
+        assert await bulk_handler.process_event(bulk_event) is False
+
+        mock_email_service.send_email.assert_not_awaited()
@@ -0,0 +1,113 @@
+import pytest
+import asyncio
+import json
+
+import httpx
+
+from config import ChannelRoute
+from notification_service.channels import FileSinkChannel, NotificationChannel, WebhookChannel
+from notification_service.exceptions import TransientProcessingError
+from notification_service.idempotency import IdempotencyStore
+from notification_service.service import EventHandler
+
+pytestmark = pytest.mark.asyncio
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    ttl_seconds = 60
+
+    def __init__(self):
+        self.processed = set()
+
+    async def is_processed(self, message_id):
+        return message_id in self.processed
+
+    async def mark_processed(self, message_id):
+        self.processed.add(message_id)
+
+
+class RendezvousChannel(NotificationChannel):
+    """Finishes only once its peer has started, so it deadlocks if channels run one after another."""
+
+    def __init__(self, name, started: asyncio.Event, peer_started: asyncio.Event):
+        self.name = name
+        self.started = started
+        self.peer_started = peer_started
+
+    async def send(self, event, correlation_id=None):
+        self.started.set()
+        await asyncio.wait_for(self.peer_started.wait(), timeout=1)
+
+
+class TestChannels:
+
+    async def test_ut051_fan_out_retries_only_failed_required_channels(
+        self, mock_redis_client, mock_email_service, event_data_factory, tmp_path
+    ):
+        """
+        Tests UT-051: Verifies that an event is fanned out to every routed
+        channel, that a failed required channel fails the message while the
+        channels that succeeded are marked done, and that the retry only
+        repeats the failed channel; an optional channel failing does not.
+        """
+        responses = [httpx.Response(503), httpx.Response(200)]
+        requests = []
+
+        def webhook_handler(request):
+            requests.append(request)
+            return responses.pop(0)
+
+        webhook = WebhookChannel(
+            "http://hooks.test/notify",
+            secret="s3cret",
+            retry_attempts=0,
+            client=httpx.AsyncClient(transport=httpx.MockTransport(webhook_handler)),
+        )
+        sink_path = tmp_path / "events.ndjson"
+        handler = EventHandler(
+            redis_client=mock_redis_client,
+            email_service=mock_email_service,
+            idempotency_store=InMemoryIdempotencyStore(),
+            channels={"webhook": webhook, "file": FileSinkChannel(str(sink_path))},
+            routes={"INVOICE_DUE_SOON": ChannelRoute(
+                channels=["email", "webhook", "file"], required=["email", "webhook"])},
+        )
+        event_data = event_data_factory()
+
+        with pytest.raises(TransientProcessingError):
+            await handler.process_event(event_data, correlation_id="corr-1")
+        mock_email_service.send_email.assert_awaited_once()
+        assert len(sink_path.read_text().splitlines()) == 1
+
+        assert await handler.process_event(event_data, correlation_id="corr-1") is True
+        mock_email_service.send_email.assert_awaited_once()
+        assert len(sink_path.read_text().splitlines()) == 1
+        assert len(requests) == 2
+        delivered = json.loads(requests[-1].content)
+        assert delivered["message_id"] == event_data["message_id"]
+        assert requests[-1].headers["X-Correlation-ID"] == "corr-1"
+        assert "X-Signature-SHA256" in requests[-1].headers
+
+        assert await handler.process_event(event_data) is False
+        await webhook.close()
+
+    async def test_ut052_channels_are_delivered_concurrently(
+        self, mock_redis_client, mock_email_service, event_data_factory
+    ):
+        """
+        Tests UT-052: Verifies that routed channels run concurrently, so one
+        slow channel never waits for another to finish.
+        """
+        first_started, second_started = asyncio.Event(), asyncio.Event()
+        handler = EventHandler(
+            redis_client=mock_redis_client,
+            email_service=mock_email_service,
+            idempotency_store=InMemoryIdempotencyStore(),
+            channels={
+                "first": RendezvousChannel("first", first_started, second_started),
+                "second": RendezvousChannel("second", second_started, first_started),
+            },
+            routes={"INVOICE_DUE_SOON": ChannelRoute(channels=["first", "second"])},
+        )
+
+        assert await handler.process_event(event_data_factory()) is True
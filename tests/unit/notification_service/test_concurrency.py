@@ -0,0 +1,61 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+
+from notification_service import concurrency as concurrency_module
+from notification_service.concurrency import AIMDConcurrencyLimiter
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(concurrency_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestAIMDConcurrencyLimiter:
+
+    async def test_ut038_limit_grows_additively_and_shrinks_once_per_burst(self, clock):
+        """
+        Tests UT-038: Verifies that fast deliveries at saturation raise the limit
+        by one per window, and that a burst of slow or failed deliveries started
+        before the decrease shrinks it only once.
+        """
+        on_change = MagicMock()
+        limiter = AIMDConcurrencyLimiter(initial_limit=4, latency_target_seconds=1.0, on_change=on_change)
+
+        started = [await limiter.acquire() for _ in range(4)]
+        clock[0] += 0.1
+        for started_at in started:
+            await limiter.release(started_at)
+        assert limiter.limit == 5
+
+        burst = [await limiter.acquire() for _ in range(5)]
+        clock[0] += 5.0
+        await limiter.release(burst[0])
+        await limiter.release(burst[1], overloaded=True)
+        for started_at in burst[2:]:
+            await limiter.release(started_at, overloaded=True)
+
+        assert limiter.limit == 3
+        assert on_change.call_args_list[-1].args == (3,)
+        assert limiter.in_flight == 0
+
+    async def test_ut039_acquire_waits_for_a_free_slot(self, clock):
+        """
+        Tests UT-039: Verifies that deliveries beyond the limit wait until a slot
+        is released, and that unsampled releases (duplicates) do not move the limit.
+        """
+        limiter = AIMDConcurrencyLimiter(initial_limit=1)
+        started_at = await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        await limiter.release(started_at, sample=False)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 1
+        assert limiter.limit == 1
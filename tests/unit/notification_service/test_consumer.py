@@ -1,8 +1,19 @@
 import pytest
+import asyncio
 import json
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, AsyncMock
+from prometheus_client import REGISTRY
+import tracing
+from config import QueueShard
 from notification_service.consumer import RabbitMQConsumer, settings
-from notification_service.exceptions import EventTypeValidationError, SchemaValidationError, TransientProcessingError
+from notification_service.exceptions import (
+    DeliveryContinuationRequired,
+    EventTypeValidationError,
+    PermanentDeliveryError,
+    SchemaValidationError,
+    TransientProcessingError,
+)
 
 pytestmark = pytest.mark.asyncio
 
@@ -119,3 +130,285 @@ class TestRabbitMQConsumer:
         consumer_instance.dlx_exchange.publish.assert_called_once()
         consumer_instance.retry_exchange.publish.assert_not_called()
         message.ack.assert_called_once()
+        dead_lettered = consumer_instance.dlx_exchange.publish.call_args.args[0]
+        assert dead_lettered.headers["x-dlq-reason"] == "max_retries"
+        assert dead_lettered.headers["x-dlq-error"] == "TransientProcessingError: Mock transient error"
+        assert dead_lettered.headers["x-dlq-at"].endswith("+00:00")
+
+    async def test_ut017_scheduler_intake_dispatches_to_handler(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-017: Verifies that, with the scheduler enabled, deliveries are
+        queued by event type and processed by the scheduler workers.
+        """
+        monkeypatch.setattr(settings, "SCHEDULER_WORKERS", 1)
+        consumer_instance._start_scheduler()
+
+        event_data = event_data_factory(event_type="PROFILE_DELETION_SCHEDULED")
+        message = aio_pika_message_factory(
+            body=json.dumps(event_data).encode('utf-8'))
+
+        await consumer_instance._enqueue_message(message)
+        assert consumer_instance._scheduler.depths() == {"PROFILE_DELETION_SCHEDULED": 1}
+
+        for _ in range(10):
+            if message.ack.called:
+                break
+            await asyncio.sleep(0)
+        await consumer_instance._stop_scheduler()
+
+        consumer_instance.event_handler.process_event.assert_awaited_once()
+        message.ack.assert_called_once()
+
+    async def test_ut018_shard_queues_bound_by_event_type(self, consumer_instance, monkeypatch):
+        """
+        Tests UT-018: Verifies that sharding declares one queue per shard, with
+        its priority argument, bound to the main exchange by event type.
+        """
+        monkeypatch.setattr(settings, "RABBITMQ_QUEUE_SHARDS", {
+            "urgent": QueueShard(event_types=["PROFILE_DELETION_SCHEDULED"], max_priority=5),
+        })
+        consumer_instance.main_exchange = MagicMock(name="main_exchange")
+        shard_queue = MagicMock()
+        shard_queue.bind = AsyncMock()
+        consumer_instance._channel.declare_queue = AsyncMock(return_value=shard_queue)
+
+        await consumer_instance._setup_shard_queues()
+
+        declared = consumer_instance._channel.declare_queue.call_args_list
+        assert declared[0].args[0] == f"{settings.RABBITMQ_QUEUE_MAIN}.urgent"
+        assert declared[0].kwargs["arguments"] == {"x-max-priority": 5}
+        assert declared[1].kwargs["arguments"]["x-dead-letter-routing-key"] == "PROFILE_DELETION_SCHEDULED"
+        shard_queue.bind.assert_any_await(
+            consumer_instance.main_exchange, routing_key="PROFILE_DELETION_SCHEDULED")
+        assert consumer_instance._shard_queues == {"urgent": shard_queue}
+
+    async def test_ut019_shard_retry_uses_shard_routing_key(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory
+    ):
+        """
+        Tests UT-019: Verifies that transient errors on a shard queue are
+        republished with the shard's retry routing key.
+        """
+        consumer_instance.event_handler.process_event.side_effect = TransientProcessingError(
+            "Mock transient error")
+        message = aio_pika_message_factory(
+            body=json.dumps(event_data_factory()).encode('utf-8'))
+
+        await consumer_instance._on_message(
+            message, queue_name="test_queue.urgent", retry_routing_key="test.key.urgent")
+
+        consumer_instance.retry_exchange.publish.assert_called_once()
+        assert consumer_instance.retry_exchange.publish.call_args.kwargs["routing_key"] == "test.key.urgent"
+        message.ack.assert_called_once()
+
+    async def test_ut037_latency_histograms_split_queue_wait_by_path(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory
+    ):
+        """
+        Tests UT-037: Verifies that end-to-end latency is measured from the aware
+        event timestamp, labelled by attempt and retry path, and that a retried
+        message's queue wait starts when it was due back from the retry queue,
+        not at the first retry recorded in x-death.
+        """
+        now = datetime.now(timezone.utc)
+        event_data = event_data_factory(
+            event_type="STATEMENT_PROCESSING_COMPLETED",
+            timestamp=(now - timedelta(seconds=40)).isoformat(),
+        )
+        message = aio_pika_message_factory(
+            body=json.dumps(event_data).encode('utf-8'),
+            headers={
+                "x-death": [{"count": 2, "time": (now - timedelta(seconds=30)).replace(tzinfo=None)}],
+                "x-retry-due-at": (now - timedelta(seconds=3)).isoformat(),
+            },
+        )
+        labels = {"event_type": "STATEMENT_PROCESSING_COMPLETED", "attempt": "3", "path": "retry"}
+
+        await consumer_instance._on_message(message)
+
+        assert REGISTRY.get_sample_value("notification_delivery_latency_seconds_count", labels) == 1
+        assert 40 <= REGISTRY.get_sample_value("notification_delivery_latency_seconds_sum", labels) < 45
+        assert 3 <= REGISTRY.get_sample_value("notification_queue_wait_seconds_sum", labels) < 8
+        message.ack.assert_called_once()
+
+    async def test_ut040_transient_errors_shrink_adaptive_prefetch(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-040: Verifies that with adaptive concurrency a transient error
+        lowers the limit and the channel-wide prefetch follows it.
+        """
+        monkeypatch.setattr(settings, "ADAPTIVE_CONCURRENCY_ENABLED", True)
+        monkeypatch.setattr(settings, "CONCURRENCY_INITIAL_LIMIT", 10)
+        consumer = RabbitMQConsumer(event_handler=consumer_instance.event_handler)
+        consumer._channel = consumer_instance._channel
+        consumer._channel.is_closed = False
+        consumer._channel.set_qos = AsyncMock()
+        consumer.retry_exchange = consumer_instance.retry_exchange
+        consumer.main_queue = consumer_instance.main_queue
+        consumer.event_handler.process_event.side_effect = TransientProcessingError("smtp 421")
+        message = aio_pika_message_factory(body=json.dumps(event_data_factory()).encode('utf-8'))
+
+        await consumer._on_message(message)
+        await consumer._prefetch_task
+
+        assert consumer.concurrency_limiter.limit == 7
+        assert consumer.concurrency_limiter.in_flight == 0
+        consumer._channel.set_qos.assert_awaited_with(prefetch_count=14, global_=True)
+        consumer.retry_exchange.publish.assert_called_once()
+
+    async def test_ut048_smtp_outcomes_route_to_dlq_or_delayed_retry(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-048: Verifies that a permanent SMTP rejection goes straight to
+        the DLQ with its reason and code, that a short retry delay becomes the
+        message expiration, and that a delay longer than the retry queue TTL
+        keeps the message cycling through the retry queue without using retries.
+        """
+        monkeypatch.setattr(settings, "RABBITMQ_RETRY_DELAY_MS", 10000)
+        body = json.dumps(event_data_factory()).encode('utf-8')
+
+        consumer_instance.event_handler.process_event.side_effect = PermanentDeliveryError("User unknown", 550)
+        await consumer_instance._on_message(aio_pika_message_factory(body=body))
+        dead_lettered = consumer_instance.dlx_exchange.publish.call_args.args[0]
+        assert dead_lettered.headers["x-dlq-reason"] == "smtp_permanent"
+        assert dead_lettered.headers["x-dlq-smtp-code"] == 550
+        consumer_instance.retry_exchange.publish.assert_not_called()
+
+        consumer_instance.event_handler.process_event.side_effect = TransientProcessingError(
+            "rate limited", retry_after_seconds=2)
+        await consumer_instance._on_message(aio_pika_message_factory(body=body))
+        assert consumer_instance.retry_exchange.publish.call_args.args[0].expiration == 2
+
+        consumer_instance.event_handler.process_event.side_effect = TransientProcessingError(
+            "greylisted", retry_after_seconds=300)
+        await consumer_instance._on_message(aio_pika_message_factory(body=body))
+        scheduled = consumer_instance.retry_exchange.publish.call_args.args[0]
+        assert "x-retry-not-before" in scheduled.headers
+        assert scheduled.expiration is None
+        assert scheduled.headers["x-retry-due-at"] == scheduled.headers["x-retry-not-before"]
+
+        consumer_instance.event_handler.process_event.reset_mock()
+        waiting = aio_pika_message_factory(body=body, headers={
+            **scheduled.headers, "x-death": [{"count": 2}], "x-retry-deferrals": 1,
+        })
+        await consumer_instance._on_message(waiting)
+        consumer_instance.event_handler.process_event.assert_not_called()
+        deferred = consumer_instance.retry_exchange.publish.call_args.args[0]
+        assert deferred.headers["x-retry-deferrals"] == 2
+        due_in = datetime.fromisoformat(deferred.headers["x-retry-due-at"]) - datetime.now(timezone.utc)
+        assert 9 < due_in.total_seconds() <= 10
+        assert RabbitMQConsumer._retry_count(waiting) == 1
+        waiting.ack.assert_called_once()
+
+    async def test_ut054_trace_context_follows_the_message_across_retries(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-054: Verifies that the consume span continues the trace of the
+        incoming `traceparent`, that spans opened while handling the message
+        are its children, that the retry copy carries the consume span as
+        parent so the next attempt joins the same trace, and that unsampled
+        traces are propagated without being exported.
+        """
+        class ListExporter:
+            def __init__(self):
+                self.spans = []
+
+            async def export(self, spans):
+                self.spans.extend(spans)
+
+            async def close(self):
+                pass
+
+        exporter = ListExporter()
+        monkeypatch.setattr(tracing, "tracer", tracing.Tracer(exporter, sample_ratio=0.0))
+
+        async def failing_handler(event_data, correlation_id=None):
+            with tracing.start_span("notification.process_event"):
+                raise TransientProcessingError("Mock transient error")
+
+        consumer_instance.event_handler.process_event.side_effect = failing_handler
+        body = json.dumps(event_data_factory()).encode('utf-8')
+        trace_id, producer_span_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+        await consumer_instance._on_message(aio_pika_message_factory(
+            body=body, headers={"traceparent": f"00-{trace_id}-{producer_span_id}-01"}))
+        retried = consumer_instance.retry_exchange.publish.call_args.args[0]
+        await consumer_instance._on_message(aio_pika_message_factory(body=body, headers=retried.headers))
+        await tracing.tracer.flush()
+
+        consume_spans = [span for span in exporter.spans if span.name == "notification.consume"]
+        handler_spans = [span for span in exporter.spans if span.name == "notification.process_event"]
+        assert {span.context.trace_id for span in exporter.spans} == {trace_id}
+        assert consume_spans[0].parent_span_id == producer_span_id
+        assert consume_spans[1].parent_span_id == consume_spans[0].context.span_id
+        assert handler_spans[0].parent_span_id == consume_spans[0].context.span_id
+        assert consume_spans[0].attributes["notification.outcome"] == "retry_scheduled"
+        assert consume_spans[0].status_code == tracing.STATUS_ERROR
+
+        exporter.spans.clear()
+        await consumer_instance._on_message(aio_pika_message_factory(body=body))
+        await tracing.tracer.flush()
+        unsampled = tracing.parse_traceparent(consumer_instance.retry_exchange.publish.call_args.args[0].headers["traceparent"])
+        assert unsampled is not None and not unsampled.sampled
+        assert exporter.spans == []
+
+    async def test_ut061_backpressure_counts_every_consuming_channel(self, consumer_instance, monkeypatch):
+        """
+        Tests UT-061: Verifies that with sharding the readiness backpressure
+        threshold is the sum of the main and shard consumers' prefetch, and
+        that with adaptive concurrency each channel is capped by the limit.
+        """
+        monkeypatch.setattr(settings, "RABBITMQ_PREFETCH_COUNT", 50)
+        monkeypatch.setattr(settings, "RABBITMQ_QUEUE_SHARDS", {
+            "urgent": QueueShard(event_types=["PROFILE_DELETION_SCHEDULED"], prefetch_count=20, consumers=2),
+        })
+        consumer_instance._connection = MagicMock()
+        consumer_instance._connection.channel = AsyncMock(
+            side_effect=lambda: MagicMock(set_qos=AsyncMock(), get_queue=AsyncMock()))
+
+        await consumer_instance._consume_shards()
+
+        assert consumer_instance.prefetch_capacity() == 90
+        consumer_instance._in_flight = 60
+        assert not consumer_instance.is_backpressured()
+        consumer_instance._in_flight = 90
+        assert consumer_instance.is_backpressured()
+
+        consumer_instance.concurrency_limiter = MagicMock()
+        consumer_instance._prefetch_target = 15
+        assert consumer_instance.prefetch_capacity() == 15 + 15 + 15
+        consumer_instance._in_flight = 44
+        assert not consumer_instance.is_backpressured()
+        consumer_instance._in_flight = 45
+        assert consumer_instance.is_backpressured()
+
+    async def test_ut068_continuation_requeues_the_message_without_using_a_retry(
+        self, consumer_instance, aio_pika_message_factory, event_data_factory
+    ):
+        """
+        Tests UT-068: Verifies that when the handler asks for the message to be
+        continued, an unchanged copy, x-death included, is published to the main
+        exchange with the original routing key and the delivery is acked,
+        without going through the retry or DLQ exchanges.
+        """
+        consumer_instance.main_exchange = MagicMock(publish=AsyncMock())
+        consumer_instance.event_handler.process_event.side_effect = DeliveryContinuationRequired("next chunk")
+        x_death = [{"count": 1, "time": datetime.now(timezone.utc)}]
+        message = aio_pika_message_factory(
+            body=json.dumps(event_data_factory()).encode(), headers={"x-death": x_death})
+
+        await consumer_instance._on_message(message)
+
+        consumer_instance.main_exchange.publish.assert_awaited_once()
+        requeued = consumer_instance.main_exchange.publish.await_args
+        assert requeued.kwargs["routing_key"] == message.routing_key
+        assert requeued.args[0].body == message.body
+        assert requeued.args[0].headers["x-death"] == x_death
+        consumer_instance.retry_exchange.publish.assert_not_awaited()
+        consumer_instance.dlx_exchange.publish.assert_not_awaited()
+        message.ack.assert_awaited_once()
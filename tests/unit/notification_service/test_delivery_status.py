@@ -0,0 +1,111 @@
+import pytest
+import httpx
+from httpx import ASGITransport
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from main import app
+from notification_service import delivery_status as delivery_status_module
+from notification_service.delivery_status import DeliveryStatusRecorder
+from notification_service.router import require_delivery_recorder
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestDeliveryStatus:
+
+    async def test_ut031_records_are_flushed_in_one_pipeline(self, fake_redis, monkeypatch):
+        """
+        Tests UT-031: Verifies that buffered outcomes are written with a single
+        pipeline round trip and can be read back per message and per user.
+        """
+        now = [1000.0]
+        monkeypatch.setattr(delivery_status_module.time, "time", lambda: now[0])
+        redis = fake_redis
+        recorder = DeliveryStatusRecorder(redis, retention_seconds=3600)
+
+        for index in range(3):
+            now[0] += 1
+            recorder.record(message_id=f"m-{index}", user_id="u-1", event_type="INVOICE_DUE_SOON",
+                            status="delivered", attempts=1)
+        recorder.record(message_id="m-3", user_id=None, event_type="INVOICE_DUE_SOON",
+                        status="dlq", attempts=4)
+        await recorder.flush()
+
+        assert redis.executions == 1
+        assert redis.expirations["delivery:m-0"] == 3600
+        assert (await recorder.get("m-3"))["status"] == "dlq"
+        assert await recorder.get("missing") is None
+
+        items, next_offset = await recorder.list_for_user("u-1", offset=0, limit=2)
+        assert [item["message_id"] for item in items] == ["m-2", "m-1"]
+        assert next_offset == 2
+        items, next_offset = await recorder.list_for_user("u-1", offset=2, limit=2)
+        assert [item["message_id"] for item in items] == ["m-0"]
+        assert next_offset is None
+
+    async def test_ut032_full_buffer_drops_new_records(self, fake_redis):
+        """
+        Tests UT-032: Verifies that recording never blocks and drops records once
+        the buffer is full.
+        """
+        recorder = DeliveryStatusRecorder(fake_redis, max_buffer=2)
+
+        for index in range(3):
+            recorder.record(message_id=f"m-{index}", user_id="u-1", event_type="INVOICE_DUE_SOON",
+                            status="delivered", attempts=1)
+
+        assert [record["message_id"] for record in recorder._buffer] == ["m-0", "m-1"]
+
+    async def test_ut033_delivery_endpoints(self, fake_redis):
+        """
+        Tests UT-033: Verifies the per-message lookup (404 when unknown) and the
+        paginated per-user listing.
+        """
+        recorder = DeliveryStatusRecorder(fake_redis)
+        recorder.record(message_id="m-1", user_id="u-1", event_type="INVOICE_DUE_SOON",
+                        status="retry_scheduled", attempts=2)
+        await recorder.flush()
+        app.dependency_overrides[require_delivery_recorder] = lambda: recorder
+
+        try:
+            async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+                found = await client.get("/api/v1/notifications/deliveries/m-1")
+                missing = await client.get("/api/v1/notifications/deliveries/m-2")
+                page = await client.get("/api/v1/notifications/deliveries", params={"user_id": "u-1"})
+        finally:
+            app.dependency_overrides = {}
+
+        assert found.status_code == 200
+        assert found.json()["status"] == "retry_scheduled"
+        assert found.json()["attempts"] == 2
+        assert missing.status_code == 404
+        assert page.json()["next_offset"] is None
+        assert [item["message_id"] for item in page.json()["items"]] == ["m-1"]
+
+    async def test_ut063_failed_flush_with_full_buffer_drops_oldest_records(self, fake_redis):
+        """
+        Tests UT-063: Verifies that when a flush fails after new records filled
+        the buffer, the batch is put back ahead of them, the oldest records
+        that no longer fit are dropped, and the drop is counted.
+        """
+        redis = fake_redis
+        recorder = DeliveryStatusRecorder(redis, batch_size=3, max_buffer=4)
+        for index in range(3):
+            recorder.record(message_id=f"m-{index}", user_id="u-1", event_type="INVOICE_DUE_SOON",
+                            status="delivered", attempts=1)
+
+        async def failing_hset(*args, **kwargs):
+            # New outcomes keep arriving while the pipeline is in flight.
+            for index in range(3, 5):
+                recorder.record(message_id=f"m-{index}", user_id="u-1", event_type="INVOICE_DUE_SOON",
+                                status="delivered", attempts=1)
+            raise RedisConnectionError("Redis down")
+        redis.hset = failing_hset
+        dropped_before = REGISTRY.get_sample_value("notification_delivery_status_dropped_total") or 0
+
+        with pytest.raises(RedisConnectionError):
+            await recorder.flush()
+
+        assert [record["message_id"] for record in recorder._buffer] == ["m-1", "m-2", "m-3", "m-4"]
+        assert REGISTRY.get_sample_value("notification_delivery_status_dropped_total") == dropped_before + 1
@@ -0,0 +1,91 @@
+import pytest
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from notification_service.dlq import (
+    DLQManager,
+    describe_message,
+    load_checkpoint,
+    matches,
+    new_replay_progress,
+    settings,
+)
+from notification_service.schemas import DLQFilter
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def dlq_message(aio_pika_message_factory, event_data_factory):
+    def _create(event_type="INVOICE_DUE_SOON", reason="max_retries", dead_lettered_at=None):
+        event = event_data_factory(event_type=event_type)
+        return aio_pika_message_factory(
+            body=json.dumps(event).encode(),
+            headers={
+                "x-death": [{"count": 3}],
+                "x-dlq-reason": reason,
+                "x-dlq-error": "TransientProcessingError: smtp down",
+                "x-dlq-at": (dead_lettered_at or datetime.now(timezone.utc)).isoformat(),
+            },
+        )
+    return _create
+
+
+@pytest.fixture
+def mock_publisher():
+    publisher = MagicMock()
+    publisher.publish_batch = AsyncMock(side_effect=lambda messages, exchange_name=None: [None] * len(messages))
+    return publisher
+
+
+def fake_dlq(manager, messages):
+    async def consume(prefetch_count, max_messages):
+        for message in messages[:max_messages]:
+            yield message
+    manager._consume = consume
+    manager.depth = AsyncMock(return_value=len(messages))
+
+
+class TestDLQ:
+
+    async def test_ut034_filters_on_event_type_reason_and_time(self, dlq_message):
+        """
+        Tests UT-034: Verifies that DLQ entries are described from the consumer's
+        x-dlq-* headers and filtered on event_type, reason and time range.
+        """
+        now = datetime.now(timezone.utc)
+        entry = describe_message(dlq_message(reason="schema_error", dead_lettered_at=now))
+
+        assert entry["reason"] == "schema_error"
+        assert entry["retry_count"] == 3
+        assert matches(DLQFilter(event_types=["INVOICE_DUE_SOON"], reason="schema_error"), entry)
+        assert not matches(DLQFilter(event_types=["INVOICE_OVERDUE"]), entry)
+        assert not matches(DLQFilter(reason="max_retries"), entry)
+        assert matches(DLQFilter(since=now - timedelta(minutes=1), until=now + timedelta(minutes=1)), entry)
+        assert not matches(DLQFilter(since=(now + timedelta(minutes=1)).replace(tzinfo=None)), entry)
+
+    async def test_ut035_replay_publishes_fresh_messages_and_checkpoints(self, dlq_message, mock_publisher, tmp_path):
+        """
+        Tests UT-035: Verifies that matching messages are republished to the main
+        exchange without retry headers and acked after the confirm, that the rest
+        are moved to the back of the DLQ, and that progress is checkpointed.
+        """
+        messages = [dlq_message(), dlq_message(event_type="INVOICE_OVERDUE"), dlq_message(), dlq_message()]
+        manager = DLQManager("amqp://test", mock_publisher, batch_size=2, rate_per_second=1e6)
+        fake_dlq(manager, messages)
+        checkpoint_path = str(tmp_path / "replay.json")
+        progress = new_replay_progress(DLQFilter(event_types=["INVOICE_DUE_SOON"]), limit=2)
+
+        progress = await manager.replay(progress, checkpoint_path=checkpoint_path)
+
+        assert (progress.state, progress.replayed, progress.skipped, progress.scanned) == ("completed", 2, 1, 3)
+        assert progress.remaining_scan == 1
+        replayed, routing_key = mock_publisher.publish_batch.call_args_list[0].args[0][0]
+        assert routing_key == settings.RABBITMQ_ROUTING_KEY
+        assert "x-death" not in replayed.headers
+        assert not any(key.startswith("x-dlq-") for key in replayed.headers)
+        assert mock_publisher.publish_batch.call_args_list[1].kwargs["exchange_name"] == settings.RABBITMQ_EXCHANGE_DLQ
+        assert all(message.ack.await_count == 1 for message in messages[:3])
+        messages[3].ack.assert_not_called()
+        assert load_checkpoint(checkpoint_path) == progress
@@ -0,0 +1,203 @@
+import pytest
+import asyncio
+import redis.exceptions
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+from notification_service import idempotency as idempotency_module
+from notification_service.idempotency import (
+    BucketedIdempotencyStore,
+    CachedIdempotencyStore,
+    DegradedModeIdempotencyStore,
+    IdempotencyJournal,
+    LocalIdempotencyCache,
+    RedisKeyIdempotencyStore,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestIdempotencyStores:
+
+    async def test_ut020_key_store_keeps_original_scheme(self, mock_redis_client):
+        """
+        Tests UT-020: Verifies that the default backend still writes one
+        `idempotency:<uuid>` key per message with its TTL.
+        """
+        message_id = uuid4()
+        store = RedisKeyIdempotencyStore(mock_redis_client, ttl_seconds=60)
+
+        assert await store.is_processed(message_id) is False
+        await store.mark_processed(message_id)
+
+        mock_redis_client.exists.assert_awaited_once_with(f"idempotency:{message_id}")
+        mock_redis_client.set.assert_awaited_once_with(
+            f"idempotency:{message_id}", "processed", ex=60)
+
+    async def test_ut021_bucketed_store_records_binary_ids(self, fake_redis, monkeypatch):
+        """
+        Tests UT-021: Verifies that the bucketed backend stores 16-byte IDs in a
+        per-bucket set that expires after the bucket closes plus the TTL.
+        """
+        monkeypatch.setattr(idempotency_module.time, "time", lambda: 7300.0)
+        redis = fake_redis
+        store = BucketedIdempotencyStore(redis, ttl_seconds=7200, bucket_seconds=3600)
+        message_id = uuid4()
+
+        await store.mark_processed(message_id)
+
+        assert redis.sets == {"idempotency:bucket:7200": {message_id.bytes}}
+        assert redis.expirations == {"idempotency:bucket:7200": 3 * 3600 + 7200}
+        assert await store.is_processed(message_id) is True
+        assert await store.is_processed(uuid4()) is False
+
+    async def test_ut022_bucketed_store_looks_back_over_ttl(self, fake_redis, monkeypatch):
+        """
+        Tests UT-022: Verifies that IDs recorded in earlier buckets are still
+        found while inside the TTL window.
+        """
+        now = [100.0]
+        monkeypatch.setattr(idempotency_module.time, "time", lambda: now[0])
+        redis = fake_redis
+        store = BucketedIdempotencyStore(redis, ttl_seconds=7200, bucket_seconds=3600)
+        message_id = uuid4()
+
+        await store.mark_processed(message_id)
+        now[0] += 7200
+
+        assert await store.is_processed(message_id) is True
+
+    async def test_ut023_local_cache_short_circuits_redis(self, mock_redis_client):
+        """
+        Tests UT-023: Verifies that IDs processed by this pod are answered by the
+        local cache without another Redis round trip.
+        """
+        message_id = uuid4()
+        store = CachedIdempotencyStore(
+            RedisKeyIdempotencyStore(mock_redis_client),
+            LocalIdempotencyCache(max_entries=10, ttl_seconds=60),
+        )
+
+        await store.mark_processed(message_id)
+
+        assert await store.is_processed(message_id) is True
+        mock_redis_client.exists.assert_not_called()
+        assert await store.is_processed(uuid4()) is False
+        mock_redis_client.exists.assert_awaited_once()
+
+    async def test_ut024_local_cache_is_bounded_and_expires(self, monkeypatch):
+        """
+        Tests UT-024: Verifies LRU eviction beyond max_entries and TTL expiry.
+        """
+        now = [0.0]
+        monkeypatch.setattr(idempotency_module.time, "monotonic", lambda: now[0])
+        cache = LocalIdempotencyCache(max_entries=2, ttl_seconds=10)
+        first, second, third = uuid4(), uuid4(), uuid4()
+
+        cache.add(first)
+        cache.add(second)
+        assert cache.contains(first) is True
+        cache.add(third)
+
+        assert cache.contains(second) is False
+        assert len(cache) == 2
+        now[0] = 11.0
+        assert cache.contains(first) is False
+        assert cache.contains(third) is False
+
+    async def test_ut025_degraded_mode_uses_journal_and_reconciles(self, mock_redis_client, tmp_path):
+        """
+        Tests UT-025: Verifies that a Redis outage switches the store to the local
+        journal, and that the journal is written back once Redis answers again.
+        """
+        mock_redis_client.exists.side_effect = redis.exceptions.ConnectionError("redis down")
+        mock_redis_client.set.side_effect = redis.exceptions.ConnectionError("redis down")
+        probe = AsyncMock(side_effect=redis.exceptions.ConnectionError("redis down"))
+        journal = IdempotencyJournal(ttl_seconds=60, path=str(tmp_path / "journal.log"))
+        store = DegradedModeIdempotencyStore(
+            RedisKeyIdempotencyStore(mock_redis_client), journal, probe=probe,
+            reconcile_interval_seconds=0,
+        )
+        message_id = uuid4()
+
+        assert await store.is_processed(message_id) is False
+        assert store.degraded is True
+        await store.mark_processed(message_id)
+        assert await store.is_processed(message_id) is True
+        assert IdempotencyJournal(ttl_seconds=60, path=journal.path).contains(message_id)
+
+        mock_redis_client.set.side_effect = None
+        probe.side_effect = None
+        await asyncio.wait_for(store._reconcile_task, timeout=1)
+
+        assert store.degraded is False
+        assert len(journal) == 0
+        mock_redis_client.set.assert_awaited_with(f"idempotency:{message_id}", "processed", ex=86400)
+
+    async def test_ut089_reconciler_survives_unexpected_errors(self, mock_redis_client, tmp_path):
+        """
+        Tests UT-089: Verifies that an error other than Redis being unavailable
+        does not end the reconcile task, which retries and still writes the
+        journal back once Redis answers.
+        """
+        mock_redis_client.set.side_effect = [redis.exceptions.ConnectionError("redis down"), True]
+        probe = AsyncMock(side_effect=[
+            redis.exceptions.ResponseError("READONLY You can't write against a read only replica."),
+            RuntimeError("unexpected"),
+            None,
+        ])
+        journal = IdempotencyJournal(ttl_seconds=60, path=str(tmp_path / "journal.log"))
+        store = DegradedModeIdempotencyStore(
+            RedisKeyIdempotencyStore(mock_redis_client), journal, probe=probe,
+            reconcile_interval_seconds=0,
+        )
+        message_id = uuid4()
+        await store.mark_processed(message_id)
+
+        await asyncio.wait_for(store._reconcile_task, timeout=1)
+
+        assert probe.await_count == 3
+        assert store.degraded is False
+        assert len(journal) == 0
+
+    async def test_ut092_journal_writes_are_grouped_bounded_and_compacted_once(
+        self, mock_redis_client, tmp_path, monkeypatch
+    ):
+        """
+        Tests UT-092: Verifies that the journal file gets one write per group of
+        concurrent marks instead of one per message, that the journal keeps only
+        its newest max_entries IDs, and that reconciling rewrites the file once
+        rather than once per batch.
+        """
+        mock_redis_client.set.side_effect = redis.exceptions.ConnectionError("redis down")
+        probe = AsyncMock(side_effect=redis.exceptions.ConnectionError("redis down"))
+        journal = IdempotencyJournal(ttl_seconds=60, path=str(tmp_path / "journal.log"), max_entries=3)
+        writes = []
+        write = journal._write
+
+        def recording_write(lines, replace=False):
+            writes.append((len(lines), replace))
+            write(lines, replace)
+
+        monkeypatch.setattr(journal, "_write", recording_write)
+        store = DegradedModeIdempotencyStore(
+            RedisKeyIdempotencyStore(mock_redis_client), journal, probe=probe,
+            reconcile_interval_seconds=0,
+        )
+        monkeypatch.setattr(store, "RECONCILE_BATCH_SIZE", 1)
+        await store.mark_processed(uuid4())
+        message_ids = [uuid4() for _ in range(5)]
+
+        await asyncio.gather(*(store.mark_processed(message_id) for message_id in message_ids))
+
+        assert writes == [(1, False), (1, False), (4, False)]
+        assert journal.entries() == message_ids[2:]
+        assert IdempotencyJournal(ttl_seconds=60, path=journal.path, max_entries=3).entries() == message_ids[2:]
+
+        mock_redis_client.set.side_effect = None
+        probe.side_effect = None
+        await asyncio.wait_for(store._reconcile_task, timeout=1)
+
+        assert mock_redis_client.set.await_count == 1 + 3
+        assert writes[3:] == [(0, True)]
+        assert journal.path.read_text() == ""
@@ -0,0 +1,153 @@
+import pytest
+import json
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from aio_pika.exceptions import ChannelInvalidStateError
+
+from notification_service.consumer import RabbitMQConsumer, settings
+from notification_service.exceptions import TransientProcessingError
+from notification_service.outbox import DLQ, RETRY, OutboxFullError, OutboxSpool, SpooledMessage
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def outbox_consumer(mock_event_handler, mock_aio_pika_channel, tmp_path):
+    settings.RABBITMQ_MAX_RETRIES = 3
+    settings.RABBITMQ_ROUTING_KEY = "test.key"
+    consumer = RabbitMQConsumer(event_handler=mock_event_handler, outbox=OutboxSpool(str(tmp_path), max_bytes=1 << 20))
+    consumer.outbox.open()
+    consumer._channel = mock_aio_pika_channel
+    consumer.retry_exchange = mock_aio_pika_channel.mock_retry_exchange
+    consumer.dlx_exchange = mock_aio_pika_channel.mock_dlx_exchange
+    consumer.main_queue = MagicMock(name="mock_main_queue")
+    consumer.main_queue.name = "mock_main_queue_name"
+    return consumer
+
+
+def _record(n: int, exchange: str = RETRY) -> SpooledMessage:
+    return SpooledMessage(exchange=exchange, routing_key="test.key", body=json.dumps({"n": n}).encode())
+
+
+class TestOutboxSpool:
+
+    async def test_ut057_refused_republish_is_spooled_acked_and_replayed(
+        self, outbox_consumer, aio_pika_message_factory, event_data_factory, tmp_path
+    ):
+        """
+        Tests UT-057: Verifies that when the broker refuses a retry publish the
+        message is spooled and the delivery acked, and that a new process
+        replays the spool with the original body and headers and empties it.
+        """
+        outbox_consumer.event_handler.process_event.side_effect = TransientProcessingError("SMTP down")
+        outbox_consumer.retry_exchange.publish.side_effect = ChannelInvalidStateError("Channel closed")
+        died_at = datetime(2025, 10, 1, tzinfo=timezone.utc)
+        message = aio_pika_message_factory(
+            body=json.dumps(event_data_factory()).encode(), headers={"x-death": [{"count": 1, "time": died_at}]})
+
+        await outbox_consumer._on_message(message)
+        message.ack.assert_awaited_once()
+        await outbox_consumer.outbox.stop()
+
+        restarted = OutboxSpool(str(tmp_path))
+        restarted.open()
+        assert restarted.size_bytes > 0
+        published = []
+
+        async def publish(record):
+            published.append(record)
+        assert await restarted.drain(publish) == 1
+        assert (published[0].exchange, published[0].routing_key, published[0].body) == (RETRY, "test.key", message.body)
+        assert published[0].headers["x-death"][0]["time"] == died_at
+        assert restarted.size_bytes == 0 and not list(tmp_path.iterdir())
+
+    async def test_ut062_refused_republish_on_closed_delivery_channel_is_not_spooled(
+        self, outbox_consumer, aio_pika_message_factory, event_data_factory
+    ):
+        """
+        Tests UT-062: Verifies that when the delivery's own channel is closed
+        the refused retry publish is not spooled, since the delivery cannot be
+        acked and the broker redelivers it, so replaying a spooled copy would
+        duplicate it.
+        """
+        outbox_consumer.event_handler.process_event.side_effect = TransientProcessingError("SMTP down")
+        outbox_consumer.retry_exchange.publish.side_effect = ChannelInvalidStateError("Channel closed")
+        message = aio_pika_message_factory(body=json.dumps(event_data_factory()).encode())
+        message.channel.is_closed = True
+
+        with pytest.raises(ChannelInvalidStateError):
+            await outbox_consumer._on_message(message)
+
+        message.ack.assert_not_awaited()
+        assert outbox_consumer.outbox.size_bytes == 0
+
+    async def test_ut073_failed_drain_resumes_from_its_checkpoint(self, tmp_path):
+        """
+        Tests UT-073: Verifies that a drain that fails mid-way is resumed at the
+        failed batch, without publishing the earlier batches again.
+        """
+        spool = OutboxSpool(str(tmp_path))
+        spool.open()
+        for n in range(3):
+            await spool.append(_record(n))
+        attempts = []
+
+        async def flaky_publish(record):
+            attempts.append(json.loads(record.body)["n"])
+            if len(attempts) == 2:
+                raise ChannelInvalidStateError("Channel closed")
+        with pytest.raises(ChannelInvalidStateError):
+            await spool.drain(flaky_publish, batch_size=1)
+        assert await spool.drain(flaky_publish, batch_size=1) == 2
+
+        assert attempts == [0, 1, 1, 2]
+
+    async def test_ut074_corrupt_segment_is_quarantined_and_torn_tail_dropped(self, tmp_path):
+        """
+        Tests UT-074: Verifies that a record with a bad checksum quarantines its
+        segment after the records before it are replayed, and that a record
+        torn at the end of a segment is dropped.
+        """
+        spool = OutboxSpool(str(tmp_path))
+        spool.open()
+        await spool.append(_record(10))
+        await spool.append(_record(11, exchange=DLQ))
+        await spool.stop()
+        segment = next(tmp_path.glob("*.seg"))
+        data = bytearray(segment.read_bytes())
+        torn = bytes(data[:-5])
+        data[-3] ^= 0xFF
+        segment.write_bytes(bytes(data))
+        published = []
+
+        async def publish(record):
+            published.append(json.loads(record.body)["n"])
+        assert await spool.drain(publish) == 1
+        assert published == [10]
+        assert [path.suffix for path in tmp_path.iterdir()] == [".corrupt"]
+
+        (tmp_path / "000000000099.seg").write_bytes(torn)
+        published.clear()
+        assert await spool.drain(publish) == 1
+        assert published == [10]
+
+    async def test_ut075_full_spool_leaves_the_delivery_unacked(
+        self, outbox_consumer, aio_pika_message_factory, event_data_factory, tmp_path
+    ):
+        """
+        Tests UT-075: Verifies that when the spool has no room the publish error
+        propagates and the delivery is left to redelivery.
+        """
+        outbox_consumer.event_handler.process_event.side_effect = TransientProcessingError("SMTP down")
+        outbox_consumer.retry_exchange.publish.side_effect = ChannelInvalidStateError("Channel closed")
+        outbox_consumer.outbox = OutboxSpool(str(tmp_path), max_bytes=10)
+        outbox_consumer.outbox.open()
+        message = aio_pika_message_factory(body=json.dumps(event_data_factory()).encode())
+
+        with pytest.raises(ChannelInvalidStateError):
+            await outbox_consumer._on_message(message)
+
+        message.ack.assert_not_awaited()
+        with pytest.raises(OutboxFullError):
+            await outbox_consumer.outbox.append(_record(0))
@@ -0,0 +1,112 @@
+import pytest
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+from prometheus_client import REGISTRY
+
+from metrics import QUEUE_CONSUMERS, QUEUE_HEAD_AGE, QUEUE_MESSAGES
+from notification_service.queue_metrics import QueueMetricsCollector
+
+pytestmark = pytest.mark.asyncio
+
+
+def fake_queue(message_count, consumer_count, head=None):
+    queue = MagicMock()
+    queue.declaration_result.message_count = message_count
+    queue.declaration_result.consumer_count = consumer_count
+    queue.get = AsyncMock(return_value=head)
+    return queue
+
+
+def head_age(queue_name):
+    return REGISTRY.get_sample_value("notification_rabbitmq_queue_head_age_seconds", {"queue": queue_name})
+
+
+class TestQueueMetricsCollector:
+
+    async def test_ut036_exports_depth_consumers_and_head_age(self, aio_pika_message_factory, event_data_factory):
+        """
+        Tests UT-036: Verifies that queues are declared passively on the
+        collector's own channel, and that the head message age is read from the
+        envelope timestamp before the message is requeued.
+        """
+        event = event_data_factory(timestamp=(datetime.now(timezone.utc) - timedelta(seconds=90)).isoformat())
+        head = aio_pika_message_factory(body=json.dumps(event).encode())
+        queues = {"q.main": fake_queue(12, 2, head), "q.dlq": fake_queue(0, 0)}
+        channel = MagicMock(is_closed=False)
+        channel.declare_queue = AsyncMock(side_effect=lambda name, passive: queues[name])
+        collector = QueueMetricsCollector("amqp://test", list(queues), head_age_enabled=True)
+        collector._connection = MagicMock()
+        collector._channel = channel
+
+        await collector.collect()
+
+        assert all(call.kwargs["passive"] for call in channel.declare_queue.await_args_list)
+        assert QUEUE_MESSAGES.labels(queue="q.main")._value.get() == 12
+        assert QUEUE_CONSUMERS.labels(queue="q.main")._value.get() == 2
+        assert 90 <= QUEUE_HEAD_AGE.labels(queue="q.main")._value.get() < 100
+        head.nack.assert_awaited_once_with(requeue=True)
+        queues["q.dlq"].get.assert_not_called()
+        assert QUEUE_HEAD_AGE.labels(queue="q.dlq")._value.get() == 0
+
+    async def test_ut060_head_age_from_management_api_reads_no_message(self):
+        """
+        Tests UT-060: Verifies that with the management API configured the head
+        age comes from head_message_timestamp without fetching the head message,
+        and that by default the head message is never fetched and no head age
+        is exported.
+        """
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={"head_message_timestamp": datetime.now(timezone.utc).timestamp() - 45})
+
+        queues = {"q.main": fake_queue(5, 1), "q.retry": fake_queue(3, 0)}
+        channel = MagicMock(is_closed=False)
+        channel.declare_queue = AsyncMock(side_effect=lambda name, passive: queues[name])
+        collector = QueueMetricsCollector(
+            "amqp://test", ["q.main"], management_url="http://rabbitmq:15672/",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        collector._connection = MagicMock()
+        collector._channel = channel
+
+        await collector.collect()
+
+        assert requests[0].url.raw_path.startswith(b"/api/queues/%2F/q.main")
+        assert 45 <= QUEUE_HEAD_AGE.labels(queue="q.main")._value.get() < 55
+        queues["q.main"].get.assert_not_called()
+
+        default = QueueMetricsCollector("amqp://test", ["q.retry"])
+        default._connection = MagicMock()
+        default._channel = channel
+        await default.collect()
+        queues["q.retry"].get.assert_not_called()
+        assert head_age("q.retry") is None
+
+    async def test_ut093_unknown_head_age_is_not_exported_as_zero(self):
+        """
+        Tests UT-093: Verifies that when the head message has no timestamp the
+        head age series is removed instead of reading as a fresh queue, and is
+        exported again once the age is known.
+        """
+        timestamps = [datetime.now(timezone.utc).timestamp() - 30, None]
+        handler = lambda request: httpx.Response(200, json={"head_message_timestamp": timestamps.pop(0)})
+        channel = MagicMock(is_closed=False)
+        channel.declare_queue = AsyncMock(return_value=fake_queue(7, 1))
+        collector = QueueMetricsCollector(
+            "amqp://test", ["q.untimed"], management_url="http://rabbitmq:15672",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        collector._connection = MagicMock()
+        collector._channel = channel
+
+        await collector.collect()
+        assert 30 <= head_age("q.untimed") < 40
+
+        await collector.collect()
+        assert head_age("q.untimed") is None
+        assert QUEUE_MESSAGES.labels(queue="q.untimed")._value.get() == 7
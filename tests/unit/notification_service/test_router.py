@@ -0,0 +1,66 @@
+import pytest
+import json
+import httpx
+from unittest.mock import MagicMock, AsyncMock
+from httpx import ASGITransport
+
+from main import app
+from notification_service.ingestion import iter_ndjson_lines
+from notification_service.publisher import get_publisher, settings
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def mock_publisher():
+    publisher = MagicMock()
+    publisher.publish_batch = AsyncMock(side_effect=lambda messages: [None] * len(messages))
+    app.dependency_overrides[get_publisher] = lambda: publisher
+    yield publisher
+    app.dependency_overrides = {}
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestBatchIngestion:
+
+    async def test_ut029_batch_endpoint_reports_each_line(self, mock_publisher, event_data_factory, monkeypatch):
+        """
+        Tests UT-029: Verifies that valid lines are published in batches and
+        invalid lines are rejected, with one NDJSON result per input line.
+        """
+        monkeypatch.setattr(settings, "INGESTION_BATCH_SIZE", 2)
+        first, second, third = event_data_factory(), event_data_factory(), event_data_factory()
+        invalid = event_data_factory(recipient={"user_id": "u-1"})
+        body = "\n".join(json.dumps(event) for event in [first, invalid, second, third]) + "\n"
+
+        async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/notifications/batch", content=body,
+                headers={"X-Correlation-ID": "batch-corr-id"})
+
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert response.status_code == 200
+        assert response.headers["x-correlation-id"] == "batch-corr-id"
+        assert [(r["line"], r["status"]) for r in results] == [
+            (2, "rejected"), (1, "accepted"), (3, "accepted"), (4, "accepted")]
+        assert results[1]["message_id"] == first["message_id"]
+        assert [len(call.args[0]) for call in mock_publisher.publish_batch.call_args_list] == [2, 1]
+        message, routing_key = mock_publisher.publish_batch.call_args_list[0].args[0][0]
+        assert message.correlation_id == "batch-corr-id"
+        assert routing_key == settings.RABBITMQ_ROUTING_KEY
+
+    async def test_ut030_ndjson_split_across_chunks(self):
+        """
+        Tests UT-030: Verifies that lines split across chunks are reassembled and
+        oversized lines are reported without being buffered.
+        """
+        lines = [item async for item in iter_ndjson_lines(
+            chunked(b'{"a":', b' 1}\n\n' + b"x" * 20, b"y" * 20 + b'\n{"b": 2}'),
+            max_line_bytes=30,
+        )]
+
+        assert lines == [(1, b'{"a": 1}'), (3, None), (4, b'{"b": 2}')]
@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+from notification_service import scheduler as scheduler_module
+from notification_service.scheduler import WeightedFairScheduler
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestWeightedFairScheduler:
+
+    async def test_ut014_weighted_round_robin_shares_capacity(self):
+        """
+        Tests UT-014: Verifies that non-empty sub-queues are served in
+        proportion to their weights, without starving the bulk event type.
+        """
+        scheduler = WeightedFairScheduler(weights={"URGENT": 3, "BULK": 1})
+        for i in range(20):
+            scheduler.put("BULK", f"bulk-{i}")
+            scheduler.put("URGENT", f"urgent-{i}")
+
+        served = [scheduler.get_nowait()[0] for _ in range(8)]
+
+        assert served.count("URGENT") == 6
+        assert served.count("BULK") == 2
+        assert len(scheduler) == 32
+
+    async def test_ut015_overdue_slo_is_served_first(self, monkeypatch):
+        """
+        Tests UT-015: Verifies that a sub-queue whose head exceeded its
+        latency SLO preempts the weighted selection.
+        """
+        now = [1000.0]
+        monkeypatch.setattr(scheduler_module.time, "monotonic", lambda: now[0])
+
+        scheduler = WeightedFairScheduler(
+            weights={"BULK": 10, "URGENT": 1},
+            latency_slo_ms={"URGENT": 500},
+        )
+        scheduler.put("URGENT", "urgent-1")
+        scheduler.put("BULK", "bulk-1")
+        now[0] += 1.0
+
+        assert scheduler.get_nowait() == ("URGENT", "urgent-1")
+        assert scheduler.get_nowait() == ("BULK", "bulk-1")
+
+    async def test_ut016_get_waits_for_items(self):
+        """
+        Tests UT-016: Verifies that get() blocks until an item is submitted
+        and that FIFO order is preserved within an event type.
+        """
+        scheduler = WeightedFairScheduler(weights={})
+        waiter = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        scheduler.put("INVOICE_DUE_SOON", "first")
+        scheduler.put("INVOICE_DUE_SOON", "second")
+
+        assert await asyncio.wait_for(waiter, timeout=1) == ("INVOICE_DUE_SOON", "first")
+        assert scheduler.get_nowait() == ("INVOICE_DUE_SOON", "second")
+        with pytest.raises(asyncio.QueueEmpty):
+            scheduler.get_nowait()
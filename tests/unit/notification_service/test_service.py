@@ -1,14 +1,86 @@
 import pytest
+import asyncio
+import redis.exceptions
 from unittest.mock import MagicMock, AsyncMock, patch
+from aiosmtplib import SMTPDataError, SMTPRecipientRefused, SMTPRecipientsRefused
 from fastapi_mail.errors import ConnectionErrors
 
-from notification_service.service import EventHandler, EmailService
-from notification_service.exceptions import EventTypeValidationError, TemplateRenderingError, TransientProcessingError
+from pathlib import Path
+from fastapi_mail import ConnectionConfig
+from fastapi_mail.connection import Connection
+
+from notification_service import service as service_module
+from notification_service.service import EventHandler, EmailService, TemplateCachingFastMail
+from config import settings
+from notification_service.exceptions import (
+    EventTypeValidationError,
+    PermanentDeliveryError,
+    TemplateRenderingError,
+    TransientProcessingError,
+)
 from notification_service.schemas import NotificationEventEnvelope
+from notification_service.smtp_errors import TEMPORARY, classify_smtp_error
 
 pytestmark = pytest.mark.asyncio
 
 
+class FakeSMTPServer:
+    """Minimal SMTP server that answers the greeting or MAIL FROM with `reply`, closing the session on 421."""
+
+    def __init__(self, reply: str, on: str = "MAIL"):
+        self.reply = reply
+        self.on = on
+        self.sessions = 0
+        self.delivered = 0
+
+    async def _handle(self, reader, writer):
+        self.sessions += 1
+        if self.on == "greeting":
+            writer.write(f"{self.reply}\r\n".encode())
+            await writer.drain()
+            writer.close()
+            return
+        writer.write(b"220 localhost ESMTP\r\n")
+        while line := await reader.readline():
+            command = line.decode().split(" ", 1)[0].strip().upper()
+            if command == self.on:
+                writer.write(f"{self.reply}\r\n".encode())
+                await writer.drain()
+                if self.reply.startswith("421"):
+                    break
+            elif command == "DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                self.delivered += 1
+                writer.write(b"250 OK\r\n")
+            elif command == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    async def __aenter__(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def _smtp_config(port: int) -> ConnectionConfig:
+    return ConnectionConfig(
+        MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="test@example.com", MAIL_PORT=port,
+        MAIL_SERVER="127.0.0.1", MAIL_STARTTLS=False, MAIL_SSL_TLS=False, USE_CREDENTIALS=False,
+        TEMPLATE_FOLDER=Path(service_module.__file__).parent / "templates", TIMEOUT=5,
+    )
+
+
 class TestEventHandler:
 
     async def test_ut001_idempotency_skips_duplicate_message(
@@ -89,6 +161,24 @@ class TestEventHandler:
         mock_email_service.send_email.assert_not_called()
         mock_redis_client.set.assert_not_called()
 
+    async def test_ut026_redis_outage_becomes_transient_error(
+        self, mock_redis_client, mock_email_service, event_data_factory
+    ):
+        """
+        Tests UT-026: Verifies that, without degraded mode, a Redis failure in the
+        idempotency check is raised as a TransientProcessingError (retry path).
+        """
+        mock_redis_client.exists.side_effect = redis.exceptions.ConnectionError("redis down")
+        handler = EventHandler(
+            redis_client=mock_redis_client,
+            email_service=mock_email_service
+        )
+
+        with pytest.raises(TransientProcessingError, match="Idempotency check failed"):
+            await handler.process_event(event_data_factory(), correlation_id="test-corr-id-026")
+
+        mock_email_service.send_email.assert_not_called()
+
 
 class TestEmailService:
 
@@ -131,3 +221,124 @@ class TestEmailService:
                 template_name="test.html",
                 body_context={}
             )
+
+    async def test_ut043_templates_compile_once(self):
+        """
+        Tests UT-043: Verifies that the caching mailer precompiles every template
+        and serves the same compiled template on each send.
+        """
+        mailer = TemplateCachingFastMail(ConnectionConfig(
+            MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="test@example.com", MAIL_PORT=1025,
+            MAIL_SERVER="localhost", MAIL_STARTTLS=False, MAIL_SSL_TLS=False,
+            TEMPLATE_FOLDER=Path(service_module.__file__).parent / "templates",
+        ))
+        email_service = EmailService(mailer=mailer)
+
+        names = email_service.precompile_templates()
+
+        assert "invoice_due_soon.html" in names
+        first = await mailer.get_mail_template(mailer.config.template_engine(), "invoice_due_soon.html")
+        second = await mailer.get_mail_template(mailer.config.template_engine(), "invoice_due_soon.html")
+        assert first is second
+
+    async def test_ut046_local_retry_resends_rendered_message(self, mocker, event_data_factory):
+        """
+        Tests UT-046: Verifies that connection failures are retried in process,
+        rendering the template once and resending the same message, and that a
+        TransientProcessingError is raised only once the local budget runs out.
+        """
+        sleep = mocker.patch.object(service_module.asyncio, "sleep", AsyncMock())
+        mailer = TemplateCachingFastMail(ConnectionConfig(
+            MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="test@example.com", MAIL_PORT=1025,
+            MAIL_SERVER="localhost", MAIL_STARTTLS=False, MAIL_SSL_TLS=False,
+            TEMPLATE_FOLDER=Path(service_module.__file__).parent / "templates",
+        ))
+        render = mocker.spy(mailer, "render_message")
+        mailer.deliver = AsyncMock(side_effect=[ConnectionErrors("refused"), ConnectionErrors("refused"), None])
+        email_service = EmailService(mailer=mailer, local_retry_attempts=2)
+        body_context = NotificationEventEnvelope.model_validate(event_data_factory()).model_dump()
+
+        await email_service.send_email("test", "test@test.com", "invoice_due_soon.html", body_context)
+
+        render.assert_awaited_once()
+        assert mailer.deliver.await_count == 3
+        first, second, third = (call.args[0] for call in mailer.deliver.await_args_list)
+        assert first is second is third
+        assert sleep.await_count == 2
+
+        mailer.deliver = AsyncMock(side_effect=ConnectionErrors("refused"))
+        with pytest.raises(TransientProcessingError, match="Failed to connect"):
+            await email_service.send_email("test", "test@test.com", "invoice_due_soon.html", body_context)
+        assert mailer.deliver.await_count == 3
+
+    async def test_ut047_smtp_replies_are_classified_by_code(self, mocker):
+        """
+        Tests UT-047: Verifies that a 5xx reply becomes a PermanentDeliveryError
+        and a 4xx reply a TransientProcessingError with the server-suggested or
+        per-code delay, neither being retried in process.
+        """
+        mocker.patch.object(service_module.asyncio, "sleep", AsyncMock())
+        mailer = TemplateCachingFastMail(ConnectionConfig(
+            MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="test@example.com", MAIL_PORT=1025,
+            MAIL_SERVER="localhost", MAIL_STARTTLS=False, MAIL_SSL_TLS=False,
+            TEMPLATE_FOLDER=Path(service_module.__file__).parent / "templates",
+        ))
+        mailer.render_message = AsyncMock(return_value=MagicMock())
+        email_service = EmailService(mailer=mailer, local_retry_attempts=2)
+        send = lambda: email_service.send_email("test", "test@test.com", "invoice_due_soon.html", {})
+
+        mailer.deliver = AsyncMock(side_effect=SMTPRecipientsRefused(
+            [SMTPRecipientRefused(550, "5.1.1 User unknown", "test@test.com")]))
+        with pytest.raises(PermanentDeliveryError) as permanent:
+            await send()
+        assert permanent.value.smtp_code == 550
+        assert mailer.deliver.await_count == 1
+
+        mailer.deliver = AsyncMock(side_effect=SMTPDataError(451, "Greylisted, please try again in 5 minutes"))
+        with pytest.raises(TransientProcessingError) as greylisted:
+            await send()
+        assert greylisted.value.retry_after_seconds == 300
+        assert mailer.deliver.await_count == 1
+
+        mailer.deliver = AsyncMock(side_effect=SMTPDataError(421, "Too many connections"))
+        with pytest.raises(TransientProcessingError) as rate_limited:
+            await send()
+        assert rate_limited.value.retry_after_seconds == settings.SMTP_RETRY_DELAYS_MS[421] / 1000
+
+    async def test_ut090_rate_limit_reply_survives_a_closed_smtp_session(self, event_data_factory):
+        """
+        Tests UT-090: Verifies, through a real SMTP session, that a 421 reply
+        after which the server drops the connection is still classified as a
+        temporary rejection with the server-suggested delay, and is left to the
+        broker retry instead of being retried in process, while a server that
+        accepts the message gets it delivered.
+        """
+        server = FakeSMTPServer("421 4.7.0 Too many connections, try again in 5 minutes")
+        body_context = NotificationEventEnvelope.model_validate(event_data_factory()).model_dump()
+        async with server as port:
+            email_service = EmailService(mailer=TemplateCachingFastMail(_smtp_config(port)), local_retry_attempts=2)
+
+            with pytest.raises(TransientProcessingError) as rate_limited:
+                await email_service.send_email("test", "test@test.com", "invoice_due_soon.html", body_context)
+
+        assert rate_limited.value.retry_after_seconds == 300
+        assert server.sessions == 1
+
+        accepting = FakeSMTPServer("250 OK")
+        async with accepting as port:
+            email_service = EmailService(mailer=TemplateCachingFastMail(_smtp_config(port)))
+            await email_service.send_email("test", "test@test.com", "invoice_due_soon.html", body_context)
+        assert accepting.delivered == 1
+
+    async def test_ut091_greeting_reply_is_classified_behind_connection_errors(self):
+        """
+        Tests UT-091: Verifies that a 421 greeting, which fastapi-mail wraps in
+        ConnectionErrors, is classified by the SMTP reply it wraps.
+        """
+        async with FakeSMTPServer("421 4.3.2 Service not available, try again in 30 seconds", on="greeting") as port:
+            with pytest.raises(ConnectionErrors) as wrapped:
+                async with Connection(_smtp_config(port)):
+                    pass
+
+        failure = classify_smtp_error(wrapped.value)
+        assert (failure.kind, failure.code, failure.retry_after_seconds) == (TEMPORARY, 421, 30)
@@ -0,0 +1,165 @@
+import pytest
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock
+
+import aio_pika
+
+from notification_service.exceptions import (
+    DeliveryContinuationRequired,
+    PermanentDeliveryError,
+    TransientProcessingError,
+)
+from notification_service.streams import RedisStreamConsumer, RedisStreamPublisher, settings
+
+pytestmark = pytest.mark.asyncio
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def stream_consumer(fake_redis, mock_event_handler, monkeypatch) -> RedisStreamConsumer:
+    monkeypatch.setattr(settings, "RABBITMQ_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "RABBITMQ_RETRY_DELAY_MS", 60000)
+    monkeypatch.setattr(settings, "REDIS_STREAM_CLAIM_IDLE_MS", 60000)
+    monkeypatch.setattr(settings, "REDIS_STREAM_CLAIM_INTERVAL_SECONDS", 60)
+    monkeypatch.setattr(settings, "REDIS_STREAM_ACK_INTERVAL_MS", 10)
+    return RedisStreamConsumer(fake_redis, mock_event_handler, stream="events", group="workers",
+                               consumer_name="pod-a", batch_size=2, concurrency=4)
+
+
+async def publish(redis, events: list[dict]):
+    errors = await RedisStreamPublisher(redis, stream="events").publish_batch(
+        [(aio_pika.Message(json.dumps(event).encode(), correlation_id=f"corr-{n}"), "ignored")
+         for n, event in enumerate(events)])
+    assert errors == [None] * len(events)
+
+
+async def run_until_settled(consumer: RedisStreamConsumer, redis, condition):
+    """Runs the consumer until `condition` holds and no entry is left pending."""
+    pending = redis.groups[("events", "workers")]["pending"]
+    run_task = asyncio.create_task(consumer.run())
+    try:
+        await wait_until(lambda: condition() and not pending)
+    finally:
+        run_task.cancel()
+        await asyncio.gather(run_task, return_exceptions=True)
+
+
+def recipients(*emails: str) -> list[dict]:
+    return [{"user_id": f"user-{n}", "email": email, "name": "User"} for n, email in enumerate(emails)]
+
+
+class TestRedisStreamConsumer:
+
+    async def test_ut058_processed_entries_are_acked_in_batches(
+        self, stream_consumer, fake_redis, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-058: Verifies that the Redis Streams backend acks processed
+        entries with one XACK per REDIS_STREAM_ACK_BATCH_SIZE ids, and flushes
+        the remainder when it stops.
+        """
+        monkeypatch.setattr(settings, "REDIS_STREAM_ACK_BATCH_SIZE", 2)
+        monkeypatch.setattr(settings, "REDIS_STREAM_ACK_INTERVAL_MS", 60000)
+        await publish(fake_redis, [event_data_factory(recipient=recipient)
+                                   for recipient in recipients("a@example.com", "b@example.com", "c@example.com")])
+        fake_redis.xack = AsyncMock(wraps=fake_redis.xack)
+        await stream_consumer.connect()
+
+        run_task = asyncio.create_task(stream_consumer.run())
+        await wait_until(lambda: fake_redis.xack.await_count == 1)
+        assert len(fake_redis.xack.await_args.args) == 2 + 2
+        run_task.cancel()
+        await asyncio.gather(run_task, return_exceptions=True)
+
+        assert fake_redis.xack.await_count == 2
+        assert len(fake_redis.xack.await_args.args) == 2 + 1
+        assert not fake_redis.groups[("events", "workers")]["pending"]
+
+    async def test_ut064_transient_failure_is_retried_from_the_retry_set(
+        self, stream_consumer, fake_redis, mock_event_handler, event_data_factory
+    ):
+        """
+        Tests UT-064: Verifies that a transient failure is acked into the retry
+        set, due after RABBITMQ_RETRY_DELAY_MS, and that once due it is re-added
+        to the stream with its retry count raised.
+        """
+        mock_event_handler.process_event.side_effect = TransientProcessingError("SMTP timeout")
+        await publish(fake_redis, [event_data_factory()])
+        await stream_consumer.connect()
+
+        await run_until_settled(stream_consumer, fake_redis, lambda: mock_event_handler.process_event.await_count == 1)
+        retry_set = fake_redis.zsets[settings.REDIS_STREAM_RETRY_KEY]
+        [(member, due_at)] = retry_set.items()
+        assert json.loads(member)["retry_count"] == "1" and due_at > (time.time() + 50) * 1000
+
+        retry_set[member] = 0
+        assert await stream_consumer.move_due_retries() == 1
+        await run_until_settled(stream_consumer, fake_redis, lambda: mock_event_handler.process_event.await_count == 2)
+        assert json.loads(next(iter(retry_set)))["retry_count"] == "2"
+
+    async def test_ut065_permanent_failures_and_invalid_entries_are_dead_lettered(
+        self, stream_consumer, fake_redis, mock_event_handler, event_data_factory
+    ):
+        """
+        Tests UT-065: Verifies that a permanent refusal and an entry that is not
+        valid JSON go to the DLQ stream with their reason, the SMTP code and
+        the original fields, and leave nothing pending.
+        """
+        mock_event_handler.process_event.side_effect = PermanentDeliveryError("Mailbox unavailable", 550)
+        await publish(fake_redis, [event_data_factory()])
+        await fake_redis.xadd("events", {"body": "not json"})
+        await stream_consumer.connect()
+
+        await run_until_settled(
+            stream_consumer, fake_redis, lambda: len(fake_redis.streams.get(settings.REDIS_STREAM_DLQ_KEY, [])) == 2)
+
+        dead_lettered = {fields["dlq_reason"]: fields for _, fields in fake_redis.streams[settings.REDIS_STREAM_DLQ_KEY]}
+        assert set(dead_lettered) == {"smtp_permanent", "schema_error"}
+        assert dead_lettered["smtp_permanent"]["dlq_smtp_code"] == "550"
+        assert dead_lettered["smtp_permanent"]["correlation_id"] == "corr-0"
+
+    async def test_ut066_entries_left_by_a_crashed_consumer_are_claimed(
+        self, stream_consumer, fake_redis, mock_event_handler, event_data_factory, monkeypatch
+    ):
+        """
+        Tests UT-066: Verifies that an entry pending on another consumer is only
+        taken over once idle for REDIS_STREAM_CLAIM_IDLE_MS, and is then handled
+        and acked.
+        """
+        await stream_consumer.connect()
+        await publish(fake_redis, [event_data_factory()])
+        await fake_redis.xreadgroup("workers", "crashed-pod", {"events": ">"}, count=1)
+
+        assert await stream_consumer.claim_stuck_entries() == 0
+        monkeypatch.setattr(settings, "REDIS_STREAM_CLAIM_IDLE_MS", 0)
+        assert await stream_consumer.claim_stuck_entries() == 1
+        await asyncio.gather(*stream_consumer._tasks)
+        await stream_consumer._flush_acks()
+
+        mock_event_handler.process_event.assert_awaited_once()
+        assert not fake_redis.groups[("events", "workers")]["pending"]
+
+    async def test_ut069_continuation_re_adds_the_entry_with_its_retry_count(
+        self, stream_consumer, fake_redis, mock_event_handler, event_data_factory
+    ):
+        """
+        Tests UT-069: Verifies that a continuation re-adds the entry to the
+        stream with its fields and retry count unchanged, and acks the original.
+        """
+        mock_event_handler.process_event.side_effect = [DeliveryContinuationRequired("next chunk"), True]
+        await fake_redis.xadd("events", {"body": json.dumps(event_data_factory()), "retry_count": "1"})
+        await stream_consumer.connect()
+
+        await run_until_settled(stream_consumer, fake_redis, lambda: mock_event_handler.process_event.await_count == 2)
+
+        (original_id, _), (_, requeued) = fake_redis.streams["events"]
+        assert requeued["retry_count"] == "1" and requeued["origin_id"] == original_id
+        assert settings.REDIS_STREAM_RETRY_KEY not in fake_redis.zsets
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from notification_service.exceptions import (
+    PermanentDeliveryError,
+    RecipientSuppressedError,
+    TransientProcessingError,
+)
+from notification_service.service import EventHandler
+from notification_service.suppression import SuppressionList
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestSuppressionList:
+
+    async def test_ut049_changes_replicate_incrementally(self, fake_redis):
+        """
+        Tests UT-049: Verifies that bulk additions and removals made by one
+        process reach another through the changes stream, that a miss in the
+        local set costs no Redis lookup, and that a trimmed stream forces a
+        full reload.
+        """
+        redis = fake_redis
+        writer = SuppressionList(redis, batch_size=2)
+        reader = SuppressionList(redis, batch_size=2)
+        await writer.load()
+        await reader.load()
+
+        assert await writer.add(["Bounce@Example.com", "spam@example.com", "bounce@example.com"], "hard_bounce") == 2
+        assert not await reader.is_suppressed("bounce@example.com")
+
+        await reader.refresh()
+        assert await reader.is_suppressed(" BOUNCE@example.com")
+        assert await reader.is_suppressed("spam@example.com")
+        redis.hexists = AsyncMock(wraps=redis.hexists)
+        assert not await reader.is_suppressed("ok@example.com")
+        redis.hexists.assert_not_awaited()
+
+        assert await writer.remove(["spam@example.com"]) == 1
+        await reader.refresh()
+        assert not await reader.is_suppressed("spam@example.com")
+        assert (await reader.get("bounce@example.com"))["reason"] == "hard_bounce"
+
+        await writer.add(["late@example.com", "later@example.com", "latest@example.com"], "complaint")
+        await redis.xtrim(SuppressionList.CHANGES_KEY, maxlen=1)
+        await reader.refresh()
+        assert await reader.is_suppressed("late@example.com")
+        assert await reader.is_suppressed("later@example.com")
+
+    async def test_ut050_handler_skips_suppressed_and_suppresses_hard_bounces(
+        self, fake_redis, mock_redis_client, mock_email_service, event_data_factory
+    ):
+        """
+        Tests UT-050: Verifies that the handler raises RecipientSuppressedError
+        without sending to a suppressed recipient, and that a permanent
+        recipient refusal adds the address to the suppression list.
+        """
+        suppression_list = SuppressionList(fake_redis)
+        await suppression_list.load()
+        handler = EventHandler(
+            redis_client=mock_redis_client,
+            email_service=mock_email_service,
+            suppression_list=suppression_list,
+        )
+        event_data = event_data_factory()
+        email = event_data["recipient"]["email"]
+
+        mock_email_service.send_email = AsyncMock(
+            side_effect=PermanentDeliveryError("User unknown", 550, recipient_refused=True))
+        with pytest.raises(PermanentDeliveryError):
+            await handler.process_event(event_data)
+        assert await suppression_list.is_suppressed(email)
+
+        mock_email_service.send_email.reset_mock()
+        with pytest.raises(RecipientSuppressedError):
+            await handler.process_event(event_data)
+        mock_email_service.send_email.assert_not_called()
+
+    async def test_ut088_lookup_failure_on_a_local_hit_is_retried(
+        self, fake_redis, mock_redis_client, mock_email_service, event_data_factory
+    ):
+        """
+        Tests UT-088: Verifies that when Redis cannot confirm a local digest
+        hit, the lookup raises TransientProcessingError so the event is retried
+        instead of dropped, and nothing is sent.
+        """
+        suppression_list = SuppressionList(fake_redis)
+        await suppression_list.load()
+        handler = EventHandler(
+            redis_client=mock_redis_client,
+            email_service=mock_email_service,
+            suppression_list=suppression_list,
+        )
+        event_data = event_data_factory()
+        await suppression_list.add([event_data["recipient"]["email"]], "hard_bounce")
+        fake_redis.hexists = AsyncMock(side_effect=RedisConnectionError("Redis is down"))
+
+        with pytest.raises(TransientProcessingError):
+            await handler.process_event(event_data)
+        mock_email_service.send_email.assert_not_called()
@@ -0,0 +1,133 @@
+import pytest
+import json
+import shutil
+
+from fastapi_mail import ConnectionConfig, MessageSchema, MessageType
+from jinja2 import Environment
+
+from notification_service.schemas import NotificationEventEnvelope
+from notification_service.service import TemplateCachingFastMail
+from notification_service.template_build import (
+    MANIFEST_NAME,
+    SOURCE_DIR,
+    build_templates,
+    compile_template,
+    normalize_text,
+)
+
+pytestmark = pytest.mark.asyncio
+
+SOURCE = """<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        .muted { color: #B3B3B3; font-family: Arial, sans-serif; }
+        @media (max-width: 600px) { .muted { font-size: 14px; } }
+    </style>
+</head>
+<body>
+    <!-- header -->
+    <h2 style="color: #FFFFFF; margin: 0; color: #FFFFFF;">Olá, {{
+        recipient.name }}!</h2>
+    {% if ok %}
+    <p class="muted" style="line-height: 1.6;">Tudo certo &amp; em dia.</p>
+    {% endif %}
+    <p class="muted">Valor: {{ "R$ %.2f" | format(amount) }}</p>
+    <a href="{{ link }}">Abrir</a>
+</body>
+</html>
+"""
+
+
+def _mailer(template_folder, build_dir) -> TemplateCachingFastMail:
+    return TemplateCachingFastMail(ConnectionConfig(
+        MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="test@example.com", MAIL_PORT=1025,
+        MAIL_SERVER="localhost", MAIL_STARTTLS=False, MAIL_SSL_TLS=False,
+        TEMPLATE_FOLDER=template_folder,
+    ), build_dir=str(build_dir))
+
+
+@pytest.fixture
+def built_templates(tmp_path):
+    source_dir, build_dir = tmp_path / "templates", tmp_path / "build"
+    shutil.copytree(SOURCE_DIR, source_dir)
+    return source_dir, build_dir, build_templates(source_dir, build_dir)
+
+
+class TestTemplateBuild:
+
+    async def test_ut059_compiled_html_is_minified_with_inlined_styles(self):
+        """
+        Tests UT-059: Verifies that compiling inlines simple CSS rules, keeps
+        media queries in the head, dedupes and compacts styles, and drops
+        comments and whitespace while keeping Jinja tags working.
+        """
+        compiled = compile_template(SOURCE)
+
+        html = Environment().from_string(compiled.html).render(
+            recipient={"name": "Ana"}, ok=True, amount=150.5, link="poupeai://app")
+
+        assert html.startswith("<!DOCTYPE html><html><head><style>@media (max-width:600px){.muted{font-size:14px;}}")
+        assert '<h2 style="margin:0;color:#FFF">Olá, Ana!</h2>' in html
+        assert '<p class="muted" style="color:#B3B3B3;font-family:Arial,sans-serif;line-height:1.6">' in html
+        assert "<!--" not in html and "\n" not in html and "R$ 150.50" in html
+
+    async def test_ut084_compiling_generates_a_plain_text_template(self):
+        """
+        Tests UT-084: Verifies that compiling generates a plain-text template
+        that renders the same content, with links written out.
+        """
+        compiled = compile_template(SOURCE)
+
+        text = Environment().from_string(compiled.text).render(
+            recipient={"name": "Ana"}, ok=False, amount=150.5, link="poupeai://app")
+
+        assert normalize_text(text) == "Olá, Ana!\n\nValor: R$ 150.50\n\nAbrir (poupeai://app)\n"
+
+    async def test_ut085_build_writes_smaller_artifacts_and_a_manifest(self, built_templates):
+        """
+        Tests UT-085: Verifies that the build writes an artifact for every
+        source template, each smaller than its source, and records the sizes
+        in the manifest.
+        """
+        _, build_dir, report = built_templates
+
+        assert {sizes.name for sizes in report} == {path.name for path in SOURCE_DIR.glob("*.html")}
+        assert all(sizes.html_bytes < sizes.source_bytes for sizes in report)
+        assert json.loads((build_dir / MANIFEST_NAME).read_text())["templates"]["invoice_due_soon.html"]["html_bytes"]
+
+    async def test_ut086_loader_uses_artifacts_and_recompiles_changed_sources(self, built_templates):
+        """
+        Tests UT-086: Verifies that the mailer loads the built artifacts at
+        startup, including the text parts, and recompiles a source that
+        changed since the build instead of serving its stale artifact.
+        """
+        source_dir, build_dir, _ = built_templates
+        (build_dir / "invoice_overdue.html").write_text("<p>from artifact</p>")
+        (source_dir / "statement_status.html").write_text("<p>changed   source</p>")
+        mailer = _mailer(source_dir, build_dir)
+
+        names = mailer.precompile_templates()
+
+        assert "invoice_due_soon.txt" in names
+        assert mailer.template_env.get_template("invoice_overdue.html").render() == "<p>from artifact</p>"
+        assert mailer.template_env.get_template("statement_status.html").render() == "<p>changed source</p>"
+
+    async def test_ut087_messages_carry_text_before_html_in_multipart_alternative(
+        self, tmp_path, event_data_factory
+    ):
+        """
+        Tests UT-087: Verifies that sent messages are multipart/alternative
+        with the plain text before the minified HTML.
+        """
+        body_context = NotificationEventEnvelope.model_validate(event_data_factory()).model_dump()
+        message = MessageSchema(
+            subject="test", recipients=["test@test.com"], template_body=body_context, subtype=MessageType.html)
+
+        rendered = await _mailer(SOURCE_DIR, tmp_path / "missing").render_message(message, "invoice_due_soon.html")
+
+        assert rendered.get_content_type() == "multipart/alternative"
+        text, html = rendered.get_payload()
+        assert (text.get_content_type(), html.get_content_type()) == ("text/plain", "text/html")
+        assert "Olá, Test User!" in text.get_payload(decode=True).decode()
+        assert len(html.get_payload(decode=True)) < len((SOURCE_DIR / "invoice_due_soon.html").read_bytes())
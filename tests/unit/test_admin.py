@@ -0,0 +1,113 @@
+import pytest
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from httpx import ASGITransport
+from pydantic import SecretStr
+
+import admin
+import diagnostics
+
+pytestmark = pytest.mark.asyncio
+
+HEADERS = {"X-Admin-Token": "let-me-in"}
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy_handler(done: asyncio.Event):
+    while not done.is_set():
+        _spin(0.05)
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+async def admin_client(monkeypatch):
+    monkeypatch.setattr(admin.settings, "ADMIN_TOKEN", SecretStr("let-me-in"))
+    diagnostics.init_diagnostics()
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/v1/admin")
+    async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await diagnostics.close_diagnostics()
+    diagnostics.diagnostics = None
+
+
+class TestAdminDiagnostics:
+
+    async def test_ut055_admin_endpoints_reject_missing_or_wrong_tokens(self, admin_client):
+        """
+        Tests UT-055: Verifies that admin endpoints reject requests without the
+        admin token or with a wrong one.
+        """
+        assert (await admin_client.get("/api/v1/admin/tasks")).status_code == 403
+        assert (await admin_client.get("/api/v1/admin/tasks", headers={"X-Admin-Token": "nope"})).status_code == 403
+        assert (await admin_client.get("/api/v1/admin/tasks", headers=HEADERS)).status_code == 200
+
+    async def test_ut080_profiler_reports_the_code_running_on_the_loop(self, admin_client):
+        """
+        Tests UT-080: Verifies that the sampling profiler returns collapsed
+        stacks of the code running on the loop and that cProfile mode returns
+        its call statistics.
+        """
+        done = asyncio.Event()
+        busy = asyncio.create_task(busy_handler(done), name="busy-handler")
+        response = await admin_client.post(
+            "/api/v1/admin/profile", params={"seconds": 0.2, "mode": "sampling"}, headers=HEADERS)
+        done.set()
+        await busy
+        assert response.status_code == 200
+        assert "busy_handler;" in response.text and "_spin" in response.text
+
+        response = await admin_client.post(
+            "/api/v1/admin/profile", params={"seconds": 0.05, "mode": "cprofile"}, headers=HEADERS)
+        assert "function calls" in response.text
+
+    async def test_ut081_memory_snapshots_diff_shows_retained_allocations(self, admin_client):
+        """
+        Tests UT-081: Verifies that two memory snapshots can be diffed and the
+        diff points at the line that retained memory between them.
+        """
+        first = (await admin_client.post("/api/v1/admin/memory/snapshots", headers=HEADERS)).json()
+        retained = [bytearray(1024) for _ in range(1000)]
+        second = (await admin_client.post("/api/v1/admin/memory/snapshots", headers=HEADERS)).json()
+        response = await admin_client.get(
+            f"/api/v1/admin/memory/snapshots/{second['snapshot_id']}/diff",
+            params={"against": first["snapshot_id"]}, headers=HEADERS)
+        del retained
+        await admin_client.delete("/api/v1/admin/memory/snapshots", headers=HEADERS)
+
+        assert any("test_admin.py" in stat["location"] and stat["size_diff_bytes"] >= 1024 * 1000
+                   for stat in response.json()["top"])
+
+    async def test_ut082_task_dump_lists_running_tasks(self, admin_client):
+        """
+        Tests UT-082: Verifies that the task dump lists the tasks running on
+        the loop by name.
+        """
+        sleeper = asyncio.create_task(asyncio.sleep(10), name="idle-sleeper")
+        tasks = (await admin_client.get("/api/v1/admin/tasks", headers=HEADERS)).json()
+        sleeper.cancel()
+
+        assert "idle-sleeper" in {task["name"] for task in tasks["tasks"]}
+
+    async def test_ut083_loop_monitor_captures_the_stack_of_a_blocking_call(self, admin_client):
+        """
+        Tests UT-083: Verifies that the loop monitor records one stall for a
+        blocking call, with its duration and the stack that blocked the loop.
+        """
+        await admin_client.post("/api/v1/admin/loop-monitor/start", params={"threshold_ms": 50}, headers=HEADERS)
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)
+        await asyncio.sleep(0.1)
+        report = (await admin_client.post("/api/v1/admin/loop-monitor/stop", headers=HEADERS)).json()
+
+        assert len(report["stalls"]) == 1
+        assert any("test_admin.py" in line for line in report["stalls"][0]["stack"])
+        assert report["stalls"][0]["duration_ms"] >= 250
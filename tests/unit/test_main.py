@@ -1,6 +1,7 @@
 import pytest
 import httpx
-from main import app, get_redis_client
+from main import app, get_health_prober
+from health import HealthProber
 import redis
 from fastapi import status as http_status
 import redis.exceptions
@@ -10,27 +11,33 @@ pytestmark = pytest.mark.asyncio
 @pytest.fixture(autouse=True)
 def mock_app_settings(mocker):
     """Mocks application settings for tests in this module."""
-    mocked_settings = mocker.patch("main.settings")
+    mocked_settings = mocker.patch("health.settings")
     mocked_settings.SERVICE_NAME = "notification-service-test"
     mocked_settings.API_VERSION = "0.0.1-test"
     return mocked_settings
 
+@pytest.fixture
+def health_prober(mock_redis_client):
+    """A prober with only the Redis check registered, probed on demand by the tests."""
+    prober = HealthProber(interval_seconds=10)
+    prober.register("redis", mock_redis_client.ping)
+    app.dependency_overrides[get_health_prober] = lambda: prober
+    yield prober
+    app.dependency_overrides = {}
+
 class TestMainApp:
 
-    async def test_health_check_pass(self, mock_redis_client):
+    async def test_health_check_pass(self, mock_redis_client, health_prober):
         """
         Tests UT-012 (renomeado): Verifies the /health endpoint returns 200 OK
         and the new JSON structure when Redis connection is healthy.
         """
         mock_redis_client.ping.return_value = True
-
-        app.dependency_overrides[get_redis_client] = lambda: mock_redis_client
+        await health_prober.run_checks()
 
         async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
             response = await client.get("/api/v1/health")
 
-        app.dependency_overrides = {}
-
         assert response.status_code == http_status.HTTP_200_OK
         data = response.json()
         assert data["status"] == "pass"
@@ -43,21 +50,18 @@ class TestMainApp:
         assert "output" not in check
         mock_redis_client.ping.assert_awaited_once()
 
-    async def test_health_check_fail_redis(self, mock_redis_client):
+    async def test_health_check_fail_redis(self, mock_redis_client, health_prober):
         """
         Tests UT-013 (renomeado): Verifies the /health endpoint returns 503 Service Unavailable
         and the new JSON failure structure when Redis ping raises ConnectionError.
         """
         error_message = "Mock Redis connection failed"
         mock_redis_client.ping.side_effect = redis.exceptions.ConnectionError(error_message)
-
-        app.dependency_overrides[get_redis_client] = lambda: mock_redis_client
+        await health_prober.run_checks()
 
         async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
             response = await client.get("/api/v1/health")
 
-        app.dependency_overrides = {}
-
         assert response.status_code == http_status.HTTP_503_SERVICE_UNAVAILABLE
         data = response.json()
         assert data["status"] == "fail"
@@ -69,3 +73,33 @@ class TestMainApp:
         assert check["status"] == "fail"
         assert error_message in check["output"]
         mock_redis_client.ping.assert_awaited_once()
+
+    async def test_ut027_health_reads_cached_results(self, mock_redis_client, health_prober):
+        """
+        Tests UT-027: Verifies that health requests are served from the cached
+        probe results without touching Redis.
+        """
+        await health_prober.run_checks()
+
+        async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            for _ in range(3):
+                response = await client.get("/api/v1/health")
+                assert response.status_code == http_status.HTTP_200_OK
+
+        mock_redis_client.ping.assert_awaited_once()
+
+    async def test_ut028_readiness_reflects_backpressure(self, health_prober):
+        """
+        Tests UT-028: Verifies that liveness passes while readiness fails when the
+        consumer reports back-pressure.
+        """
+        health_prober.set_backpressure_source(lambda: True)
+        await health_prober.run_checks()
+
+        async with httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            live = await client.get("/api/v1/health/live")
+            ready = await client.get("/api/v1/health/ready")
+
+        assert live.status_code == http_status.HTTP_200_OK
+        assert ready.status_code == http_status.HTTP_503_SERVICE_UNAVAILABLE
+        assert ready.json()["backpressure"] is True
@@ -0,0 +1,72 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import startup
+from startup import StartupError, backoff_delay, retry_with_backoff, warm_up
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(startup.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+class TestStartup:
+
+    async def test_ut041_backoff_grows_and_stops_at_deadline(self, no_sleep, monkeypatch):
+        """
+        Tests UT-041: Verifies exponential backoff with jitter between attempts,
+        capped at the maximum delay, and that the last error is raised once the
+        deadline would be passed.
+        """
+        monkeypatch.setattr(startup.random, "uniform", lambda low, high: high)
+        operation = AsyncMock(side_effect=[ConnectionError("down"), ConnectionError("down"), "ok"])
+
+        assert await retry_with_backoff(operation, name="redis", initial_seconds=1, max_seconds=10) == "ok"
+        assert no_sleep == [1, 2]
+        assert backoff_delay(10, 1, 10) == 10
+
+        failing = AsyncMock(side_effect=ConnectionError("still down"))
+        with pytest.raises(ConnectionError, match="still down"):
+            await retry_with_backoff(failing, name="redis", deadline=time.monotonic() + 2.5,
+                                     initial_seconds=1, max_seconds=10)
+        assert failing.await_count == 3
+
+    async def test_ut042_warm_up_runs_concurrently_and_fails_on_critical(self):
+        """
+        Tests UT-042: Verifies that warm-up steps run concurrently, that a
+        non-critical failure does not stop startup, and that a critical failure
+        raises StartupError after every step finished.
+        """
+        events = []
+
+        async def slow(name):
+            events.append(f"{name}:start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name}:end")
+
+        async def broken(deadline):
+            raise ConnectionError("smtp down")
+
+        await warm_up({
+            "redis": (lambda deadline: slow("redis"), True),
+            "rabbitmq": (lambda deadline: slow("rabbitmq"), True),
+            "smtp": (broken, False),
+        }, deadline_seconds=1)
+        assert events[:2] == ["redis:start", "rabbitmq:start"]
+
+        with pytest.raises(StartupError, match="rabbitmq"):
+            await warm_up({
+                "redis": (lambda deadline: slow("redis"), True),
+                "rabbitmq": (broken, True),
+            }, deadline_seconds=1)
+        assert events[-1] == "redis:end"
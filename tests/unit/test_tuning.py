@@ -0,0 +1,127 @@
+import pytest
+import json
+from unittest.mock import AsyncMock
+
+from config import settings
+from notification_service.concurrency import AIMDConcurrencyLimiter
+from tuning import OVERRIDES_KEY, TUNABLE_SETTINGS, RuntimeTuner, TuningError
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def restore_settings(monkeypatch):
+    for name in TUNABLE_SETTINGS:
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+
+
+@pytest.fixture
+def pod_a(fake_redis, restore_settings, monkeypatch) -> RuntimeTuner:
+    monkeypatch.setattr(settings, "RABBITMQ_PREFETCH_COUNT", 50)
+    monkeypatch.setattr(settings, "CONCURRENCY_MIN_LIMIT", 1)
+    monkeypatch.setattr(settings, "CONCURRENCY_MAX_LIMIT", 100)
+    monkeypatch.setattr(settings, "ADAPTIVE_CONCURRENCY_ENABLED", False)
+    return RuntimeTuner(fake_redis, channel="tuning:changes", audit_max_entries=2, instance_id="pod-a")
+
+
+class TestRuntimeTuning:
+
+    async def test_ut056_invalid_changes_are_rejected_as_a_whole(self, pod_a, fake_redis):
+        """
+        Tests UT-056: Verifies that a change naming an unknown setting, a value
+        out of range or of the wrong type, or inconsistent limiter bounds is
+        rejected without applying or publishing any part of it.
+        """
+        set_prefetch = AsyncMock()
+        pod_a.on("RABBITMQ_PREFETCH_COUNT", set_prefetch)
+
+        for changes in ({"RABBITMQ_PREFETCH_COUNT": 20, "UNKNOWN": 1},
+                        {"RABBITMQ_PREFETCH_COUNT": 20, "RABBITMQ_MAX_RETRIES": 1000},
+                        {"RABBITMQ_PREFETCH_COUNT": "many"},
+                        {"CONCURRENCY_MIN_LIMIT": 10, "CONCURRENCY_MAX_LIMIT": 5}):
+            with pytest.raises(TuningError):
+                await pod_a.update(changes, actor="alice")
+
+        assert settings.RABBITMQ_PREFETCH_COUNT == 50
+        set_prefetch.assert_not_awaited()
+        assert not fake_redis.published
+
+    async def test_ut077_valid_change_is_applied_persisted_and_audited(self, pod_a, fake_redis):
+        """
+        Tests UT-077: Verifies that a valid change updates the settings, runs
+        the registered appliers (prefetch re-applied, limiter clamped to the new
+        bounds), and is persisted, audited and published.
+        """
+        set_prefetch = AsyncMock()
+        limiter = AIMDConcurrencyLimiter(initial_limit=30, max_limit=100)
+        pod_a.on("RABBITMQ_PREFETCH_COUNT", set_prefetch)
+        pod_a.on("CONCURRENCY_MAX_LIMIT", lambda value: limiter.set_bounds(settings.CONCURRENCY_MIN_LIMIT, value))
+
+        result = await pod_a.update({"RABBITMQ_PREFETCH_COUNT": "20", "CONCURRENCY_MAX_LIMIT": 5}, actor="alice")
+
+        assert result["synced"] is True
+        assert result["applied"]["RABBITMQ_PREFETCH_COUNT"] == {"old": 50, "new": 20}
+        set_prefetch.assert_awaited_once_with(20)
+        assert (limiter.max_limit, limiter.limit) == (5, 5)
+        assert fake_redis.hashes[OVERRIDES_KEY] == {"RABBITMQ_PREFETCH_COUNT": "20", "CONCURRENCY_MAX_LIMIT": "5"}
+        assert (await pod_a.audit_log())[0]["actor"] == "alice"
+        channel, message = fake_redis.published[0]
+        assert channel == "tuning:changes"
+        assert json.loads(message)["values"] == {"RABBITMQ_PREFETCH_COUNT": 20, "CONCURRENCY_MAX_LIMIT": 5}
+
+    async def test_ut078_published_change_applies_on_other_pods_only(self, pod_a, fake_redis, monkeypatch):
+        """
+        Tests UT-078: Verifies that another pod applies a published change and
+        runs its appliers, while the publishing pod ignores its own message.
+        """
+        pod_b = RuntimeTuner(fake_redis, channel="tuning:changes", instance_id="pod-b")
+        pod_b_prefetch = AsyncMock()
+        pod_b.on("RABBITMQ_PREFETCH_COUNT", pod_b_prefetch)
+        await pod_a.update({"RABBITMQ_PREFETCH_COUNT": 20}, actor="alice")
+        # The same settings object stands in for both pods, so roll back what pod-b should re-apply.
+        monkeypatch.setattr(settings, "RABBITMQ_PREFETCH_COUNT", 50)
+        _, message = fake_redis.published[0]
+
+        await pod_a.handle_message(message)
+        assert settings.RABBITMQ_PREFETCH_COUNT == 50
+        await pod_b.handle_message(message)
+
+        assert settings.RABBITMQ_PREFETCH_COUNT == 20
+        pod_b_prefetch.assert_awaited_once_with(20)
+
+    async def test_ut079_null_resets_a_setting_and_removes_its_override(self, pod_a, fake_redis):
+        """
+        Tests UT-079: Verifies that null restores the startup value, removes the
+        override, publishes the restored value and is audited.
+        """
+        await pod_a.update({"RABBITMQ_PREFETCH_COUNT": 20}, actor="alice")
+
+        await pod_a.update({"RABBITMQ_PREFETCH_COUNT": None}, actor="bob")
+
+        assert settings.RABBITMQ_PREFETCH_COUNT == 50
+        assert "RABBITMQ_PREFETCH_COUNT" not in fake_redis.hashes[OVERRIDES_KEY]
+        assert json.loads(fake_redis.published[-1][1])["values"] == {"RABBITMQ_PREFETCH_COUNT": 50}
+        assert [entry["actor"] for entry in await pod_a.audit_log()] == ["bob", "alice"]
+
+    async def test_ut076_changes_without_effect_are_not_recorded(self, fake_redis, restore_settings, monkeypatch):
+        """
+        Tests UT-076: Verifies that RABBITMQ_PREFETCH_COUNT is rejected while
+        adaptive concurrency drives the prefetch, and that a change an applier
+        refuses is reverted and neither reported as applied nor audited.
+        """
+        monkeypatch.setattr(settings, "RABBITMQ_PREFETCH_COUNT", 50)
+        monkeypatch.setattr(settings, "INGESTION_BACKEND", "rabbitmq")
+        tuner = RuntimeTuner(fake_redis, instance_id="pod-a")
+
+        monkeypatch.setattr(settings, "ADAPTIVE_CONCURRENCY_ENABLED", True)
+        with pytest.raises(TuningError):
+            await tuner.update({"RABBITMQ_PREFETCH_COUNT": 20}, actor="alice")
+
+        monkeypatch.setattr(settings, "ADAPTIVE_CONCURRENCY_ENABLED", False)
+        tuner.on("RABBITMQ_PREFETCH_COUNT", AsyncMock(side_effect=ConnectionError("Consumer channel is closed")))
+        result = await tuner.update({"RABBITMQ_PREFETCH_COUNT": 20, "RABBITMQ_MAX_RETRIES": 5}, actor="alice")
+
+        assert settings.RABBITMQ_PREFETCH_COUNT == 50
+        assert list(result["applied"]) == ["RABBITMQ_MAX_RETRIES"]
+        assert list((await tuner.audit_log())[0]["changes"]) == ["RABBITMQ_MAX_RETRIES"]
+        assert "RABBITMQ_PREFETCH_COUNT" not in fake_redis.hashes[OVERRIDES_KEY]
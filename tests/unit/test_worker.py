@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import worker
+
+pytestmark = pytest.mark.asyncio
+
+SRC_DIR = Path(__file__).resolve().parents[2] / "src"
+
+
+class TestWorker:
+
+    async def test_ut044_worker_path_does_not_import_web_stack(self):
+        """
+        Tests UT-044: Verifies that importing the worker and the consumer runtime
+        it starts does not pull in FastAPI, uvicorn or the HTTP instrumentator.
+        """
+        code = (
+            "import sys, worker, bootstrap; "
+            "print(','.join(m for m in ('fastapi', 'uvicorn', 'prometheus_fastapi_instrumentator') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=SRC_DIR,
+            env={**os.environ, "PYTHONPATH": str(SRC_DIR)},
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == ""
+
+    async def test_ut045_worker_exits_non_zero_when_consumer_stops(self, mocker):
+        """
+        Tests UT-045: Verifies the worker serves metrics, records startup timings
+        and exits with a non-zero code, after stopping the runtime, when the
+        consumer task ends without a shutdown signal.
+        """
+        async def failing_consumer():
+            raise RuntimeError("channel closed")
+
+        runtime = MagicMock()
+        runtime.consumer_task = asyncio.create_task(failing_consumer())
+        mocker.patch("bootstrap.start_consumer_runtime", AsyncMock(return_value=runtime))
+        stop_runtime = mocker.patch("bootstrap.stop_consumer_runtime", AsyncMock())
+        start_http_server = mocker.patch("prometheus_client.start_http_server")
+        time_to_ready = mocker.patch.object(worker, "STARTUP_TIME_TO_READY")
+
+        exit_code = await worker.run_worker()
+
+        assert exit_code == 1
+        start_http_server.assert_called_once_with(worker.settings.WORKER_METRICS_PORT)
+        time_to_ready.set.assert_called_once()
+        stop_runtime.assert_awaited_once_with(runtime)
+        with pytest.raises(RuntimeError):
+            runtime.consumer_task.result()